@@ -8068,6 +8068,7 @@ def _register_lazy_builtins():
     # register lazy builtins from other modules; called at startup and should
     # be only called once.
     for name, aliases, module_name in [
+        ("cmd_benchmark_transport", [], "breezy.transport.replay"),
         ("cmd_bisect", [], "breezy.bisect"),
         ("cmd_bundle_info", [], "breezy.bzr.bundle.commands"),
         ("cmd_config", [], "breezy.config"),
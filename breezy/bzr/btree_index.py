@@ -750,9 +750,25 @@ class BTreeGraphIndex:
         pages fit in that length.
         """
         recommended_read = self._transport.recommended_page_size()
+        self._recommended_read = recommended_read
         recommended_pages = int(math.ceil(recommended_read / _PAGE_SIZE))
         return recommended_pages
 
+    def _update_recommended_pages(self):
+        """Follow changes to the transport's recommended_page_size.
+
+        Transports that measure their connection may recommend larger reads
+        once they know it better.
+        """
+        if self._transport.recommended_page_size() != self._recommended_read:
+            self._recommended_pages = self._compute_recommended_pages()
+            if debug.debug_flag_enabled("readv"):
+                trace.mutter(
+                    "readv %s: expanding reads to %d pages",
+                    self._name,
+                    self._recommended_pages,
+                )
+
     def _compute_total_pages_in_index(self):
         """How many pages are in the index.
 
@@ -788,6 +804,7 @@ class BTreeGraphIndex:
         if debug.debug_flag_enabled("index"):
             trace.mutter("expanding: %s\toffsets: %s", self._name, offsets)
 
+        self._update_recommended_pages()
         if len(offsets) >= self._recommended_pages:
             # Don't add more, we are already requesting more than enough
             if debug.debug_flag_enabled("index"):
@@ -26,10 +26,11 @@ branch.
 
 import operator
 
-from .. import errors, ui
+from .. import config, errors, ui
 from ..i18n import gettext
 from ..revision import NULL_REVISION
-from ..trace import mutter
+from ..trace import mutter, warning
+from . import vf_repository
 
 
 class RepoFetcher:
@@ -119,11 +120,10 @@ class RepoFetcher:
         with ui.ui_factory.nested_progress_bar() as pb:
             pb.update("Get stream source")
             source = self.from_repository._get_source(self.to_repository._format)
-            stream = source.get_stream(search)
             from_format = self.from_repository._format
             pb.update("Inserting stream")
-            resume_tokens, missing_keys = self.sink.insert_stream(
-                stream, from_format, []
+            resume_tokens, missing_keys = self._insert_stream(
+                source, search, from_format
             )
             if missing_keys:
                 pb.update("Missing keys")
@@ -143,6 +143,56 @@ class RepoFetcher:
             pb.update("Finishing stream")
             self.sink.finished()
 
+    def _insert_stream(self, source, search, from_format):
+        """Insert the stream for search from source into the sink.
+
+        Sources that support it fetch the stream over
+        repository.fetch_connections connections.  If the connection is lost
+        while the stream is inserted and the source can resume streams, the
+        data inserted so far is kept and only the remainder of the stream is
+        requested, up to repository.fetch_resume_attempts times.
+
+        :return: The result of the sink's insert_stream.
+        """
+        stack = config.GlobalStack()
+        attempts = stack.get("repository.fetch_resume_attempts")
+        stream = self._get_stream(source, search, stack)
+        if not attempts or getattr(source, "get_stream_remainder", None) is None:
+            return self.sink.insert_stream(stream, from_format, [])
+        checkpoint = vf_repository.StreamCheckpoint()
+        while True:
+            try:
+                return self.sink.insert_stream(
+                    checkpoint.track(stream),
+                    from_format,
+                    checkpoint.resume_tokens,
+                    checkpoint=checkpoint,
+                )
+            except ConnectionError as e:
+                if not checkpoint.resume_tokens:
+                    raise
+                stream = None
+                if attempts > 0:
+                    attempts -= 1
+                    warning(gettext("Connection lost during fetch (%s), resuming."), e)
+                    stream = source.get_stream_remainder(search, checkpoint)
+                if stream is None:
+                    self._abort_suspended_write_group(checkpoint.resume_tokens)
+                    raise
+
+    def _get_stream(self, source, search, stack):
+        connections = stack.get("repository.fetch_connections")
+        if connections > 1 and getattr(source, "get_parallel_stream", None):
+            stream = source.get_parallel_stream(search, connections)
+            if stream is not None:
+                return stream
+        return source.get_stream(search)
+
+    def _abort_suspended_write_group(self, resume_tokens):
+        with self.to_repository.lock_write():
+            self.to_repository.resume_write_group(resume_tokens)
+            self.to_repository.abort_write_group(suppress_errors=True)
+
     def _revids_to_fetch(self):
         """Determines the exact revisions needed from self.from_repository to
         install self._last_revision in self.to_repository.
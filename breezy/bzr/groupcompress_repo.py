@@ -18,6 +18,7 @@
 
 import hashlib
 import time
+import zlib
 
 from .. import _bzr_rs, controldir, debug, errors, osutils, trace, ui
 from .. import revision as _mod_revision
@@ -1280,9 +1281,21 @@ class GroupCHKStreamSource(StreamSource):
         self._revision_keys = None
         self._text_keys = None
         self._text_fetch_order = "groupcompress"
+        self._text_partition = None
         self._chk_id_roots = None
         self._chk_p_id_roots = None
 
+    def partition_texts(self, index, count):
+        """Only stream the texts of one partition of the file ids.
+
+        Texts are partitioned by file id rather than by key, so that all the
+        texts of a file are still compressed together.
+
+        :param index: The partition to stream, from 0 to count - 1.
+        :param count: The number of partitions.
+        """
+        self._text_partition = (index, count)
+
     def _get_inventory_stream(self, inventory_keys, allow_absent=False):
         """Get a stream of inventory texts.
 
@@ -1374,8 +1387,14 @@ class GroupCHKStreamSource(StreamSource):
     def _get_text_stream(self):
         # Note: We know we don't have to handle adding root keys, because both
         # the source and target are the identical network name.
+        text_keys = self._text_keys
+        if self._text_partition is not None:
+            index, count = self._text_partition
+            text_keys = {
+                key for key in text_keys if zlib.crc32(key[0]) % count == index
+            }
         text_stream = self.from_repository.texts.get_record_stream(
-            self._text_keys, self._text_fetch_order, False
+            text_keys, self._text_fetch_order, False
         )
         return ("texts", text_stream)
 
@@ -1419,6 +1438,28 @@ class GroupCHKStreamSource(StreamSource):
             self.from_repository.texts.clear_cache()
             pb.update("Done", rc.max, rc.max)
 
+    def get_text_stream(self, search):
+        """Get a stream of just the texts get_stream would send for search.
+
+        The inventories and the file id maps of the CHK pages are still read
+        to find the texts to send, but the revisions, inventories and CHK
+        pages themselves are not streamed.  This is used for the partitions
+        of a parallel fetch after the first, which carries the rest.
+        """
+        revision_keys = [(rev_id,) for rev_id in search.get_keys()]
+        from_repo = self.from_repository
+        parent_keys = from_repo._find_parent_keys_of_revisions(revision_keys)
+        for _record in self._get_inventory_stream(revision_keys)[1]:
+            pass
+        from_repo.inventories.clear_cache()
+        # The first of the CHK streams walks the file id maps, collecting the
+        # text keys; the second only holds the parent id maps.
+        for _record in next(self._get_filtered_chk_streams(parent_keys))[1]:
+            pass
+        from_repo.chk_bytes.clear_cache()
+        yield self._get_text_stream()
+        from_repo.texts.clear_cache()
+
     def get_stream_for_missing_keys(self, missing_keys):
         # missing keys can only occur when we are byte copying and not
         # translating (because translation means we don't send
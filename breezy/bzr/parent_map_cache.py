@@ -0,0 +1,190 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""A persistent on-disk cache of revision parents for remote repositories.
+
+The parents of a revision never change once it has been committed, so
+parent maps retrieved from a smart server can be kept between invocations
+and consulted before asking the server again.
+
+Only present revisions are recorded.  That a revision is absent from a
+repository is *not* persistent knowledge (it may be pushed later), so
+negative results stay in the in-memory CachingParentsProvider.  Ghost
+parents are kept, as part of the parent list of the revisions that refer
+to them.
+
+The cache file is a sequence of blocks, each a 4-byte big-endian length
+followed by zlib-compressed lines of the form ``revid parent1 parent2...``.
+New entries are appended as a single block; once the file grows beyond its
+size limit it is rewritten keeping only the most recently added entries.
+"""
+
+import os
+import struct
+import zlib
+from hashlib import sha1
+
+from .. import bedding, osutils, trace
+from ..atomicfile import AtomicFile
+from ..revision import NULL_REVISION
+
+
+def cache_path_for_url(url):
+    """Return the path of the parent map cache file for a repository URL."""
+    return osutils.pathjoin(
+        bedding.cache_dir(),
+        "parent-maps",
+        sha1(url.rstrip("/").encode("utf-8")).hexdigest(),
+    )
+
+
+def _serialise_parent_map(parent_map):
+    lines = [b" ".join((key,) + tuple(parents)) for key, parents in parent_map.items()]
+    block = zlib.compress(b"\n".join(lines))
+    return struct.pack("!L", len(block)) + block
+
+
+def _cacheable(key, parents):
+    if key == NULL_REVISION or parents is None:
+        return False
+    for revid in (key,) + tuple(parents):
+        if not revid or b" " in revid or b"\n" in revid:
+            return False
+    return True
+
+
+class ParentMapCache:
+    """Revision parents for one remote repository, stored on local disk."""
+
+    def __init__(self, path, max_size):
+        """Create a ParentMapCache.
+
+        :param path: Path of the cache file.  It is created when entries are
+            first added.
+        :param max_size: Approximate limit on the size of the cache file, in
+            bytes.
+        """
+        self._path = path
+        self._max_size = max_size
+        self._parent_map = None
+        self._file_size = 0
+
+    @classmethod
+    def for_url(cls, url, max_size):
+        """Open the cache for the repository at url."""
+        return cls(cache_path_for_url(url), max_size)
+
+    def _load(self):
+        if self._parent_map is not None:
+            return
+        self._parent_map = {}
+        try:
+            with open(self._path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            trace.mutter("unable to read parent map cache %s: %s", self._path, e)
+            return
+        pos = 0
+        while pos + 4 <= len(data):
+            (length,) = struct.unpack("!L", data[pos : pos + 4])
+            end = pos + 4 + length
+            if end > len(data):
+                # A partially written block from an interrupted append.
+                break
+            try:
+                lines = zlib.decompress(data[pos + 4 : end]).split(b"\n")
+            except zlib.error:
+                trace.mutter("corrupt block in parent map cache %s", self._path)
+                break
+            for line in lines:
+                revids = line.split(b" ")
+                if revids[0]:
+                    self._parent_map[revids[0]] = tuple(revids[1:])
+            pos = end
+        self._file_size = pos
+
+    def get_parent_map(self, keys):
+        """Return the cached parents for keys, omitting unknown keys."""
+        self._load()
+        result = {}
+        for key in keys:
+            parents = self._parent_map.get(key)
+            if parents is not None:
+                result[key] = parents
+        return result
+
+    def add(self, parent_map):
+        """Record parents retrieved from the repository.
+
+        Entries that are already cached are ignored.
+        """
+        self._load()
+        new = {
+            key: tuple(parents)
+            for key, parents in parent_map.items()
+            if key not in self._parent_map and _cacheable(key, parents)
+        }
+        if not new:
+            return
+        self._parent_map.update(new)
+        block = _serialise_parent_map(new)
+        try:
+            if self._file_size + len(block) > self._max_size:
+                self._rewrite()
+            else:
+                self._append(block)
+        except OSError as e:
+            trace.mutter("unable to write parent map cache %s: %s", self._path, e)
+
+    def _ensure_directory(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _append(self, block):
+        self._ensure_directory()
+        with open(self._path, "ab") as f:
+            f.write(block)
+        self._file_size += len(block)
+
+    def _rewrite(self):
+        """Rewrite the cache file with the newest entries that fit.
+
+        Only half of the size limit is used, so the file isn't rewritten
+        again on every subsequent addition.
+        """
+        budget = self._max_size // 2
+        kept = []
+        for key, parents in reversed(self._parent_map.items()):
+            budget -= len(key) + sum(len(p) + 1 for p in parents) + 1
+            if budget < 0:
+                break
+            kept.append((key, parents))
+        self._parent_map = dict(reversed(kept))
+        self._ensure_directory()
+        f = AtomicFile(self._path)
+        try:
+            if self._parent_map:
+                block = _serialise_parent_map(self._parent_map)
+            else:
+                block = b""
+            f.write(block)
+            f.commit()
+        finally:
+            f.close()
+        self._file_size = len(block)
@@ -17,7 +17,9 @@
 import bz2
 import contextlib
 import os
+import queue
 import re
+import threading
 import zlib
 from typing import Callable, List, Optional
 
@@ -1382,6 +1384,9 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
             get_parent_map=self._get_parent_map_rpc
         )
         self._unstacked_provider.disable_cache()
+        # Persistent cache of revision parents, see _get_parent_map_cache.
+        self._parent_map_cache = None
+        self._parent_map_cache_checked = False
         # For tests:
         # These depend on the actual remote format, so force them off for
         # maximum compatibility. XXX: In future these should depend on the
@@ -2558,6 +2563,23 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
         """See breezy.Graph.get_parent_map()."""
         return self._make_parents_provider().get_parent_map(revision_ids)
 
+    def _get_parent_map_cache(self):
+        """Return the persistent parent map cache for this repository.
+
+        :return: A ParentMapCache, or None if the ``repository.parent_map_cache``
+            option is not enabled for this location.
+        """
+        if not self._parent_map_cache_checked:
+            self._parent_map_cache_checked = True
+            conf = _mod_config.LocationStack(self.base)
+            if conf.get("repository.parent_map_cache"):
+                from .parent_map_cache import ParentMapCache
+
+                self._parent_map_cache = ParentMapCache.for_url(
+                    self.base, conf.get("repository.parent_map_cache_size")
+                )
+        return self._parent_map_cache
+
     def _get_parent_map_rpc(self, keys):
         """Helper for get_parent_map that performs the RPC."""
         medium = self._client._medium
@@ -2596,6 +2618,16 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
                 return found_parents
         else:
             found_parents = {}
+        persistent_cache = self._get_parent_map_cache()
+        if persistent_cache is not None:
+            cached_parents = persistent_cache.get_parent_map(keys)
+            if cached_parents:
+                keys.difference_update(cached_parents)
+                if not keys:
+                    found_parents.update(cached_parents)
+                    return found_parents
+        else:
+            cached_parents = {}
         # TODO(Needs analysis): We could assume that the keys being requested
         # from get_parent_map are in a breadth first search, so typically they
         # will all be depth N from some common parent, and we don't have to
@@ -2665,7 +2697,7 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
             coded = bz2.decompress(response_handler.read_body_bytes())
             if coded == b"":
                 # no revisions found
-                return {}
+                return cached_parents
             lines = coded.split(b"\n")
             revision_graph = {}
             for line in lines:
@@ -2681,6 +2713,9 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
                         # no parents - so give the Graph result
                         # (NULL_REVISION,).
                         revision_graph[d[0]] = (NULL_REVISION,)
+            if persistent_cache is not None:
+                persistent_cache.add(revision_graph)
+            revision_graph.update(cached_parents)
             return revision_graph
 
     def get_signature_text(self, revision_id):
@@ -3150,7 +3185,9 @@ class RemoteStreamSink(vf_repository.StreamSink):
             stream = source.get_stream_for_missing_keys(missing_keys)
         return self.insert_stream_without_locking(stream, self.target_repo._format)
 
-    def insert_stream(self, stream, src_format, resume_tokens):
+    def insert_stream(self, stream, src_format, resume_tokens, checkpoint=None):
+        # The write group lives on the server, so an interrupted stream can
+        # not be checkpointed and checkpoint is ignored.
         target = self.target_repo
         target._unstacked_provider.missing_keys.clear()
         candidate_calls = [(b"Repository.insert_stream_1.19", (1, 19))]
@@ -3283,6 +3320,134 @@ class RemoteStreamSource(vf_repository.StreamSource):
             sources.append(repo)
         return self.missing_parents_chain(search, sources)
 
+    def get_parallel_stream(self, search, connections):
+        """Get a stream for search, fetching texts over several connections.
+
+        The server divides the texts into one partition per connection, by
+        file id.  The first connection also carries the rest of the stream.
+        Texts from all connections are merged into the stream, so they are
+        still inserted into one write group by the caller.
+
+        :param search: The search to get a stream for.
+        :param connections: The number of connections to use.
+        :return: A stream, or None if the stream can't be fetched in parallel.
+        """
+        repo = self.from_repository
+        if repo._fallback_repositories or self.to_format._fetch_uses_deltas:
+            # Texts with deltas against texts in other partitions could not be
+            # inserted in arbitrary order.
+            return None
+        medium = repo._client._medium
+        if medium._is_remote_before((3, 4)):
+            return None
+        path = repo.controldir._path_for_remote_call(repo._client)
+        search_bytes = repo._serialise_search_result(search)
+        try:
+            first = self._get_stream_partition(
+                repo._client, path, search_bytes, 0, connections
+            )
+        except errors.UnknownSmartMethod:
+            medium._remember_remote_is_before((3, 4))
+            return None
+        return self._iter_parallel_stream(first, path, search_bytes, connections)
+
+    def _iter_parallel_stream(self, first, path, search_bytes, connections):
+        # The extra connections are only opened once the stream is read, and
+        # closed again by _merge_text_streams.
+        url = self.from_repository.controldir.root_transport.base
+        mediums = []
+        others = []
+        try:
+            for index in range(1, connections):
+                medium = _mod_transport.get_transport_from_url(url).get_smart_medium()
+                mediums.append(medium)
+                others.append(
+                    self._get_stream_partition(
+                        _SmartClient(medium), path, search_bytes, index, connections
+                    )
+                )
+        except BaseException:
+            for medium in mediums:
+                medium.disconnect()
+            raise
+        yield from _merge_text_streams(first, others, mediums)
+
+    def _get_stream_partition(self, client, path, search_bytes, index, count):
+        repo = self.from_repository
+        args = (path, self.to_format.network_name(), b"%d" % index, b"%d" % count)
+        try:
+            response_tuple, response_handler = (
+                client.call_with_body_bytes_expecting_body(
+                    b"Repository.get_stream_partition", args, search_bytes
+                )
+            )
+        except errors.ErrorFromSmartServer as err:
+            repo._translate_error(err)
+        if response_tuple[0] != b"ok":
+            raise errors.UnexpectedSmartServerResponse(response_tuple)
+        byte_stream = response_handler.read_streamed_body()
+        src_format, stream = smart_repo._byte_stream_to_stream(
+            byte_stream, self._record_counter if index == 0 else None
+        )
+        if src_format.network_name() != repo._format.network_name():
+            raise AssertionError(
+                "Mismatched RemoteRepository and stream src {!r}, {!r}".format(
+                    src_format.network_name(), repo._format.network_name()
+                )
+            )
+        return stream
+
+    def get_stream_remainder(self, search, checkpoint):
+        """Get the part of the stream for search that checkpoint lacks.
+
+        This is used to resume a stream from get_stream after the connection
+        was lost, without transferring the data inserted before that again.
+
+        :param search: The search the interrupted stream was for.
+        :param checkpoint: The vf_repository.StreamCheckpoint recording the
+            progress of the interrupted stream.
+        :return: A stream, or None if the remainder of the stream can not be
+            requested and it has to be restarted.
+        """
+        repo = self.from_repository
+        if repo._fallback_repositories:
+            # Streams from stacked repositories are chained together from
+            # several sources.
+            return None
+        client = repo._client
+        medium = client._medium
+        if medium._is_remote_before((3, 4)):
+            return None
+        medium.reset()
+        path = repo.controldir._path_for_remote_call(client)
+        body = smart_repo._serialise_stream_continuation(
+            repo._serialise_search_result(search), checkpoint
+        )
+        try:
+            response_tuple, response_handler = (
+                repo._call_with_body_bytes_expecting_body(
+                    b"Repository.resume_stream",
+                    (path, self.to_format.network_name()),
+                    body,
+                )
+            )
+        except errors.UnknownSmartMethod:
+            medium._remember_remote_is_before((3, 4))
+            return None
+        if response_tuple[0] != b"ok":
+            raise errors.UnexpectedSmartServerResponse(response_tuple)
+        byte_stream = response_handler.read_streamed_body()
+        src_format, stream = smart_repo._byte_stream_to_stream(
+            byte_stream, self._record_counter
+        )
+        if src_format.network_name() != repo._format.network_name():
+            raise AssertionError(
+                "Mismatched RemoteRepository and stream src {!r}, {!r}".format(
+                    src_format.network_name(), repo._format.network_name()
+                )
+            )
+        return stream
+
     def _get_real_stream_for_missing_keys(self, missing_keys):
         self.from_repository._ensure_real()
         real_repo = self.from_repository._real_repository
@@ -3447,6 +3612,119 @@ class RemoteStreamSource(vf_repository.StreamSource):
             yield content
 
 
+def _iter_wire_units(records):
+    """Group records into the units they were sent over the wire in.
+
+    The records of a groupcompress block follow the first record of the
+    block, and have to be inserted directly after it.
+    """
+    unit = []
+    for record in records:
+        if unit and record.storage_kind != "groupcompress-block-ref":
+            yield unit
+            unit = []
+        unit.append(record)
+    if unit:
+        yield unit
+
+
+def _read_text_units(stream, units, stop):
+    """Read the texts of stream onto the units queue.
+
+    This runs in a thread per connection.  None is queued when the stream is
+    finished, or the exception that stopped reading it.  Reading stops early
+    when the stop event is set.
+    """
+    try:
+        for kind, substream in stream:
+            if kind != "texts":
+                raise errors.UnexpectedSmartServerResponse((kind.encode("ascii"),))
+            for unit in _iter_wire_units(substream):
+                if stop.is_set():
+                    return
+                units.put(unit)
+    except BaseException as e:
+        units.put(e)
+    else:
+        units.put(None)
+
+
+def _merge_text_streams(first, others, mediums=()):
+    """Merge the texts of several stream partitions into the first stream.
+
+    The texts of the other partitions are merged into the texts substream of
+    the first, so that all texts are inserted as one substream, in the
+    position the source put them in.  Until the first stream gets to its
+    texts, the readers of the others only fill the queue.  Sources that
+    partition their texts always send a texts substream in the first
+    partition; the others are empty for sources that don't.
+
+    When the merged stream is closed, whether it was read completely or not,
+    the background threads are stopped and mediums are disconnected.
+
+    :param first: The stream of the first partition, with all kinds of
+        substream.
+    :param others: Streams holding only texts, read in background threads.
+    :param mediums: The client mediums others are read from.
+    """
+    # Bound the number of units held in memory; readers that get too far
+    # ahead of the inserter wait, which pushes back on their connection.
+    units = queue.Queue(maxsize=16 * len(others))
+    stop = threading.Event()
+    readers = [
+        threading.Thread(
+            target=_read_text_units, args=(stream, units, stop), daemon=True
+        )
+        for stream in others
+    ]
+    pending = [len(others)]
+
+    def next_unit(block):
+        item = units.get(block)
+        if item is None:
+            pending[0] -= 1
+            return []
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def merged_texts(substream):
+        for unit in _iter_wire_units(substream):
+            yield from unit
+            while pending[0]:
+                try:
+                    unit = next_unit(False)
+                except queue.Empty:
+                    break
+                yield from unit
+        while pending[0]:
+            yield from next_unit(True)
+
+    try:
+        for reader in readers:
+            reader.start()
+        texts_sent = False
+        for kind, substream in first:
+            if kind == "texts" and not texts_sent:
+                texts_sent = True
+                substream = merged_texts(substream)
+            yield kind, substream
+        if not texts_sent:
+            yield "texts", merged_texts([])
+    finally:
+        stop.set()
+        for medium in mediums:
+            medium.disconnect()
+        # Readers blocked on a full queue only notice stop once there is
+        # room again.
+        for reader in readers:
+            while reader.is_alive():
+                with contextlib.suppress(queue.Empty):
+                    while True:
+                        units.get_nowait()
+                reader.join(0.1)
+
+
 class RemoteBranchLockableFiles(LockableFiles):
     """A 'LockableFiles' implementation that talks to a smart server.
 
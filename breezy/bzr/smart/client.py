@@ -204,6 +204,7 @@ class _SmartClientRequest:
             response_tuple = response_handler.read_response_tuple(
                 expect_body=self.expect_response_body
             )
+            self._remember_body_encoding(response_handler)
         except ConnectionResetError:
             self.client._medium.reset()
             if not self._is_safe_to_send_twice():
@@ -217,8 +218,18 @@ class _SmartClientRequest:
             response_tuple = response_handler.read_response_tuple(
                 expect_body=self.expect_response_body
             )
+            self._remember_body_encoding(response_handler)
         return (response_tuple, response_handler)
 
+    def _remember_body_encoding(self, response_handler):
+        """If the server compressed its response, compress our requests too."""
+        headers = getattr(response_handler, "headers", None)
+        if not headers:
+            return
+        encoding = headers.get(protocol.BODY_ENCODING_HEADER)
+        if encoding is not None:
+            self.client._medium._remember_body_encoding(encoding)
+
     def _call_determining_protocol_version(self):
         """Determine what protocol the remote server supports.
 
@@ -259,7 +270,11 @@ class _SmartClientRequest:
         """Build the encoding stack for a given protocol version."""
         request = self.client._medium.get_request()
         if version == 3:
+            medium = self.client._medium
             request_encoder = protocol.ProtocolThreeRequester(request)
+            request_encoder.set_body_encodings(
+                medium._get_accepted_body_encodings(), medium._body_encoding
+            )
             response_handler = message.ConventionalResponseHandler()
             response_proto = protocol.ProtocolThreeDecoder(
                 response_handler, expect_version_marker=True
@@ -225,14 +225,19 @@ class SmartServerStreamMedium(SmartMedium):
 
     _timer = time.time
 
-    def __init__(self, backing_transport, root_client_path="/", timeout=None):
+    def __init__(
+        self, backing_transport, root_client_path="/", timeout=None, metrics=None
+    ):
         """Construct new server.
 
         :param backing_transport: Transport for the directory served.
+        :param metrics: An optional metrics.ServerMetrics to record the
+            requests served in.
         """
         # backing_transport could be passed to serve instead of __init__
         self.backing_transport = backing_transport
         self.root_client_path = root_client_path
+        self._metrics = metrics
         self.finished = False
         if timeout is None:
             raise AssertionError("You must supply a timeout.")
@@ -246,6 +251,8 @@ class SmartServerStreamMedium(SmartMedium):
         # None during interpreter shutdown.
         from sys import stderr
 
+        if self._metrics is not None:
+            self._metrics.connection_opened()
         try:
             while not self.finished:
                 server_protocol = self._build_protocol()
@@ -259,6 +266,9 @@ class SmartServerStreamMedium(SmartMedium):
         except Exception as e:
             stderr.write(f"{self} terminating on exception {e}\n")
             raise
+        finally:
+            if self._metrics is not None:
+                self._metrics.connection_closed()
         self._disconnect_client()
 
     def _stop_gracefully(self):
@@ -347,12 +357,21 @@ class SmartServerStreamMedium(SmartMedium):
         if protocol is None:
             return
         try:
-            self._serve_one_request_unguarded(protocol)
+            if self._metrics is None:
+                self._serve_one_request_unguarded(protocol)
+            else:
+                with self._metrics.track_request():
+                    self._serve_one_request_unguarded(protocol)
         except KeyboardInterrupt:
             raise
         except Exception:
             self.terminate_due_to_error()
 
+    def _report_activity(self, bytes, direction):
+        if self._metrics is not None:
+            self._metrics.record_activity(bytes, direction)
+        super()._report_activity(bytes, direction)
+
     def terminate_due_to_error(self):
         """Called when an unhandled exception from the protocol occurs."""
         raise NotImplementedError(self.terminate_due_to_error)
@@ -366,14 +385,20 @@ class SmartServerStreamMedium(SmartMedium):
 
 
 class SmartServerSocketStreamMedium(SmartServerStreamMedium):
-    def __init__(self, sock, backing_transport, root_client_path="/", timeout=None):
+    def __init__(
+        self, sock, backing_transport, root_client_path="/", timeout=None, metrics=None
+    ):
         """Constructor.
 
         :param sock: the socket the server will read from.  It will be put
             into blocking mode.
         """
         SmartServerStreamMedium.__init__(
-            self, backing_transport, root_client_path=root_client_path, timeout=timeout
+            self,
+            backing_transport,
+            root_client_path=root_client_path,
+            timeout=timeout,
+            metrics=metrics,
         )
         sock.setblocking(True)
         self.socket = sock
@@ -764,6 +789,11 @@ class SmartClientMedium(SmartMedium):
         # _remote_version_is_before tracks the bzr version the remote side
         # can be based on what we've seen so far.
         self._remote_version_is_before = None
+        # The body encodings we ask the server to compress responses with
+        # (read from configuration on first use), and the encoding the server
+        # has told us it supports for compressing request bodies.
+        self._accepted_body_encodings = None
+        self._body_encoding = None
         # Install debug hook function if debug flag is set.
         if debug.debug_flag_enabled("hpss"):
             global _debug_counter
@@ -824,6 +854,35 @@ class SmartClientMedium(SmartMedium):
             return
         self._remote_version_is_before = version_tuple
 
+    def _get_accepted_body_encodings(self):
+        """Return the body encodings the server may compress responses with.
+
+        This is controlled by the ``smart.body_compression`` option, and only
+        includes encodings that are available in this process.
+        """
+        if self._accepted_body_encodings is None:
+            from ...config import GlobalStack
+
+            requested = [
+                name.encode("ascii")
+                for name in GlobalStack().get("smart.body_compression")
+            ]
+            supported = protocol.supported_body_encodings()
+            self._accepted_body_encodings = [
+                encoding for encoding in requested if encoding in supported
+            ]
+        return self._accepted_body_encodings
+
+    def _remember_body_encoding(self, encoding):
+        """Record that the server can decode bodies compressed with encoding.
+
+        Subsequent requests on this medium will compress their bodies.
+        """
+        if encoding not in self._get_accepted_body_encodings():
+            # We never asked for that; leave request bodies alone.
+            return
+        self._body_encoding = encoding
+
     def protocol_version(self):
         """Find out if 'hello' smart request works."""
         if self._protocol_version_error is not None:
@@ -865,6 +924,10 @@ class SmartClientMedium(SmartMedium):
         The default implementation does nothing.
         """
 
+    def reset(self):
+        """We have been disconnected, reset current state."""
+        self.disconnect()
+
     def remote_path_from_transport(self, transport):
         """Convert transport into a path suitable for using in a request.
 
@@ -0,0 +1,254 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Metrics about the requests served by a smart server.
+
+A ServerMetrics object is shared by the connections of a SmartTCPServer.
+Each connection thread tracks the request it is serving; the request
+handler reports the verb and path of the request to the tracked request of
+its thread with note_request, so the protocol code needs no knowledge of
+metrics.  Nothing is tracked unless the server has metrics enabled.
+
+The metrics are rendered in the Prometheus text exposition format.
+"""
+
+import threading
+import time
+
+from ... import osutils
+
+# Upper bounds of the request duration histogram buckets, in seconds.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_UNKNOWN_VERB = "unknown"
+
+_local = threading.local()
+
+
+def note_request(verb, path=None):
+    """Record the verb and path of the request served by this thread.
+
+    :param verb: The verb of the request, as bytes.
+    :param path: The path the request operates on, as bytes, or None.
+    """
+    request = getattr(_local, "request", None)
+    if request is not None:
+        request.verb = verb.decode("ascii", "backslashreplace")
+        if path is not None:
+            request.path = path.decode("utf-8", "backslashreplace")
+
+
+def note_request_failed():
+    """Record that the request served by this thread failed."""
+    request = getattr(_local, "request", None)
+    if request is not None:
+        request.failed = True
+
+
+class _Request:
+    def __init__(self):
+        self.verb = _UNKNOWN_VERB
+        self.path = None
+        self.failed = False
+
+
+class _VerbMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.duration = 0.0
+        self.cpu = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class ServerMetrics:
+    """Counters and latency histograms for the requests of a smart server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._verbs = {}
+        self._path_cpu = {}
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.connections = 0
+        self.active_connections = 0
+        self.requests_in_progress = 0
+
+    def track_request(self):
+        """Return a context manager tracking a request served by this thread."""
+        return _RequestTracker(self)
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+            self.active_connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.active_connections -= 1
+
+    def record_activity(self, byte_count, direction):
+        """Count bytes read from or written to a client.
+
+        This has the signature of SmartMedium._report_activity.
+        """
+        with self._lock:
+            if direction == "read":
+                self.bytes_received += byte_count
+            elif direction == "write":
+                self.bytes_sent += byte_count
+
+    def _request_started(self):
+        with self._lock:
+            self.requests_in_progress += 1
+
+    def _request_finished(self, request, duration, cpu):
+        with self._lock:
+            self.requests_in_progress -= 1
+            verb = self._verbs.get(request.verb)
+            if verb is None:
+                verb = self._verbs[request.verb] = _VerbMetrics()
+            verb.count += 1
+            if request.failed:
+                verb.errors += 1
+            verb.duration += duration
+            verb.cpu += cpu
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    verb.buckets[i] += 1
+                    break
+            if request.path is not None:
+                self._path_cpu[request.path] = (
+                    self._path_cpu.get(request.path, 0.0) + cpu
+                )
+
+    def to_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            verbs = sorted(self._verbs.items())
+            path_cpu = sorted(self._path_cpu.items())
+            lines = []
+
+            def metric(name, kind, help, samples):
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for suffix, labels, value in samples:
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {value}")
+
+            metric(
+                "bzr_smart_requests_total",
+                "counter",
+                "Requests served, by verb.",
+                [("", {"verb": name}, verb.count) for name, verb in verbs],
+            )
+            metric(
+                "bzr_smart_request_errors_total",
+                "counter",
+                "Requests that got an error response, by verb.",
+                [("", {"verb": name}, verb.errors) for name, verb in verbs],
+            )
+            samples = []
+            for name, verb in verbs:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, verb.buckets):
+                    cumulative += count
+                    samples.append(
+                        ("_bucket", {"verb": name, "le": str(bound)}, cumulative)
+                    )
+                samples.append(("_bucket", {"verb": name, "le": "+Inf"}, verb.count))
+                samples.append(("_sum", {"verb": name}, verb.duration))
+                samples.append(("_count", {"verb": name}, verb.count))
+            metric(
+                "bzr_smart_request_duration_seconds",
+                "histogram",
+                "Time taken to read requests and write their responses, by verb.",
+                samples,
+            )
+            metric(
+                "bzr_smart_request_cpu_seconds_total",
+                "counter",
+                "CPU time spent serving requests, by verb.",
+                [("", {"verb": name}, verb.cpu) for name, verb in verbs],
+            )
+            metric(
+                "bzr_smart_path_cpu_seconds_total",
+                "counter",
+                "CPU time spent serving requests, by the path they operate on.",
+                [("", {"path": path}, cpu) for path, cpu in path_cpu],
+            )
+            metric(
+                "bzr_smart_received_bytes_total",
+                "counter",
+                "Bytes read from clients.",
+                [("", {}, self.bytes_received)],
+            )
+            metric(
+                "bzr_smart_sent_bytes_total",
+                "counter",
+                "Bytes written to clients.",
+                [("", {}, self.bytes_sent)],
+            )
+            metric(
+                "bzr_smart_connections_total",
+                "counter",
+                "Client connections accepted.",
+                [("", {}, self.connections)],
+            )
+            metric(
+                "bzr_smart_active_connections",
+                "gauge",
+                "Client connections currently open.",
+                [("", {}, self.active_connections)],
+            )
+            metric(
+                "bzr_smart_requests_in_progress",
+                "gauge",
+                "Requests currently being served.",
+                [("", {}, self.requests_in_progress)],
+            )
+        return "".join(line + "\n" for line in lines)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()]
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape_label_value(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _RequestTracker:
+    def __init__(self, metrics):
+        self._metrics = metrics
+
+    def __enter__(self):
+        self._request = _local.request = _Request()
+        self._metrics._request_started()
+        self._start = osutils.perf_counter()
+        self._cpu_start = time.thread_time()
+        return self._request
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = osutils.perf_counter() - self._start
+        cpu = time.thread_time() - self._cpu_start
+        _local.request = None
+        if exc_type is not None:
+            self._request.failed = True
+        self._metrics._request_finished(self._request, duration, cpu)
+        return False
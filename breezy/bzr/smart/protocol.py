@@ -21,6 +21,8 @@ client and server.
 import _thread
 import struct
 import sys
+import threading
+import zlib
 from collections import deque
 from io import BytesIO
 
@@ -43,6 +45,14 @@ MESSAGE_VERSION_THREE = _smart_rs.MESSAGE_VERSION_THREE
 REQUEST_VERSION_THREE = _smart_rs.REQUEST_VERSION_THREE
 RESPONSE_VERSION_THREE = _smart_rs.RESPONSE_VERSION_THREE
 
+# Protocol three headers used to negotiate compression of message bodies.
+# A client lists the encodings it can decode in ACCEPT_BODY_ENCODING_HEADER;
+# a message whose bytes parts are compressed names the encoding used in
+# BODY_ENCODING_HEADER.  Peers that don't know about these headers ignore
+# them, so compression is only ever used when both sides support it.
+ACCEPT_BODY_ENCODING_HEADER = b"Accept-Body-Encoding"
+BODY_ENCODING_HEADER = b"Body-Encoding"
+
 
 class SmartMessageHandlerError(errors.InternalBzrError):
     _fmt = "The message handler raised an exception:\n" "%(traceback_text)s"
@@ -59,6 +69,152 @@ class SmartMessageHandlerError(errors.InternalBzrError):
         self.traceback_text = "".join(traceback_strings)
 
 
+class _ZlibBodyCompressor:
+    """Compress the bytes parts of one message with zlib.
+
+    Each part is flushed with Z_SYNC_FLUSH, so the receiver can decompress it
+    as soon as it arrives while the whole message still shares one
+    compression context.
+    """
+
+    def __init__(self):
+        self._compressobj = zlib.compressobj()
+
+    def compress(self, data):
+        return self._compressobj.compress(data) + self._compressobj.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+
+class _ZlibBodyDecompressor:
+    def __init__(self):
+        self._decompressobj = zlib.decompressobj()
+
+    def decompress(self, data):
+        return self._decompressobj.decompress(data)
+
+
+class _ZstdBodyCompressor:
+    """Compress the bytes parts of one message with zstd.
+
+    Like _ZlibBodyCompressor, every part is flushed at a block boundary.
+    """
+
+    def __init__(self):
+        import zstandard
+
+        self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressobj = zstandard.ZstdCompressor().compressobj()
+
+    def compress(self, data):
+        return self._compressobj.compress(data) + self._compressobj.flush(
+            self._flush_mode
+        )
+
+
+class _ZstdBodyDecompressor:
+    def __init__(self):
+        import zstandard
+
+        self._decompressobj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data):
+        return self._decompressobj.decompress(data)
+
+
+def _zstd_available():
+    try:
+        import zstandard  # noqa: F401
+    except ModuleNotFoundError:
+        return False
+    return True
+
+
+# Map of encoding name -> (compressor factory, decompressor factory,
+# availability check).
+_body_encodings = {
+    b"zstd": (_ZstdBodyCompressor, _ZstdBodyDecompressor, _zstd_available),
+    b"zlib": (_ZlibBodyCompressor, _ZlibBodyDecompressor, lambda: True),
+}
+
+
+def supported_body_encodings():
+    """Return the body encodings usable in this process, most preferred first."""
+    return [name for name, (_, _, available) in _body_encodings.items() if available()]
+
+
+def select_body_encoding(accepted):
+    """Pick the body encoding to use given a peer's list of accepted encodings.
+
+    :param accepted: A sequence of encoding names (bytes) in the peer's order
+        of preference, or None.
+    :return: The first accepted encoding that is supported locally, or None.
+    """
+    if not accepted:
+        return None
+    supported = supported_body_encodings()
+    for encoding in accepted:
+        if encoding in supported:
+            return encoding
+    return None
+
+
+def _get_body_encoding(encoding):
+    """Return the (compressor, decompressor) factories for an encoding.
+
+    :raises SmartProtocolError: if the encoding is unknown or unavailable.
+    """
+    try:
+        compressor, decompressor, available = _body_encodings[encoding]
+    except (KeyError, TypeError) as e:
+        raise errors.SmartProtocolError(
+            f"Unsupported body encoding: {encoding!r}"
+        ) from e
+    if not available():
+        raise errors.SmartProtocolError(f"Unsupported body encoding: {encoding!r}")
+    return compressor, decompressor
+
+
+class BodyCompressionStats:
+    """Counters for the size of compressed message bodies.
+
+    ``raw`` sizes are the lengths of the body bytes before compression (when
+    sending) or after decompression (when receiving); ``wire`` sizes are the
+    lengths actually transmitted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.raw_bytes_sent = 0
+        self.wire_bytes_sent = 0
+        self.raw_bytes_received = 0
+        self.wire_bytes_received = 0
+
+    def record_sent(self, raw_count, wire_count):
+        with self._lock:
+            self.raw_bytes_sent += raw_count
+            self.wire_bytes_sent += wire_count
+
+    def record_received(self, raw_count, wire_count):
+        with self._lock:
+            self.raw_bytes_received += raw_count
+            self.wire_bytes_received += wire_count
+
+    def __repr__(self):
+        return "<%s sent %d->%d bytes, received %d->%d bytes>" % (
+            self.__class__.__name__,
+            self.raw_bytes_sent,
+            self.wire_bytes_sent,
+            self.wire_bytes_received,
+            self.raw_bytes_received,
+        )
+
+
+# Process-wide counters, updated by every protocol three encoder and decoder
+# that compresses or decompresses a message body.
+body_compression_stats = BodyCompressionStats()
+
+
 def _recv_tuple(from_file):
     req_line = from_file.readline()
     return _decode_tuple(req_line)
@@ -934,6 +1090,7 @@ class ProtocolThreeDecoder(_StatefulDecoder):
             self._number_needed_bytes = 4
         self.decoding_failed = False
         self.request_handler = self.message_handler = message_handler
+        self._body_decompressor = None
 
     def accept_bytes(self, bytes):
         self._number_needed_bytes = None
@@ -1029,6 +1186,10 @@ class ProtocolThreeDecoder(_StatefulDecoder):
         decoded = self._extract_prefixed_bencoded_data()
         if not isinstance(decoded, dict):
             raise errors.SmartProtocolError(f"Header object {decoded!r} is not a dict")
+        encoding = decoded.get(BODY_ENCODING_HEADER)
+        if encoding is not None:
+            decompressor_factory = _get_body_encoding(encoding)[1]
+            self._body_decompressor = decompressor_factory()
         self.state_accept = self._state_accept_expecting_message_part
         try:
             self.message_handler.headers_received(decoded)
@@ -1062,6 +1223,15 @@ class ProtocolThreeDecoder(_StatefulDecoder):
         # XXX: this should not buffer whole message part, but instead deliver
         # the bytes as they arrive.
         prefixed_bytes = self._extract_length_prefixed_bytes()
+        if self._body_decompressor is not None:
+            wire_count = len(prefixed_bytes)
+            try:
+                prefixed_bytes = self._body_decompressor.decompress(prefixed_bytes)
+            except Exception as e:
+                raise errors.SmartProtocolError(
+                    f"Unable to decompress message body: {e}"
+                ) from e
+            body_compression_stats.record_received(len(prefixed_bytes), wire_count)
         self.state_accept = self._state_accept_expecting_message_part
         try:
             self.message_handler.bytes_part_received(prefixed_bytes)
@@ -1113,6 +1283,7 @@ class _ProtocolThreeEncoder:
         self._buf = []
         self._buf_len = 0
         self._real_write_func = write_func
+        self._body_compressor = None
 
     def _write_func(self, bytes):
         # TODO: Another possibility would be to turn this into an async model.
@@ -1163,7 +1334,22 @@ class _ProtocolThreeEncoder:
         self._write_func(b"e")
         self.flush()
 
+    def _set_body_encoding(self, encoding):
+        """Compress the bytes parts of the message with encoding.
+
+        :param encoding: An encoding name, or None to send bodies as-is.
+        """
+        if encoding is None:
+            self._body_compressor = None
+        else:
+            compressor_factory = _get_body_encoding(encoding)[0]
+            self._body_compressor = compressor_factory()
+
     def _write_prefixed_body(self, bytes):
+        if self._body_compressor is not None:
+            raw_count = len(bytes)
+            bytes = self._body_compressor.compress(bytes)
+            body_compression_stats.record_sent(raw_count, len(bytes))
         self._write_func(b"b")
         self._write_func(struct.pack("!L", len(bytes)))
         self._write_func(bytes)
@@ -1202,6 +1388,19 @@ class ProtocolThreeResponder(_ProtocolThreeEncoder):
                 extra = extra[:29] + extra[-1] + "..."
         mutter("%12s: [%s] %s%s%s" % (action, self._thread_id, t, message, extra))
 
+    def negotiate_body_encoding(self, request_headers):
+        """Compress the response body if the client can decode it.
+
+        :param request_headers: The headers of the request being answered.
+        """
+        encoding = select_body_encoding(
+            request_headers.get(ACCEPT_BODY_ENCODING_HEADER)
+        )
+        if encoding is None:
+            return
+        self._headers[BODY_ENCODING_HEADER] = encoding
+        self._set_body_encoding(encoding)
+
     def send_error(self, exception):
         if self.response_sent:
             raise AssertionError(
@@ -1330,10 +1529,30 @@ class ProtocolThreeRequester(_ProtocolThreeEncoder, Requester):
         _ProtocolThreeEncoder.__init__(self, medium_request.accept_bytes)
         self._medium_request = medium_request
         self._headers = {}
+        self._body_encoding_headers = {}
         self.body_stream_started = None
 
     def set_headers(self, headers):
         self._headers = headers.copy()
+        self._headers.update(self._body_encoding_headers)
+
+    def set_body_encodings(self, accepted_encodings, encoding=None):
+        """Negotiate compression of the request and response bodies.
+
+        :param accepted_encodings: Encodings the server may compress the
+            response body with, most preferred first.
+        :param encoding: Encoding to compress the request body with.  Only
+            pass an encoding the server is already known to support.
+        """
+        self._body_encoding_headers = {}
+        if accepted_encodings:
+            self._body_encoding_headers[ACCEPT_BODY_ENCODING_HEADER] = list(
+                accepted_encodings
+            )
+        if encoding is not None:
+            self._body_encoding_headers[BODY_ENCODING_HEADER] = encoding
+        self._headers.update(self._body_encoding_headers)
+        self._set_body_encoding(encoding)
 
     def call(self, *args):
         if debug.debug_flag_enabled("hpss"):
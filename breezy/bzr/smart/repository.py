@@ -559,7 +559,7 @@ class SmartServerRepositoryGetStream(SmartServerRepositoryRequest):
                 repository.unlock()
                 return error
             source = repository._get_source(self._to_format)
-            stream = source.get_stream(search_result)
+            stream = self._get_stream(source, search_result)
         except Exception:
             try:
                 # On non-error, unlocking is done by the body stream handler.
@@ -570,6 +570,9 @@ class SmartServerRepositoryGetStream(SmartServerRepositoryRequest):
             (b"ok",), body_stream=self.body_stream(stream, repository)
         )
 
+    def _get_stream(self, source, search_result):
+        return source.get_stream(search_result)
+
     def body_stream(self, stream, repository):
         byte_stream = _stream_to_byte_stream(stream, repository._format)
         try:
@@ -597,6 +600,144 @@ class SmartServerRepositoryGetStream_1_19(SmartServerRepositoryGetStream):
         return False
 
 
+class SmartServerRepositoryResumeStream(SmartServerRepositoryGetStream_1_19):
+    """Resume an interrupted Repository.get_stream_1.19 stream.
+
+    The request body is a stream continuation (see
+    _serialise_stream_continuation): the search of the original request, the
+    substream kinds the client received in full, the kind it was receiving
+    when the stream was interrupted and the keys of that kind it already
+    holds.  Those are left out of the resumed stream.
+
+    New in 3.4.
+    """
+
+    def do_body(self, body_bytes):
+        (
+            search_bytes,
+            self._completed_kinds,
+            self._current_kind,
+            self._skip_keys,
+        ) = _parse_stream_continuation(body_bytes)
+        return super().do_body(search_bytes)
+
+    def _get_stream(self, source, search_result):
+        stream = source.get_stream(search_result)
+        return _skip_received(
+            stream, self._completed_kinds, self._current_kind, self._skip_keys
+        )
+
+
+class SmartServerRepositoryGetStreamPartition(SmartServerRepositoryGetStream_1_19):
+    """Get one of several partitions of a Repository.get_stream_1.19 stream.
+
+    Clients fetch the partitions over separate connections to use more
+    bandwidth.  The texts are divided between the partitions by file id; the
+    first partition also holds all the other substreams.  The other
+    partitions only hold texts, so the revisions, inventories and CHK pages
+    are only generated for the first.  Sources that can't partition their
+    texts send the whole stream as the first partition and nothing in the
+    others.
+
+    New in 3.4.
+    """
+
+    def do_repository_request(self, repository, to_network_name, index, count):
+        """Get a stream partition for inserting into a to_format repository.
+
+        :param index: The partition to send, from 0 to count - 1.
+        :param count: The number of partitions the stream is divided into.
+        """
+        self._index = int(index)
+        self._count = int(count)
+        return super().do_repository_request(repository, to_network_name)
+
+    def _get_stream(self, source, search_result):
+        partition_texts = getattr(source, "partition_texts", None)
+        if partition_texts is None:
+            if self._index == 0:
+                return source.get_stream(search_result)
+            return iter([])
+        partition_texts(self._index, self._count)
+        if self._index == 0:
+            return source.get_stream(search_result)
+        return source.get_text_stream(search_result)
+
+
+def _serialise_stream_continuation(search_bytes, checkpoint):
+    """Serialise the request body of Repository.resume_stream.
+
+    :param search_bytes: The serialised search of the interrupted stream.
+    :param checkpoint: A StreamCheckpoint recording the progress made.
+    """
+    return zlib.compress(
+        bencode.bencode(
+            [
+                search_bytes,
+                [kind.encode("ascii") for kind in checkpoint.completed_kinds],
+                (checkpoint.current_kind or "").encode("ascii"),
+                [list(key) for key in checkpoint.durable_keys],
+            ]
+        )
+    )
+
+
+def _parse_stream_continuation(body_bytes):
+    """Parse the output of _serialise_stream_continuation.
+
+    :return: A tuple of (search_bytes, completed_kinds, current_kind,
+        skip_keys).
+    """
+    search_bytes, completed_kinds, current_kind, keys = bencode.bdecode(
+        zlib.decompress(body_bytes)
+    )
+    return (
+        search_bytes,
+        {kind.decode("ascii") for kind in completed_kinds},
+        current_kind.decode("ascii") or None,
+        {tuple(key) for key in keys},
+    )
+
+
+def _skip_received(stream, completed_kinds, current_kind, skip_keys):
+    """Filter a stream down to the part a resuming client does not have.
+
+    Substreams of completed_kinds are still read, because sources gather
+    state for later substreams while generating them (e.g. the text keys to
+    send are found while streaming inventories), but nothing is sent.
+    """
+    for substream_type, substream in stream:
+        if substream_type in completed_kinds:
+            for _record in substream:
+                pass
+            continue
+        if substream_type == current_kind:
+            substream = _skip_records(substream, skip_keys)
+        yield substream_type, substream
+
+
+def _skip_records(substream, skip_keys):
+    """Yield the records of substream whose keys are not in skip_keys.
+
+    Groupcompress blocks are sent as part of the first record in them, with
+    the other records having no wire representation.  When that first record
+    is skipped, the remaining records of its block are sent as fulltexts.
+    """
+    block_sent = True
+    for record in substream:
+        if record.key in skip_keys:
+            if record.storage_kind == "groupcompress-block":
+                block_sent = False
+            continue
+        if record.storage_kind == "groupcompress-block":
+            block_sent = True
+        elif record.storage_kind == "groupcompress-block-ref" and not block_sent:
+            record = ChunkedContentFactory(
+                record.key, record.parents, record.sha1, record.get_bytes_as("chunked")
+            )
+        yield record
+
+
 def _stream_to_byte_stream(stream, src_format):
     """Convert a record stream to a self delimited byte stream."""
     pack_writer = pack.ContainerSerialiser()
@@ -36,6 +36,7 @@ from _thread import get_ident
 from ... import branch as _mod_branch
 from ... import debug, errors, osutils, registry, revision, trace, urlutils
 from ... import transport as _mod_transport
+from . import metrics
 
 jail_info = threading.local()
 jail_info.transports = None
@@ -338,6 +339,8 @@ class SmartServerRequestHandler:
         result = self._call_converting_errors(callable, args, kwargs)
 
         if result is not None:
+            if not result.is_successful():
+                metrics.note_request_failed()
             self.response = result
             self.finished_reading = True
 
@@ -370,15 +373,20 @@ class SmartServerRequestHandler:
         except LookupError as e:
             if debug.debug_flag_enabled("hpss"):
                 self._trace("hpss unknown request", cmd, repr(args)[1:-1])
+            metrics.note_request_failed()
             raise errors.UnknownSmartMethod(cmd) from e
-        if debug.debug_flag_enabled("hpss"):
-            from . import vfs
+        from . import vfs
 
+        if debug.debug_flag_enabled("hpss"):
             if issubclass(command, vfs.VfsRequest):
                 action = "hpss vfs req"
             else:
                 action = "hpss request"
             self._trace(action, f"{cmd} {repr(args)[1:-1]}")
+        if args and not issubclass(command, vfs.VfsRequest):
+            metrics.note_request(cmd, args[0])
+        else:
+            metrics.note_request(cmd)
         self._command = command(
             self._backing_transport, self._root_client_path, self._jail_root
         )
@@ -982,6 +990,12 @@ request_handlers.register_lazy(
     "SmartServerRepositoryGetStream_1_19",
     info="read",
 )
+request_handlers.register_lazy(
+    b"Repository.get_stream_partition",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryGetStreamPartition",
+    info="read",
+)
 request_handlers.register_lazy(
     b"Repository.get_stream_for_missing_keys",
     "breezy.bzr.smart.repository",
@@ -1000,6 +1014,12 @@ request_handlers.register_lazy(
     "SmartServerRepositoryPack",
     info="idem",
 )
+request_handlers.register_lazy(
+    b"Repository.resume_stream",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryResumeStream",
+    info="read",
+)
 request_handlers.register_lazy(
     b"Repository.start_write_group",
     "breezy.bzr.smart.repository",
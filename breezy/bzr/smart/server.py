@@ -35,6 +35,7 @@ lazy_import(
     """
 from breezy.bzr.smart import (
     medium,
+    metrics,
     signals,
     )
 from breezy.transport import (
@@ -45,6 +46,7 @@ from breezy import (
     config,
     urlutils,
     )
+from breezy.atomicfile import AtomicFile
 """,
 )
 
@@ -64,10 +66,18 @@ class SmartTCPServer:
     _ACCEPT_TIMEOUT = 1.0
     _SHUTDOWN_POLL_TIMEOUT = 1.0
     _LOG_WAITING_TIMEOUT = 10.0
+    # How often the metrics file is rewritten, in seconds.
+    _METRICS_INTERVAL = 10.0
 
     _timer = time.time
 
-    def __init__(self, backing_transport, root_client_path="/", client_timeout=None):
+    def __init__(
+        self,
+        backing_transport,
+        root_client_path="/",
+        client_timeout=None,
+        metrics_file=None,
+    ):
         """Construct a new server.
 
         To actually start it running, call either start_background_thread or
@@ -78,10 +88,18 @@ class SmartTCPServer:
             of backing_transport.
         :param client_timeout: See SmartServerSocketStreamMedium's timeout
             parameter.
+        :param metrics_file: If not None, the path of a file to periodically
+            write request metrics to, in the Prometheus text format.
         """
         self.backing_transport = backing_transport
         self.root_client_path = root_client_path
         self._client_timeout = client_timeout
+        self._metrics_file = metrics_file
+        if metrics_file is None:
+            self.metrics = None
+        else:
+            self.metrics = metrics.ServerMetrics()
+        self._metrics_written = None
         self._active_connections = []
         # This is set to indicate we want to wait for clients to finish before
         # we disconnect.
@@ -226,6 +244,7 @@ class SmartTCPServer:
                         self.serve_conn(conn, thread_name_suffix)
                     # Cleanout any threads that have finished processing.
                     self._poll_active_connections()
+                    self._maybe_write_metrics()
             except KeyboardInterrupt:
                 # dont log when CTRL-C'd.
                 raise
@@ -244,8 +263,29 @@ class SmartTCPServer:
             self.run_server_stopped_hooks()
         if self._gracefully_stopping:
             self._wait_for_clients_to_disconnect()
+        if self.metrics is not None:
+            self.write_metrics()
         self._fully_stopped.set()
 
+    def _maybe_write_metrics(self):
+        if self.metrics is None:
+            return
+        now = self._timer()
+        if (
+            self._metrics_written is None
+            or now - self._metrics_written >= self._METRICS_INTERVAL
+        ):
+            self._metrics_written = now
+            self.write_metrics()
+
+    def write_metrics(self):
+        """Write the request metrics to the metrics file."""
+        try:
+            with AtomicFile(self._metrics_file) as f:
+                f.write(self.metrics.to_prometheus().encode("utf-8"))
+        except OSError as e:
+            trace.mutter("unable to write metrics to %s: %s", self._metrics_file, e)
+
     def get_url(self):
         """Return the url of the server."""
         return f"bzr://{self._sockname[0]}:{self._sockname[1]}/"
@@ -256,6 +296,7 @@ class SmartTCPServer:
             self.backing_transport,
             self.root_client_path,
             timeout=self._client_timeout,
+            metrics=self.metrics,
         )
 
     def _poll_active_connections(self, timeout=0.0):
@@ -453,8 +494,8 @@ class BzrServerFactory:
         return sys.stdin.buffer, sys.stdout.buffer
 
     def _make_smart_server(self, host, port, inet, timeout):
+        c = config.GlobalStack()
         if timeout is None:
-            c = config.GlobalStack()
             timeout = c.get("serve.client_timeout")
         if inet:
             stdin, stdout = self._get_stdin_stdout()
@@ -466,7 +507,11 @@ class BzrServerFactory:
                 host = medium.BZR_DEFAULT_INTERFACE
             if port is None:
                 port = medium.BZR_DEFAULT_PORT
-            smart_server = SmartTCPServer(self.transport, client_timeout=timeout)
+            smart_server = SmartTCPServer(
+                self.transport,
+                client_timeout=timeout,
+                metrics_file=c.get("serve.metrics_file"),
+            )
             smart_server.start_server(host, port)
             trace.note(gettext("listening on port: %s"), str(smart_server.port))
         self.smart_server = smart_server
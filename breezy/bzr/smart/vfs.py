@@ -25,6 +25,8 @@ protocol, as implemented in bzr 0.11 and later.
 """
 
 import os
+import tempfile
+from io import BytesIO
 
 from ... import urlutils
 from . import request
@@ -68,6 +70,41 @@ class VfsRequest(request.SmartServerRequest):
         return str(urlutils.unescape(x))
 
 
+class SpooledBodyRequest(VfsRequest):
+    """Base class for VFS requests writing their body to a file.
+
+    The body is spooled to a temporary file as it is received, so that
+    receiving a large file does not need to hold all of it in memory.
+    Subclasses implement do_body_file, which is called with that file
+    positioned at the start of the body.
+    """
+
+    # Bodies larger than this are spooled to disk rather than kept in memory.
+    _spool_size = 1024 * 1024
+
+    _body_file = None
+
+    def do_chunk(self, chunk_bytes):
+        if self._body_file is None:
+            self._body_file = tempfile.SpooledTemporaryFile(max_size=self._spool_size)
+        self._body_file.write(chunk_bytes)
+
+    def do_end(self):
+        body_file = self._body_file
+        if body_file is None:
+            body_file = BytesIO()
+        self._body_file = None
+        with body_file:
+            body_file.seek(0)
+            return self.do_body_file(body_file)
+
+    def do_body(self, body_bytes):
+        return self.do_body_file(BytesIO(body_bytes))
+
+    def do_body_file(self, body_file):
+        raise NotImplementedError(self.do_body_file)
+
+
 class HasRequest(VfsRequest):
     def do(self, relpath):
         relpath = self.translate_client_path(relpath)
@@ -82,15 +119,15 @@ class GetRequest(VfsRequest):
         return request.SuccessfulSmartServerResponse((b"ok",), backing_bytes)
 
 
-class AppendRequest(VfsRequest):
+class AppendRequest(SpooledBodyRequest):
     def do(self, relpath, mode):
         relpath = self.translate_client_path(relpath)
         self._relpath = relpath
         self._mode = _deserialise_optional_mode(mode)
 
-    def do_body(self, body_bytes):
-        old_length = self._backing_transport.append_bytes(
-            self._relpath, body_bytes, self._mode
+    def do_body_file(self, body_file):
+        old_length = self._backing_transport.append_file(
+            self._relpath, body_file, self._mode
         )
         return request.SuccessfulSmartServerResponse(
             (b"appended", str(old_length).encode("ascii"))
@@ -140,18 +177,18 @@ class MoveRequest(VfsRequest):
         return request.SuccessfulSmartServerResponse((b"ok",))
 
 
-class PutRequest(VfsRequest):
+class PutRequest(SpooledBodyRequest):
     def do(self, relpath, mode):
         relpath = self.translate_client_path(relpath)
         self._relpath = relpath
         self._mode = _deserialise_optional_mode(mode)
 
-    def do_body(self, body_bytes):
-        self._backing_transport.put_bytes(self._relpath, body_bytes, self._mode)
+    def do_body_file(self, body_file):
+        self._backing_transport.put_file(self._relpath, body_file, self._mode)
         return request.SuccessfulSmartServerResponse((b"ok",))
 
 
-class PutNonAtomicRequest(VfsRequest):
+class PutNonAtomicRequest(SpooledBodyRequest):
     def do(self, relpath, mode, create_parent, dir_mode):
         relpath = self.translate_client_path(relpath)
         self._relpath = relpath
@@ -160,10 +197,10 @@ class PutNonAtomicRequest(VfsRequest):
         # a boolean would be nicer XXX
         self._create_parent = create_parent == b"T"
 
-    def do_body(self, body_bytes):
-        self._backing_transport.put_bytes_non_atomic(
+    def do_body_file(self, body_file):
+        self._backing_transport.put_file_non_atomic(
             self._relpath,
-            body_bytes,
+            body_file,
             mode=self._mode,
             create_parent_dir=self._create_parent,
             dir_mode=self._dir_mode,
@@ -63,11 +63,14 @@ def load_tests(loader, basic_tests, pattern):
         "test_lockable_files",
         "test_matchers",
         "test_pack",
+        "test_parent_map_cache",
         "test_read_bundle",
         "test_remote",
         "test_repository",
         "test_rio",
+        "test_roundtrip_benchmarks",
         "test_smart",
+        "test_smart_metrics",
         "test_smart_request",
         "test_smart_signals",
         "test_smart_transport",
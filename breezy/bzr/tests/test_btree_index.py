@@ -1565,6 +1565,12 @@ class TestExpandOffsets(tests.TestCase):
         # local transport recommends 4096 byte reads, which is 1 page
         self.assertEqual(1, index._recommended_pages)
 
+    def test_recommended_pages_follow_transport(self):
+        index = self.make_index(4096 * 10)
+        index._transport.recommended_page_size = lambda: 10 * 4096
+        self.assertExpandOffsets(list(range(10)), index, [0])
+        self.assertEqual(10, index._recommended_pages)
+
     def test__compute_total_pages_in_index(self):
         index = self.make_index(None)
         self.assertNumPages(1, index, 1024)
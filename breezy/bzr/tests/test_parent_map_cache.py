@@ -0,0 +1,79 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the persistent parent map cache."""
+
+import os
+
+from ... import tests
+from ..parent_map_cache import ParentMapCache, cache_path_for_url
+
+
+class TestParentMapCache(tests.TestCaseInTempDir):
+    def test_empty(self):
+        cache = ParentMapCache("cache", 1000)
+        self.assertEqual({}, cache.get_parent_map([b"rev1"]))
+        self.assertFalse(os.path.exists("cache"))
+
+    def test_add_and_reload(self):
+        cache = ParentMapCache("cache", 1000)
+        cache.add({b"rev1": (b"null:",), b"rev2": (b"rev1", b"ghost")})
+        cache.add({b"rev3": (b"rev2",)})
+        self.assertEqual({b"rev1": (b"null:",)}, cache.get_parent_map([b"rev1"]))
+        reloaded = ParentMapCache("cache", 1000)
+        self.assertEqual(
+            {b"rev2": (b"rev1", b"ghost"), b"rev3": (b"rev2",)},
+            reloaded.get_parent_map([b"rev2", b"rev3", b"ghost"]),
+        )
+
+    def test_null_revision_not_stored(self):
+        cache = ParentMapCache("cache", 1000)
+        cache.add({b"null:": ()})
+        self.assertFalse(os.path.exists("cache"))
+
+    def test_ignores_truncated_block(self):
+        cache = ParentMapCache("cache", 1000)
+        cache.add({b"rev1": (b"null:",)})
+        cache.add({b"rev2": (b"rev1",)})
+        with open("cache", "rb") as f:
+            data = f.read()
+        with open("cache", "wb") as f:
+            f.write(data[:-3])
+        reloaded = ParentMapCache("cache", 1000)
+        self.assertEqual(
+            {b"rev1": (b"null:",)}, reloaded.get_parent_map([b"rev1", b"rev2"])
+        )
+
+    def test_size_limit(self):
+        cache = ParentMapCache("cache", 300)
+        for i in range(50):
+            cache.add({b"revision-%d" % i: (b"revision-%d" % (i - 1),)})
+        self.assertLessEqual(os.path.getsize("cache"), 300)
+        reloaded = ParentMapCache("cache", 300)
+        self.assertEqual(
+            {b"revision-49": (b"revision-48",)},
+            reloaded.get_parent_map([b"revision-0", b"revision-49"]),
+        )
+
+    def test_cache_path_for_url(self):
+        self.assertEqual(
+            cache_path_for_url("bzr://example.com/repo/"),
+            cache_path_for_url("bzr://example.com/repo"),
+        )
+        self.assertNotEqual(
+            cache_path_for_url("bzr://example.com/repo"),
+            cache_path_for_url("bzr://example.com/other"),
+        )
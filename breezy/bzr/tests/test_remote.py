@@ -26,6 +26,7 @@ These tests correspond to tests.test_smart, which exercises the server side.
 import base64
 import bz2
 import tarfile
+import threading
 import zlib
 from io import BytesIO
 
@@ -49,6 +50,7 @@ from .. import (
     knitpack_repo,
     remote,
     versionedfile,
+    vf_repository,
     vf_search,
 )
 from ..bzrdir import BzrDir, BzrDirFormat
@@ -66,6 +68,7 @@ from ..smart.client import _SmartClient
 from ..smart.repository import (
     SmartServerRepositoryGetParentMap,
     SmartServerRepositoryGetStream_1_19,
+    _serialise_stream_continuation,
     _stream_to_byte_stream,
 )
 
@@ -3029,6 +3032,42 @@ class TestRepositoryGetParentMap(TestRemoteRepository):
         )
         repo.unlock()
 
+    def test_get_parent_map_persistent_cache(self):
+        # With repository.parent_map_cache enabled, parents retrieved by one
+        # repository object are reused by the next one for the same URL.
+        config.GlobalStack().set("repository.parent_map_cache", True)
+        lines = [b"rev2 rev1 ghost", b"rev1", b"missing:absent"]
+        encoded_body = bz2.compress(b"\n".join(lines))
+        repo, client = self.setup_fake_client_and_repository("quack")
+        client.add_success_response_with_body(encoded_body, b"ok")
+        self.assertEqual(
+            {b"rev2": (b"rev1", b"ghost"), b"rev1": (NULL_REVISION,)},
+            repo.get_parent_map([b"rev2", b"rev1", b"absent"]),
+        )
+        self.assertLength(1, client._calls)
+        repo, client = self.setup_fake_client_and_repository("quack")
+        self.assertEqual(
+            {b"rev2": (b"rev1", b"ghost"), b"rev1": (NULL_REVISION,)},
+            repo.get_parent_map([b"rev2", b"rev1"]),
+        )
+        self.assertEqual([], client._calls)
+        # Absent revisions may be added later, so they are not remembered.
+        client.add_success_response_with_body(bz2.compress(b"missing:absent"), b"ok")
+        self.assertEqual(
+            {b"rev1": (NULL_REVISION,)}, repo.get_parent_map([b"rev1", b"absent"])
+        )
+        self.assertEqual(
+            [
+                (
+                    "call_with_body_bytes_expecting_body",
+                    b"Repository.get_parent_map",
+                    (b"quack/", b"include-missing:", b"absent"),
+                    b"\n\n0",
+                )
+            ],
+            client._calls,
+        )
+
     def test_get_parent_map_reconnects_if_unknown_method(self):
         transport_path = "quack"
         rev_id = b"revision-id"
@@ -3850,6 +3889,152 @@ class TestRepositoryIterFilesBytes(TestRemoteRepository):
         )
 
 
+class TestRepositoryResumeStream(TestRemoteRepository):
+    def test_unknown_method(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        client.add_unknown_method_response(b"Repository.resume_stream")
+        source = repo._get_source(repo._format)
+        checkpoint = vf_repository.StreamCheckpoint()
+        search = vf_search.EverythingResult(repo)
+        self.assertIs(None, source.get_stream_remainder(search, checkpoint))
+        self.assertEqual(
+            [
+                ("disconnect medium",),
+                (
+                    "call_with_body_bytes_expecting_body",
+                    b"Repository.resume_stream",
+                    (b"quack/", repo._format.network_name()),
+                    _serialise_stream_continuation(b"everything", checkpoint),
+                ),
+            ],
+            client._calls,
+        )
+        self.assertTrue(client._medium._is_remote_before((3, 4)))
+        # The verb is not tried again.
+        self.assertIs(None, source.get_stream_remainder(search, checkpoint))
+        self.assertLength(2, client._calls)
+
+
+class FakeRecord:
+    def __init__(self, key, storage_kind="fulltext"):
+        self.key = key
+        self.storage_kind = storage_kind
+
+
+class TestMergeTextStreams(tests.TestCase):
+    def test_iter_wire_units(self):
+        records = [
+            FakeRecord(b"a", "groupcompress-block"),
+            FakeRecord(b"b", "groupcompress-block-ref"),
+            FakeRecord(b"c", "groupcompress-block"),
+            FakeRecord(b"d", "fulltext"),
+        ]
+        self.assertEqual(
+            [[b"a", b"b"], [b"c"], [b"d"]],
+            [
+                [record.key for record in unit]
+                for unit in remote._iter_wire_units(records)
+            ],
+        )
+
+    def test_merge(self):
+        first = [
+            ("revisions", [FakeRecord(b"rev")]),
+            (
+                "texts",
+                [
+                    FakeRecord(b"a", "groupcompress-block"),
+                    FakeRecord(b"b", "groupcompress-block-ref"),
+                ],
+            ),
+        ]
+        others = [
+            [("texts", [FakeRecord(b"c"), FakeRecord(b"d")])],
+            [("texts", [FakeRecord(b"e")])],
+        ]
+        merged = [
+            (kind, [record.key for record in substream])
+            for kind, substream in remote._merge_text_streams(first, others)
+        ]
+        self.assertEqual(["revisions", "texts"], [kind for kind, keys in merged])
+        texts = merged[1][1]
+        self.assertEqual([b"a", b"b"], texts[texts.index(b"a") :][:2])
+        self.assertEqual({b"a", b"b", b"c", b"d", b"e"}, set(texts))
+        self.assertLength(5, texts)
+
+    def test_merge_without_texts_in_first(self):
+        first = [("revisions", [FakeRecord(b"rev")])]
+        others = [[("texts", [FakeRecord(b"a")])]]
+        merged = [
+            (kind, [record.key for record in substream])
+            for kind, substream in remote._merge_text_streams(first, others)
+        ]
+        self.assertEqual([("revisions", [b"rev"]), ("texts", [b"a"])], merged)
+
+    def test_error_in_other_stream(self):
+        def failing_stream():
+            yield "texts", [FakeRecord(b"a")]
+            raise ConnectionResetError("connection lost")
+
+        stream = remote._merge_text_streams([], [failing_stream()])
+        kind, substream = next(stream)
+        self.assertEqual("texts", kind)
+        self.assertRaises(ConnectionResetError, list, substream)
+
+    def test_merge_texts_after_inventories(self):
+        # The texts of groupcompress sources follow the inventories and CHK
+        # pages; those of the first partition are merged with the others.
+        first = [
+            ("revisions", [FakeRecord(b"rev")]),
+            ("inventories", [FakeRecord(b"inv")]),
+            ("chk_bytes", [FakeRecord(b"chk")]),
+            ("texts", [FakeRecord(b"a")]),
+        ]
+        others = [[("texts", [FakeRecord(b"b")])]]
+        merged = [
+            (kind, sorted(record.key for record in substream))
+            for kind, substream in remote._merge_text_streams(first, others)
+        ]
+        self.assertEqual(
+            [
+                ("revisions", [b"rev"]),
+                ("inventories", [b"inv"]),
+                ("chk_bytes", [b"chk"]),
+                ("texts", [b"a", b"b"]),
+            ],
+            merged,
+        )
+
+    def test_close_stops_readers(self):
+        read = []
+
+        def endless_stream():
+            def texts():
+                while True:
+                    read.append(None)
+                    yield FakeRecord(b"a")
+
+            yield "texts", texts()
+
+        class FakeMedium:
+            disconnected = False
+
+            def disconnect(self):
+                self.disconnected = True
+
+        medium = FakeMedium()
+        threads = threading.active_count()
+        first = [("texts", [FakeRecord(b"b")]), ("signatures", [])]
+        stream = remote._merge_text_streams(first, [endless_stream()], [medium])
+        _kind, substream = next(stream)
+        next(substream)
+        stream.close()
+        self.assertTrue(medium.disconnected)
+        # The reader has stopped, rather than waiting for room on the queue.
+        self.assertEqual(threads, threading.active_count())
+        self.assertNotEqual([], read)
+
+
 class TestRepositoryInsertStreamBase(TestRemoteRepository):
     """Base class for Repository.insert_stream and .insert_stream_1.19
     tests.
@@ -4771,6 +4956,42 @@ class TestRemoteBranchEffort(tests.TestCaseWithTransport):
         )
         self.assertEqual([b"Repository.get_stream_1.19"], self.hpss_calls)
 
+    def test_fetch_in_parallel(self):
+        config.GlobalStack().set("repository.fetch_connections", "3")
+        tree = self.make_branch_and_tree("remote")
+        self.build_tree(["remote/" + name for name in "abcdefgh"])
+        tree.add(list("abcdefgh"))
+        revid = tree.commit("Commit.")
+        local = self.make_repository("local")
+        remote_repo = BzrDir.open(self.smart_server.get_url() + "remote")
+        remote_repo = remote_repo.open_repository()
+        self.hpss_calls = []
+        local.fetch(remote_repo, revid)
+        self.assertEqual(
+            [b"Repository.get_stream_partition"] * 3,
+            [
+                call
+                for call in self.hpss_calls
+                if call.startswith(b"Repository.get_stream")
+            ],
+        )
+        with local.lock_read():
+            self.assertEqual(
+                {(tree.path2id(name), revid) for name in "abcdefgh"}
+                | {(tree.path2id(""), revid)},
+                local.texts.keys(),
+            )
+            self.assertEqual(
+                b"contents of remote/d\n",
+                local.revision_tree(revid).get_file_text("d"),
+            )
+        # The extra connections are closed again, so once the main one is
+        # too the server has no connections left.
+        remote_repo._client._medium.disconnect()
+        for _sock, _addr, thread in self.smart_server.server.clients:
+            thread.join()
+            self.assertFalse(thread.is_alive())
+
     def override_verb(self, verb_name, verb):
         request_handlers = request.request_handlers
         orig_verb = request_handlers.get(verb_name)
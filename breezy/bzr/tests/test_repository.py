@@ -50,6 +50,7 @@ from breezy.bzr import (
     vf_search,
 )
 from breezy.bzr import repository as bzrrepository
+from breezy.bzr.smart import repository as smart_repo
 from breezy.tests import TestCase, TestCaseWithTransport
 
 from ...errors import UnknownFormatError
@@ -1749,6 +1750,85 @@ class TestCrossFormatPacks(TestCaseWithTransport):
         self.run_fetch("2a", "2a", False)
 
 
+class TestStreamCheckpoint(TestCaseWithTransport):
+    def interrupted(self, stream, interrupt_kind):
+        for kind, substream in stream:
+            if kind == interrupt_kind:
+                yield kind, self.interrupted_substream(substream)
+            else:
+                yield kind, substream
+
+    def interrupted_substream(self, substream):
+        for record in substream:
+            yield record
+            raise ConnectionResetError("connection lost")
+
+    def test_resume_interrupted_stream(self):
+        source_tree = self.make_branch_and_tree("src", format="2a")
+        self.build_tree(["src/a", "src/b"])
+        source_tree.add(["a", "b"])
+        source_tree.commit("one")
+        tip = source_tree.commit("two")
+        source_repo = source_tree.branch.repository
+        target = self.make_repository("target", format="2a")
+        self.addCleanup(source_repo.lock_read().unlock)
+        search = target.search_missing_revision_ids(source_repo, revision_ids=[tip])
+        source = source_repo._get_source(target._format)
+        sink = target._get_sink()
+        checkpoint = vf_repository.StreamCheckpoint()
+        stream = self.interrupted(source.get_stream(search), "texts")
+        self.assertRaises(
+            ConnectionResetError,
+            sink.insert_stream,
+            checkpoint.track(stream),
+            source_repo._format,
+            [],
+            checkpoint=checkpoint,
+        )
+        self.assertNotEqual([], checkpoint.resume_tokens)
+        self.assertEqual("texts", checkpoint.current_kind)
+        self.assertNotIn("texts", checkpoint.completed_kinds)
+        self.assertIn("revisions", checkpoint.completed_kinds)
+        self.assertFalse(target.has_revision(tip))
+        remainder = smart_repo._skip_received(
+            source_repo._get_source(target._format).get_stream(search),
+            set(checkpoint.completed_kinds),
+            checkpoint.current_kind,
+            checkpoint.durable_keys,
+        )
+        self.assertEqual(
+            ([], set()),
+            sink.insert_stream(
+                checkpoint.track(remainder),
+                source_repo._format,
+                checkpoint.resume_tokens,
+                checkpoint=checkpoint,
+            ),
+        )
+        target = target.controldir.open_repository()
+        self.assertTrue(target.has_revision(tip))
+        target.lock_read()
+        self.addCleanup(target.unlock)
+        self.assertEqual(set(source_repo.texts.keys()), set(target.texts.keys()))
+
+    def test_durable_keys_not_in_fallbacks(self):
+        base_tree = self.make_branch_and_tree("base", format="2a")
+        self.build_tree(["base/a"])
+        base_tree.add(["a"])
+        base_tree.commit("one")
+        target = self.make_repository("target", format="2a")
+        target.add_fallback_repository(base_tree.branch.repository)
+        self.addCleanup(target.lock_read().unlock)
+        keys = set(base_tree.branch.repository.texts.keys())
+        self.assertEqual(keys, set(target.texts.get_parent_map(keys)))
+        checkpoint = vf_repository.StreamCheckpoint()
+        checkpoint.current_kind = "texts"
+        checkpoint._received_keys = set(keys)
+        checkpoint.record_durable_keys(target)
+        # The texts still have to be inserted into the stacked repository.
+        self.assertEqual(set(), checkpoint.durable_keys)
+
+
 class Test_LazyListJoin(tests.TestCase):
     def test__repr__(self):
         lazy = repository._LazyListJoin(["a"], ["b"])
@@ -0,0 +1,216 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Benchmarks of the round trips needed by common commands.
+
+The commands are run against a location reached through a latency+
+transport, or a smart server whose calls are delayed by the same simulated
+link.  The link doesn't actually wait, so the benchmarks are fast: the number
+of round trips and the simulated delay they would cost are reported as the
+details 'round_trips' and 'simulated_delay' of each test, alongside the wall
+time measured for the command.
+"""
+
+import os
+
+from testtools import content
+
+from ... import branch, config, urlutils
+from ...repository import Repository
+from ...tests import test_server
+from ...transport import latency
+from ..smart import client, medium
+from . import TestCaseWithTransport
+
+# The round trip time simulated, in seconds.
+_RTT = 0.05
+
+
+class RoundTripBenchmark(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.link = latency.SimulatedLink(rtt=_RTT)
+        self.overrideAttr(latency, "_sleep", lambda delay: None)
+        self.overrideAttr(latency, "_latency_link", self.link)
+        self.addDetail(
+            "round_trips",
+            content.Content(content.UTF8_TEXT, lambda: [b"%d" % self.link.round_trips]),
+        )
+        self.addDetail(
+            "simulated_delay",
+            content.Content(content.UTF8_TEXT, lambda: [b"%.3f" % self.link.delay]),
+        )
+
+    def make_source(self):
+        """Create a branch with a few revisions and reset the link."""
+        tree = self.make_branch_and_tree("source")
+        for count in range(9):
+            tree.commit(message=f"commit {count}")
+        self.link.reset()
+        return tree
+
+    def run_timed(self, args):
+        """Run a command, accruing its time to the benchmark time."""
+        self.time(self.run_bzr, args)
+        self.assertAlmostEqual(self.link.round_trips * _RTT, self.link.delay)
+
+
+class TestLatencyRoundTrips(RoundTripBenchmark):
+    """Round trips of commands run over a latency+ transport.
+
+    The transport is used for all accesses to the location, so this measures
+    the plain file access of the commands.
+    """
+
+    def get_latency_url(self, relpath):
+        return "latency+" + urlutils.local_path_to_url(relpath)
+
+    def test_branch(self):
+        tree = self.make_source()
+        self.run_timed(["branch", self.get_latency_url("source"), "target"])
+        self.assertNotEqual(0, self.link.round_trips)
+        self.assertEqual(
+            tree.last_revision(), branch.Branch.open("target").last_revision()
+        )
+
+    def test_push(self):
+        tree = self.make_source()
+        self.run_timed(["push", "-d", "source", self.get_latency_url("target")])
+        self.assertNotEqual(0, self.link.round_trips)
+        self.assertEqual(
+            tree.last_revision(), branch.Branch.open("target").last_revision()
+        )
+
+    def test_pull(self):
+        tree = self.make_source()
+        tree.branch.controldir.sprout("target", revision_id=tree.branch.get_rev_id(5))
+        self.link.reset()
+        self.run_timed(["pull", "-d", "target", self.get_latency_url("source")])
+        self.assertNotEqual(0, self.link.round_trips)
+        self.assertEqual(
+            tree.last_revision(), branch.Branch.open("target").last_revision()
+        )
+
+    def test_log(self):
+        self.make_source()
+        self.run_timed(["log", self.get_latency_url("source")])
+        self.assertNotEqual(0, self.link.round_trips)
+
+
+class TestSmartRoundTrips(RoundTripBenchmark):
+    """Round trips of commands run against a smart server.
+
+    Each call of the smart client costs a round trip of the link.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.setup_smart_server_with_call_log()
+        client._SmartClient.hooks.install_named_hook(
+            "call", self.link.smart_call_hook, "simulated link"
+        )
+        self.addCleanup(
+            client._SmartClient.hooks.uninstall_named_hook, "call", "simulated link"
+        )
+
+    def make_source(self):
+        tree = super().make_source()
+        self.reset_smart_call_log()
+        return tree
+
+    def run_timed(self, args):
+        super().run_timed(args)
+        self.assertEqual(len(self.hpss_calls), self.link.round_trips)
+
+    def test_branch(self):
+        self.make_source()
+        self.run_timed(["branch", self.get_url("source"), "target"])
+        # A regression if branching needs more round trips than
+        # test_vfs_ratchet accepts; fewer are always welcome.
+        self.assertLessEqual(self.link.round_trips, 11)
+
+    def test_push(self):
+        self.make_source()
+        self.run_timed(["push", "-d", "source", self.get_url("target")])
+        self.assertNotEqual(0, self.link.round_trips)
+
+    def test_pull(self):
+        tree = self.make_source()
+        tree.branch.controldir.sprout("target", revision_id=tree.branch.get_rev_id(5))
+        self.reset_smart_call_log()
+        self.link.reset()
+        self.run_timed(["pull", "-d", "target", self.get_url("source")])
+        self.assertNotEqual(0, self.link.round_trips)
+
+    def test_log(self):
+        self.make_source()
+        self.run_timed(["log", self.get_url("source")])
+        self.assertNotEqual(0, self.link.round_trips)
+
+
+class TestParallelFetchBenchmark(TestCaseWithTransport):
+    """Wall time of a fetch over one or several connections.
+
+    Every connection to the smart server reads its responses through its own
+    simulated link of limited bandwidth, as connections whose throughput is
+    limited by the round trip time are, so fetching the texts over several
+    connections takes less time.  The link waits for real here, and the time
+    of the fetch is the benchmark time of the test.
+    """
+
+    # The bandwidth of the link of each connection, in bytes per second.
+    bandwidth = 256 * 1024
+
+    def setUp(self):
+        super().setUp()
+        self.transport_server = test_server.SmartTCPServer_for_testing
+        read_bytes = medium.SmartClientSocketMedium._read_bytes
+        bandwidth = self.bandwidth
+
+        def throttled_read_bytes(client_medium, count):
+            data = read_bytes(client_medium, count)
+            link = getattr(client_medium, "_benchmark_link", None)
+            if link is None:
+                link = client_medium._benchmark_link = latency.SimulatedLink(
+                    bandwidth=bandwidth
+                )
+            link.transfer(len(data))
+            return data
+
+        self.overrideAttr(
+            medium.SmartClientSocketMedium, "_read_bytes", throttled_read_bytes
+        )
+
+    def fetch(self, connections):
+        config.GlobalStack().set("repository.fetch_connections", str(connections))
+        tree = self.make_branch_and_tree("source")
+        names = [f"file{i}" for i in range(24)]
+        for name in names:
+            # Random contents, so that the texts don't compress.
+            with open(os.path.join("source", name), "wb") as f:
+                f.write(os.urandom(8 * 1024))
+        tree.add(names)
+        revid = tree.commit("add files")
+        target = self.make_repository("target")
+        source = Repository.open(self.get_url("source"))
+        self.time(target.fetch, source, revid)
+        self.assertTrue(target.has_revision(revid))
+
+    def test_fetch_one_connection(self):
+        self.fetch(1)
+
+    def test_fetch_four_connections(self):
+        self.fetch(4)
@@ -34,7 +34,7 @@ import fastbencode as bencode
 from breezy import branch as _mod_branch
 from breezy import controldir, errors, gpg, tests, transport, urlutils
 from breezy.bzr import branch as _mod_bzrbranch
-from breezy.bzr import inventory_delta, versionedfile
+from breezy.bzr import inventory_delta, versionedfile, vf_repository
 from breezy.bzr.inventory import _make_delta
 from breezy.bzr.smart import branch as smart_branch
 from breezy.bzr.smart import bzrdir as smart_dir
@@ -1961,6 +1961,95 @@ class TestSmartServerRepositoryGetStream(GetStreamTestBase):
         self.assertStartsWith(stream_bytes, b"Bazaar pack format 1")
 
 
+class TestSmartServerRepositoryGetStreamPartition(tests.TestCaseWithTransport):
+    def get_partition(self, repo, index, count):
+        request = smart_repo.SmartServerRepositoryGetStreamPartition(
+            self.get_transport()
+        )
+        request.execute(b"", repo._format.network_name(), b"%d" % index, b"%d" % count)
+        response = request.do_body(b"everything")
+        self.assertEqual((b"ok",), response.args)
+        src_format, stream = smart_repo._byte_stream_to_stream(response.body_stream)
+        return [
+            (kind, {record.key for record in substream}) for kind, substream in stream
+        ]
+
+    def test_partitions_texts(self):
+        tree = self.make_branch_and_tree(".", format="2a")
+        names = ["file%d" % i for i in range(10)]
+        self.build_tree(names)
+        tree.add(names)
+        tree.commit("add files")
+        repo = tree.branch.repository
+        whole = dict(self.get_partition(repo, 0, 1))
+        first = dict(self.get_partition(repo, 0, 2))
+        second = self.get_partition(repo, 1, 2)
+        self.assertEqual(["texts"], [kind for kind, keys in second])
+        second_texts = second[0][1]
+        self.assertEqual(set(), first["texts"] & second_texts)
+        self.assertEqual(whole["texts"], first["texts"] | second_texts)
+        del whole["texts"], first["texts"]
+        self.assertEqual(whole, first)
+
+    def test_unpartitioned_source(self):
+        tree = self.make_branch_and_tree(".", format="1.9")
+        tree.commit("commit")
+        repo = tree.branch.repository
+        self.assertIn("revisions", dict(self.get_partition(repo, 0, 2)))
+        self.assertEqual([], self.get_partition(repo, 1, 2))
+
+
+class TestSmartServerRepositoryResumeStream(GetStreamTestBase):
+    def resume_stream(self, repo, completed_kinds, current_kind, keys):
+        checkpoint = vf_repository.StreamCheckpoint()
+        checkpoint.completed_kinds = completed_kinds
+        checkpoint.current_kind = current_kind
+        checkpoint.durable_keys = set(keys)
+        body = smart_repo._serialise_stream_continuation(b"everything", checkpoint)
+        request = smart_repo.SmartServerRepositoryResumeStream(self.get_transport())
+        request.execute(b"", repo._format.network_name())
+        response = request.do_body(body)
+        self.assertEqual((b"ok",), response.args)
+        src_format, stream = smart_repo._byte_stream_to_stream(response.body_stream)
+        return [
+            (kind, [record.key for record in substream]) for kind, substream in stream
+        ]
+
+    def test_continuation_roundtrip(self):
+        checkpoint = vf_repository.StreamCheckpoint()
+        checkpoint.completed_kinds = ["revisions", "signatures"]
+        checkpoint.current_kind = "texts"
+        checkpoint.durable_keys = {(b"file-id", b"rev1")}
+        self.assertEqual(
+            (
+                b"everything",
+                {"revisions", "signatures"},
+                "texts",
+                {(b"file-id", b"rev1")},
+            ),
+            smart_repo._parse_stream_continuation(
+                smart_repo._serialise_stream_continuation(b"everything", checkpoint)
+            ),
+        )
+
+    def test_skips_completed_kinds(self):
+        repo, r1, r2 = self.make_two_commit_repo()
+        kinds = [kind for kind, keys in self.resume_stream(repo, [], None, [])]
+        self.assertIn("revisions", kinds)
+        remainder = self.resume_stream(repo, kinds[:-1], None, [])
+        self.assertEqual([kinds[-1]], [kind for kind, keys in remainder])
+
+    def test_skips_received_keys(self):
+        repo, r1, r2 = self.make_two_commit_repo()
+        completed = []
+        for kind, keys in self.resume_stream(repo, [], None, []):
+            if kind == "revisions":
+                break
+            completed.append(kind)
+        remainder = dict(self.resume_stream(repo, completed, "revisions", [(r1,)]))
+        self.assertEqual([(r2,)], remainder["revisions"])
+
+
 class TestSmartServerRequestHasRevision(tests.TestCaseWithMemoryTransport):
     def test_missing_revision(self):
         """For a missing revision, ('no', ) is returned."""
@@ -2573,6 +2662,41 @@ class TestSmartServerVfsGet(tests.TestCaseWithMemoryTransport):
         )
 
 
+class TestSmartServerVfsPut(tests.TestCaseWithMemoryTransport):
+    def test_put_spools_body(self):
+        backing = self.get_transport()
+        request = vfs.PutRequest(backing)
+        request._spool_size = 10
+        self.assertEqual(None, request.execute(b"foo", b""))
+        request.do_chunk(b"contents\n")
+        request.do_chunk(b"of\nfoo\n")
+        # The body no longer fits in memory and has been spooled to disk.
+        self.assertTrue(request._body_file._rolled)
+        self.assertEqual(smart_req.SmartServerResponse((b"ok",)), request.do_end())
+        self.assertEqual(b"contents\nof\nfoo\n", backing.get_bytes("foo"))
+
+    def test_put_body(self):
+        backing = self.get_transport()
+        request = vfs.PutRequest(backing)
+        request.execute(b"foo", b"")
+        self.assertEqual(
+            smart_req.SmartServerResponse((b"ok",)), request.do_body(b"contents\n")
+        )
+        self.assertEqual(b"contents\n", backing.get_bytes("foo"))
+
+    def test_append_streamed_body(self):
+        backing = self.get_transport()
+        backing.put_bytes("foo", b"contents\n")
+        request = vfs.AppendRequest(backing)
+        request.execute(b"foo", b"")
+        request.do_chunk(b"more ")
+        request.do_chunk(b"contents\n")
+        self.assertEqual(
+            smart_req.SmartServerResponse((b"appended", b"9")), request.do_end()
+        )
+        self.assertEqual(b"contents\nmore contents\n", backing.get_bytes("foo"))
+
+
 class TestHandlers(tests.TestCase):
     """Tests for the request.request_handlers object."""
 
@@ -2728,6 +2852,10 @@ class TestHandlers(tests.TestCase):
             b"Repository.get_stream_1.19",
             smart_repo.SmartServerRepositoryGetStream_1_19,
         )
+        self.assertHandlerEqual(
+            b"Repository.get_stream_partition",
+            smart_repo.SmartServerRepositoryGetStreamPartition,
+        )
         self.assertHandlerEqual(
             b"Repository.iter_revisions", smart_repo.SmartServerRepositoryIterRevisions
         )
@@ -2761,6 +2889,9 @@ class TestHandlers(tests.TestCase):
         self.assertHandlerEqual(
             b"Repository.reconcile", smart_repo.SmartServerRepositoryReconcile
         )
+        self.assertHandlerEqual(
+            b"Repository.resume_stream", smart_repo.SmartServerRepositoryResumeStream
+        )
         self.assertHandlerEqual(
             b"Repository.tarball", smart_repo.SmartServerRepositoryTarball
         )
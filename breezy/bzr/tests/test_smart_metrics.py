@@ -0,0 +1,121 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for smart server request metrics."""
+
+from ... import tests
+from ..smart import metrics
+from ..smart import server as _mod_server
+
+
+class TestServerMetrics(tests.TestCase):
+    def test_note_request_without_tracking(self):
+        # Requests served without metrics enabled are simply not recorded.
+        metrics.note_request(b"Repository.get_stream", b"repo/")
+        metrics.note_request_failed()
+
+    def test_track_request(self):
+        server_metrics = metrics.ServerMetrics()
+        with server_metrics.track_request():
+            self.assertEqual(1, server_metrics.requests_in_progress)
+            metrics.note_request(b"Repository.get_stream", b"repo/")
+        with server_metrics.track_request():
+            metrics.note_request(b"Repository.get_stream", b"repo/")
+            metrics.note_request_failed()
+        self.assertEqual(0, server_metrics.requests_in_progress)
+        text = server_metrics.to_prometheus()
+        self.assertContainsRe(
+            text, '\nbzr_smart_requests_total{verb="Repository.get_stream"} 2\n'
+        )
+        self.assertContainsRe(
+            text, '\nbzr_smart_request_errors_total{verb="Repository.get_stream"} 1\n'
+        )
+        self.assertContainsRe(
+            text,
+            "\nbzr_smart_request_duration_seconds_bucket"
+            '{verb="Repository.get_stream",le="\\+Inf"} 2\n',
+        )
+        self.assertContainsRe(text, '\nbzr_smart_path_cpu_seconds_total{path="repo/"} ')
+
+    def test_exception_counts_as_error(self):
+        server_metrics = metrics.ServerMetrics()
+        try:
+            with server_metrics.track_request():
+                raise ConnectionResetError()
+        except ConnectionResetError:
+            pass
+        self.assertContainsRe(
+            server_metrics.to_prometheus(),
+            '\nbzr_smart_request_errors_total{verb="unknown"} 1\n',
+        )
+
+    def test_duration_buckets(self):
+        server_metrics = metrics.ServerMetrics()
+        request = metrics._Request()
+        request.verb = "get"
+        server_metrics._request_started()
+        server_metrics._request_finished(request, 0.02, 0.0)
+        server_metrics._request_started()
+        server_metrics._request_finished(request, 100.0, 0.0)
+        text = server_metrics.to_prometheus()
+        self.assertContainsRe(
+            text,
+            '\nbzr_smart_request_duration_seconds_bucket{verb="get",le="0.01"} 0\n',
+        )
+        self.assertContainsRe(
+            text,
+            '\nbzr_smart_request_duration_seconds_bucket{verb="get",le="0.025"} 1\n',
+        )
+        self.assertContainsRe(
+            text, '\nbzr_smart_request_duration_seconds_bucket{verb="get",le="60"} 1\n'
+        )
+        self.assertContainsRe(
+            text, '\nbzr_smart_request_duration_seconds_count{verb="get"} 2\n'
+        )
+
+    def test_activity_and_connections(self):
+        server_metrics = metrics.ServerMetrics()
+        server_metrics.connection_opened()
+        server_metrics.connection_opened()
+        server_metrics.connection_closed()
+        server_metrics.record_activity(10, "read")
+        server_metrics.record_activity(25, "write")
+        text = server_metrics.to_prometheus()
+        self.assertContainsRe(text, "\nbzr_smart_received_bytes_total 10\n")
+        self.assertContainsRe(text, "\nbzr_smart_sent_bytes_total 25\n")
+        self.assertContainsRe(text, "\nbzr_smart_connections_total 2\n")
+        self.assertContainsRe(text, "\nbzr_smart_active_connections 1\n")
+
+    def test_escape_label_value(self):
+        self.assertEqual(
+            'path="a\\\\b\\"c\\nd"', metrics._format_labels({"path": 'a\\b"c\nd'})[1:-1]
+        )
+
+
+class TestMetricsFile(tests.TestCaseInTempDir):
+    def test_write_metrics(self):
+        server = _mod_server.SmartTCPServer(
+            None, client_timeout=4.0, metrics_file="metrics.prom"
+        )
+        server.metrics.connection_opened()
+        server.write_metrics()
+        with open("metrics.prom") as f:
+            self.assertContainsRe(f.read(), "\nbzr_smart_connections_total 1\n")
+
+    def test_disabled(self):
+        server = _mod_server.SmartTCPServer(None, client_timeout=4.0)
+        self.assertIs(None, server.metrics)
+        server._maybe_write_metrics()
@@ -33,7 +33,7 @@ from testtools.matchers import DocTestMatches
 
 import breezy
 
-from ... import controldir, debug, errors, osutils, tests, urlutils
+from ... import config, controldir, debug, errors, osutils, tests, urlutils
 from ... import transport as _mod_transport
 from ...tests import features, test_server
 from ...transport import local, memory, remote, ssh
@@ -1612,6 +1612,34 @@ class WritableEndToEndTests(SmartTCPTests):
         fp = self.transport.get("foo")
         self.assertEqual(b"contents\nof\nfoo\n", fp.read())
 
+    def test_smart_transport_put_file(self):
+        """Put a file over smart, streamed in several chunks."""
+        self.overrideEnv("BRZ_NO_SMART_VFS", None)
+        # The first request determines the protocol version.
+        self.assertFalse(self.transport.has("foo"))
+        self.transport._put_chunk_size = 4
+        f = BytesIO(b"skipped contents\nof\nfoo\n")
+        f.seek(8)
+        self.assertEqual(16, self.transport.put_file("foo", f))
+        self.assertEqual(
+            b"contents\nof\nfoo\n", self.backing_transport.get_bytes("foo")
+        )
+        self.assertEqual(16, self.transport.append_file("foo", BytesIO(b"more\n")))
+        self.assertEqual(
+            b"contents\nof\nfoo\nmore\n", self.backing_transport.get_bytes("foo")
+        )
+
+    def test_smart_transport_put_file_error(self):
+        """A failed streamed put leaves the file where it started."""
+        self.overrideEnv("BRZ_NO_SMART_VFS", None)
+        self.assertFalse(self.transport.has("foo"))
+        self.transport._put_chunk_size = 4
+        f = BytesIO(b"contents\n")
+        self.assertRaises(
+            _mod_transport.NoSuchFile, self.transport.put_file, "dir/foo", f
+        )
+        self.assertEqual(0, f.tell())
+
     def test_get_error_enoent(self):
         """Error reported from server getting nonexistent file."""
         # The path in a raised NoSuchFile exception should be the precise path
@@ -3511,6 +3539,123 @@ class TestResponseEncoderBufferingProtocolThree(tests.TestCase):
         self.assertWriteCount(3)
 
 
+class TestBodyCompressionProtocolThree(tests.TestCaseInTempDir):
+    """Tests for negotiated compression of v3 message bodies."""
+
+    def decode_message(self, message_bytes):
+        """Decode message_bytes (without the version marker)."""
+        handler = LoggingMessageHandler()
+        decoder = protocol.ProtocolThreeDecoder(handler)
+        decoder.accept_bytes(message_bytes)
+        self.assertEqual(0, decoder.next_read_size())
+        return handler.event_log
+
+    def test_select_body_encoding(self):
+        self.assertEqual(b"zlib", protocol.select_body_encoding([b"bogus", b"zlib"]))
+        self.assertEqual(None, protocol.select_body_encoding([b"bogus"]))
+        self.assertEqual(None, protocol.select_body_encoding(None))
+
+    def test_request_body_compressed(self):
+        output = BytesIO()
+        medium_request = StubMediumRequest()
+        medium_request.accept_bytes = output.write
+        requester = protocol.ProtocolThreeRequester(medium_request)
+        requester.set_body_encodings([b"zlib"], b"zlib")
+        requester.set_headers({})
+        body = b"body bytes " * 100
+        requester.call_with_body_bytes((b"one arg",), body)
+        message_bytes = output.getvalue()
+        self.assertStartsWith(message_bytes, protocol.MESSAGE_VERSION_THREE)
+        self.assertLess(len(message_bytes), len(body))
+        event_log = self.decode_message(
+            message_bytes[len(protocol.MESSAGE_VERSION_THREE) :]
+        )
+        self.assertEqual(
+            [
+                (
+                    "headers",
+                    {
+                        b"Accept-Body-Encoding": (b"zlib",),
+                        b"Body-Encoding": b"zlib",
+                    },
+                ),
+                ("structure", (b"one arg",)),
+                ("bytes", body),
+                ("end",),
+            ],
+            event_log,
+        )
+
+    def test_response_body_stream_compressed(self):
+        out_stream = BytesIO()
+        responder = protocol.ProtocolThreeResponder(out_stream.write)
+        responder._headers = {}
+        responder.negotiate_body_encoding({b"Accept-Body-Encoding": (b"zlib",)})
+        chunks = [b"chunk one " * 50, b"chunk two " * 50]
+        responder.send_response(
+            _mod_request.SuccessfulSmartServerResponse(
+                (b"args",), body_stream=iter(chunks)
+            )
+        )
+        response_handler = message.ConventionalResponseHandler()
+        decoder = protocol.ProtocolThreeDecoder(
+            response_handler, expect_version_marker=True
+        )
+        response_handler.setProtoAndMediumRequest(decoder, StubRequest())
+        decoder.accept_bytes(out_stream.getvalue())
+        self.assertEqual({b"Body-Encoding": b"zlib"}, response_handler.headers)
+        self.assertEqual((b"args",), response_handler.read_response_tuple(True))
+        self.assertEqual(chunks, list(response_handler.read_streamed_body()))
+
+    def test_response_not_compressed_without_accepted_encoding(self):
+        out_stream = BytesIO()
+        responder = protocol.ProtocolThreeResponder(out_stream.write)
+        responder._headers = {}
+        responder.negotiate_body_encoding({b"Accept-Body-Encoding": (b"bogus",)})
+        responder.send_response(
+            _mod_request.SuccessfulSmartServerResponse((b"args",), body=b"body")
+        )
+        self.assertEqual(
+            b"bzr message 3 (bzr 1.6)\n"
+            b"\x00\x00\x00\x02de"
+            b"oS"
+            b"s\x00\x00\x00\x08l4:argse"
+            b"b\x00\x00\x00\x04body"
+            b"e",
+            out_stream.getvalue(),
+        )
+
+    def test_decode_unknown_body_encoding(self):
+        handler = LoggingMessageHandler()
+        decoder = protocol.ProtocolThreeDecoder(handler)
+        decoder.accept_bytes(b"\x00\x00\x00\x14d13:Body-Encoding0:e")
+        self.assertTrue(decoder.decoding_failed)
+        [(event, exception)] = handler.event_log
+        self.assertEqual("protocol_error", event)
+        self.assertIsInstance(exception, errors.SmartProtocolError)
+
+    def test_stats_record_sizes(self):
+        stats = protocol.body_compression_stats
+        raw_sent, wire_sent = stats.raw_bytes_sent, stats.wire_bytes_sent
+        output = BytesIO()
+        encoder = protocol._ProtocolThreeEncoder(output.write)
+        encoder._set_body_encoding(b"zlib")
+        encoder._write_prefixed_body(b"x" * 1000)
+        encoder.flush()
+        self.assertEqual(raw_sent + 1000, stats.raw_bytes_sent)
+        self.assertEqual(wire_sent + len(output.getvalue()) - 5, stats.wire_bytes_sent)
+
+    def test_client_medium_remembers_accepted_encoding(self):
+        self.overrideAttr(protocol, "supported_body_encodings", lambda: [b"zlib"])
+        config.GlobalStack().set("smart.body_compression", "zstd,zlib")
+        client_medium = medium.SmartClientMedium("base")
+        self.assertEqual([b"zlib"], client_medium._get_accepted_body_encodings())
+        client_medium._remember_body_encoding(b"zstd")
+        self.assertEqual(None, client_medium._body_encoding)
+        client_medium._remember_body_encoding(b"zlib")
+        self.assertEqual(b"zlib", client_medium._body_encoding)
+
+
 class TestSmartClientUnicode(tests.TestCase):
     """_SmartClient tests for unicode arguments.
 
@@ -1832,10 +1832,15 @@ class StreamSink:
         stream = source.get_stream_for_missing_keys(missing_keys)
         return self.insert_stream_without_locking(stream, self.target_repo._format)
 
-    def insert_stream(self, stream, src_format, resume_tokens):
+    def insert_stream(self, stream, src_format, resume_tokens, checkpoint=None):
         """Insert a stream's content into the target repository.
 
         :param src_format: a bzr repository format.
+        :param checkpoint: An optional StreamCheckpoint tracking stream.  If
+            reading the stream fails with a ConnectionError, the data already
+            inserted is kept: the write group is suspended, its tokens and
+            the durably inserted keys are recorded in the checkpoint, and the
+            error is re-raised.
 
         :return: a list of resume tokens and an  iterable of keys additional
             items required before the insertion can be completed.
@@ -1868,10 +1873,28 @@ class StreamSink:
                 ) and self.target_repo._format.pack_compresses:
                     self.target_repo.pack(hint=hint)
                 return [], set()
+            except ConnectionError:
+                if checkpoint is None or not self._suspend_interrupted(checkpoint):
+                    self.target_repo.abort_write_group(suppress_errors=True)
+                raise
             except:
                 self.target_repo.abort_write_group(suppress_errors=True)
                 raise
 
+    def _suspend_interrupted(self, checkpoint):
+        """Suspend the write group of an interrupted stream into checkpoint.
+
+        :return: True if the write group was suspended, False if the target
+            repository can not suspend write groups.
+        """
+        try:
+            checkpoint.record_durable_keys(self.target_repo)
+            checkpoint.resume_tokens = self.target_repo.suspend_write_group()
+        except errors.UnsuspendableWriteGroup:
+            checkpoint.resume_tokens = []
+            return False
+        return True
+
     def insert_stream_without_locking(self, stream, src_format, is_resume=False):
         """Insert a stream's content into the target repository.
 
@@ -2039,6 +2062,76 @@ class StreamSink:
             self.target_repo.reconcile()
 
 
+class StreamCheckpoint:
+    """Progress of a stream insertion, used to resume an interrupted fetch.
+
+    Streams yield each substream kind once, in an order fixed by the source,
+    so progress is recorded as the kinds that have been received in full plus
+    the keys of the current kind that are present in the target repository.
+
+    :ivar completed_kinds: Substream kinds that have been received in full.
+    :ivar current_kind: The kind of the substream being received.
+    :ivar durable_keys: Keys of current_kind that are known to be present in
+        the target repository.
+    :ivar resume_tokens: Tokens of the suspended write group holding the
+        inserted data, if the insertion was interrupted.
+    """
+
+    def __init__(self):
+        self.completed_kinds = []
+        self.current_kind = None
+        self.durable_keys = set()
+        self.resume_tokens = []
+        self._received_keys = set()
+
+    def track(self, stream):
+        """Wrap stream, recording the progress of its consumer."""
+        for kind, substream in stream:
+            if kind != self.current_kind:
+                if self.current_kind is not None:
+                    self.completed_kinds.append(self.current_kind)
+                self.current_kind = kind
+                self.durable_keys = set()
+                self._received_keys = set()
+            yield kind, self._track_substream(substream)
+
+    def _track_substream(self, substream):
+        for record in substream:
+            self._received_keys.add(record.key)
+            yield record
+
+    def record_durable_keys(self, repository):
+        """Record which keys of the current kind repository now holds.
+
+        Records may be buffered by the target before being written, so only
+        the keys it reports as present are safe to skip when resuming.
+        Keys only present in fallback repositories don't count, as they
+        still have to be copied into a stacked repository.
+        """
+        versioned_files = self._versioned_files(repository)
+        if versioned_files is None:
+            return
+        without_fallbacks = getattr(versioned_files, "without_fallbacks", None)
+        if without_fallbacks is not None:
+            versioned_files = without_fallbacks()
+        pending = self._received_keys.difference(self.durable_keys)
+        self.durable_keys.update(versioned_files.get_parent_map(pending))
+        self._received_keys = set(self.durable_keys)
+
+    def _versioned_files(self, repository):
+        if self.current_kind == "inventory-deltas":
+            return repository.inventories
+        if self.current_kind in (
+            "texts",
+            "inventories",
+            "chk_bytes",
+            "revisions",
+            "signatures",
+        ):
+            return getattr(repository, self.current_kind)
+        return None
+
+
 class StreamSource:
     """A source of a stream for fetching between repositories."""
 
@@ -2498,6 +2498,46 @@ A negative value means disable the size check.
 """,
     )
 )
+option_registry.register(
+    Option(
+        "block_cache.disk",
+        default=False,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Keep the blocks cached by cache+ transports on disk.
+
+When enabled, the blocks of pack and index files read through a cache+
+transport are also stored in the breezy cache directory, so later
+invocations read them from there rather than from the server.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "block_cache.disk_size",
+        default="1GB",
+        from_unicode=int_SI_from_store,
+        invalid="warning",
+        help="""\
+Disk space used to keep the blocks cached by cache+ transports.
+
+When the blocks kept on disk with block_cache.disk take more space, the
+blocks of the files used least recently are removed. 0 means no limit.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "block_cache.memory_size",
+        default="32MB",
+        from_unicode=int_SI_from_store,
+        invalid="warning",
+        help="""\
+Memory used to cache the blocks read by cache+ transports.
+""",
+    )
+)
 option_registry.register(
     Option(
         "bound",
@@ -2667,9 +2707,111 @@ This defaults to the first key associated with the users email.
 """,
     )
 )
+option_registry.register(
+    Option(
+        "http.adaptive_readv",
+        default=False,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Size HTTP range requests from the measured latency and bandwidth.
+
+When enabled, the time taken by range requests is used to estimate the
+round trip time and throughput of the connection. On slow links, offsets
+further apart are then combined into one range and indices read more pages
+per request, so fewer requests are issued. The static defaults are used
+until a few requests have been measured.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "http.idle_timeout",
+        default=60.0,
+        from_unicode=float_from_store,
+        invalid="warning",
+        help="""\
+Seconds an unused HTTP connection is kept open for reuse.
+
+Connections that are no longer used by any transport are kept open so that
+later requests to the same host don't have to connect again.  Connections
+left idle for longer than this are closed instead of being reused.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "http.max_connections_per_host",
+        default=4,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Maximum number of unused HTTP connections kept open for each host.
+
+See ``http.idle_timeout``.  Setting this to 0 disables the reuse of
+connections between unrelated transports.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "http.readv_connections",
+        default=1,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of connections used to read parts of a file over HTTP.
+
+With more than one connection, the byte ranges read from a file at once are
+divided between several requests issued in parallel over separate keep-alive
+connections, so fetching from a plain HTTP server is not limited by the
+latency of each request.
+""",
+    )
+)
 option_registry.register(
     Option("language", help="Language to translate messages into.")
 )
+option_registry.register(
+    Option(
+        "latency.jitter",
+        default=0.0,
+        from_unicode=float_from_store,
+        invalid="warning",
+        help="""\
+Maximum random delay added to the round trips of latency+ transports.
+
+In milliseconds. Each round trip takes latency.rtt plus a random delay
+between zero and this value, drawn from a generator seeded with
+latency.seed so that runs are reproducible.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "latency.rtt",
+        default=50.0,
+        from_unicode=float_from_store,
+        invalid="warning",
+        help="""\
+Round trip time simulated by latency+ transports, in milliseconds.
+
+Every request made through a ``latency+`` URL waits this long before it is
+passed on, as if the location was reached over a slow network.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "latency.seed",
+        default=0,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Seed of the random jitter added to the round trips of latency+ transports.
+""",
+    )
+)
 option_registry.register(
     Option(
         "locks.steal_dead",
@@ -2782,6 +2924,68 @@ lost if the machine crashes.  See also dirstate.fdatasync.
 """,
     )
 )
+option_registry.register(
+    Option(
+        "repository.fetch_connections",
+        default=1,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of connections used to fetch from a smart server.
+
+With more than one connection, file texts are divided between the connections
+by file id and fetched in parallel, which can make better use of links with
+high bandwidth and high latency.  Only used when both repositories use a
+format like 2a that doesn't store texts as deltas against other texts.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "repository.fetch_resume_attempts",
+        default=3,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+How many times an interrupted fetch from a smart server is resumed.
+
+When the connection to the server is lost while fetching, the data received
+so far is kept and only the remainder is requested again.  Set to 0 to
+disable resuming.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "repository.parent_map_cache",
+        default=False,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Keep a persistent local cache of revision parents for remote repositories.
+
+Revision parents never change, so parents retrieved from a smart server are
+stored in the breezy cache directory and reused by later commands, which then
+only ask the server about revisions they have not seen before.
+
+See also: repository.parent_map_cache_size.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "repository.parent_map_cache_size",
+        default="20MB",
+        from_unicode=int_SI_from_store,
+        invalid="warning",
+        help="""\
+Size limit of the persistent parent map cache of each remote repository.
+
+When the cache grows beyond this size, only the most recently added entries
+are kept.
+""",
+    )
+)
 option_registry.register_lazy("smtp_server", "breezy.smtp_connection", "smtp_server")
 option_registry.register_lazy(
     "smtp_password", "breezy.smtp_connection", "smtp_password"
@@ -2821,11 +3025,74 @@ option_registry.register(
         " X seconds, consider the client idle, and hangup.",
     )
 )
+option_registry.register(
+    Option(
+        "serve.metrics_file",
+        default=None,
+        help="""\
+File to write smart server metrics to.
+
+When set, ``brz serve`` (when not using --inet) periodically writes
+per-verb request counts, latency histograms and CPU time, byte counts and
+connection counts to this file in the Prometheus text format, e.g. for the
+node exporter textfile collector.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "sftp.pipeline_depth",
+        default=1,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of SFTP requests kept in flight at once.
+
+With more than one, the reads of a readv, the writes of a file upload and
+the stats of a recursive listing are issued without waiting for the
+previous ones to complete, which makes better use of links with high
+latency.
+""",
+    )
+)
+option_registry.register(
+    ListOption(
+        "smart.body_compression",
+        default=[],
+        help="""\
+Compression to negotiate for smart protocol message bodies.
+
+A list of encodings (``zstd``, ``zlib``) in order of preference. When the
+server supports one of them, response bodies are compressed with it and
+request bodies are compressed on later requests over the same connection.
+``zstd`` is only used when the zstandard module is installed. By default
+bodies are sent uncompressed.
+""",
+    )
+)
 option_registry.register(
     Option(
         "ssh", default=None, override_from_env=["BRZ_SSH"], help="SSH vendor to use."
     )
 )
+option_registry.register(
+    Option(
+        "ssh.control_persist",
+        default=0,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Seconds to keep idle SSH connections open for reuse.
+
+When positive, connections to the same user, host and port share one
+authenticated SSH connection. With the OpenSSH vendor this is a control
+master whose socket lives in the breezy cache directory, so it is also
+reused by later brz invocations until it has been idle for this long. With
+paramiko, connections are reused within a single process. By default every
+connection performs its own SSH handshake.
+""",
+    )
+)
 option_registry.register(
     Option(
         "stacked_on_location",
@@ -2853,6 +3120,33 @@ option_registry.register(
         "suppress_warnings", default=[], help="List of warning classes to suppress."
     )
 )
+option_registry.register(
+    Option(
+        "throttle.bandwidth",
+        default="1MB",
+        from_unicode=int_SI_from_store,
+        invalid="warning",
+        help="""\
+Bandwidth simulated by throttle+ transports, in bytes per second.
+
+The data read and written through a ``throttle+`` URL is delayed as if it
+was transferred over a link of this bandwidth.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "transport.record_file",
+        default=None,
+        help="""\
+File the record+ transport decorator writes its trace to.
+
+Every operation performed through a ``record+`` URL is appended to this file,
+which can then be replayed with ``brz benchmark-transport``. It has to be set
+to use ``record+`` URLs; the file is not rotated.
+""",
+    )
+)
 option_registry.register(
     Option(
         "validate_signatures_in_log",
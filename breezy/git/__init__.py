@@ -479,8 +479,164 @@ install_lazy_named_hook(
 )
 
 
-from ..config import Option, bool_from_store, option_registry
+from ..config import (
+    Option,
+    bool_from_store,
+    int_from_store,
+    int_SI_from_store,
+    option_registry,
+)
+
+option_registry.register(
+    Option(
+        "git.commit_graph",
+        default=True,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Use the commit-graph file of git repositories.
+
+The parents and generation numbers of the commits listed in the
+commit-graph file are read from it rather than from the commit objects.
+'brz pack' writes the file for the commits reachable from the refs.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.delta_blobs",
+        default=True,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Delta-compress blobs in the packs sent to git clients.
 
+A blob is sent as a delta against the blob of the previous revision of the
+same file, when that is part of the pack too.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.export_batch_size",
+        default=1000,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of revisions added to the git SHA map per write group.
+
+Only used when git.export_workers is set. The map is written after each
+batch, so that an interrupted export doesn't have to start over.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.export_workers",
+        default=0,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of threads hashing file texts when exporting revisions to git.
+
+The first push of a Bazaar repository to git, or the first fetch from it by
+a git client, maps every revision to git objects. When this is greater than
+zero, the file texts of a batch of revisions are read at once and hashed in
+parallel; 0 converts revisions one at a time.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.file_history_index",
+        default=True,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Keep an index of the commits that change each file of git repositories.
+
+'brz pack' builds the index, and fetches into the repository extend it.
+Annotate and log of a single file then find the previous change to the
+file without looking it up in the tree of every commit.
+""",
+    )
+)
+
+option_registry.register(
+    Option(
+        "git.hash_workers",
+        default=4,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of threads hashing the changed files of git working trees.
+
+The files whose stat data differs from that recorded in the index are
+read and hashed in parallel when comparing a working tree to its basis,
+as done by 'brz status' and 'brz diff'; 0 or 1 hashes them one at a time.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.import_tree_cache_size",
+        default="50M",
+        from_unicode=int_SI_from_store,
+        invalid="warning",
+        help="""\
+Size of the cache of revision trees used when importing git commits.
+
+The trees of recently imported revisions are kept, as they are the parents
+of the next ones. The size is estimated from the number of inventory
+entries; a larger cache helps when importing histories with many long
+lived branches.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.import_workers",
+        default=0,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of threads reading ahead the git objects of imported commits.
+
+When this is greater than zero, the trees and blobs changed by the next
+commits to import are looked up while the current one is added to the
+Bazaar repository; 0 looks them up as they are needed.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.pack_bitmaps",
+        default=False,
+        from_unicode=bool_from_store,
+        invalid="warning",
+        help="""\
+Write a pack bitmap when packing git repositories.
+
+'brz pack' then repacks all objects into a single pack and writes a bitmap
+of the objects reachable from a selection of commits next to it. Existing
+bitmaps, such as those written by 'git repack -b', are always used to find
+the objects to send to clients.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "git.sha_map_format",
+        default="index",
+        help="""\
+Format of new caches mapping Bazaar revisions to git objects.
+
+``index`` stores the map in B+Tree indexes. ``segment`` stores it in sorted
+binary segments that are mapped into memory, which makes lookups cheaper.
+Existing caches keep their format.
+""",
+    )
+)
 option_registry.register(
     Option(
         "git.http",
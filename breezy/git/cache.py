@@ -18,13 +18,15 @@
 
 import contextlib
 import hashlib
+import mmap
 import os
+import struct
 import threading
 
 from dulwich.objects import ShaFile, hex_to_sha, sha_to_hex
 
+from .. import config, registry, trace
 from .. import errors as bzr_errors
-from .. import registry, trace
 from .._git_rs import get_cache_dir
 from ..bzr import btree_index as _mod_btree_index
 from ..bzr import index as _mod_index
@@ -98,6 +100,19 @@ class GitShaMap:
             revids = set(revids)
         return revids - present_revids
 
+    def lookup_git_shas(self, shas):
+        """Lookup several Git shas at once.
+
+        :param shas: Git object shas
+        :return: Dictionary mapping the shas that were found to lists of
+            (type, type_data) tuples, as returned by lookup_git_sha()
+        """
+        ret = {}
+        for sha in shas:
+            with contextlib.suppress(KeyError):
+                ret[sha] = list(self.lookup_git_sha(sha))
+        return ret
+
     def sha1s(self):
         """List the SHA1s."""
         raise NotImplementedError(self.sha1s)
@@ -155,7 +170,10 @@ class BzrGitCacheFormat:
             format_name = transport.get_bytes("format")
             format = formats.get(format_name)
         except NoSuchFile:
-            format = formats.get("default")
+            if config.GlobalStack().get("git.sha_map_format") == "segment":
+                format = SegmentGitCacheFormat()
+            else:
+                format = formats.get("default")
             format.initialize(transport)
         return format.open(transport)
 
@@ -920,10 +938,514 @@ class IndexGitShaMap(GitShaMap):
             yield key[1]
 
 
+class SegmentCacheUpdater(CacheUpdater):
+    """Cache updater for segment-based caches."""
+
+    def __init__(self, cache, rev):
+        self.cache = cache
+        self.revid = rev.revision_id
+        self._commit = None
+
+    def add_object(self, obj, bzr_key_data, path):
+        if isinstance(obj, tuple):
+            (type_name, hexsha) = obj
+        else:
+            type_name = obj.type_name.decode("ascii")
+            hexsha = obj.id
+        if type_name == "commit":
+            self._commit = obj
+            if not isinstance(bzr_key_data, dict):
+                raise TypeError(bzr_key_data)
+            testament3_sha1 = bzr_key_data.get("testament3-sha1") or b""
+            self.cache.idmap._add(
+                hexsha,
+                (b"commit", self.revid, obj.tree, testament3_sha1),
+                (b"commit", self.revid),
+            )
+        elif type_name in ("blob", "tree"):
+            if bzr_key_data is None:
+                return
+            key = (type_name.encode("ascii"),) + tuple(bzr_key_data)
+            self.cache.idmap._add(hexsha, key, key)
+        else:
+            raise AssertionError
+
+    def finish(self):
+        if self._commit is None:
+            raise AssertionError("No commit object added")
+        return self._commit
+
+
+def SegmentBzrGitCache(transport=None):
+    if transport is not None:
+        transport = transport.clone("segments")
+    return BzrGitCache(SegmentGitShaMap(transport), SegmentCacheUpdater)
+
+
+class SegmentGitCacheFormat(BzrGitCacheFormat):
+    """Cache format storing the map in sorted binary segments."""
+
+    def get_format_string(self):
+        return b"bzr-git sha map segments version 1\n"
+
+    def initialize(self, transport):
+        super().initialize(transport)
+        transport.mkdir("segments")
+
+    def open(self, transport):
+        return SegmentBzrGitCache(transport)
+
+
+SEGMENT_SIGNATURE = b"bzr-git sha map segment 1\n"
+_SEGMENT_COUNTS = struct.Struct(">II")
+_FANOUT = struct.Struct(">256I")
+# Git sha, offset and length of the entry in the data area.
+_OBJECT_RECORD = struct.Struct(">20sII")
+# Digest of the bzr key, git sha.
+_KEY_RECORD = struct.Struct(">20s20s")
+# Number of segments of similar size that are merged into one.
+_MERGE_FACTOR = 10
+# Name of the file listing the merged segments that couldn't be deleted.
+_OBSOLETE_NAME = "obsolete"
+
+
+def _key_digest(key):
+    """Return the digest a bzr key is stored under in segments."""
+    return hashlib.sha1(b"\0".join(key)).digest()  # noqa: S324
+
+
+def _fanout(keys):
+    """Return the fanout table of sorted 20-byte keys.
+
+    Entry i is the number of keys whose first byte is at most i.
+    """
+    counts = [0] * 256
+    for key in keys:
+        counts[key[0]] += 1
+    total = 0
+    table = []
+    for count in counts:
+        total += count
+        table.append(total)
+    return table
+
+
+def _encode_segment(objects, keys):
+    """Serialize a segment.
+
+    :param objects: Iterable over (binary git sha, entry) tuples
+    :param keys: Dictionary mapping bzr key digests to binary git shas
+    :return: The contents of the segment
+    """
+    objects = sorted(set(objects))
+    keys = sorted(keys.items())
+    records = []
+    data = []
+    offset = 0
+    for sha, entry in objects:
+        records.append(_OBJECT_RECORD.pack(sha, offset, len(entry)))
+        data.append(entry)
+        offset += len(entry)
+    records.extend(_KEY_RECORD.pack(digest, sha) for digest, sha in keys)
+    return b"".join(
+        [
+            SEGMENT_SIGNATURE,
+            _SEGMENT_COUNTS.pack(len(objects), len(keys)),
+            _FANOUT.pack(*_fanout(sha for sha, entry in objects)),
+            _FANOUT.pack(*_fanout(digest for digest, sha in keys)),
+        ]
+        + records
+        + data
+    )
+
+
+def _decode_entry(entry):
+    """Convert an entry of a segment to a (type, type_data) tuple."""
+    data = entry.split(b"\0")
+    type_name = data[0].decode("ascii")
+    if type_name == "commit":
+        verifiers = {"testament3-sha1": data[3]} if data[3] else {}
+        return (type_name, (data[1], data[2], verifiers))
+    elif type_name in ("tree", "blob"):
+        return (type_name, tuple(data[1:]))
+    else:
+        raise AssertionError(f"unknown type {type_name!r}")
+
+
+class _Segment:
+    """A sorted, immutable set of sha map records.
+
+    A segment starts with a signature line, the number of object and key
+    records and a fanout table for each kind of record: as in git pack index
+    files, entry i of a fanout table is the number of records whose key
+    starts with a byte of at most i, which narrows a lookup down to the
+    records sharing the first byte of its key. Then come the fixed-width
+    object records, sorted by git sha and pointing at the entries of the
+    data area, and the key records, sorted by the digest of a bzr key and
+    holding the git sha it maps to.
+    """
+
+    def __init__(self, buf, name=None):
+        """Create a _Segment.
+
+        :param buf: The contents of the segment, as bytes or a mmap
+        :param name: The name of the file holding the segment, if any
+        """
+        if buf[: len(SEGMENT_SIGNATURE)] != SEGMENT_SIGNATURE:
+            raise bzr_errors.BzrError(f"Invalid git sha map segment {name!r}")
+        self.name = name
+        self._buf = buf
+        pos = len(SEGMENT_SIGNATURE)
+        self.object_count, self.key_count = _SEGMENT_COUNTS.unpack_from(buf, pos)
+        pos += _SEGMENT_COUNTS.size
+        self._object_fanout = _FANOUT.unpack_from(buf, pos)
+        pos += _FANOUT.size
+        self._key_fanout = _FANOUT.unpack_from(buf, pos)
+        pos += _FANOUT.size
+        self._objects_start = pos
+        self._keys_start = pos + self.object_count * _OBJECT_RECORD.size
+        self._data_start = self._keys_start + self.key_count * _KEY_RECORD.size
+
+    def __len__(self):
+        return self.object_count + self.key_count
+
+    def close(self):
+        if not isinstance(self._buf, bytes):
+            self._buf.close()
+
+    def _bisect(self, fanout, start, width, key):
+        """Find the first record not sorting before a key.
+
+        :return: Tuple with the index of that record and the index of the
+            first record whose key has a greater first byte.
+        """
+        first = key[0]
+        lo = fanout[first - 1] if first else 0
+        end = hi = fanout[first]
+        buf = self._buf
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = start + mid * width
+            if buf[pos : pos + 20] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo, end
+
+    def lookup_object(self, sha):
+        """Return the entries recorded for a binary git sha."""
+        index, end = self._bisect(
+            self._object_fanout, self._objects_start, _OBJECT_RECORD.size, sha
+        )
+        entries = []
+        while index < end:
+            record_sha, offset, length = _OBJECT_RECORD.unpack_from(
+                self._buf, self._objects_start + index * _OBJECT_RECORD.size
+            )
+            if record_sha != sha:
+                break
+            pos = self._data_start + offset
+            entries.append(self._buf[pos : pos + length])
+            index += 1
+        return entries
+
+    def lookup_key(self, digest):
+        """Return the binary git sha a bzr key digest maps to, or None."""
+        index, end = self._bisect(
+            self._key_fanout, self._keys_start, _KEY_RECORD.size, digest
+        )
+        if index < end:
+            record_digest, sha = _KEY_RECORD.unpack_from(
+                self._buf, self._keys_start + index * _KEY_RECORD.size
+            )
+            if record_digest == digest:
+                return sha
+        return None
+
+    def iter_objects(self):
+        """Iterate over the (binary git sha, entry) tuples of the segment."""
+        for index in range(self.object_count):
+            sha, offset, length = _OBJECT_RECORD.unpack_from(
+                self._buf, self._objects_start + index * _OBJECT_RECORD.size
+            )
+            pos = self._data_start + offset
+            yield sha, self._buf[pos : pos + length]
+
+    def iter_keys(self):
+        """Iterate over the (bzr key digest, binary git sha) tuples."""
+        for index in range(self.key_count):
+            yield _KEY_RECORD.unpack_from(
+                self._buf, self._keys_start + index * _KEY_RECORD.size
+            )
+
+
+class SegmentGitShaMap(GitShaMap):
+    r"""SHA Map stored in sorted segments of fixed-width binary records.
+
+    Each write group adds a segment file to the transport, named after the
+    SHA1 of its contents. Local segments are mapped into memory, so lookups
+    are binary searches in memory rather than index parsing. To keep the
+    number of segments searched low, segments of similar size are merged
+    once there are _MERGE_FACTOR of them, so each record is rewritten a
+    logarithmic number of times rather than on every repack.
+
+    Segments that were merged can't always be deleted right away, for
+    instance on Windows while another process has them mapped into memory.
+    Their names are then listed in the 'obsolete' file, so they are ignored
+    until a later merge manages to delete them.
+
+    Segments record:
+
+    <sha1> -> "<type>\0<type-data1>\0<type-data2>[\0<testament3-sha1>]"
+    digest("commit\0<revid>") -> <sha1>
+    digest("blob\0<fileid>\0<revid>") -> <sha1>
+    digest("tree\0<fileid>\0<revid>") -> <sha1>
+    """
+
+    def __init__(self, transport=None):
+        self._transport = transport
+        self._segments = []
+        # The records of the open write group, if any.
+        self._objects = None
+        self._keys = None
+        if transport is not None:
+            obsolete = self._read_obsolete()
+            for name in sorted(transport.list_dir(".")):
+                if not name.endswith(".seg") or name in obsolete:
+                    continue
+                with contextlib.suppress(NoSuchFile):
+                    self._segments.append(self._open_segment(name))
+
+    def __repr__(self):
+        if self._transport is not None:
+            return f"{self.__class__.__name__}({self._transport.base!r})"
+        else:
+            return f"{self.__class__.__name__}()"
+
+    def _open_segment(self, name):
+        try:
+            path = self._transport.local_abspath(name)
+        except bzr_errors.NotLocalUrl:
+            return _Segment(self._transport.get_bytes(name), name)
+        try:
+            with open(path, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError as err:
+            raise NoSuchFile(path) from err
+        return _Segment(buf, name)
+
+    def _add_segment(self, objects, keys):
+        data = _encode_segment(objects, keys)
+        if self._transport is None:
+            segment = _Segment(data)
+        else:
+            name = hashlib.sha1(data).hexdigest() + ".seg"  # noqa: S324
+            self._transport.put_bytes(name, data)
+            segment = self._open_segment(name)
+        self._segments.append(segment)
+        return segment
+
+    def _read_obsolete(self):
+        try:
+            return set(
+                self._transport.get_bytes(_OBSOLETE_NAME).decode("ascii").split()
+            )
+        except NoSuchFile:
+            return set()
+
+    def _delete_obsolete(self, names):
+        """Delete obsolete segments, listing those that can't be deleted yet."""
+        names = self._read_obsolete() | set(names)
+        remaining = []
+        for name in sorted(names):
+            try:
+                self._transport.delete(name)
+            except NoSuchFile:
+                pass
+            except (bzr_errors.PermissionDenied, OSError) as e:
+                trace.mutter("unable to delete git sha map segment %s: %s", name, e)
+                remaining.append(name)
+        if remaining:
+            self._transport.put_bytes(
+                _OBSOLETE_NAME,
+                "".join(name + "\n" for name in remaining).encode("ascii"),
+            )
+        else:
+            with contextlib.suppress(NoSuchFile):
+                self._transport.delete(_OBSOLETE_NAME)
+
+    def _merge_segments(self):
+        """Merge segments of similar size.
+
+        Segments are grouped by the number of digits of their record count;
+        a group holding _MERGE_FACTOR segments is merged into one segment,
+        which may in turn complete the group of the next size.
+        """
+        while True:
+            groups = {}
+            for segment in self._segments:
+                groups.setdefault(len(str(len(segment))), []).append(segment)
+            to_merge = None
+            for _size, segments in sorted(groups.items()):
+                if len(segments) >= _MERGE_FACTOR:
+                    to_merge = segments
+                    break
+            if to_merge is None:
+                return
+            trace.mutter("merging %d git sha map segments", len(to_merge))
+            objects = []
+            keys = {}
+            for segment in to_merge:
+                objects.extend(segment.iter_objects())
+                keys.update(segment.iter_keys())
+            merged = self._add_segment(objects, keys)
+            for segment in to_merge:
+                self._segments.remove(segment)
+                segment.close()
+            if self._transport is not None:
+                self._delete_obsolete(
+                    segment.name for segment in to_merge if segment.name != merged.name
+                )
+
+    def start_write_group(self):
+        """Start writing changes."""
+        if self._objects is not None:
+            raise bzr_errors.BzrError("write group already open")
+        self._objects = {}
+        self._keys = {}
+
+    def commit_write_group(self):
+        """Commit any pending changes."""
+        if self._objects is None:
+            raise bzr_errors.BzrError("write group not open")
+        objects = [
+            (sha, entry)
+            for (sha, entries) in self._objects.items()
+            for entry in entries
+        ]
+        keys = self._keys
+        self._objects = None
+        self._keys = None
+        if objects or keys:
+            self._add_segment(objects, keys)
+            self._merge_segments()
+
+    def abort_write_group(self):
+        """Abort any pending changes."""
+        if self._objects is None:
+            raise bzr_errors.BzrError("write group not open")
+        self._objects = None
+        self._keys = None
+
+    def _add(self, hexsha, fields, key):
+        """Record an object.
+
+        :param hexsha: Hex git sha of the object
+        :param fields: Type and type data of the object
+        :param key: bzr key the object can be looked up by
+        """
+        if self._objects is None:
+            raise bzr_errors.BzrError("write group not open")
+        sha = hex_to_sha(hexsha)
+        entry = b"\0".join(fields)
+        entries = self._objects.setdefault(sha, [])
+        if entry not in entries:
+            entries.append(entry)
+        self._keys[_key_digest(key)] = sha
+
+    def _lookup_entries(self, sha):
+        """Return the entries recorded for a binary git sha."""
+        if self._objects is not None:
+            entries = list(self._objects.get(sha, ()))
+        else:
+            entries = []
+        for segment in self._segments:
+            for entry in segment.lookup_object(sha):
+                if entry not in entries:
+                    entries.append(entry)
+        return entries
+
+    def _lookup_key(self, key):
+        """Return the hex git sha a bzr key maps to."""
+        digest = _key_digest(key)
+        if self._keys is not None:
+            sha = self._keys.get(digest)
+            if sha is not None:
+                return sha_to_hex(sha)
+        for segment in reversed(self._segments):
+            sha = segment.lookup_key(digest)
+            if sha is not None:
+                return sha_to_hex(sha)
+        raise KeyError(key)
+
+    def lookup_commit(self, revid):
+        return self._lookup_key((b"commit", revid))
+
+    def lookup_blob_id(self, fileid, revision):
+        return self._lookup_key((b"blob", fileid, revision))
+
+    def lookup_tree_id(self, fileid, revision):
+        return self._lookup_key((b"tree", fileid, revision))
+
+    def lookup_git_sha(self, sha):
+        if len(sha) == 40:
+            sha = hex_to_sha(sha)
+        entries = self._lookup_entries(sha)
+        if not entries:
+            raise KeyError(sha)
+        for entry in entries:
+            yield _decode_entry(entry)
+
+    def lookup_git_shas(self, shas):
+        ret = {}
+        for sha in shas:
+            entries = self._lookup_entries(hex_to_sha(sha) if len(sha) == 40 else sha)
+            if entries:
+                ret[sha] = [_decode_entry(entry) for entry in entries]
+        return ret
+
+    def missing_revisions(self, revids):
+        """Return set of all the revisions that are not present."""
+        missing = set()
+        for revid in revids:
+            try:
+                self.lookup_commit(revid)
+            except KeyError:
+                missing.add(revid)
+        return missing
+
+    def _iter_entries(self):
+        if self._objects is not None:
+            for sha, entries in self._objects.items():
+                for entry in entries:
+                    yield sha, entry
+        for segment in self._segments:
+            yield from segment.iter_objects()
+
+    def revids(self):
+        """List the revision ids known."""
+        seen = set()
+        for _sha, entry in self._iter_entries():
+            if entry.startswith(b"commit\0"):
+                revid = entry.split(b"\0", 2)[1]
+                if revid not in seen:
+                    seen.add(revid)
+                    yield revid
+
+    def sha1s(self):
+        """List the SHA1s."""
+        seen = set()
+        for sha, _entry in self._iter_entries():
+            if sha not in seen:
+                seen.add(sha)
+                yield sha_to_hex(sha)
+
+
 formats = registry.Registry[str, BzrGitCacheFormat, None]()
 formats.register(TdbGitCacheFormat().get_format_string(), TdbGitCacheFormat())
 formats.register(SqliteGitCacheFormat().get_format_string(), SqliteGitCacheFormat())
 formats.register(IndexGitCacheFormat().get_format_string(), IndexGitCacheFormat())
+formats.register(SegmentGitCacheFormat().get_format_string(), SegmentGitCacheFormat())
 # In the future, this will become the default:
 formats.register("default", IndexGitCacheFormat())
 
@@ -229,6 +229,7 @@ class GitCommitBuilder(CommitBuilder):
                     raise
         self.store.add_object(c)
         self.repository.commit_write_group()
+        self.repository._update_file_history([c.id])
         self._new_revision_id = self._mapping.revision_id_foreign_to_bzr(c.id)
         return self._new_revision_id
 
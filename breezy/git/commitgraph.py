@@ -0,0 +1,136 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Revision graph access backed by git's commit-graph file.
+
+The commit-graph file lists the parents and the generation number of each
+commit in fixed-width tables, so that the graph can be walked without
+reading and parsing the commit objects. Generation numbers bound the walks
+done to find heads: a commit can only be an ancestor of commits with a
+higher generation number.
+"""
+
+from .. import errors, lru_cache
+from .. import graph as _mod_graph
+from ..revision import NULL_REVISION
+
+# Number of Bazaar revision ids of commits remembered by a provider.
+_REVISION_ID_CACHE_SIZE = 100000
+
+
+class CommitGraphParentsProvider:
+    """Parents provider for a local git repository with a commit-graph."""
+
+    def __init__(self, repository, commit_graph):
+        """Create a CommitGraphParentsProvider.
+
+        :param repository: LocalGitRepository
+        :param commit_graph: dulwich CommitGraph of the repository
+        """
+        self.repository = repository
+        self.commit_graph = commit_graph
+        self._revision_ids = lru_cache.LRUCache(_REVISION_ID_CACHE_SIZE)
+
+    def revision_id(self, sha, mapping):
+        """Return the Bazaar revision id of a commit.
+
+        With mappings that store revision ids in commits, the commit has to
+        be read, as it may carry the revision id it was pushed from, but only
+        once.  Otherwise the revision id follows from the SHA1.
+        """
+        if not mapping.revision_ids_in_commits:
+            return mapping.revision_id_foreign_to_bzr(sha)
+        key = (sha, mapping.revid_prefix)
+        try:
+            return self._revision_ids[key]
+        except KeyError:
+            pass
+        try:
+            revid = self.repository.lookup_foreign_revision_id(sha, mapping)
+        except KeyError:
+            revid = mapping.revision_id_foreign_to_bzr(sha)
+        self._revision_ids[key] = revid
+        return revid
+
+    def get_parents(self, sha, mapping):
+        """Return the revision ids of the parents of a commit.
+
+        :return: List of revision ids, or None if the commit is not in the
+            commit-graph
+        """
+        entry = self.commit_graph.get_entry_by_oid(sha)
+        if entry is None:
+            return None
+        return [self.revision_id(parent, mapping) for parent in entry.parents]
+
+    def get_parent_map(self, revids):
+        return self.repository.get_parent_map(revids)
+
+    def _lookup_entry(self, revid):
+        try:
+            sha, mapping = self.repository.lookup_bzr_revision_id(revid)
+        except errors.NoSuchRevision:
+            return None
+        return self.commit_graph.get_entry_by_oid(sha)
+
+    def heads(self, revids):
+        """Return the heads from amongst revids.
+
+        :return: Set of heads, or None if some of the commits walked are not
+            in the commit-graph
+        """
+        entries = {}
+        for revid in revids:
+            entry = self._lookup_entry(revid)
+            if entry is None:
+                return None
+            entries[entry.commit_id] = revid
+        min_generation = min(
+            self.commit_graph.get_entry_by_oid(sha).generation for sha in entries
+        )
+        candidates = dict(entries)
+        todo = []
+        for sha in entries:
+            todo.extend(self.commit_graph.get_entry_by_oid(sha).parents)
+        seen = set()
+        while todo and len(candidates) > 1:
+            sha = todo.pop()
+            if sha in seen:
+                continue
+            seen.add(sha)
+            candidates.pop(sha, None)
+            entry = self.commit_graph.get_entry_by_oid(sha)
+            if entry is None:
+                return None
+            if entry.generation > min_generation:
+                todo.extend(entry.parents)
+        return set(candidates.values())
+
+
+class CommitGraphGraph(_mod_graph.Graph):
+    """Graph answering heads() from the generation numbers of a commit-graph."""
+
+    def __init__(self, parents_provider):
+        super().__init__(parents_provider)
+        self._commit_graph_provider = parents_provider
+
+    def heads(self, keys):
+        keys = set(keys)
+        if NULL_REVISION not in keys and len(keys) >= 2:
+            heads = self._commit_graph_provider.heads(keys)
+            if heads is not None:
+                return heads
+        return super().heads(keys)
@@ -16,13 +16,15 @@
 
 """Fetching from git into bzr."""
 
+import collections
 import posixpath
 import stat
+from concurrent.futures import ThreadPoolExecutor
 
 from dulwich.object_store import tree_lookup_path
 from dulwich.objects import S_IFGITLINK, S_ISGITLINK, ZERO_SHA, Commit, Tag, Tree
 
-from .. import debug, osutils, trace
+from .. import config, debug, osutils, trace
 from ..bzr.inventory import (
     InventoryDirectory,
     InventoryFile,
@@ -569,6 +571,115 @@ def import_git_commit(
         )
 
 
+class _CommitPrefetcher:
+    """Look up the git objects of the commits to import ahead of time.
+
+    While a commit is imported, worker threads walk the differences between
+    the trees of the next commits and their first parents, reading and
+    decompressing the changed trees and blobs, so that importing them
+    doesn't wait for the objects.
+
+    The workers read from the object store without a lock, as the packs
+    of dulwich can be read from several threads. If looking up the objects
+    of a commit fails, the main thread looks them up itself, and no more
+    commits are looked up ahead of time.
+    """
+
+    def __init__(self, object_iter, revision_ids, workers):
+        """Create a _CommitPrefetcher.
+
+        :param object_iter: Object store to look up objects in
+        :param revision_ids: SHA1s of the commits to import, in order
+        :param workers: Number of worker threads
+        """
+        self._object_iter = object_iter
+        self._revision_ids = revision_ids
+        self._executor = ThreadPoolExecutor(workers)
+        self._window = workers * 4
+        self._pending = collections.deque()
+        self._next = 0
+        self._objects = {}
+        self._failed = False
+
+    def _commit_objects(self, head):
+        """Look up the objects needed to import a commit.
+
+        :return: Dictionary mapping SHA1s to objects; objects that are not
+            in the object store are left out
+        """
+        objects = {}
+        lookup = self._object_iter.__getitem__
+        try:
+            commit = objects[head] = lookup(head)
+            if not isinstance(commit, Commit):
+                return objects
+            base_tree_id = None
+            if commit.parents:
+                parent = objects[commit.parents[0]] = lookup(commit.parents[0])
+                base_tree_id = parent.tree
+            todo = [(base_tree_id, commit.tree)]
+            while todo:
+                base_tree_id, tree_id = todo.pop()
+                if base_tree_id == tree_id:
+                    continue
+                tree = objects[tree_id] = lookup(tree_id)
+                base_tree = None
+                if base_tree_id is not None:
+                    base_tree = objects[base_tree_id] = lookup(base_tree_id)
+                    if type(base_tree) is not Tree:
+                        base_tree = None
+                for name, mode, hexsha in tree.iteritems():
+                    base_mode, base_hexsha = (0, None)
+                    if base_tree is not None and name in base_tree:
+                        base_mode, base_hexsha = base_tree[name]
+                    if base_hexsha == hexsha or S_ISGITLINK(mode):
+                        continue
+                    if stat.S_ISDIR(mode):
+                        if not stat.S_ISDIR(base_mode):
+                            base_hexsha = None
+                        todo.append((base_hexsha, hexsha))
+                    else:
+                        objects[hexsha] = lookup(hexsha)
+        except KeyError:
+            # Left to the lookups of the main thread
+            pass
+        return objects
+
+    def advance(self):
+        """Make the objects of the next commit to import available."""
+        if self._failed:
+            self._objects = {}
+            return
+        while len(self._pending) < self._window and self._next < len(
+            self._revision_ids
+        ):
+            self._pending.append(
+                self._executor.submit(
+                    self._commit_objects, self._revision_ids[self._next]
+                )
+            )
+            self._next += 1
+        try:
+            self._objects = self._pending.popleft().result()
+        except Exception as e:
+            trace.mutter("looking up objects ahead of time failed: %s", e)
+            self._failed = True
+            self._objects = {}
+            self.close()
+
+    def __getitem__(self, sha):
+        try:
+            return self._objects[sha]
+        except KeyError:
+            return self._object_iter[sha]
+
+    def close(self):
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown()
+
+
 def import_git_objects(
     repo, mapping, object_iter, target_git_object_retriever, heads, pb=None, limit=None
 ):
@@ -589,7 +700,8 @@ def import_git_objects(
     graph = []
     checked = set()
     heads = list(set(heads))
-    trees_cache = LRUTreeCache(repo)
+    config_stack = config.GlobalStack()
+    trees_cache = LRUTreeCache(repo, config_stack.get("git.import_tree_cache_size"))
     # Find and convert commit objects
     while heads:
         if pb is not None:
@@ -628,36 +740,62 @@ def import_git_objects(
     if limit is not None:
         revision_ids = revision_ids[:limit]
     last_imported = None
-    for offset in range(0, len(revision_ids), batch_size):
-        target_git_object_retriever.start_write_group()
-        try:
-            repo.start_write_group()
+    workers = config_stack.get("git.import_workers")
+    if workers > 0 and revision_ids:
+        prefetcher = _CommitPrefetcher(object_iter, revision_ids, workers)
+
+        def lookup_object(sha):
             try:
-                for i, head in enumerate(revision_ids[offset : offset + batch_size]):
-                    if pb is not None:
-                        pb.update("fetching revisions", offset + i, len(revision_ids))
-                    import_git_commit(
-                        repo,
-                        mapping,
-                        head,
-                        lookup_object,
-                        target_git_object_retriever,
-                        trees_cache,
-                        strict=True,
-                    )
-                    last_imported = head
+                return prefetcher[sha]
+            except KeyError:
+                return target_git_object_retriever[sha]
+
+    else:
+        prefetcher = None
+    try:
+        for offset in range(0, len(revision_ids), batch_size):
+            target_git_object_retriever.start_write_group()
+            try:
+                repo.start_write_group()
+                try:
+                    for i, head in enumerate(
+                        revision_ids[offset : offset + batch_size]
+                    ):
+                        if pb is not None:
+                            pb.update(
+                                "fetching revisions (tree cache: "
+                                f"{trees_cache.size() // 1000000}MB of "
+                                f"{trees_cache.max_size // 1000000}MB)",
+                                offset + i,
+                                len(revision_ids),
+                            )
+                        if prefetcher is not None:
+                            prefetcher.advance()
+                        import_git_commit(
+                            repo,
+                            mapping,
+                            head,
+                            lookup_object,
+                            target_git_object_retriever,
+                            trees_cache,
+                            strict=True,
+                        )
+                        last_imported = head
+                except BaseException:
+                    repo.abort_write_group()
+                    raise
+                else:
+                    hint = repo.commit_write_group()
+                    if hint is not None:
+                        pack_hints.extend(hint)
             except BaseException:
-                repo.abort_write_group()
+                target_git_object_retriever.abort_write_group()
                 raise
             else:
-                hint = repo.commit_write_group()
-                if hint is not None:
-                    pack_hints.extend(hint)
-        except BaseException:
-            target_git_object_retriever.abort_write_group()
-            raise
-        else:
-            target_git_object_retriever.commit_write_group()
+                target_git_object_retriever.commit_write_group()
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
     return pack_hints, last_imported
 
 
@@ -34,7 +34,18 @@ class GitFileLastChangeScanner:
         self.repository = repository
         self.store = self.repository._git.object_store
 
-    def find_last_change_revision(self, path, commit_id):
+    def _get_file_history(self):
+        get_file_history = getattr(self.repository, "_get_file_history", None)
+        if get_file_history is None:
+            return None
+        return get_file_history()
+
+    def _lookup_target(self, path, commit_id):
+        """Look up a path in a commit, descending into submodules.
+
+        :return: Tuple with the store, the commit, the path relative to the
+            commit, and the mode and SHA1 of the path
+        """
         if not isinstance(path, bytes):
             raise TypeError(path)
         store = self.store
@@ -56,30 +67,131 @@ class GitFileLastChangeScanner:
             target_mode = stat.S_IFDIR
         if target_mode is None:
             raise AssertionError(f"sha {target_sha!r} for {path!r} in {commit_id!r}")
+        return store, commit, path, target_mode, target_sha
+
+    def _compare_with_parents(self, store, commit, path, target_mode, target_sha):
+        """Compare a path in a commit with the parents of the commit.
+
+        :return: Tuple with whether the commit changes the path, and a list
+            of (parent_commit, mode, sha) tuples for the parents that have
+            the path
+        """
+        parents = []
+        changed = False
+        for parent_id in commit.parents:
+            try:
+                parent_commit = store[parent_id]
+                mode, sha = tree_lookup_path(
+                    store.__getitem__, parent_commit.tree, path
+                )
+            except (KeyError, NotTreeError):
+                continue
+            if path == b"":
+                mode = stat.S_IFDIR
+            parents.append((parent_commit, mode, sha))
+            # Candidate found iff, mode or text changed,
+            # or is a directory that didn't previously exist.
+            if mode != target_mode or (
+                not stat.S_ISDIR(target_mode) and sha != target_sha
+            ):
+                changed = True
+        return changed or parents == [], parents
+
+    def _get_changes(self, store, path, target_mode, commit_id, file_history):
+        """Return the commits changing a file, if the index covers a commit.
+
+        Directories and files in submodules are not in the index.
+        """
+        if (
+            file_history is None
+            or store is not self.store
+            or stat.S_ISDIR(target_mode)
+            or commit_id not in file_history
+        ):
+            return None
+        return file_history.get_changes(path)
+
+    def _find_last_change(
+        self, store, commit, path, target_mode, target_sha, file_history
+    ):
+        changes = None
         while True:
-            parent_commits = []
-            for parent_id in commit.parents:
-                try:
-                    parent_commit = store[parent_id]
-                    mode, sha = tree_lookup_path(
-                        store.__getitem__, parent_commit.tree, path
-                    )
-                except (KeyError, NotTreeError):
+            if changes is None:
+                # Once a commit is in the index, so are all its ancestors.
+                changes = self._get_changes(
+                    store, path, target_mode, commit.id, file_history
+                )
+            if changes is not None:
+                if commit.id in changes:
+                    return commit.id
+                if len(commit.parents) == 1:
+                    commit = store[commit.parents[0]]
                     continue
-                else:
-                    parent_commits.append(parent_commit)
-                if path == b"":
-                    mode = stat.S_IFDIR
-                # Candidate found iff, mode or text changed,
-                # or is a directory that didn't previously exist.
-                if mode != target_mode or (
-                    not stat.S_ISDIR(target_mode) and sha != target_sha
-                ):
-                    return (store, path, commit.id)
-            if parent_commits == []:
-                break
-            commit = parent_commits[0]
-        return (store, path, commit.id)
+            changed, parents = self._compare_with_parents(
+                store, commit, path, target_mode, target_sha
+            )
+            if changed:
+                return commit.id
+            commit = parents[0][0]
+
+    def find_text_parents(self, path, commit_id):
+        """Find the last changes to a path before a commit that changes it.
+
+        :return: List with the ids of the commits that last changed the path
+            in the ancestry of each parent, or None if the commit does not
+            change the path compared to its parents
+        :raise KeyError: if the path does not exist in the commit
+        """
+        store, commit, target_path, target_mode, target_sha = self._lookup_target(
+            path, commit_id
+        )
+        file_history = self._get_file_history()
+        changes = self._get_changes(
+            store, target_path, target_mode, commit.id, file_history
+        )
+        if changes is not None:
+            if commit.id not in changes:
+                return None
+            parent_ids = self.store[commit_id].parents
+        else:
+            changed, parents = self._compare_with_parents(
+                store, commit, target_path, target_mode, target_sha
+            )
+            if not changed:
+                return None
+            if store is not self.store:
+                # The parents that were compared are those of the submodule.
+                parent_ids = self.store[commit_id].parents
+            else:
+                # Carry on from the lookups in the parents.
+                text_parents = []
+                for parent_commit, mode, sha in parents:
+                    text_parent = self._find_last_change(
+                        store, parent_commit, target_path, mode, sha, file_history
+                    )
+                    if text_parent not in text_parents:
+                        text_parents.append(text_parent)
+                return text_parents
+        text_parents = []
+        for parent_id in parent_ids:
+            try:
+                (_store, _path, text_parent) = self.find_last_change_revision(
+                    path, parent_id
+                )
+            except KeyError:
+                continue
+            if text_parent not in text_parents:
+                text_parents.append(text_parent)
+        return text_parents
+
+    def find_last_change_revision(self, path, commit_id):
+        store, commit, path, target_mode, target_sha = self._lookup_target(
+            path, commit_id
+        )
+        commit_id = self._find_last_change(
+            store, commit, path, target_mode, target_sha, self._get_file_history()
+        )
+        return (store, path, commit_id)
 
 
 class GitFileParentProvider:
@@ -95,18 +207,10 @@ class GitFileParentProvider:
             path = encode_git_path(mapping.parse_file_id(file_id))
         except ValueError as err:
             raise KeyError(file_id) from err
-        text_parents = []
-        for commit_parent in self.store[commit_id].parents:
-            try:
-                (
-                    store,
-                    path,
-                    text_parent,
-                ) = self.change_scanner.find_last_change_revision(path, commit_parent)
-            except KeyError:
-                continue
-            if text_parent not in text_parents:
-                text_parents.append(text_parent)
+        # Only the commits that change the file have a text.
+        text_parents = self.change_scanner.find_text_parents(path, commit_id)
+        if text_parents is None:
+            raise KeyError((file_id, text_revision))
         return tuple(
             [
                 (file_id, self.change_scanner.repository.lookup_foreign_revision_id(p))
@@ -0,0 +1,240 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Index of the commits that change each file of a git repository.
+
+Finding the previous change to a file means walking back through history
+and looking the file up in the tree of every commit and its parents. The
+index records once which files each commit changes, so that annotate and
+per-file log only have to walk the commits.
+
+The index covers all ancestors of the commits it covers. It is built by
+'brz pack' and extended when commits are fetched into the repository.
+"""
+
+import contextlib
+import hashlib
+
+from dulwich.diff_tree import CHANGE_ADD, CHANGE_DELETE, tree_changes
+from dulwich.errors import NotTreeError
+from dulwich.object_store import iter_tree_contents, tree_lookup_path
+from dulwich.objects import Commit, Tag
+
+from .. import lru_cache, urlutils
+from ..bzr import btree_index as _mod_btree_index
+from ..bzr import index as _mod_index
+from ..transport import FileExists, NoSuchFile
+
+# Name of the directory in the git control directory the index is kept in.
+FILE_HISTORY_DIRNAME = "bzr-file-history"
+
+# Number of paths whose changes are remembered by an index.
+_CHANGES_CACHE_SIZE = 100
+
+
+def changed_paths(store, commit):
+    """Return the paths of the files that a commit changes.
+
+    A file is changed when none of the parents of the commit have it, or
+    when any of the parents that have it have a different mode or contents.
+    Directories are not included.
+
+    :param store: Object store to read objects from
+    :param commit: The commit
+    :return: Set of paths
+    """
+    parent_trees = []
+    for parent_id in commit.parents:
+        # Parents missing from shallow repositories don't have the file.
+        with contextlib.suppress(KeyError):
+            parent_trees.append(store[parent_id].tree)
+    if not parent_trees:
+        return {entry.path for entry in iter_tree_contents(store, commit.tree)}
+    changed = set()
+    added = []
+    for parent_tree in parent_trees:
+        parent_added = set()
+        for change in tree_changes(store, parent_tree, commit.tree):
+            if change.type == CHANGE_DELETE:
+                continue
+            if change.type == CHANGE_ADD:
+                parent_added.add(change.new.path)
+            else:
+                changed.add(change.new.path)
+        added.append(parent_added)
+    changed.update(set.intersection(*added))
+    # A file that replaces a directory of one of the parents is changed,
+    # even if other parents have the same file.
+    for parent_tree, parent_added in zip(parent_trees, added):
+        for path in parent_added - changed:
+            with contextlib.suppress(KeyError, NotTreeError):
+                tree_lookup_path(store.__getitem__, parent_tree, path)
+                changed.add(path)
+    return changed
+
+
+def _path_key(path):
+    # Index keys can not contain whitespace.
+    return urlutils.quote_from_bytes(path).encode("ascii")
+
+
+class FileHistoryIndex:
+    """Index of the commits that change each file.
+
+    BTree Index files with the following contents:
+
+    ("commit", <sha1>, "X") -> ""
+    ("path", <quoted path>, <sha1>) -> ""
+
+    """
+
+    def __init__(self, transport):
+        self._transport = transport
+        self._index = _mod_index.CombinedGraphIndex([])
+        for name in self._transport.list_dir("."):
+            if not name.endswith(".rix"):
+                continue
+            x = _mod_btree_index.BTreeGraphIndex(
+                self._transport, name, self._transport.stat(name).st_size
+            )
+            self._index.insert_index(0, x)
+        self._changes = lru_cache.LRUCache(_CHANGES_CACHE_SIZE)
+
+    @classmethod
+    def from_repository(cls, repository, create=False):
+        """Open the index of a repository.
+
+        :param repository: LocalGitRepository
+        :param create: Whether to create the index if it doesn't exist yet
+        :return: A FileHistoryIndex, or None if the repository has no index
+        """
+        transport = repository.control_transport
+        if create:
+            with contextlib.suppress(FileExists):
+                transport.mkdir(FILE_HISTORY_DIRNAME)
+        transport = transport.clone(FILE_HISTORY_DIRNAME)
+        try:
+            return cls(transport)
+        except NoSuchFile:
+            return None
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self._transport.base!r})"
+
+    def __contains__(self, commit_id):
+        """Check whether the changes of a commit are in the index."""
+        for _entry in self._index.iter_entries([(b"commit", commit_id, b"X")]):
+            return True
+        return False
+
+    def get_changes(self, path):
+        """Return the commits that change a file.
+
+        :param path: Path of the file
+        :return: Frozen set of the hex SHA1s of the commits in the index
+            that change the file
+        """
+        try:
+            return self._changes[path]
+        except KeyError:
+            pass
+        changes = frozenset(
+            entry[1][2]
+            for entry in self._index.iter_entries_prefix(
+                [(b"path", _path_key(path), None)]
+            )
+        )
+        self._changes[path] = changes
+        return changes
+
+    def _find_missing_commits(self, store, heads):
+        """Find the commits that are not in the index yet.
+
+        As the index covers all ancestors of the commits it covers, the walk
+        stops at the first commits found in it.
+        """
+        missing = []
+        seen = set()
+        todo = list(heads)
+        while todo:
+            sha = todo.pop()
+            if sha in seen:
+                continue
+            seen.add(sha)
+            if sha in self:
+                continue
+            try:
+                commit = store[sha]
+            except KeyError:
+                continue
+            if isinstance(commit, Tag):
+                todo.append(commit.object[1])
+                continue
+            if not isinstance(commit, Commit):
+                continue
+            missing.append(commit)
+            todo.extend(commit.parents)
+        return missing
+
+    def update(self, store, heads, pb=None):
+        """Add the commits reachable from some heads to the index.
+
+        :param store: Object store to read objects from
+        :param heads: Hex SHA1s of the commits to add
+        :param pb: Optional progress bar
+        :return: Number of commits added
+        """
+        missing = self._find_missing_commits(store, heads)
+        if not missing:
+            return 0
+        builder = _mod_btree_index.BTreeBuilder(0, key_elements=3)
+        name = hashlib.sha1()  # noqa: S324
+        for i, commit in enumerate(missing):
+            if pb is not None:
+                pb.update("indexing file changes", i, len(missing))
+            name.update(commit.id)
+            builder.add_node((b"commit", commit.id, b"X"), b"")
+            for path in changed_paths(store, commit):
+                builder.add_node((b"path", _path_key(path), commit.id), b"")
+        self._add_index(name.hexdigest() + ".rix", builder)
+        return len(missing)
+
+    def _add_index(self, name, builder):
+        size = self._transport.put_file(name, builder.finish())
+        index = _mod_btree_index.BTreeGraphIndex(self._transport, name, size)
+        self._index.insert_index(0, index)
+        self._changes.clear()
+        return index
+
+    def repack(self):
+        """Combine the index files into one."""
+        names = [
+            name for name in self._transport.list_dir(".") if name.endswith(".rix")
+        ]
+        if len(names) < 2:
+            return
+        builder = _mod_btree_index.BTreeBuilder(0, key_elements=3)
+        name = hashlib.sha1()  # noqa: S324
+        for _index, key, value in self._index.iter_all_entries():
+            if key[0] == b"commit":
+                name.update(key[1])
+            builder.add_node(key, value)
+        new_name = name.hexdigest() + ".rix"
+        index = self._add_index(new_name, builder)
+        self._index = _mod_index.CombinedGraphIndex([index])
+        for old_name in names:
+            if old_name != new_name:
+                self._transport.delete(old_name)
@@ -0,0 +1,141 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Support for the fsmonitor extension of git's index.
+
+When core.fsmonitor names a hook, git asks it for the paths changed since
+the index was written, identified by a token stored in the 'FSMN' extension
+of the index. The extension also lists the entries that were not known to
+be up to date when the index was written. All other entries are unchanged,
+and don't even have to be stat'ed.
+
+Only hooks are supported, not git's builtin file system monitor daemon.
+"""
+
+import struct
+import subprocess
+
+from dulwich.index import ConflictedIndexEntry
+
+from .untracked import read_ewah
+
+FSMN_EXTENSION = b"FSMN"
+
+
+def parse_fsmonitor_extension(data):
+    """Parse the contents of an FSMN extension.
+
+    :return: Tuple with the hook version, the token of the last update and
+        the positions of the index entries that may have changed
+    """
+    (version,) = struct.unpack_from(">L", data, 0)
+    if version == 1:
+        (timestamp,) = struct.unpack_from(">Q", data, 4)
+        token = b"%d" % timestamp
+        offset = 12
+    elif version == 2:
+        end = data.index(b"\0", 4)
+        token = data[4:end]
+        offset = end + 1
+    else:
+        raise ValueError(f"unsupported fsmonitor extension version {version}")
+    dirty, _offset = read_ewah(data, offset + 4)
+    return version, token, dirty
+
+
+def query_hook(hook, version, token, cwd):
+    """Ask a fsmonitor hook for the paths changed since a token.
+
+    :return: List of paths, directories ending with a slash, or None if any
+        path may have changed
+    """
+    try:
+        # Like git, run the hook through the shell.
+        p = subprocess.run(
+            [hook + b' "$@"', hook, b"%d" % version, token],
+            shell=True,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError:
+        return None
+    if p.returncode != 0:
+        return None
+    paths = p.stdout.split(b"\0")
+    if version == 2:
+        # The first line is the new token.
+        paths = paths[1:]
+    paths = [path for path in paths if path]
+    if b"/" in paths:
+        return None
+    return paths
+
+
+class FsmonitorChanges:
+    """The paths of a working tree that may have changed."""
+
+    def __init__(self, paths):
+        self._paths = set()
+        self._dirs = set()
+        for path in paths:
+            if path.endswith(b"/"):
+                self._dirs.add(path.rstrip(b"/"))
+            else:
+                self._paths.add(path)
+
+    def __contains__(self, path):
+        if path in self._paths:
+            return True
+        if self._dirs:
+            parts = path.split(b"/")
+            for i in range(1, len(parts)):
+                if b"/".join(parts[:i]) in self._dirs:
+                    return True
+        return False
+
+
+def get_fsmonitor_changes(index, data, hook, cwd, version=None):
+    """Find the paths that may have changed since an index was written.
+
+    :param index: The index, as read
+    :param data: Contents of the FSMN extension of the index
+    :param hook: Command line of the fsmonitor hook, as bytes
+    :param cwd: Path of the working tree
+    :param version: Version of the hook protocol, or None for the version
+        of the extension
+    :return: A FsmonitorChanges object, or None if any path may have changed
+    """
+    ext_version, token, dirty = parse_fsmonitor_extension(data)
+    if version is None:
+        version = ext_version
+    paths = query_hook(hook, version, token, cwd)
+    if paths is None:
+        return None
+    # The positions are those of the entries in the index file, with one
+    # entry per stage of conflicted paths.
+    entry_paths = []
+    for path, entry in index.items():
+        if isinstance(entry, ConflictedIndexEntry):
+            for stage in (entry.ancestor, entry.this, entry.other):
+                if stage is not None:
+                    entry_paths.append(path)
+        else:
+            entry_paths.append(path)
+    for i in dirty:
+        if i < len(entry_paths):
+            paths.append(entry_paths[i])
+    return FsmonitorChanges(paths)
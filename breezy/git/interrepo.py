@@ -307,7 +307,10 @@ class InterToLocalGitRepository(InterToGitRepository):
                             self.mapping.revision_id_bzr_to_foreign(old_revid)
                     revidmap[old_revid] = (git_sha, new_revid)
                 self.target_store.add_objects(object_generator)
-                return revidmap
+            self.target._update_file_history(
+                [git_sha for (git_sha, _new_revid) in revidmap.values()]
+            )
+            return revidmap
 
     def fetch(
         self, revision_id=None, find_ghosts: bool = False, lossy=False, fetch_spec=None
@@ -692,12 +695,21 @@ class InterGitGitRepository(InterFromGitRepository):
         self.fetch_objects(determine_wants)
         for k, (git_sha, _bzr_revid) in ref_changes.items():
             self.target._git.refs[k] = git_sha  # type: ignore
+        self._update_file_history(
+            [git_sha for (git_sha, _bzr_revid) in ref_changes.values()]
+        )
         new_refs = self.target.controldir.get_refs_container()
         return {}, old_refs, new_refs
 
     def fetch_objects(self, determine_wants, limit=None, mapping=None, lossy=False):
         raise NotImplementedError(self.fetch_objects)
 
+    def _update_file_history(self, heads):
+        """Add the fetched commits to the file history index of the target."""
+        update_file_history = getattr(self.target, "_update_file_history", None)
+        if update_file_history is not None:
+            update_file_history(heads)
+
     def _target_has_shas(self, shas):
         return {sha for sha in shas if sha in self.target._git.object_store}
 
@@ -734,6 +746,7 @@ class InterGitGitRepository(InterFromGitRepository):
             )
         wants_recorder = DetermineWantsRecorder(determine_wants)
         self.fetch_objects(wants_recorder, limit=limit)
+        self._update_file_history(wants_recorder.wants)
         result = FetchResult()
         result.refs = wants_recorder.remote_refs
         return result
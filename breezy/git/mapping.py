@@ -153,6 +153,10 @@ class BzrGitMapping(foreign.VcsMapping):
 
     experimental = False
 
+    # Whether commits can carry the revision ids they were pushed from, so
+    # that they have to be read to find their revision ids.
+    revision_ids_in_commits = False
+
     BZR_DUMMY_FILE: Optional[str] = None
 
     def is_special_file(self, filename):
@@ -567,6 +571,7 @@ class BzrGitMappingExperimental(BzrGitMappingv1):
     revid_prefix = b"git-experimental"
     experimental = True
     roundtripping = False
+    revision_ids_in_commits = True
 
     BZR_DUMMY_FILE = ".bzrdummy"
 
@@ -17,16 +17,37 @@
 
 """Map from Git sha's to Bazaar objects."""
 
+import collections
 import contextlib
+import itertools
 import posixpath
 import stat
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
 from typing import Dict, Iterable, Iterator, List, Tuple
 
 from dulwich.object_store import BaseObjectStore
-from dulwich.objects import ZERO_SHA, Blob, Commit, ObjectID, ShaFile, Tree, sha_to_hex
-from dulwich.pack import Pack, PackData, pack_objects_to_data
+from dulwich.objects import (
+    ZERO_SHA,
+    Blob,
+    Commit,
+    ObjectID,
+    ShaFile,
+    Tree,
+    hex_to_sha,
+    object_header,
+    sha_to_hex,
+)
+from dulwich.pack import (
+    REF_DELTA,
+    Pack,
+    PackData,
+    UnpackedObject,
+    create_delta,
+    full_unpacked_object,
+)
 
-from .. import errors, lru_cache, osutils, trace, ui
+from .. import config, errors, lru_cache, osutils, trace, ui
 from ..bzr.testament import StrictTestament3
 from ..lock import LogicalLockResult
 from ..revision import NULL_REVISION
@@ -57,16 +78,23 @@ def get_object_store(repo, mapping=None):
 
 MAX_TREE_CACHE_SIZE = 50 * 1024 * 1024
 
+# Number of objects reconstructed together when several are requested.
+_RECONSTRUCT_BATCH_SIZE = 1000
+
+# Maximum length of the chains of deltas between the blobs of a pack.
+_MAX_DELTA_DEPTH = 50
+
 
 class LRUTreeCache:
-    def __init__(self, repository):
+    def __init__(self, repository, max_size=MAX_TREE_CACHE_SIZE):
         def approx_tree_size(tree):
             # Very rough estimate, 250 per inventory entry
             return len(tree.root_inventory) * 250
 
         self.repository = repository
+        self.max_size = max_size
         self._cache = lru_cache.LRUSizeCache(
-            max_size=MAX_TREE_CACHE_SIZE,
+            max_size=max_size,
             after_cleanup_size=None,
             compute_size=approx_tree_size,
         )
@@ -106,6 +134,10 @@ class LRUTreeCache:
     def add(self, tree):
         self._cache[tree.get_revision_id()] = tree
 
+    def size(self):
+        """Return the estimated size of the cached trees, in bytes."""
+        return self._cache._value_size
+
 
 def _find_missing_bzr_revids(graph, want, have, shallow=None):
     """Find the revisions that have to be pushed.
@@ -151,6 +183,17 @@ def _check_expected_sha(expected_sha, object):
         raise AssertionError(f"Unknown length {len(expected_sha)} for {expected_sha!r}")
 
 
+def _blob_id(chunks):
+    """Return the hex SHA1 of a git blob.
+
+    :param chunks: The contents of the blob, as a list of byte strings
+    """
+    sha = sha1(object_header(Blob.type_num, sum(map(len, chunks))))  # noqa: S324
+    for chunk in chunks:
+        sha.update(chunk)
+    return sha.hexdigest().encode("ascii")
+
+
 def directory_to_tree(
     path, children, lookup_ie_sha1, unusual_modes, empty_file_name, allow_empty=False
 ):
@@ -185,7 +228,13 @@ def directory_to_tree(
 
 
 def _tree_to_objects(
-    tree, parent_trees, idmap, unusual_modes, dummy_file_name=None, add_cache_entry=None
+    tree,
+    parent_trees,
+    idmap,
+    unusual_modes,
+    dummy_file_name=None,
+    add_cache_entry=None,
+    blob_ids=None,
 ):
     """Iterate over the objects that were introduced in a revision.
 
@@ -194,6 +243,9 @@ def _tree_to_objects(
     :param unusual_modes: Unusual file modes dictionary
     :param dummy_file_name: File name to use for dummy files
         in empty directories. None to skip empty directories
+    :param blob_ids: Optional dictionary with the SHA1s of file texts by
+        (file_id, revision) key, computed in advance. Blobs found there are
+        not read nor yielded.
     :return: Yields (path, object, ie) entries
     """
     dirty_dirs = set()
@@ -244,6 +296,10 @@ def _tree_to_objects(
                         blob = Blob()
                         blob.data = tree.get_file_text(change.path[1])
                         blob_id = blob.id
+            if blob_id is None and blob_ids is not None:
+                blob_id = blob_ids.get(
+                    (change.file_id, tree.get_file_revision(change.path[1]))
+                )
             if blob_id is None:
                 new_blobs.append((change.path[1], change.file_id))
             else:
@@ -393,6 +449,12 @@ class BazaarObjectStore(BaseObjectStore):
         self.commit_write_group = self._cache.idmap.commit_write_group
         self.tree_cache = LRUTreeCache(self.repository)
         self.unpeel_map = UnpeelMap.from_repository(self.repository)
+        # SHAs announced by find_missing_objects, which are likely to be
+        # requested in that order, and the objects reconstructed ahead of
+        # being requested.
+        self._read_ahead_order = collections.deque()
+        self._read_ahead_pending = set()
+        self._read_ahead = {}
 
     def _missing_revisions(self, revisions):
         return self._cache.idmap.missing_revisions(revisions)
@@ -425,13 +487,23 @@ class BazaarObjectStore(BaseObjectStore):
             if stop_revision is None:
                 self._map_updated = True
             return
+        config_stack = config.GlobalStack()
+        workers = config_stack.get("git.export_workers")
         self.start_write_group()
         try:
             with ui.ui_factory.nested_progress_bar() as pb:
-                for i, revid in enumerate(graph.iter_topo_order(missing_revids)):
-                    trace.mutter("processing %r", revid)
-                    pb.update("updating git map", i, len(missing_revids))
-                    self._update_sha_map_revision(revid)
+                if workers > 0:
+                    self._update_sha_map_pipelined(
+                        list(graph.iter_topo_order(missing_revids)),
+                        workers,
+                        config_stack.get("git.export_batch_size"),
+                        pb,
+                    )
+                else:
+                    for i, revid in enumerate(graph.iter_topo_order(missing_revids)):
+                        trace.mutter("processing %r", revid)
+                        pb.update("updating git map", i, len(missing_revids))
+                        self._update_sha_map_revision(revid)
             if stop_revision is None:
                 self._map_updated = True
         except BaseException:
@@ -440,6 +512,60 @@ class BazaarObjectStore(BaseObjectStore):
         else:
             self.commit_write_group()
 
+    def _update_sha_map_pipelined(self, revids, workers, batch_size, pb):
+        """Add revisions to the map, hashing their file texts in parallel.
+
+        The revisions are processed in batches. The texts introduced by the
+        revisions of a batch are read at once and hashed by a pool of
+        threads, as hashlib releases the GIL while hashing; the trees and
+        commits are then built in order, using the precomputed blob SHA1s.
+        The write group is committed after each batch, so that the work done
+        is kept if a later batch fails.
+
+        :param revids: Revisions to add, in topological order
+        :param workers: Number of threads hashing texts
+        :param batch_size: Number of revisions per batch
+        :param pb: Progress bar
+        """
+        batch_size = max(batch_size, 1)
+        with ThreadPoolExecutor(workers) as executor:
+            for start in range(0, len(revids), batch_size):
+                batch = revids[start : start + batch_size]
+                if start > 0:
+                    self.commit_write_group()
+                    self.start_write_group()
+                pb.update("hashing texts for git map", start, len(revids))
+                blob_ids = self._compute_blob_ids(batch, executor, workers * 4)
+                for i, revid in enumerate(batch, start):
+                    trace.mutter("processing %r", revid)
+                    pb.update("updating git map", i, len(revids))
+                    self._update_sha_map_revision(revid, blob_ids)
+
+    def _compute_blob_ids(self, revids, executor, max_pending):
+        """Compute the blob SHA1s of the file texts introduced by revisions.
+
+        :param revids: Revisions whose texts to hash
+        :param executor: Executor to hash the texts with
+        :param max_pending: Number of texts read ahead of the hashing
+        :return: Dictionary mapping (file_id, revision) keys to blob SHA1s
+        """
+        altered = self.repository.fileids_altered_by_revision_ids(revids)
+        desired = [
+            (file_id, revid, (file_id, revid))
+            for file_id, file_revids in altered.items()
+            for revid in file_revids
+        ]
+        blob_ids = {}
+        pending = collections.deque()
+        for key, chunks in self.repository.iter_files_bytes(desired):
+            pending.append((key, executor.submit(_blob_id, list(chunks))))
+            while len(pending) > max_pending:
+                key, future = pending.popleft()
+                blob_ids[key] = future.result()
+        for key, future in pending:
+            blob_ids[key] = future.result()
+        return blob_ids
+
     def __iter__(self):
         self._update_sha_map()
         return iter(self._cache.idmap.sha1s())
@@ -464,12 +590,16 @@ class BazaarObjectStore(BaseObjectStore):
             rev, tree_sha, parent_lookup, lossy, verifiers
         )
 
-    def _revision_to_objects(self, rev, tree, lossy, add_cache_entry=None):
+    def _revision_to_objects(
+        self, rev, tree, lossy, add_cache_entry=None, blob_ids=None
+    ):
         """Convert a revision to a set of git objects.
 
         :param rev: Bazaar revision object
         :param tree: Bazaar revision tree
         :param lossy: Whether to not roundtrip all Bazaar revision data
+        :param blob_ids: Optional dictionary with precomputed blob SHA1s, see
+            _tree_to_objects
         """
         unusual_modes = extract_unusual_modes(rev)
         present_parents = self.repository.has_revisions(rev.parent_ids)
@@ -484,6 +614,7 @@ class BazaarObjectStore(BaseObjectStore):
             unusual_modes,
             self.mapping.BZR_DUMMY_FILE,
             add_cache_entry,
+            blob_ids,
         ):
             if path == "":
                 root_tree = obj
@@ -524,7 +655,7 @@ class BazaarObjectStore(BaseObjectStore):
     def _get_updater(self, rev):
         return self._cache.get_updater(rev)
 
-    def _update_sha_map_revision(self, revid):
+    def _update_sha_map_revision(self, revid, blob_ids=None):
         rev = self.repository.get_revision(revid)
         tree = self.tree_cache.revision_tree(rev.revision_id)
         updater = self._get_updater(rev)
@@ -534,12 +665,58 @@ class BazaarObjectStore(BaseObjectStore):
             tree,
             lossy=(not self.mapping.roundtripping),
             add_cache_entry=updater.add_object,
+            blob_ids=blob_ids,
         ):
             if isinstance(obj, Commit):
                 commit_obj = obj
         commit_obj = updater.finish()
         return commit_obj.id
 
+    def _find_blob_delta_bases(self, shas):
+        """Find the blobs to delta-compress blobs against.
+
+        A blob is compressed against the blob of the previous revision of the
+        same file in the per-file graph, when that is in shas too. The chains
+        of deltas are cut at _MAX_DELTA_DEPTH.
+
+        :param shas: Set of SHA1s of the objects
+        :return: List of (key, base_key) tuples, with (file_id, revision,
+            sha) keys as taken by _reconstruct_blobs
+        """
+        blob_shas = {}
+        for sha, entries in self.lookup_git_shas(shas).items():
+            kind, type_data = entries[0]
+            if kind == "blob":
+                blob_shas[type_data] = sha
+        bases = {}
+        for text_key, parents in self.repository.texts.get_parent_map(
+            blob_shas
+        ).items():
+            sha = blob_shas[text_key]
+            for parent in parents:
+                base_sha = blob_shas.get(parent)
+                if base_sha is not None and base_sha != sha:
+                    bases[text_key] = parent
+                    break
+        depths = {}
+        for text_key in list(bases):
+            chain = []
+            while text_key in bases and text_key not in depths:
+                chain.append(text_key)
+                text_key = bases[text_key]
+            depth = depths.get(text_key, 0)
+            for text_key in reversed(chain):
+                depth += 1
+                if depth > _MAX_DELTA_DEPTH:
+                    # Sent in full, starting a new chain
+                    del bases[text_key]
+                    depth = 0
+                depths[text_key] = depth
+        return [
+            (text_key + (blob_shas[text_key],), base + (blob_shas[base],))
+            for text_key, base in bases.items()
+        ]
+
     def iter_unpacked_subset(
         self,
         shas,
@@ -547,11 +724,49 @@ class BazaarObjectStore(BaseObjectStore):
         include_comp=False,
         allow_missing: bool = False,
         convert_ofs_delta: bool = True,
-    ) -> Iterator[ShaFile]:
-        # We don't store unpacked objects, so...
-        if not allow_missing and shas:
-            raise KeyError(shas.pop())
-        yield from []
+    ) -> Iterator[UnpackedObject]:
+        """Iterate over the objects as they are to be written to a pack.
+
+        We don't store packs, but blobs are delta-compressed against the
+        previous text of their file when it is part of shas as well, unless
+        git.delta_blobs is disabled. With allow_missing, only those deltas are
+        returned, so that dulwich retrieves the other objects in full.
+        """
+        shas = set(shas)
+        with self.repository.lock_read():
+            if config.GlobalStack().get("git.delta_blobs"):
+                deltas = self._find_blob_delta_bases(shas)
+            else:
+                deltas = []
+            for start in range(0, len(deltas), _RECONSTRUCT_BATCH_SIZE):
+                batch = deltas[start : start + _RECONSTRUCT_BATCH_SIZE]
+                blobs = {
+                    blob.id: blob
+                    for blob in self._reconstruct_blobs(
+                        {key for keys in batch for key in keys}
+                    )
+                }
+                for key, base_key in batch:
+                    sha = key[2]
+                    base_sha = base_key[2]
+                    raw = blobs[sha].as_raw_string()
+                    delta = list(create_delta(blobs[base_sha].as_raw_string(), raw))
+                    delta_len = sum(map(len, delta))
+                    if delta_len >= len(raw):
+                        continue
+                    shas.discard(sha)
+                    # Don't reconstruct it for a later self[sha]
+                    self._read_ahead_pending.discard(sha)
+                    yield UnpackedObject(
+                        REF_DELTA,
+                        delta_base=hex_to_sha(base_sha),
+                        decomp_len=delta_len,
+                        decomp_chunks=delta,
+                        sha=hex_to_sha(sha),
+                    )
+            if not allow_missing:
+                for obj in self.iterobjects_subset(shas):
+                    yield full_unpacked_object(obj)
 
     def _reconstruct_blobs(self, keys):
         """Return a Git Blob object from a fileid and revision stored in bzr.
@@ -695,24 +910,36 @@ class BazaarObjectStore(BaseObjectStore):
 
     def lookup_git_shas(self, shas: Iterable[ObjectID]) -> Dict[ObjectID, List]:
         ret: Dict[ObjectID, List] = {}
+        todo = []
         for sha in shas:
             if sha == ZERO_SHA:
                 ret[sha] = [("commit", (NULL_REVISION, None, {}))]
-                continue
-            try:
-                ret[sha] = list(self._cache.idmap.lookup_git_sha(sha))
-            except KeyError:
-                # if not, see if there are any unconverted revisions and
-                # add them to the map, search for sha in map again
-                self._update_sha_map()
-                with contextlib.suppress(KeyError):
-                    ret[sha] = list(self._cache.idmap.lookup_git_sha(sha))
+            else:
+                todo.append(sha)
+        ret.update(self._cache.idmap.lookup_git_shas(todo))
+        missing = [sha for sha in todo if sha not in ret]
+        if missing:
+            # if not, see if there are any unconverted revisions and
+            # add them to the map, search for the missing shas in map again
+            self._update_sha_map()
+            ret.update(self._cache.idmap.lookup_git_shas(missing))
         return ret
 
     def lookup_git_sha(self, sha):
         return self.lookup_git_shas([sha])[sha]
 
     def __getitem__(self, sha):
+        try:
+            return self._read_ahead.pop(sha)
+        except KeyError:
+            pass
+        if sha in self._read_ahead_pending:
+            self._read_ahead_batch(sha)
+            with contextlib.suppress(KeyError):
+                return self._read_ahead.pop(sha)
+        return self._get_object(sha)
+
+    def _get_object(self, sha):
         with self.repository.lock_read():
             for kind, type_data in self.lookup_git_sha(sha):
                 # convert object to git object
@@ -773,11 +1000,127 @@ class BazaarObjectStore(BaseObjectStore):
             else:
                 raise KeyError(sha)
 
+    def _reset_read_ahead(self):
+        self._read_ahead_order.clear()
+        self._read_ahead_pending.clear()
+        self._read_ahead.clear()
+
+    def _read_ahead_batch(self, sha):
+        """Reconstruct the next batch of announced objects, starting at sha.
+
+        The objects announced before sha were either requested already or
+        will not be, so they are dropped.
+        """
+        order = self._read_ahead_order
+        pending = self._read_ahead_pending
+        while order[0] != sha:
+            pending.discard(order.popleft())
+        batch = []
+        while order and len(batch) < _RECONSTRUCT_BATCH_SIZE:
+            next_sha = order.popleft()
+            if next_sha in pending:
+                pending.remove(next_sha)
+                batch.append(next_sha)
+        self._read_ahead.clear()
+        with self.repository.lock_read():
+            for obj in self._reconstruct_objects(batch, allow_missing=True):
+                self._read_ahead[obj.id] = obj
+
+    def _reconstruct_objects(self, shas, allow_missing=False):
+        """Reconstruct a batch of Git objects.
+
+        The SHA1s are looked up in the map at once. The blobs are read with a
+        single call to iter_files_bytes, so that they come in the order they
+        are stored in, and the revisions are retrieved together.
+
+        :param shas: List of SHA1s of the objects
+        :param allow_missing: Whether to skip objects that are not present
+            rather than raise KeyError
+        :return: Iterator over the objects, in no particular order
+        """
+        entries = self.lookup_git_shas(shas)
+        blobs = []
+        commits = []
+        trees = collections.defaultdict(list)
+        fallback = []
+        for sha in shas:
+            try:
+                kind, type_data = entries[sha][0]
+            except (KeyError, IndexError):
+                if not allow_missing:
+                    raise KeyError(sha) from None
+                continue
+            if kind == "blob":
+                blobs.append((type_data[0], type_data[1], sha))
+            elif kind == "commit" and type_data[0] != NULL_REVISION:
+                commits.append((sha, type_data))
+            elif kind == "tree":
+                trees[type_data[1]].append((sha, type_data[0]))
+            else:
+                fallback.append(sha)
+        revids = {type_data[0] for sha, type_data in commits}
+        revids.update(trees)
+        revs = {
+            revid: rev
+            for revid, rev in self.repository.iter_revisions(revids)
+            if rev is not None
+        }
+        for sha, (revid, tree_sha, verifiers) in commits:
+            if revid not in revs:
+                fallback.append(sha)
+                continue
+            commit = self._reconstruct_commit(
+                revs[revid],
+                tree_sha,
+                lossy=(not self.mapping.roundtripping),
+                verifiers=verifiers,
+            )
+            _check_expected_sha(sha, commit)
+            yield commit
+        for bzr_tree in self.tree_cache.iter_revision_trees(
+            [revid for revid in trees if revid in revs]
+        ):
+            revid = bzr_tree.get_revision_id()
+            unusual_modes = extract_unusual_modes(revs[revid])
+            for sha, fileid in trees.pop(revid):
+                try:
+                    yield self._reconstruct_tree(
+                        fileid, revid, bzr_tree, unusual_modes, expected_sha=sha
+                    )
+                except errors.NoSuchRevision:
+                    fallback.append(sha)
+        for tree_entries in trees.values():
+            fallback.extend(sha for sha, fileid in tree_entries)
+        yield from self._reconstruct_blobs(blobs)
+        # Let the single object code path deal with anything unusual
+        for sha in fallback:
+            try:
+                yield self._get_object(sha)
+            except KeyError:
+                if not allow_missing:
+                    raise
+
+    def iterobjects_subset(
+        self, shas: Iterable[ObjectID], *, allow_missing: bool = False
+    ) -> Iterator[ShaFile]:
+        """Iterate over a subset of the objects, in no particular order.
+
+        The objects are reconstructed in batches, see _reconstruct_objects.
+        """
+        shas = iter(shas)
+        while True:
+            batch = list(itertools.islice(shas, _RECONSTRUCT_BATCH_SIZE))
+            if not batch:
+                return
+            with self.repository.lock_read():
+                yield from self._reconstruct_objects(batch, allow_missing)
+
     def generate_lossy_pack_data(
         self, have, want, shallow=None, progress=None, get_tagged=None, ofs_delta=False
     ):
-        object_ids = list(
-            self.find_missing_objects(
+        object_ids = [
+            oid
+            for (oid, hint) in self.find_missing_objects(
                 have,
                 want,
                 progress=progress,
@@ -785,10 +1128,19 @@ class BazaarObjectStore(BaseObjectStore):
                 get_tagged=get_tagged,
                 lossy=True,
             )
-        )
-        return pack_objects_to_data(
-            [(self[oid], path) for (oid, (type_num, path)) in object_ids]
-        )
+        ]
+        # The objects are streamed rather than requested one by one.
+        self._reset_read_ahead()
+
+        def records():
+            todo = set(object_ids)
+            for unpacked in self.iter_unpacked_subset(todo, allow_missing=True):
+                todo.discard(sha_to_hex(unpacked.sha()))
+                yield unpacked
+            for obj in self.iterobjects_subset(todo):
+                yield full_unpacked_object(obj)
+
+        return len(object_ids), records()
 
     def find_missing_objects(
         self,
@@ -802,9 +1154,14 @@ class BazaarObjectStore(BaseObjectStore):
     ) -> Iterator[Tuple[ObjectID, Tuple[int, str]]]:
         """Iterate over the contents of a pack file.
 
+        The SHA1s yielded are remembered, so that the objects can be
+        reconstructed in batches when they are then requested in that order,
+        as dulwich does when writing a pack.
+
         :param haves: List of SHA1s of objects that should not be sent
         :param wants: List of SHA1s of objects that should be sent
         """
+        self._reset_read_ahead()
         processed = set()
         ret: Dict[ObjectID, List] = self.lookup_git_shas(haves + wants)
         for commit_sha in haves:
@@ -851,6 +1208,8 @@ class BazaarObjectStore(BaseObjectStore):
                     tree = self.tree_cache.revision_tree(revid)
                     for path, obj in self._revision_to_objects(rev, tree, lossy=lossy):
                         if obj.id not in seen:
+                            self._read_ahead_order.append(obj.id)
+                            self._read_ahead_pending.add(obj.id)
                             yield (obj.id, (obj.type_num, path))
                             seen.add(obj.id)
 
@@ -0,0 +1,398 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Reachability queries answered from git pack bitmaps.
+
+A '.bitmap' file next to a pack stores, for a selection of commits, the set
+of objects reachable from each of them. The bits refer to the objects of the
+pack in the order in which they appear in the pack file, while the commits
+are identified by their position in the pack index. The objects
+reachable from one set of commits but not from another can then be found
+with set arithmetic, reading only the objects between the commits asked
+about and the nearest commits with a bitmap.
+
+Bitmaps are only valid for packs that contain every object reachable from
+their commits, as written by 'git repack -a -b'.
+"""
+
+import stat
+from array import array
+from bisect import bisect_left
+
+from dulwich.bitmap import (
+    BITMAP_OPT_FULL_DAG,
+    DEFAULT_COMMIT_INTERVAL,
+    BitmapEntry,
+    EWAHBitmap,
+    PackBitmap,
+    read_bitmap_file,
+)
+from dulwich.objects import (
+    S_ISGITLINK,
+    Blob,
+    Commit,
+    Tag,
+    Tree,
+    hex_to_sha,
+    sha_to_hex,
+)
+
+from .. import lru_cache
+
+# Number of previous bitmaps to try as the XOR base of a new one, as git does.
+XOR_WINDOW = 10
+
+# The pack order of the most recently used packs, by pack checksum, shared
+# between the object stores that have the same pack open.
+_pack_orders = lru_cache.LRUCache(max_cache=4)
+
+
+class PackOrder:
+    """The positions of the objects of a pack in the pack file.
+
+    Objects are found through the pack index, so only the offsets and SHA1s
+    of the objects are kept, in pack order and in flat arrays.
+    """
+
+    def __init__(self, pack_index, offsets, shas, sha_size=20):
+        """Create a PackOrder.
+
+        :param pack_index: Index of the pack
+        :param offsets: Array with the offsets of the objects, in pack order
+        :param shas: Concatenated binary SHA1s of the objects, in pack order
+        :param sha_size: Size of the SHA1s
+        """
+        self._index = pack_index
+        self._offsets = offsets
+        self._shas = shas
+        self._sha_size = sha_size
+
+    @classmethod
+    def from_pack(cls, pack):
+        """Return the order of the objects of a pack."""
+        checksum = pack.get_stored_checksum()
+        try:
+            offsets, shas, sha_size = _pack_orders[checksum]
+        except KeyError:
+            entries = sorted(
+                (offset, sha) for (sha, offset, _crc32) in pack.index.iterentries()
+            )
+            offsets = array("Q", [offset for (offset, _sha) in entries])
+            shas = b"".join(sha for (_offset, sha) in entries)
+            sha_size = len(entries[0][1]) if entries else 20
+            _pack_orders[checksum] = (offsets, shas, sha_size)
+        return cls(pack.index, offsets, shas, sha_size)
+
+    def __len__(self):
+        """Return the number of objects in the pack."""
+        return len(self._offsets)
+
+    def __getitem__(self, sha):
+        """Return the position of an object in the pack.
+
+        :param sha: Binary SHA1 of the object
+        :raise KeyError: if the object is not in the pack
+        """
+        return bisect_left(self._offsets, self._index.object_offset(sha))
+
+    def __contains__(self, sha):
+        """Check whether an object, by binary SHA1, is in the pack."""
+        try:
+            self._index.object_offset(sha)
+        except KeyError:
+            return False
+        return True
+
+    def sha(self, pos):
+        """Return the binary SHA1 of the object at a position."""
+        start = pos * self._sha_size
+        return self._shas[start : start + self._sha_size]
+
+    def __iter__(self):
+        """Iterate over the binary SHA1s of the objects, in pack order."""
+        for pos in range(len(self)):
+            yield self.sha(pos)
+
+
+def reachable_positions(sha, positions, object_store, get_bitmap, types=None):
+    """Find the objects of a pack reachable from an object.
+
+    Objects are read until commits with a bitmap are reached, or objects
+    already known to be reachable.
+
+    :param sha: Hex SHA1 of the object to start from
+    :param positions: PackOrder, or dictionary mapping binary SHA1s to pack
+        positions
+    :param object_store: Object store to read objects from
+    :param get_bitmap: Callable returning the set of positions reachable
+        from a commit, or None if the commit has no bitmap
+    :param types: Optional dictionary to record the type numbers of the
+        objects walked in, by position
+    :return: Set of positions, or None if some of the objects are not in
+        the pack
+    """
+    bits = set()
+    todo = [(sha, None)]
+    while todo:
+        sha, type_num = todo.pop()
+        if type_num in (None, Commit.type_num):
+            commit_bits = get_bitmap(sha)
+            if commit_bits is not None:
+                bits.update(commit_bits)
+                continue
+        try:
+            pos = positions[hex_to_sha(sha)]
+        except KeyError:
+            return None
+        if pos in bits:
+            continue
+        bits.add(pos)
+        if type_num == Blob.type_num:
+            if types is not None:
+                types[pos] = type_num
+            continue
+        obj = object_store[sha]
+        if types is not None:
+            types[pos] = obj.type_num
+        if isinstance(obj, Commit):
+            # Parents are walked first, so that the trees they share with
+            # this commit are known to be reachable by the time they're seen.
+            todo.append((obj.tree, Tree.type_num))
+            todo.extend((parent, Commit.type_num) for parent in obj.parents)
+        elif isinstance(obj, Tree):
+            for _name, mode, child in obj.iteritems():
+                if S_ISGITLINK(mode):
+                    continue
+                if stat.S_ISDIR(mode):
+                    todo.append((child, Tree.type_num))
+                else:
+                    todo.append((child, Blob.type_num))
+        elif isinstance(obj, Tag):
+            todo.append((obj.object[1], obj.object[0].type_num))
+    return bits
+
+
+class PackBitmapIndex:
+    """The bitmaps of a pack, with their positions resolved to objects."""
+
+    def __init__(self, pack, bitmap):
+        """Create a PackBitmapIndex.
+
+        :param pack: The pack the bitmap was written for
+        :param bitmap: dulwich PackBitmap, as read without a pack index
+        """
+        self.pack = pack
+        self._bitmap = bitmap
+        self._positions = PackOrder.from_pack(pack)
+        # Entries are looked up by commit, and their XOR bases by row.
+        self._rows = {}
+        for row, (_key, entry) in enumerate(bitmap.entries_list):
+            try:
+                sha = pack.index.object_sha_at_position(entry.object_pos)
+            except IndexError:
+                continue
+            self._rows[sha_to_hex(sha)] = row
+        self._resolved = {}
+
+    @classmethod
+    def from_file(cls, pack, f):
+        """Read the bitmap of a pack.
+
+        :raise ChecksumMismatch: if the bitmap was written for another pack
+        :raise ValueError: if the bitmap is corrupt
+        """
+        # dulwich resolves the bits in index order rather than in pack
+        # order, so they are resolved here instead.
+        bitmap = read_bitmap_file(f, pack_checksum=pack.get_stored_checksum())
+        return cls(pack, bitmap)
+
+    def _row_bits(self, row):
+        chain = []
+        i = row
+        while i not in self._resolved:
+            chain.append(i)
+            entry = self._bitmap.entries_list[i][1]
+            if not entry.xor_offset:
+                break
+            i -= entry.xor_offset
+        for i in reversed(chain):
+            entry = self._bitmap.entries_list[i][1]
+            bits = entry.bitmap.bits
+            if entry.xor_offset:
+                bits = bits ^ self._resolved[i - entry.xor_offset]
+            self._resolved[i] = bits
+        return self._resolved[row]
+
+    def get_bitmap(self, sha):
+        """Return the positions reachable from a commit with a bitmap.
+
+        :param sha: Hex SHA1 of the commit
+        :return: Set of positions, or None if the commit has no bitmap
+        """
+        try:
+            row = self._rows[sha]
+        except KeyError:
+            return None
+        return self._row_bits(row)
+
+    def __contains__(self, sha):
+        return hex_to_sha(sha) in self._positions
+
+    def reachable(self, shas, object_store):
+        """Find the objects of the pack reachable from some objects.
+
+        :return: Set of positions, or None if some of the objects reachable
+            are not in the pack
+        """
+        bits = set()
+        for sha in shas:
+            sha_bits = reachable_positions(
+                sha, self._positions, object_store, self.get_bitmap
+            )
+            if sha_bits is None:
+                return None
+            bits.update(sha_bits)
+        return bits
+
+    def missing_objects(self, haves, wants, object_store):
+        """Find the objects reachable from wants but not from haves.
+
+        :return: Tuple with a list of (sha, type_num) tuples for the missing
+            objects, in pack order, and the set of SHA1s of the objects
+            reachable from haves; or None if some of the objects reachable
+            are not in the pack
+        """
+        want_bits = self.reachable(wants, object_store)
+        if want_bits is None:
+            return None
+        have_bits = self.reachable(haves, object_store)
+        if have_bits is None:
+            return None
+        type_bitmaps = [
+            (self._bitmap.commit_bitmap.bits, Commit.type_num),
+            (self._bitmap.tree_bitmap.bits, Tree.type_num),
+            (self._bitmap.blob_bitmap.bits, Blob.type_num),
+            (self._bitmap.tag_bitmap.bits, Tag.type_num),
+        ]
+        missing = []
+        for pos in sorted(want_bits - have_bits):
+            for bits, type_num in type_bitmaps:
+                if pos in bits:
+                    break
+            else:
+                type_num = None
+            missing.append((sha_to_hex(self._positions.sha(pos)), type_num))
+        return missing, {sha_to_hex(self._positions.sha(pos)) for pos in have_bits}
+
+
+def _commits_parents_first(heads, positions, object_store):
+    """List the commits of a pack reachable from heads, parents first."""
+    order = []
+    seen = set()
+    for head in heads:
+        todo = [(head, False)]
+        while todo:
+            sha, parents_done = todo.pop()
+            if parents_done:
+                order.append(sha)
+                continue
+            if sha in seen or hex_to_sha(sha) not in positions:
+                continue
+            seen.add(sha)
+            todo.append((sha, True))
+            todo.extend((parent, False) for parent in object_store[sha].parents)
+    return order
+
+
+def _ewah(bits):
+    bitmap = EWAHBitmap()
+    bitmap.bits = set(bits)
+    bitmap.bit_count = max(bits) + 1 if bits else 0
+    return bitmap
+
+
+def generate_pack_bitmap(
+    pack, object_store, heads, commit_interval=DEFAULT_COMMIT_INTERVAL
+):
+    """Generate the bitmap of a pack.
+
+    Like git, bitmaps are built parents first, each from the bitmaps of the
+    commits selected before it, and are stored XORed with one of the
+    previous few bitmaps when that makes them smaller. Only the bitmaps in
+    that window are kept in full.
+
+    :param pack: The pack to write a bitmap for
+    :param object_store: Object store to read objects from
+    :param heads: Hex SHA1s of the commits at the tips of the refs
+    :param commit_interval: Also write a bitmap for one in this many commits
+    :return: dulwich PackBitmap
+    """
+    positions = PackOrder.from_pack(pack)
+    commits = _commits_parents_first(heads, positions, object_store)
+    selected = set(heads)
+    selected.update(commits[commit_interval - 1 :: commit_interval])
+    wanted = {hex_to_sha(sha) for sha in selected}
+    index_positions = {
+        sha: pos
+        for (pos, (sha, _offset, _crc32)) in enumerate(pack.index.iterentries())
+        if sha in wanted
+    }
+
+    pack_bitmap = PackBitmap(flags=BITMAP_OPT_FULL_DAG)
+    pack_bitmap.pack_checksum = pack.get_stored_checksum()
+    # The full bitmaps of the last few entries, by commit.
+    recent = {}
+    types = {}
+    for sha in commits:
+        if sha not in selected:
+            continue
+        bits = reachable_positions(sha, positions, object_store, recent.get, types)
+        # Commits that reach objects outside the pack can't have a bitmap.
+        if bits is None:
+            continue
+        xor_offset = 0
+        stored = bits
+        row = len(pack_bitmap.entries_list)
+        for offset in range(1, min(row, XOR_WINDOW) + 1):
+            base = recent[pack_bitmap.entries_list[row - offset][0]]
+            xored = bits ^ base
+            if len(xored) < len(stored):
+                xor_offset = offset
+                stored = xored
+        entry = BitmapEntry(
+            index_positions[hex_to_sha(sha)],
+            xor_offset=xor_offset,
+            flags=0,
+            bitmap=_ewah(stored),
+        )
+        pack_bitmap.entries[sha] = entry
+        pack_bitmap.entries_list.append((sha, entry))
+        recent[sha] = bits
+        if len(recent) > XOR_WINDOW:
+            del recent[pack_bitmap.entries_list[row - XOR_WINDOW][0]]
+
+    type_bitmaps = {
+        Commit.type_num: pack_bitmap.commit_bitmap,
+        Tree.type_num: pack_bitmap.tree_bitmap,
+        Blob.type_num: pack_bitmap.blob_bitmap,
+        Tag.type_num: pack_bitmap.tag_bitmap,
+    }
+    for pos, sha in enumerate(positions):
+        type_num = types.pop(pos, None)
+        if type_num is None:
+            type_num = object_store.get_raw(sha_to_hex(sha))[0]
+        type_bitmaps[type_num].add(pos)
+    return pack_bitmap
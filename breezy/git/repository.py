@@ -23,12 +23,14 @@ from dulwich.errors import NotCommitError
 from dulwich.object_store import peel_sha, tree_lookup_path
 from dulwich.objects import ZERO_SHA, Commit
 
-from .. import check, errors, lock, repository, trace, transactions, ui
+from .. import check, config, errors, lock, repository, trace, transactions, ui
 from .. import graph as _mod_graph
 from .. import revision as _mod_revision
 from ..decorators import only_raises
 from ..foreign import ForeignRepository
+from .commitgraph import CommitGraphGraph, CommitGraphParentsProvider
 from .filegraph import GitFileLastChangeScanner, GitFileParentProvider
+from .filehistory import FileHistoryIndex
 from .mapping import default_mapping, encode_git_path, foreign_vcs_git, mapping_registry
 from .tree import GitRevisionTree
 
@@ -210,6 +212,8 @@ class LocalGitRepository(GitRepository):
         self._git = gitdir._git
         self._file_change_scanner = GitFileLastChangeScanner(self)
         self._transaction = None
+        self._commit_graph_provider = None
+        self._file_history = None
 
     def get_commit_builder(
         self,
@@ -260,6 +264,91 @@ class LocalGitRepository(GitRepository):
     def get_file_graph(self):
         return _mod_graph.Graph(GitFileParentProvider(self._file_change_scanner))
 
+    def _get_commit_graph_provider(self):
+        """Return a parents provider reading the commit-graph file.
+
+        :return: A CommitGraphParentsProvider, or None if the repository has
+            no commit-graph or git.commit_graph is disabled
+        """
+        if self._commit_graph_provider is None:
+            commit_graph = None
+            get_commit_graph = getattr(self._git.object_store, "get_commit_graph", None)
+            if get_commit_graph is not None and config.GlobalStack().get(
+                "git.commit_graph"
+            ):
+                commit_graph = get_commit_graph()
+            if commit_graph is None:
+                self._commit_graph_provider = False
+            else:
+                self._commit_graph_provider = CommitGraphParentsProvider(
+                    self, commit_graph
+                )
+        return self._commit_graph_provider or None
+
+    def get_graph(self, other_repository=None):
+        provider = self._get_commit_graph_provider()
+        if provider is None or (
+            other_repository is not None
+            and not self.has_same_location(other_repository)
+        ):
+            return super().get_graph(other_repository)
+        return CommitGraphGraph(provider)
+
+    def _get_ref_heads(self):
+        """Return the SHA1s of the commits the refs point at."""
+        object_store = self._git.object_store
+        heads = set()
+        for sha in self._git.refs.as_dict().values():
+            try:
+                obj = peel_sha(object_store, sha)[1]
+            except KeyError:
+                continue
+            if isinstance(obj, Commit):
+                heads.add(obj.id)
+        return heads
+
+    def _write_commit_graph(self):
+        """Write a commit-graph file for the commits reachable from the refs."""
+        object_store = self._git.object_store
+        if getattr(object_store, "write_commit_graph", None) is None:
+            return
+        heads = self._get_ref_heads()
+        if heads:
+            object_store.write_commit_graph(list(heads), reachable=True)
+            self._commit_graph_provider = None
+
+    def _get_file_history(self):
+        """Return the index of the commits that change each file.
+
+        :return: A FileHistoryIndex, or None if the repository has no index
+            or git.file_history_index is disabled
+        """
+        if self._file_history is None:
+            file_history = None
+            if config.GlobalStack().get("git.file_history_index"):
+                file_history = FileHistoryIndex.from_repository(self)
+            self._file_history = file_history or False
+        return self._file_history or None
+
+    def _update_file_history(self, heads=None, create=False):
+        """Add commits to the index of the commits that change each file.
+
+        :param heads: SHA1s of the commits to add, with their ancestors;
+            defaults to the commits the refs point at
+        :param create: Whether to create the index if the repository doesn't
+            have one yet
+        """
+        file_history = self._get_file_history()
+        if file_history is None:
+            if not create or not config.GlobalStack().get("git.file_history_index"):
+                return
+            file_history = FileHistoryIndex.from_repository(self, create=True)
+            self._file_history = file_history
+        if heads is None:
+            heads = self._get_ref_heads()
+        with ui.ui_factory.nested_progress_bar() as pb:
+            file_history.update(self._git.object_store, heads, pb=pb)
+
     def iter_files_bytes(self, desired_files):
         """Iterate through file versions.
 
@@ -348,6 +437,11 @@ class LocalGitRepository(GitRepository):
         except errors.NoSuchRevision:
             return None
         # FIXME: Honor no_alternates setting
+        provider = self._get_commit_graph_provider()
+        if provider is not None:
+            parents = provider.get_parents(hexsha, mapping)
+            if parents is not None:
+                return parents
         try:
             commit = self._git.object_store[hexsha]
         except KeyError:
@@ -412,7 +506,22 @@ class LocalGitRepository(GitRepository):
         return result
 
     def pack(self, hint=None, clean_obsolete_packs=False):
-        self._git.object_store.pack_loose_objects()
+        stack = config.GlobalStack()
+        object_store = self._git.object_store
+        if (
+            stack.get("git.pack_bitmaps")
+            and getattr(object_store, "write_pack_bitmap", None) is not None
+        ):
+            # Bitmaps are only written for a pack with all objects.
+            object_store.repack()
+            object_store.write_pack_bitmap(list(self._get_ref_heads()))
+        else:
+            object_store.pack_loose_objects()
+        if stack.get("git.commit_graph"):
+            self._write_commit_graph()
+        if stack.get("git.file_history_index"):
+            self._update_file_history(create=True)
+            self._file_history.repack()
 
     def lookup_foreign_revision_id(self, foreign_revid, mapping=None):
         """Lookup a revision id.
@@ -33,6 +33,7 @@ from ..controldir import ControlDir
 from .mapping import decode_git_path, default_mapping
 from .object_store import BazaarObjectStore, get_object_store
 from .refs import get_refs_container
+from .transportgit import TransportObjectStore
 
 
 class BzrBackend(Backend):
@@ -86,6 +87,11 @@ class BzrBackendRepo(BackendRepo):
                     get_tagged=get_tagged,
                     lossy=True,
                 )
+            elif isinstance(self.object_store, TransportObjectStore):
+                # Uses the pack bitmap, if there is one.
+                return self.object_store.find_missing_objects(
+                    have, wants, shallow=shallows, progress=progress
+                )
             else:
                 return MissingObjectFinder(
                     self.object_store, have, wants, shallow=shallows, progress=progress
@@ -213,6 +213,7 @@ def load_tests(loader, basic_tests, pattern):
         "test_cache",
         "test_dir",
         "test_fetch",
+        "test_filehistory",
         "test_git_remote_helper",
         "test_mapping",
         "test_memorytree",
@@ -229,6 +230,7 @@ def load_tests(loader, basic_tests, pattern):
         "test_transportgit",
         "test_tree",
         "test_unpeel_map",
+        "test_untracked",
         "test_urls",
         "test_workingtree",
     ]
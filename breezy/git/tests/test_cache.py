@@ -22,13 +22,17 @@ import stat
 
 from dulwich.objects import Blob, Commit, Tree
 
+from ... import config
 from ...revision import Revision
 from ...tests import TestCase, TestCaseInTempDir, UnavailableFeature
 from ...transport import get_transport
+from .. import cache
 from ..cache import (
     DictBzrGitCache,
     IndexBzrGitCache,
     IndexGitCacheFormat,
+    SegmentBzrGitCache,
+    SegmentGitCacheFormat,
     SqliteBzrGitCache,
     TdbBzrGitCache,
 )
@@ -220,3 +224,133 @@ class IndexGitShaMapTests(TestCaseInTempDir, TestGitShaMap):
         IndexGitCacheFormat().initialize(transport)
         self.cache = IndexBzrGitCache(transport)
         self.map = self.cache.idmap
+
+
+class SegmentGitShaMapTests(TestCaseInTempDir, TestGitShaMap):
+    def setUp(self):
+        TestCaseInTempDir.setUp(self)
+        self.transport = get_transport(self.test_dir)
+        SegmentGitCacheFormat().initialize(self.transport)
+        self.cache = SegmentBzrGitCache(self.transport)
+        self.map = self.cache.idmap
+
+    def add_revision(self, revid):
+        self.map.start_write_group()
+        updater = self.cache.get_updater(
+            Revision(
+                revid,
+                parent_ids=[],
+                message="",
+                committer="",
+                timezone=0,
+                timestamp=0,
+                properties={},
+                inventory_sha1=None,
+            )
+        )
+        c = self._get_test_commit()
+        c.message = revid
+        updater.add_object(c, {"testament3-sha1": b"testament"}, None)
+        b = Blob()
+        b.data = revid
+        updater.add_object(b, (b"myfileid", revid), None)
+        updater.finish()
+        self.map.commit_write_group()
+        return c.id, b.id
+
+    def test_reopen(self):
+        commit_id, blob_id = self.add_revision(b"myrevid")
+        idmap = SegmentBzrGitCache(self.transport).idmap
+        self.assertEqual(commit_id, idmap.lookup_commit(b"myrevid"))
+        self.assertEqual(blob_id, idmap.lookup_blob_id(b"myfileid", b"myrevid"))
+        self.assertEqual(
+            [("blob", (b"myfileid", b"myrevid"))], list(idmap.lookup_git_sha(blob_id))
+        )
+
+    def test_lookup_pending(self):
+        self.map.start_write_group()
+        b = Blob()
+        b.data = b"TEH BLOB"
+        key = (b"blob", b"myfileid", b"myrevid")
+        self.map._add(b.id, key, key)
+        self.assertEqual(b.id, self.map.lookup_blob_id(b"myfileid", b"myrevid"))
+        self.map.abort_write_group()
+        self.assertRaises(KeyError, self.map.lookup_blob_id, b"myfileid", b"myrevid")
+
+    def test_lookup_git_shas(self):
+        commit_id, blob_id = self.add_revision(b"myrevid")
+        missing_id = b"5686645d49063c73d35436192dfc9a160c672301"
+        self.assertEqual(
+            {
+                commit_id: [
+                    (
+                        "commit",
+                        (
+                            b"myrevid",
+                            b"cc9462f7f8263ef5adfbeff2fb936bb36b504cba",
+                            {"testament3-sha1": b"testament"},
+                        ),
+                    )
+                ],
+                blob_id: [("blob", (b"myfileid", b"myrevid"))],
+            },
+            self.map.lookup_git_shas([commit_id, blob_id, missing_id]),
+        )
+
+    def test_merge_segments(self):
+        self.overrideAttr(cache, "_MERGE_FACTOR", 3)
+        ids = [self.add_revision(b"rev%d" % i) for i in range(3)]
+        self.assertLength(1, self.map._segments)
+        self.assertEqual(
+            [self.map._segments[0].name],
+            self.transport.list_dir("segments"),
+        )
+        idmap = SegmentBzrGitCache(self.transport).idmap
+        for i, (commit_id, blob_id) in enumerate(ids):
+            self.assertEqual(commit_id, idmap.lookup_commit(b"rev%d" % i))
+            self.assertEqual(blob_id, idmap.lookup_blob_id(b"myfileid", b"rev%d" % i))
+        self.assertEqual({b"rev0", b"rev1", b"rev2"}, set(idmap.revids()))
+
+    def test_merge_segments_delete_fails(self):
+        self.overrideAttr(cache, "_MERGE_FACTOR", 3)
+        ids = [self.add_revision(b"rev%d" % i) for i in range(2)]
+        old_names = [segment.name for segment in self.map._segments]
+        segment_transport = self.map._transport
+        orig_delete = segment_transport.delete
+
+        def delete(name):
+            if name in old_names:
+                raise PermissionError(name)
+            return orig_delete(name)
+
+        segment_transport.delete = delete
+        ids.append(self.add_revision(b"rev2"))
+        self.assertLength(1, self.map._segments)
+        self.assertEqual(set(old_names), self.map._read_obsolete())
+        # The segments that couldn't be deleted are ignored.
+        idmap = SegmentBzrGitCache(self.transport).idmap
+        self.assertLength(1, idmap._segments)
+        self.assertEqual({b"rev0", b"rev1", b"rev2"}, set(idmap.revids()))
+        # A later merge deletes them.
+        del segment_transport.delete
+        for i in range(3, 6):
+            self.add_revision(b"rev%d" % i)
+        self.assertEqual(set(), self.map._read_obsolete())
+        self.assertEqual(
+            sorted(segment.name for segment in self.map._segments),
+            sorted(self.transport.list_dir("segments")),
+        )
+
+    def test_new_cache_format(self):
+        transport = get_transport(self.test_dir)
+        transport.mkdir("old")
+        self.assertIsInstance(
+            cache.BzrGitCacheFormat.from_transport(transport.clone("old")).idmap,
+            cache.IndexGitShaMap,
+        )
+        config.GlobalStack().set("git.sha_map_format", "segment")
+        transport.mkdir("new")
+        self.assertIsInstance(
+            cache.BzrGitCacheFormat.from_transport(transport.clone("new")).idmap,
+            cache.SegmentGitShaMap,
+        )
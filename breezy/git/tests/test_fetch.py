@@ -20,17 +20,23 @@ import os
 import stat
 import time
 
-from dulwich.objects import S_IFGITLINK, Blob, Tag, Tree
+from dulwich.object_store import MemoryObjectStore
+from dulwich.objects import S_IFGITLINK, Blob, Commit, Tag, Tree
 from dulwich.repo import Repo as GitRepo
 
-from ... import osutils
+from ... import config, osutils
 from ...branch import Branch
 from ...bzr import knit, versionedfile
 from ...bzr.inventory import Inventory
 from ...controldir import ControlDir
 from ...repository import Repository
-from ...tests import TestCaseWithTransport
-from ..fetch import import_git_blob, import_git_submodule, import_git_tree
+from ...tests import TestCase, TestCaseWithTransport
+from ..fetch import (
+    _CommitPrefetcher,
+    import_git_blob,
+    import_git_submodule,
+    import_git_tree,
+)
 from ..mapping import DEFAULT_FILE_MODE, BzrGitMappingv1
 from . import GitBranchBuilder
 
@@ -279,6 +285,32 @@ class RepositoryFetchTests:
         newrepo = self.clone_git_repo("d", "f")
         self.assertEqual({revid}, set(newrepo.all_revision_ids()))
 
+    def test_import_workers(self):
+        self.make_git_repo("d")
+        os.chdir("d")
+        bb = GitBranchBuilder()
+        bb.set_file("dir/foo", b"foo\n", False)
+        bb.set_file("bar", b"bar\n", False)
+        bb.commit(b"Somebody <somebody@someorg.org>", b"mymsg1")
+        bb.set_file("dir/foo", b"foo\nfoo\n", True)
+        bb.set_file("dir/sub/baz", b"baz\n", False)
+        bb.commit(b"Somebody <somebody@someorg.org>", b"mymsg2")
+        bb.delete_entry("dir/sub/baz")
+        bb.set_symlink("bar", "dir/foo")
+        bb.commit(b"Somebody <somebody@someorg.org>", b"mymsg3")
+        bb.finish()
+        os.chdir("..")
+        serial_repo = self.clone_git_repo("d", "serial")
+        config.GlobalStack().set("git.import_workers", "2")
+        newrepo = self.clone_git_repo("d", "f")
+        revids = serial_repo.all_revision_ids()
+        self.assertEqual(3, len(revids))
+        self.assertEqual(set(revids), set(newrepo.all_revision_ids()))
+        for revid in revids:
+            self.assertEqual(
+                serial_repo.get_inventory(revid), newrepo.get_inventory(revid)
+            )
+
 
 class LocalRepositoryFetchTests(RepositoryFetchTests, TestCaseWithTransport):
     def open_git_repo(self, path):
@@ -293,6 +325,54 @@ class DummyStoreUpdater:
         pass
 
 
+class _FailingStore:
+    """Object store whose lookups fail until told otherwise."""
+
+    def __init__(self, store):
+        self.store = store
+        self.fail = True
+
+    def __getitem__(self, sha):
+        if self.fail:
+            raise OSError("unable to read pack")
+        return self.store[sha]
+
+
+class CommitPrefetcherTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = MemoryObjectStore()
+        self.blob = Blob.from_string(b"contents\n")
+        tree = Tree()
+        tree.add(b"a", DEFAULT_FILE_MODE, self.blob.id)
+        self.commit = Commit()
+        self.commit.tree = tree.id
+        self.commit.author = self.commit.committer = b"Joe Foo <joe@foo.com>"
+        self.commit.author_time = self.commit.commit_time = 0
+        self.commit.author_timezone = self.commit.commit_timezone = 0
+        self.commit.message = b"msg"
+        for obj in [self.blob, tree, self.commit]:
+            self.store.add_object(obj)
+
+    def test_advance(self):
+        prefetcher = _CommitPrefetcher(self.store, [self.commit.id], 2)
+        self.addCleanup(prefetcher.close)
+        prefetcher.advance()
+        self.assertEqual(self.blob, prefetcher._objects[self.blob.id])
+        self.assertEqual(self.commit, prefetcher[self.commit.id])
+
+    def test_lookup_error(self):
+        # The objects of commits the workers failed to read are looked up
+        # by the main thread.
+        store = _FailingStore(self.store)
+        prefetcher = _CommitPrefetcher(store, [self.commit.id], 2)
+        self.addCleanup(prefetcher.close)
+        prefetcher.advance()
+        store.fail = False
+        self.assertEqual(self.commit, prefetcher[self.commit.id])
+        self.assertEqual(self.blob, prefetcher[self.blob.id])
+
+
 class ImportObjects(TestCaseWithTransport):
     def setUp(self):
         super().setUp()
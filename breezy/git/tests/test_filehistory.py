@@ -0,0 +1,274 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the index of the commits that change each file."""
+
+import os
+
+from dulwich.object_store import MemoryObjectStore
+from dulwich.objects import Blob, Commit, Tree
+from dulwich.repo import Repo as GitRepo
+
+from ... import config
+from ...repository import InterRepository, Repository
+from ...tests import TestCase, TestCaseWithTransport
+from .. import tests
+from ..filehistory import FileHistoryIndex, changed_paths
+from ..mapping import default_mapping
+
+
+class ChangedPathsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = MemoryObjectStore()
+
+    def make_commit(self, files, parents=()):
+        trees = {b"": Tree()}
+        for path, data in sorted(files.items(), reverse=True):
+            blob = Blob.from_string(data)
+            self.store.add_object(blob)
+            dirname, basename = os.path.split(path)
+            trees.setdefault(dirname, Tree()).add(basename, 0o100644, blob.id)
+        for path in sorted(trees, key=len, reverse=True):
+            self.store.add_object(trees[path])
+            if path:
+                dirname, basename = os.path.split(path)
+                trees.setdefault(dirname, Tree()).add(basename, 0o40000, trees[path].id)
+        commit = Commit()
+        commit.tree = trees[b""].id
+        commit.parents = [parent.id for parent in parents]
+        commit.author = commit.committer = b"Joe Foo <joe@foo.com>"
+        commit.author_time = commit.commit_time = 0
+        commit.author_timezone = commit.commit_timezone = 0
+        commit.message = b"msg"
+        self.store.add_object(commit)
+        return commit
+
+    def test_root(self):
+        commit = self.make_commit({b"a": b"a", b"d/b": b"b"})
+        self.assertEqual({b"a", b"d/b"}, changed_paths(self.store, commit))
+
+    def test_modify(self):
+        base = self.make_commit({b"a": b"a", b"d/b": b"b"})
+        commit = self.make_commit({b"a": b"a", b"d/b": b"c", b"e": b"e"}, [base])
+        self.assertEqual({b"d/b", b"e"}, changed_paths(self.store, commit))
+
+    def test_merge(self):
+        base = self.make_commit({b"a": b"a", b"b": b"b"})
+        left = self.make_commit({b"a": b"left", b"b": b"b"}, [base])
+        right = self.make_commit({b"a": b"a", b"b": b"b", b"c": b"c"}, [base])
+        merged = self.make_commit(
+            {b"a": b"left", b"b": b"b", b"c": b"c"}, [left, right]
+        )
+        # Files that are the same in one parent and missing from the other
+        # aren't changed, but files that differ from one of the parents are.
+        self.assertEqual({b"a"}, changed_paths(self.store, merged))
+
+    def test_directory_replaced(self):
+        left = self.make_commit({b"a/b": b"b"})
+        right = self.make_commit({b"a": b"a"})
+        merged = self.make_commit({b"a": b"a"}, [left, right])
+        self.assertEqual({b"a"}, changed_paths(self.store, merged))
+
+
+class FileHistoryIndexTests(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.store = MemoryObjectStore()
+        self.commits = []
+        for data in [b"a", b"b", b"b"]:
+            tree = Tree()
+            blob = Blob.from_string(data)
+            self.store.add_object(blob)
+            tree.add(b"a file", 0o100644, blob.id)
+            self.store.add_object(tree)
+            commit = Commit()
+            commit.tree = tree.id
+            commit.parents = [self.commits[-1].id] if self.commits else []
+            commit.author = commit.committer = b"Joe Foo <joe@foo.com>"
+            commit.author_time = commit.commit_time = 0
+            commit.author_timezone = commit.commit_timezone = 0
+            commit.message = b"msg"
+            self.store.add_object(commit)
+            self.commits.append(commit)
+
+    def test_update(self):
+        index = FileHistoryIndex(self.get_transport())
+        self.assertEqual(2, index.update(self.store, [self.commits[1].id]))
+        self.assertIn(self.commits[0].id, index)
+        self.assertNotIn(self.commits[2].id, index)
+        self.assertEqual(1, index.update(self.store, [self.commits[2].id]))
+        self.assertEqual(0, index.update(self.store, [self.commits[2].id]))
+        self.assertEqual(
+            {self.commits[0].id, self.commits[1].id}, index.get_changes(b"a file")
+        )
+        self.assertEqual(frozenset(), index.get_changes(b"other"))
+
+    def test_repack(self):
+        index = FileHistoryIndex(self.get_transport())
+        index.update(self.store, [self.commits[0].id])
+        index.update(self.store, [self.commits[2].id])
+        self.assertEqual(2, len(self.get_transport().list_dir(".")))
+        index.repack()
+        self.assertEqual(1, len(self.get_transport().list_dir(".")))
+        index = FileHistoryIndex(self.get_transport())
+        self.assertIn(self.commits[2].id, index)
+        self.assertEqual(
+            {self.commits[0].id, self.commits[1].id}, index.get_changes(b"a file")
+        )
+
+
+class RepositoryFileHistoryTests(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        GitRepo.init(self.test_dir)
+        builder = tests.GitBranchBuilder()
+        builder.set_file(b"a", b"base\n", False)
+        builder.set_file(b"b", b"base\n", False)
+        base = builder.commit(b"Joe Foo <joe@foo.com>", b"base")
+        builder.set_file(b"a", b"left\n", False)
+        left = builder.commit(b"Joe Foo <joe@foo.com>", b"left")
+        builder.set_file(b"b", b"right\n", False)
+        right = builder.commit(b"Joe Foo <joe@foo.com>", b"right", base=base)
+        builder.set_file(b"a", b"left\n", False)
+        builder.set_file(b"b", b"right\n", False)
+        merged = builder.commit(
+            b"Joe Foo <joe@foo.com>", b"merge", base=left, merge=[right]
+        )
+        marks = builder.finish()
+        self.shas = {
+            name: marks[mark]
+            for name, mark in [
+                ("base", base),
+                ("left", left),
+                ("right", right),
+                ("merged", merged),
+            ]
+        }
+
+    def find_last_changes(self, repo):
+        scanner = repo._file_change_scanner
+        return {
+            (path, name): scanner.find_last_change_revision(path, sha)[2]
+            for name, sha in self.shas.items()
+            for path in [b"", b"a", b"b"]
+        }
+
+    def test_pack_builds_index(self):
+        repo = Repository.open(".")
+        self.assertIs(None, repo._get_file_history())
+        expected = self.find_last_changes(repo)
+        repo.pack()
+        self.assertTrue(os.path.isdir(".git/bzr-file-history"))
+        file_history = repo._get_file_history()
+        self.assertIn(self.shas["merged"], file_history)
+        self.assertEqual(expected, self.find_last_changes(repo))
+        self.assertEqual(
+            self.shas["base"],
+            repo._file_change_scanner.find_last_change_revision(
+                b"b", self.shas["left"]
+            )[2],
+        )
+
+    def test_disabled(self):
+        config.GlobalStack().set("git.file_history_index", "false")
+        repo = Repository.open(".")
+        repo.pack()
+        self.assertFalse(os.path.exists(".git/bzr-file-history"))
+        self.assertIs(None, repo._get_file_history())
+
+    def check_file_graph(self, repo):
+        file_id = default_mapping.generate_file_id("a")
+        revids = {
+            name: default_mapping.revision_id_foreign_to_bzr(sha)
+            for name, sha in self.shas.items()
+        }
+        with repo.lock_read():
+            parent_map = repo.get_file_graph().get_parent_map(
+                [(file_id, revid) for revid in revids.values()]
+            )
+        # Only the commits that change the file have a text. The merge
+        # differs from one of its parents.
+        self.assertEqual(
+            {
+                (file_id, revids["base"]): (),
+                (file_id, revids["left"]): ((file_id, revids["base"]),),
+                (file_id, revids["merged"]): (
+                    (file_id, revids["left"]),
+                    (file_id, revids["base"]),
+                ),
+            },
+            parent_map,
+        )
+
+    def test_file_graph(self):
+        repo = Repository.open(".")
+        repo.pack()
+        self.check_file_graph(repo)
+
+    def test_file_graph_without_index(self):
+        repo = Repository.open(".")
+        self.assertIs(None, repo._get_file_history())
+        self.check_file_graph(repo)
+
+    def test_commit_extends_index(self):
+        tree = self.make_branch_and_tree("wt", format="git")
+        self.build_tree(["wt/a"])
+        tree.add(["a"])
+        tree.commit("one")
+        repo = tree.branch.repository
+        repo.pack()
+        self.build_tree_contents([("wt/a", b"changed\n")])
+        revid = tree.commit("two")
+        sha, _mapping = repo.lookup_bzr_revision_id(revid)
+        self.assertIn(sha, repo._get_file_history())
+
+    def test_push_extends_index(self):
+        tree = self.make_branch_and_tree("bzr")
+        self.build_tree(["bzr/a"])
+        tree.add(["a"])
+        tree.commit("one")
+        target = self.make_repository("target", format="git")
+        interrepo = InterRepository.get(tree.branch.repository, target)
+
+        def push():
+            revid = tree.last_revision()
+            revidmap, _old_refs, _new_refs = interrepo.fetch_refs(
+                lambda refs: {b"refs/heads/master": (None, revid)}, lossy=True
+            )
+            return revidmap[revid][0]
+
+        push()
+        target.pack()
+        self.build_tree_contents([("bzr/a", b"changed\n")])
+        tree.commit("two")
+        self.assertIn(push(), target._get_file_history())
+
+    def test_fetch_extends_index(self):
+        repo = Repository.open(".")
+        repo.pack()
+        target = self.make_repository("target", format="git")
+        target.fetch(repo)
+        self.assertIs(None, target._get_file_history())
+        target.pack()
+        self.assertIn(self.shas["merged"], target._get_file_history())
+        builder = tests.GitBranchBuilder()
+        builder.set_file(b"a", b"new\n", False)
+        mark = builder.commit(b"Joe Foo <joe@foo.com>", b"new")
+        new_sha = builder.finish()[mark]
+        target = Repository.open("target")
+        target.fetch(Repository.open("."))
+        self.assertIn(new_sha, target._get_file_history())
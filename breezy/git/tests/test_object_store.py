@@ -20,8 +20,10 @@ import os
 import shutil
 import stat
 
-from dulwich.objects import Blob, Tree
+from dulwich.objects import Blob, Tree, sha_to_hex
+from dulwich.pack import REF_DELTA, apply_delta
 
+from ... import config
 from ...branchbuilder import BranchBuilder
 from ...bzr.inventory import InventoryDirectory, InventoryFile
 from ...errors import NoSuchRevision
@@ -218,6 +220,179 @@ class BazaarObjectStoreTests(TestCaseWithTransport):
         self.store.lock_read()
         self.assertIn(b.id, self.store)
 
+    def test_update_sha_map_pipelined(self):
+        bb = BranchBuilder(branch=self.branch)
+        bb.start_series()
+        bb.build_snapshot(
+            None,
+            [
+                ("add", ("", None, "directory", None)),
+                ("add", ("foo", b"foo-id", "file", b"a\nb\n")),
+                ("add", ("dir", b"dir-id", "directory", None)),
+                ("add", ("dir/bar", b"bar-id", "file", b"bar\n")),
+            ],
+            revision_id=b"rev1",
+        )
+        bb.build_snapshot(
+            [b"rev1"], [("modify", ("foo", b"a\nb\nc\n"))], revision_id=b"rev2"
+        )
+        bb.build_snapshot(
+            [b"rev1"], [("modify", ("dir/bar", b"baz\n"))], revision_id=b"rev3"
+        )
+        bb.build_snapshot(
+            [b"rev2", b"rev3"],
+            [("modify", ("dir/bar", b"baz\n"))],
+            revision_id=b"rev4",
+        )
+        bb.finish_series()
+        serial_branch = self.make_branch("serial")
+        serial_branch.repository.fetch(self.branch.repository)
+        serial_store = BazaarObjectStore(serial_branch.repository)
+        with serial_store.lock_read():
+            expected = set(serial_store)
+        config.GlobalStack().set("git.export_workers", "2")
+        config.GlobalStack().set("git.export_batch_size", "1")
+        with self.store.lock_read():
+            self.assertEqual(expected, set(self.store))
+            b = Blob()
+            b.data = b"a\nb\nc\n"
+            self.assertEqual(b, self.store[b.id])
+
+    def build_history(self):
+        bb = BranchBuilder(branch=self.branch)
+        bb.start_series()
+        bb.build_snapshot(
+            None,
+            [
+                ("add", ("", None, "directory", None)),
+                ("add", ("foo", b"foo-id", "file", b"a\nb\n")),
+                ("add", ("dir", b"dir-id", "directory", None)),
+                ("add", ("dir/bar", b"bar-id", "file", b"bar\n")),
+            ],
+            revision_id=b"rev1",
+        )
+        bb.build_snapshot(
+            [b"rev1"], [("modify", ("foo", b"a\nb\nc\n"))], revision_id=b"rev2"
+        )
+        bb.finish_series()
+
+    def test_lookup_git_shas(self):
+        self.build_history()
+        b = Blob()
+        b.data = b"a\nb\nc\n"
+        missing = Blob()
+        missing.data = b"missing\n"
+        with self.store.lock_read():
+            self.assertEqual(
+                {b.id: [("blob", (b"foo-id", b"rev2"))]},
+                self.store.lookup_git_shas([b.id, missing.id]),
+            )
+
+    def test_iterobjects_subset(self):
+        self.build_history()
+        with self.store.lock_read():
+            shas = list(self.store)
+            expected = {sha: self.store[sha] for sha in shas}
+            objects = list(self.store.iterobjects_subset(shas))
+        self.assertEqual(len(shas), len(objects))
+        self.assertEqual(expected, {obj.id: obj for obj in objects})
+
+    def test_iterobjects_subset_missing(self):
+        self.build_history()
+        b = Blob()
+        b.data = b"a\nb\nc\n"
+        missing = Blob()
+        missing.data = b"missing\n"
+        with self.store.lock_read():
+            self.assertRaises(
+                KeyError, list, self.store.iterobjects_subset([b.id, missing.id])
+            )
+            self.assertEqual(
+                [b],
+                list(
+                    self.store.iterobjects_subset(
+                        [b.id, missing.id], allow_missing=True
+                    )
+                ),
+            )
+
+    def test_read_ahead(self):
+        self.build_history()
+        with self.store.lock_read():
+            head = self.store._lookup_revision_sha1(b"rev2")
+            object_ids = [
+                oid
+                for (oid, hint) in self.store.find_missing_objects(
+                    [], [head], lossy=True
+                )
+            ]
+            objects = [self.store[oid] for oid in object_ids]
+            # The first request reconstructed all the others
+            self.assertEqual({}, self.store._read_ahead)
+            self.assertEqual(set(), self.store._read_ahead_pending)
+        self.assertEqual(object_ids, [obj.id for obj in objects])
+
+    def build_large_history(self):
+        old = Blob.from_string(b"".join(b"line %d\n" % i for i in range(100)))
+        new = Blob.from_string(old.data + b"line 100\n")
+        bb = BranchBuilder(branch=self.branch)
+        bb.start_series()
+        bb.build_snapshot(
+            None,
+            [
+                ("add", ("", None, "directory", None)),
+                ("add", ("foo", b"foo-id", "file", old.data)),
+            ],
+            revision_id=b"rev1",
+        )
+        bb.build_snapshot(
+            [b"rev1"], [("modify", ("foo", new.data))], revision_id=b"rev2"
+        )
+        bb.finish_series()
+        return old, new
+
+    def test_iter_unpacked_subset_delta(self):
+        old, new = self.build_large_history()
+        with self.store.lock_read():
+            (unpacked,) = self.store.iter_unpacked_subset(
+                {old.id, new.id}, allow_missing=True
+            )
+        self.assertEqual(REF_DELTA, unpacked.pack_type_num)
+        self.assertEqual(new.id, sha_to_hex(unpacked.sha()))
+        self.assertEqual(old.sha().digest(), unpacked.delta_base)
+        delta = apply_delta(old.as_raw_string(), unpacked.decomp_chunks)
+        self.assertEqual(new.data, b"".join(delta))
+
+    def test_iter_unpacked_subset_without_base(self):
+        old, new = self.build_large_history()
+        with self.store.lock_read():
+            self.assertEqual(
+                [], list(self.store.iter_unpacked_subset({new.id}, allow_missing=True))
+            )
+            (unpacked,) = self.store.iter_unpacked_subset({new.id})
+        self.assertEqual(Blob.type_num, unpacked.pack_type_num)
+        self.assertEqual(new.as_raw_chunks(), unpacked.decomp_chunks)
+
+    def test_iter_unpacked_subset_disabled(self):
+        old, new = self.build_large_history()
+        config.GlobalStack().set("git.delta_blobs", "false")
+        with self.store.lock_read():
+            unpacked = list(self.store.iter_unpacked_subset({old.id, new.id}))
+        self.assertEqual(
+            [Blob.type_num, Blob.type_num], [u.pack_type_num for u in unpacked]
+        )
+
+    def test_generate_lossy_pack_data(self):
+        old, new = self.build_large_history()
+        with self.store.lock_read():
+            head = self.store._lookup_revision_sha1(b"rev2")
+            count, records = self.store.generate_lossy_pack_data([], [head])
+            records = list(records)
+        self.assertEqual(count, len(records))
+        self.assertEqual(
+            [REF_DELTA], [u.pack_type_num for u in records if u.delta_base]
+        )
+
 
 class TreeToObjectsTests(TestCaseWithTransport):
     def setUp(self):
@@ -25,6 +25,7 @@ from dulwich.repo import Repo as GitRepo
 from ... import config, errors, revision
 from ...repository import InterRepository, Repository
 from .. import dir, repository, tests
+from ..commitgraph import CommitGraphGraph
 from ..mapping import default_mapping
 from ..object_store import BazaarObjectStore
 from ..push import MissingObjectsIterator
@@ -124,6 +125,90 @@ class TestGitRepositoryFeatures(tests.TestCaseInTempDir):
         self.assertEqual(b"text\n", tree.get_file_text("data"))
 
 
+class TestCommitGraph(tests.TestCaseInTempDir):
+    """Tests for the use of git's commit-graph file."""
+
+    def setUp(self):
+        super().setUp()
+        GitRepo.init(self.test_dir)
+        builder = tests.GitBranchBuilder()
+        builder.set_file(b"a", b"base\n", False)
+        base = builder.commit(b"Joe Foo <joe@foo.com>", b"base")
+        builder.set_file(b"a", b"left\n", False)
+        left = builder.commit(b"Joe Foo <joe@foo.com>", b"left")
+        builder.set_file(b"a", b"right\n", False)
+        right = builder.commit(b"Joe Foo <joe@foo.com>", b"right", base=base)
+        builder.set_file(b"a", b"merged\n", False)
+        merged = builder.commit(
+            b"Joe Foo <joe@foo.com>", b"merge", base=left, merge=[right]
+        )
+        marks = builder.finish()
+        self.revids = {
+            name: default_mapping.revision_id_foreign_to_bzr(marks[mark])
+            for name, mark in [
+                ("base", base),
+                ("left", left),
+                ("right", right),
+                ("merged", merged),
+            ]
+        }
+
+    def test_pack_writes_commit_graph(self):
+        repo = Repository.open(".")
+        self.assertIs(None, repo._get_commit_graph_provider())
+        repo.pack()
+        self.assertTrue(os.path.exists(".git/objects/info/commit-graph"))
+        self.assertIsNot(None, repo._get_commit_graph_provider())
+
+    def test_disabled(self):
+        config.GlobalStack().set("git.commit_graph", "false")
+        repo = Repository.open(".")
+        repo.pack()
+        self.assertFalse(os.path.exists(".git/objects/info/commit-graph"))
+        self.assertIs(None, repo._get_commit_graph_provider())
+
+    def test_get_parent_map(self):
+        expected = Repository.open(".").get_parent_map(self.revids.values())
+        repo = Repository.open(".")
+        repo.pack()
+        self.assertEqual(expected, repo.get_parent_map(self.revids.values()))
+
+    def test_get_parent_map_reads_no_objects(self):
+        repo = Repository.open(".")
+        repo.pack()
+        store_class = type(repo._git.object_store)
+        reads = []
+        getitem = store_class.__getitem__
+
+        def counting_getitem(store, sha):
+            reads.append(sha)
+            return getitem(store, sha)
+
+        self.overrideAttr(store_class, "__getitem__", counting_getitem)
+        parent_map = repo.get_parent_map(self.revids.values())
+        self.assertEqual([], reads)
+        self.assertEqual(
+            (self.revids["left"], self.revids["right"]),
+            parent_map[self.revids["merged"]],
+        )
+
+    def test_heads(self):
+        repo = Repository.open(".")
+        repo.pack()
+        graph = repo.get_graph()
+        self.assertIsInstance(graph, CommitGraphGraph)
+        revids = self.revids
+        self.assertEqual(
+            {revids["left"], revids["right"]},
+            graph.heads([revids["base"], revids["left"], revids["right"]]),
+        )
+        self.assertEqual(
+            {revids["merged"]}, graph.heads([revids["right"], revids["merged"]])
+        )
+        self.assertTrue(graph.is_ancestor(revids["base"], revids["merged"]))
+        self.assertFalse(graph.is_ancestor(revids["left"], revids["right"]))
+
+
 class TestGitRepository(tests.TestCaseWithTransport):
     def _do_commit(self):
         builder = tests.GitBranchBuilder()
@@ -16,9 +16,12 @@
 
 """Tests for bzr-git's object store."""
 
-from dulwich.objects import Blob
+from io import BytesIO
+
+from dulwich.object_store import MissingObjectFinder
+from dulwich.objects import Blob, Tree
 from dulwich.tests.test_object_store import PackBasedObjectStoreTests
-from dulwich.tests.utils import make_object
+from dulwich.tests.utils import make_commit, make_object
 
 from ...tests import TestCaseWithTransport
 from ..transportgit import TransportObjectStore, TransportRefsContainer
@@ -63,6 +66,109 @@ class TransportObjectStoreTests(PackBasedObjectStoreTests, TestCaseWithTransport
         self.assertEqual(2, len(restore.packs))
 
 
+class TransportObjectStoreBitmapTests(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.store = TransportObjectStore.init(self.get_transport())
+        self.commits = []
+        for i in range(5):
+            self.commits.append(self.add_commit(i))
+
+    def add_commit(self, i):
+        blob = make_object(Blob, data=b"text %d" % i)
+        tree = Tree()
+        tree.add(b"file", 0o100644, blob.id)
+        tree.add(b"other", 0o100644, make_object(Blob, data=b"other").id)
+        commit = make_commit(tree=tree.id, parents=self.commits[-1:])
+        for obj in (blob, tree, commit):
+            self.store.add_object(obj)
+        if i == 0:
+            self.store.add_object(make_object(Blob, data=b"other"))
+        return commit.id
+
+    def find_missing_objects(self, haves, wants):
+        return {
+            sha
+            for (sha, hint) in MissingObjectFinder(self.store, haves=haves, wants=wants)
+        }
+
+    def test_write_pack_bitmap(self):
+        # Loose objects would not be covered by the bitmap.
+        self.assertFalse(self.store.write_pack_bitmap(self.commits[-1:]))
+        self.store.repack()
+        self.assertIs(None, self.store.get_pack_bitmap())
+        self.assertTrue(self.store.write_pack_bitmap(self.commits[-1:]))
+        [pack] = self.store.packs
+        self.assertTrue(self.store.pack_transport.has(pack._basename + ".bitmap"))
+        bitmap = self.store.get_pack_bitmap()
+        self.assertIsNot(None, bitmap)
+        self.assertIsNot(None, bitmap.get_bitmap(self.commits[-1]))
+
+    def test_pack_bitmap_xor_compressed(self):
+        from dulwich.bitmap import write_bitmap_file
+
+        from ..packbitmap import (
+            PackBitmapIndex,
+            PackOrder,
+            generate_pack_bitmap,
+            reachable_positions,
+        )
+
+        self.store.repack()
+        [pack] = self.store.packs
+        bitmap = generate_pack_bitmap(
+            pack, self.store, self.commits[-1:], commit_interval=1
+        )
+        # Each commit only adds a few objects to those of its parent.
+        self.assertEqual(
+            [0, 1, 1, 1, 1], [entry.xor_offset for (_sha, entry) in bitmap.entries_list]
+        )
+        f = BytesIO()
+        write_bitmap_file(f, bitmap)
+        f.seek(0)
+        bitmap_index = PackBitmapIndex.from_file(pack, f)
+        positions = PackOrder.from_pack(pack)
+        for sha in self.commits:
+            self.assertEqual(
+                reachable_positions(sha, positions, self.store, lambda sha: None),
+                bitmap_index.get_bitmap(sha),
+            )
+
+    def test_find_missing_objects(self):
+        self.store.repack()
+        self.store.write_pack_bitmap(self.commits[-1:])
+        haves = [self.commits[1]]
+        wants = [self.commits[3]]
+        self.assertIsNot(
+            None, self.store._find_missing_objects_from_bitmap(haves, wants)
+        )
+        self.assertEqual(
+            self.find_missing_objects(haves, wants),
+            {sha for (sha, hint) in self.store.find_missing_objects(haves, wants)},
+        )
+
+    def test_objects_outside_pack(self):
+        self.store.repack()
+        self.store.write_pack_bitmap(self.commits[-1:])
+        self.commits.append(self.add_commit(5))
+        haves = [self.commits[1]]
+        wants = [self.commits[5]]
+        self.assertIs(None, self.store._find_missing_objects_from_bitmap(haves, wants))
+        self.assertEqual(
+            self.find_missing_objects(haves, wants),
+            {sha for (sha, hint) in self.store.find_missing_objects(haves, wants)},
+        )
+
+    def test_repack_removes_bitmap(self):
+        self.store.repack()
+        self.store.write_pack_bitmap(self.commits[-1:])
+        self.commits.append(self.add_commit(5))
+        self.store.repack()
+        [pack] = self.store.packs
+        self.assertFalse(self.store.pack_transport.has(pack._basename + ".bitmap"))
+        self.assertIs(None, self.store.get_pack_bitmap())
+
+
 # FIXME: Unfortunately RefsContainerTests requires on a specific set of refs existing.
 
 
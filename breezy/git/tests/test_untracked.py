@@ -0,0 +1,200 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the untracked cache and fsmonitor index extensions."""
+
+import os
+import struct
+
+from dulwich.objects import Blob, hex_to_sha
+
+from ...tests import TestCase, TestCaseInTempDir
+from ..fsmonitor import FsmonitorChanges, parse_fsmonitor_extension
+from ..untracked import (
+    UntrackedCache,
+    UntrackedCacheDir,
+    decode_varint,
+    encode_varint,
+    exclude_file_oids,
+    read_ewah,
+    write_ewah,
+)
+
+
+class VarintTests(TestCase):
+    def test_roundtrip(self):
+        for value in [0, 1, 127, 128, 129, 16511, 16512, 2**40]:
+            data = encode_varint(value)
+            self.assertEqual((value, len(data)), decode_varint(data, 0))
+
+    def test_encoding(self):
+        # Each continuation adds one, unlike LEB128.
+        self.assertEqual(b"\x7f", encode_varint(127))
+        self.assertEqual(b"\x80\x00", encode_varint(128))
+        self.assertEqual(b"\x80\x01", encode_varint(129))
+
+
+class EwahTests(TestCase):
+    def test_roundtrip(self):
+        data = write_ewah([0, 5, 64, 130], 131)
+        self.assertEqual(([0, 5, 64, 130], len(data)), read_ewah(data, 0))
+
+    def test_empty(self):
+        data = write_ewah([], 0)
+        self.assertEqual(([], len(data)), read_ewah(data, 0))
+
+    def test_running_length(self):
+        # A run of 2 words of set bits followed by one literal word.
+        words = [1 | (2 << 1) | (1 << 33), 0x3]
+        data = (
+            struct.pack(">LL", 192, 2)
+            + struct.pack(">2Q", *words)
+            + struct.pack(">L", 0)
+        )
+        self.assertEqual((list(range(128)) + [128, 129], len(data)), read_ewah(data, 0))
+
+
+class UntrackedCacheTests(TestCase):
+    def make_cache(self):
+        root = UntrackedCacheDir(b"", [b"c/", b"u1"])
+        root.stat_data = tuple(range(9))
+        root.exclude_oid = b"\x01" * 20
+        a = UntrackedCacheDir(b"a", [b"u2"])
+        a.stat_data = tuple(range(1, 10))
+        b = UntrackedCacheDir(b"b")
+        a.dirs.append(b)
+        c = UntrackedCacheDir(b"c", [b"u3"])
+        c.stat_data = tuple(range(2, 11))
+        c.check_only = True
+        root.dirs.extend([a, c])
+        return UntrackedCache(b"Location /tmp, system Linux\0", root=root)
+
+    def test_roundtrip(self):
+        cache = self.make_cache()
+        data = cache.to_bytes()
+        self.assertEqual(data, UntrackedCache.from_bytes(data).to_bytes())
+        read = UntrackedCache.from_bytes(data)
+        self.assertEqual(b"Location /tmp, system Linux\0", read.ident)
+        self.assertEqual([b"c/", b"u1"], read.root.untracked)
+        self.assertEqual(b"\x01" * 20, read.root.exclude_oid)
+        a = read.root.get_dir(b"a")
+        self.assertEqual([b"u2"], a.untracked)
+        self.assertEqual(tuple(range(1, 10)), a.stat_data)
+        # Invalid listings are written empty.
+        self.assertEqual(None, a.get_dir(b"b").stat_data)
+        self.assertTrue(read.root.get_dir(b"c").check_only)
+
+    def test_empty(self):
+        cache = UntrackedCache(b"ident\0")
+        read = UntrackedCache.from_bytes(cache.to_bytes())
+        self.assertIs(None, read.root)
+
+    def test_invalidate_path(self):
+        cache = self.make_cache()
+        cache.invalidate_path(b"a/b/file")
+        self.assertIs(None, cache.root.stat_data)
+        self.assertEqual([], cache.root.untracked)
+        self.assertIs(None, cache.root.get_dir(b"a").stat_data)
+        self.assertIsNot(None, cache.root.get_dir(b"c").stat_data)
+
+
+class UntrackedCacheListingTests(TestCaseInTempDir):
+    def is_ignored(self, path):
+        return path.endswith(".o") or path == "ignored/"
+
+    def iter_untracked(self, cache, index_paths):
+        basedir = os.fsencode(self.test_dir)
+        return sorted(cache.iter_untracked(basedir, index_paths, self.is_ignored))
+
+    def test_listing(self):
+        self.build_tree(
+            [
+                "a/",
+                "a/tracked",
+                "a/unknown",
+                "a/x.o",
+                "empty/",
+                "ignored/",
+                "ignored/file",
+                "onlyignored/",
+                "onlyignored/x.o",
+                "unknowndir/",
+                "unknowndir/file",
+                "unknown",
+            ]
+        )
+        # Make sure that removing a file changes the mtime of the directory.
+        os.utime(".", (0, 0))
+        cache = UntrackedCache(b"ident\0")
+        index_paths = {b"a/tracked"}
+        self.assertEqual(
+            [b"a/unknown", b"unknown", b"unknowndir/"],
+            self.iter_untracked(cache, index_paths),
+        )
+        self.assertEqual([b"a"], [d.name for d in cache.root.dirs])
+        # The listing is reused while the directory is unchanged.
+        cache.root.untracked.append(b"cached")
+        self.assertIn(b"cached", self.iter_untracked(cache, index_paths))
+        os.unlink("unknown")
+        self.assertEqual(
+            [b"a/unknown", b"unknowndir/"], self.iter_untracked(cache, index_paths)
+        )
+
+    def test_gitignore_change(self):
+        self.build_tree(["a/", "a/tracked", "a/unknown"])
+        cache = UntrackedCache(b"ident\0")
+        index_paths = {b"a/tracked"}
+        self.assertEqual([b"a/unknown"], self.iter_untracked(cache, index_paths))
+        self.build_tree_contents([(".gitignore", b"unknown\n")])
+        # The .gitignore file changes the ignore rules of the subdirectories
+        # too, so their listings are not reused.
+        cache.root.get_dir(b"a").untracked.append(b"cached")
+        self.assertNotIn(b"a/cached", self.iter_untracked(cache, index_paths))
+
+    def test_exclude_file_oids(self):
+        self.assertEqual([], exclude_file_oids("missing"))
+        self.build_tree_contents([("empty", b""), ("ignore", b"*.o\n")])
+        self.assertEqual(
+            [hex_to_sha(Blob.from_string(b"").id)], exclude_file_oids("empty")
+        )
+        self.assertEqual(
+            [
+                hex_to_sha(Blob.from_string(b"*.o\n\n").id),
+                hex_to_sha(Blob.from_string(b"*.o\n").id),
+            ],
+            exclude_file_oids("ignore"),
+        )
+
+
+class FsmonitorTests(TestCase):
+    def test_parse_v2(self):
+        data = struct.pack(">L", 2) + b"token\0"
+        bitmap = write_ewah([1, 3], 4)
+        data += struct.pack(">L", len(bitmap)) + bitmap
+        self.assertEqual((2, b"token", [1, 3]), parse_fsmonitor_extension(data))
+
+    def test_parse_v1(self):
+        data = struct.pack(">LQ", 1, 1234)
+        bitmap = write_ewah([], 4)
+        data += struct.pack(">L", len(bitmap)) + bitmap
+        self.assertEqual((1, b"1234", []), parse_fsmonitor_extension(data))
+
+    def test_changes(self):
+        changes = FsmonitorChanges([b"a/b", b"c/"])
+        self.assertIn(b"a/b", changes)
+        self.assertIn(b"c/d/e", changes)
+        self.assertNotIn(b"a/c", changes)
+        self.assertNotIn(b"cd", changes)
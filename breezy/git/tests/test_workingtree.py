@@ -22,15 +22,23 @@ import stat
 
 from dulwich import __version__ as dulwich_version
 from dulwich.diff_tree import RenameDetector, tree_changes
-from dulwich.index import ConflictedIndexEntry, IndexEntry
+from dulwich.index import (
+    FLAG_VALID,
+    ConflictedIndexEntry,
+    Index,
+    IndexEntry,
+    index_entry_from_stat,
+)
 from dulwich.object_store import OverlayObjectStore
 from dulwich.objects import S_IFGITLINK, ZERO_SHA, Blob, Tree
 
+from ... import config
 from ... import conflicts as _mod_conflicts
 from ... import workingtree as _mod_workingtree
 from ...bzr.inventorytree import InventoryTreeChange as TreeChange
 from ...delta import TreeDelta
 from ...tests import TestCase, TestCaseWithTransport
+from .. import workingtree as git_workingtree
 from ..mapping import default_mapping
 from ..tree import tree_delta_from_git_changes
 
@@ -119,6 +127,130 @@ class GitWorkingTreeTests(TestCaseWithTransport):
         self.assertEqual([], list(subtree.unknowns()))
 
 
+class GitWorkingTreeStatusTests(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.tree = self.make_branch_and_tree(".", format="git")
+        self.build_tree(["a", "b", "dir/", "dir/c"])
+        self.tree.add(["a", "b", "dir", "dir/c"])
+        self.tree.commit("Add files")
+
+    def get_changed_paths(self):
+        with self.tree.lock_read():
+            return sorted(
+                change.path[1]
+                for change in self.tree.iter_changes(self.tree.basis_tree())
+            )
+
+    def test_unchanged_files_not_hashed(self):
+        hashed = []
+        orig_live_entry = self.tree._live_entry
+
+        def live_entry(path):
+            hashed.append(path)
+            return orig_live_entry(path)
+
+        self.tree._live_entry = live_entry
+        self.assertEqual([], self.get_changed_paths())
+        self.assertEqual([], hashed)
+        self.build_tree_contents([("a", b"new contents of a\n")])
+        self.assertEqual(["a"], self.get_changed_paths())
+        self.assertEqual([b"a"], hashed)
+
+    def test_racy_file_hashed(self):
+        self.build_tree_contents([("a", b"contents of b\n")])
+        # The index records the stat data of the changed file, as happens if
+        # the file changes right after it was hashed.
+        with self.tree.lock_tree_write():
+            entry = self.tree.index[b"a"]
+            self.tree.index[b"a"] = index_entry_from_stat(os.lstat("a"), entry.sha)
+            self.tree._index_dirty = True
+        index_path = self.tree.control_transport.local_abspath("index")
+        mtime_ns = os.lstat("a").st_mtime_ns
+        os.utime(index_path, ns=(mtime_ns, mtime_ns))
+        self.assertEqual(["a"], self.get_changed_paths())
+
+    def test_racy_entries_smudged_if_changed(self):
+        # The entries of the files written just before the index are racy,
+        # but match the files.
+        with self.tree.lock_read():
+            self.assertNotEqual((0, 0), self.tree.index[b"a"].ctime)
+        self.build_tree_contents([("a", b"contents of b\n")])
+        with self.tree.lock_tree_write():
+            entry = self.tree.index[b"a"]
+            self.tree.index[b"a"] = index_entry_from_stat(os.lstat("a"), entry.sha)
+            self.tree._index_dirty = True
+        with self.tree.lock_read():
+            self.assertEqual((0, 0), self.tree.index[b"a"].ctime)
+            self.assertNotEqual((0, 0), self.tree.index[b"b"].ctime)
+
+    def test_assume_unchanged(self):
+        with self.tree.lock_tree_write():
+            self.tree.index[b"a"].flags |= FLAG_VALID
+            self.tree._index_dirty = True
+        self.build_tree_contents([("a", b"new contents of a\n")])
+        self.assertEqual([], self.get_changed_paths())
+
+    def test_hash_workers(self):
+        config.GlobalStack().set("git.hash_workers", "2")
+        self.build_tree_contents(
+            [("a", b"new contents of a\n"), ("dir/c", b"new contents of c\n")]
+        )
+        os.unlink("b")
+        with self.tree.lock_read():
+            changes = sorted(
+                (change.path[0], change.kind[1])
+                for change in self.tree.iter_changes(self.tree.basis_tree())
+            )
+        self.assertEqual([("a", "file"), ("b", None), ("dir/c", "file")], changes)
+
+    def test_untracked_cache(self):
+        git_config = self.tree.repository._git.get_config()
+        git_config.set((b"core",), b"untrackedCache", True)
+        git_config.write_to_path()
+        self.build_tree(
+            ["unknown", "dir/unknown", "newdir/", "newdir/file", "ignored.o"]
+        )
+        self.build_tree_contents([(".gitignore", b"*.o\n")])
+        expected = [".gitignore", "dir/unknown", "newdir/file", "unknown"]
+        with self.tree.lock_tree_write():
+            self.assertEqual(expected, sorted(self.tree.unknowns()))
+            self.tree.add(["unknown"])
+        index = Index(self.tree.control_transport.local_abspath("index"))
+        self.assertEqual(
+            [b"UNTR"], [extension.signature for extension in index._extensions]
+        )
+        expected.remove("unknown")
+        self.assertEqual(expected, sorted(self.tree.unknowns()))
+
+    def test_untracked_cache_not_set(self):
+        # Without a cache in the index or core.untrackedCache set, the
+        # identity of the system isn't looked up.
+        def get_ident(worktree_path):
+            raise AssertionError("get_ident called")
+
+        self.overrideAttr(git_workingtree, "get_ident", get_ident)
+        self.build_tree(["unknown"])
+        self.assertEqual(["unknown"], list(self.tree.unknowns()))
+
+    def test_untracked_cache_add(self):
+        git_config = self.tree.repository._git.get_config()
+        git_config.set((b"core",), b"untrackedCache", True)
+        git_config.write_to_path()
+        self.build_tree(["unknown", "dir/unknown"])
+        with self.tree.lock_tree_write():
+            self.assertEqual(["dir/unknown", "unknown"], sorted(self.tree.unknowns()))
+            self.tree._index_dirty = True
+        # The listings of the directories are up to date in the index now.
+        index_path = self.tree.control_transport.local_abspath("index")
+        mtime_ns = os.lstat(index_path).st_mtime_ns + 1000000000
+        os.utime(index_path, ns=(mtime_ns, mtime_ns))
+        with self.tree.lock_tree_write():
+            self.tree.add(["unknown", "dir/unknown"])
+            self.assertEqual([], list(self.tree.unknowns()))
+        self.assertEqual([], list(self.tree.unknowns()))
+
+
 class GitWorkingTreeFileTests(TestCaseWithTransport):
     def setUp(self):
         super().setUp()
@@ -22,11 +22,12 @@ import posixpath
 import sys
 from io import BytesIO
 
-from dulwich.errors import NoIndexPresent
+from dulwich.errors import ChecksumMismatch, NoIndexPresent
 from dulwich.file import FileLocked, _GitFile
 from dulwich.object_store import (
     PACK_MODE,
     PACKDIR,
+    MissingObjectFinder,
     PackBasedObjectStore,
     read_packs_file,
 )
@@ -37,6 +38,7 @@ from dulwich.pack import (
     PackIndexer,
     PackStreamCopier,
     extend_pack,
+    generate_unpacked_objects,
     iter_sha1,
     load_pack_index_file,
     write_pack_index,
@@ -69,7 +71,7 @@ from ..errors import (
     TransportNotPossible,
 )
 from ..lock import LogicalLockResult
-from ..trace import warning
+from ..trace import mutter, warning
 from ..transport import FileExists, NoSuchFile
 
 
@@ -604,6 +606,8 @@ class TransportObjectStore(PackBasedObjectStore):
         self.transport = transport
         self.pack_transport = self.transport.clone(PACKDIR)
         self._alternates = None
+        self._commit_graph = None
+        self._pack_bitmaps = {}
 
     @classmethod
     def from_config(cls, path, config):
@@ -661,6 +665,172 @@ class TransportObjectStore(PackBasedObjectStore):
                 ret.append(l)
             return ret
 
+    def get_commit_graph(self):
+        """Return the commit-graph of this store, or None if it has none."""
+        if self._commit_graph is None:
+            try:
+                from dulwich.commit_graph import CommitGraph
+            except ImportError:  # dulwich without commit-graph support
+                return None
+            try:
+                f = self.transport.get("info/commit-graph")
+            except NoSuchFile:
+                return None
+            with f:
+                self._commit_graph = CommitGraph.from_file(f)
+        return self._commit_graph
+
+    def write_commit_graph(self, refs, reachable=True):
+        """Write a commit-graph file.
+
+        :param refs: SHA1s of the commits to include
+        :param reachable: Whether to include the commits reachable from refs
+        """
+        from dulwich.commit_graph import generate_commit_graph, get_reachable_commits
+
+        if reachable:
+            refs = get_reachable_commits(self, refs)
+        graph = generate_commit_graph(self, refs)
+        f = BytesIO()
+        graph.write_to_file(f)
+        self.transport.put_bytes("info/commit-graph", f.getvalue())
+        self._commit_graph = None
+
+    def _load_pack_bitmap(self, pack):
+        try:
+            from .packbitmap import PackBitmapIndex
+        except ImportError:  # dulwich without bitmap support
+            return None
+        try:
+            f = self.pack_transport.get(pack._basename + ".bitmap")
+        except NoSuchFile:
+            return None
+        with f:
+            try:
+                return PackBitmapIndex.from_file(pack, f)
+            except (ChecksumMismatch, ValueError) as e:
+                # Like git, carry on without a stale or corrupt bitmap.
+                mutter("Ignoring bitmap of %s: %s", pack._basename, e)
+                return None
+
+    def get_pack_bitmap(self):
+        """Return the bitmap of the pack of this store that has one.
+
+        :return: A PackBitmapIndex, or None if no pack has a bitmap
+        """
+        for pack in self.packs:
+            try:
+                bitmap = self._pack_bitmaps[pack._basename]
+            except KeyError:
+                bitmap = self._load_pack_bitmap(pack)
+                self._pack_bitmaps[pack._basename] = bitmap
+            if bitmap is not None:
+                return bitmap
+        return None
+
+    def write_pack_bitmap(self, heads):
+        """Write a bitmap for the pack of this store.
+
+        git only uses the bitmap of one pack, and only commits whose objects
+        are all in that pack can have a bitmap, so nothing is written unless
+        all objects are in a single pack, as after repack().
+
+        :param heads: SHA1s of the commits at the tips of the refs
+        :return: Whether a bitmap was written
+        """
+        from dulwich.bitmap import write_bitmap_file
+
+        from .packbitmap import generate_pack_bitmap
+
+        packs = list(self.packs)
+        if len(packs) != 1 or any(True for sha in self._iter_loose_objects()):
+            return False
+        [pack] = packs
+        bitmap = generate_pack_bitmap(pack, self, heads)
+        f = BytesIO()
+        write_bitmap_file(f, bitmap)
+        self.pack_transport.put_bytes(
+            pack._basename + ".bitmap", f.getvalue(), mode=PACK_MODE
+        )
+        self._pack_bitmaps.pop(pack._basename, None)
+        return True
+
+    def _find_missing_objects_from_bitmap(self, haves, wants):
+        """Find the objects to send using the pack bitmap.
+
+        :return: Tuple with a list of (sha, pack_hint) tuples and the set of
+            SHA1s of the objects reachable from haves, or None if the bitmap
+            can't answer the query
+        """
+        bitmap = self.get_pack_bitmap()
+        if bitmap is None:
+            return None
+        # Like MissingObjectFinder, ignore haves that are not present.
+        haves = [sha for sha in haves if sha in self]
+        ret = bitmap.missing_objects(haves, wants, self)
+        if ret is None:
+            return None
+        missing, remote_has = ret
+        return [(sha, (type_num, None)) for (sha, type_num) in missing], remote_has
+
+    def find_missing_objects(
+        self,
+        haves,
+        wants,
+        shallow=None,
+        progress=None,
+        get_tagged=None,
+        get_parents=lambda commit: commit.parents,
+    ):
+        """Find the missing objects required for a set of revisions.
+
+        The pack bitmap is used when it covers the objects involved, rather
+        than walking the commits and trees.
+
+        :return: Iterator over (sha, pack_hint) tuples
+        """
+        if not shallow:
+            ret = self._find_missing_objects_from_bitmap(haves, wants)
+            if ret is not None:
+                missing, remote_has = ret
+                tagged = (get_tagged and get_tagged()) or {}
+                shas = {sha for (sha, hint) in missing}
+                for sha in list(shas):
+                    tag = tagged.get(sha)
+                    if tag is not None and tag not in shas and tag not in remote_has:
+                        missing.append((tag, None))
+                        shas.add(tag)
+                return iter(missing)
+        return iter(
+            MissingObjectFinder(
+                self,
+                haves=haves,
+                wants=wants,
+                shallow=shallow,
+                progress=progress,
+                get_tagged=get_tagged,
+                get_parents=get_parents,
+            )
+        )
+
+    def generate_pack_data(
+        self, have, want, *, shallow=None, progress=None, ofs_delta=True
+    ):
+        if not shallow:
+            ret = self._find_missing_objects_from_bitmap(have, want)
+            if ret is not None:
+                missing, remote_has = ret
+                return len(missing), generate_unpacked_objects(
+                    self,
+                    missing,
+                    progress=progress,
+                    ofs_delta=ofs_delta,
+                    other_haves=remote_has,
+                )
+        return super().generate_pack_data(
+            have, want, shallow=shallow, progress=progress, ofs_delta=ofs_delta
+        )
+
     def _update_pack_cache(self):
         pack_files = set(self._pack_names())
         new_packs = []
@@ -681,6 +851,7 @@ class TransportObjectStore(PackBasedObjectStore):
         # Remove disappeared pack files
         for n in set(self._pack_cache) - pack_files:
             self._pack_cache.pop(n).close()
+            self._pack_bitmaps.pop(n, None)
         return new_packs
 
     def _pack_names(self):
@@ -712,10 +883,13 @@ class TransportObjectStore(PackBasedObjectStore):
         return pack_files
 
     def _remove_pack(self, pack):
+        with contextlib.suppress(NoSuchFile):
+            self.pack_transport.delete(pack._basename + ".bitmap")
         self.pack_transport.delete(os.path.basename(pack.index.path))
         self.pack_transport.delete(pack.data.filename)
         with contextlib.suppress(KeyError):
             del self._pack_cache[os.path.basename(pack._basename)]
+        self._pack_bitmaps.pop(pack._basename, None)
 
     def _iter_loose_objects(self):
         for base in self.transport.list_dir("."):
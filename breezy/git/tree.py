@@ -1794,6 +1794,21 @@ class MutableGitIndexTree(mutabletree.MutableTree, GitTree):
     def _live_entry(self, relpath):
         raise NotImplementedError(self._live_entry)
 
+    def _live_entries(self, entries):
+        """Return the live entries of the files of index entries.
+
+        :param entries: List of (path, index_entry) tuples
+        :return: Dictionary mapping paths to live entries, as returned by
+            _live_entry; paths that no longer exist are left out
+        """
+        live_entries = {}
+        for path, _index_entry in entries:
+            try:
+                live_entries[path] = self._live_entry(path)
+            except FileNotFoundError:
+                pass
+        return live_entries
+
     def transform(self, pb=None):
         from .transform import GitTreeTransform
 
@@ -1854,11 +1869,15 @@ def snapshot_workingtree(
     # replaced with non-empty directories if they have contents.
     dirified = []
     trust_executable = target._supports_executable()  # type: ignore
-    for path, index_entry in target._recurse_index_entries():
-        index_entry = getattr(index_entry, "this", index_entry)
+    entries = [
+        (path, getattr(index_entry, "this", index_entry))
+        for path, index_entry in target._recurse_index_entries()
+    ]
+    live_entries = target._live_entries(entries)
+    for path, index_entry in entries:
         try:
-            live_entry = target._live_entry(path)
-        except FileNotFoundError:
+            live_entry = live_entries[path]
+        except KeyError:
             # Entry was removed; keep it listed, but mark it as gone.
             blobs[path] = (ZERO_SHA, 0)
         else:
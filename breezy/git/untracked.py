@@ -0,0 +1,499 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Support for the untracked cache extension of git's index.
+
+The untracked cache ('UNTR' extension) records, for each directory of the
+working tree that has versioned contents, the untracked files and
+directories it contains that are not ignored, along with the stat data of
+the directory and the object id of its .gitignore file. As adding or
+removing an entry changes the mtime of a directory, the listing of a
+directory whose stat data and ignore rules are unchanged can be reused
+without reading the directory.
+
+The listings are those of 'git status' with the default
+status.showUntrackedFiles=normal: untracked directories are listed as a
+whole, with a trailing slash, if they contain untracked files.
+"""
+
+import os
+import platform
+import struct
+
+from dulwich.objects import Blob, hex_to_sha
+
+UNTR_EXTENSION = b"UNTR"
+
+# Flags of the directory listings, as used by git.
+DIR_SHOW_IGNORED = 0x01
+DIR_SHOW_OTHER_DIRECTORIES = 0x02
+DIR_HIDE_EMPTY_DIRECTORIES = 0x04
+
+DEFAULT_DIR_FLAGS = DIR_SHOW_OTHER_DIRECTORIES | DIR_HIDE_EMPTY_DIRECTORIES
+
+NULL_OID = b"\0" * 20
+
+# ctime, mtime (seconds and nanoseconds), dev, ino, uid, gid and size.
+_STAT_DATA = struct.Struct(">9L")
+_NULL_STAT_DATA = (0,) * 9
+
+
+def encode_varint(value):
+    """Encode an integer in the variable width format of git's index."""
+    ret = [value & 0x7F]
+    value >>= 7
+    while value:
+        value -= 1
+        ret.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(ret))
+
+
+def decode_varint(data, offset):
+    """Decode an integer in the variable width format of git's index.
+
+    :return: Tuple with the integer and the offset after it
+    """
+    c = data[offset]
+    offset += 1
+    value = c & 0x7F
+    while c & 0x80:
+        c = data[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (c & 0x7F)
+    return value, offset
+
+
+def read_ewah(data, offset):
+    """Read an EWAH compressed bitmap.
+
+    :return: Tuple with the list of the positions of the set bits and the
+        offset after the bitmap
+    """
+    bit_size, word_count = struct.unpack_from(">LL", data, offset)
+    offset += 8
+    words = struct.unpack_from(">%dQ" % word_count, data, offset)
+    # Skip the words and the position of the last running length word.
+    offset += 8 * word_count + 4
+    positions = []
+    position = 0
+    i = 0
+    while i < word_count:
+        marker = words[i]
+        i += 1
+        running_length = (marker >> 1) & 0xFFFFFFFF
+        if marker & 1:
+            positions.extend(range(position, position + 64 * running_length))
+        position += 64 * running_length
+        for word in words[i : i + (marker >> 33)]:
+            while word:
+                low_bit = word & -word
+                positions.append(position + low_bit.bit_length() - 1)
+                word ^= low_bit
+            position += 64
+        i += marker >> 33
+    return [p for p in positions if p < bit_size], offset
+
+
+def write_ewah(positions, bit_size):
+    """Write an EWAH compressed bitmap.
+
+    The bitmap is written as a single run of literal words, which is valid
+    if not the most compact encoding.
+    """
+    literals = [0] * ((bit_size + 63) // 64)
+    for position in positions:
+        literals[position // 64] |= 1 << (position % 64)
+    words = [len(literals) << 33] + literals
+    return (
+        struct.pack(">LL", bit_size, len(words))
+        + struct.pack(">%dQ" % len(words), *words)
+        + struct.pack(">L", 0)
+    )
+
+
+def stat_data(st):
+    """Return the stat data git records for a stat result."""
+    return (
+        int(st.st_ctime) & 0xFFFFFFFF,
+        st.st_ctime_ns % 1000000000,
+        int(st.st_mtime) & 0xFFFFFFFF,
+        st.st_mtime_ns % 1000000000,
+        st.st_dev & 0xFFFFFFFF,
+        st.st_ino & 0xFFFFFFFF,
+        st.st_uid & 0xFFFFFFFF,
+        st.st_gid & 0xFFFFFFFF,
+        st.st_size & 0xFFFFFFFF,
+    )
+
+
+def exclude_file_oids(path):
+    """Return the object ids git may record for an ignore file.
+
+    Git hashes the contents of ignore files with a newline appended, unless
+    they are empty, but uses the object id of the blob in the index for
+    versioned ignore files that are unchanged.
+
+    :return: List of binary object ids, the one git computes first; empty if
+        the file doesn't exist
+    """
+    try:
+        with open(path, "rb") as f:
+            contents = f.read()
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    blob_oid = hex_to_sha(Blob.from_string(contents).id)
+    if not contents:
+        return [blob_oid]
+    return [hex_to_sha(Blob.from_string(contents + b"\n").id), blob_oid]
+
+
+def get_ident(worktree_path):
+    """Return the identity of the working tree a cache is valid for.
+
+    Git drops caches recorded for another location or system.
+    """
+    return b"Location %s, system %s\0" % (
+        os.fsencode(os.path.realpath(worktree_path)),
+        os.fsencode(platform.system()),
+    )
+
+
+class UntrackedCacheDir:
+    """The cached listing of a directory.
+
+    :ivar name: Name of the directory within its parent
+    :ivar untracked: Names of the untracked entries, with a trailing slash
+        for directories
+    :ivar dirs: Listings of the subdirectories, sorted by name
+    :ivar stat_data: Stat data of the directory when listed, or None if the
+        listing is not valid
+    :ivar exclude_oid: Object id of the .gitignore file of the directory, or
+        None
+    :ivar check_only: Whether the directory was only checked for untracked
+        entries, being untracked itself
+    """
+
+    __slots__ = ("check_only", "dirs", "exclude_oid", "name", "stat_data", "untracked")
+
+    def __init__(self, name, untracked=None, dirs=None):
+        self.name = name
+        self.untracked = [] if untracked is None else untracked
+        self.dirs = [] if dirs is None else dirs
+        self.stat_data = None
+        self.exclude_oid = None
+        self.check_only = False
+
+    def get_dir(self, name):
+        for d in self.dirs:
+            if d.name == name:
+                return d
+        return None
+
+    def invalidate(self):
+        self.stat_data = None
+        self.untracked = []
+        self.check_only = False
+
+    def invalidate_tree(self):
+        """Invalidate the listings of this directory and its subdirectories."""
+        self.invalidate()
+        for d in self.dirs:
+            d.invalidate_tree()
+
+
+class UntrackedCache:
+    """The untracked cache of a git index.
+
+    :ivar ident: Identity of the working tree the cache is valid for
+    :ivar dir_flags: Flags the listings were made with
+    :ivar info_exclude: Stat data and object id of $GIT_DIR/info/exclude
+    :ivar excludes_file: Stat data and object id of core.excludesFile
+    :ivar exclude_per_dir: Name of the per-directory ignore files
+    :ivar root: Listing of the root of the working tree, or None
+    """
+
+    def __init__(
+        self,
+        ident,
+        dir_flags=DEFAULT_DIR_FLAGS,
+        exclude_per_dir=b".gitignore",
+        info_exclude=(_NULL_STAT_DATA, None),
+        excludes_file=(_NULL_STAT_DATA, None),
+        root=None,
+    ):
+        self.ident = ident
+        self.dir_flags = dir_flags
+        self.exclude_per_dir = exclude_per_dir
+        self.info_exclude = info_exclude
+        self.excludes_file = excludes_file
+        self.root = root
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Parse the contents of an UNTR extension."""
+        ident_len, offset = decode_varint(data, 0)
+        ident = data[offset : offset + ident_len]
+        offset += ident_len
+        info_exclude_stat = _STAT_DATA.unpack_from(data, offset)
+        excludes_file_stat = _STAT_DATA.unpack_from(data, offset + 36)
+        (dir_flags,) = struct.unpack_from(">L", data, offset + 72)
+        offset += 76
+        info_exclude_oid = data[offset : offset + 20]
+        excludes_file_oid = data[offset + 20 : offset + 40]
+        offset += 40
+        end = data.index(b"\0", offset)
+        exclude_per_dir = data[offset:end]
+        offset = end + 1
+        ret = cls(
+            ident,
+            dir_flags=dir_flags,
+            exclude_per_dir=exclude_per_dir,
+            info_exclude=(info_exclude_stat, _oid_or_none(info_exclude_oid)),
+            excludes_file=(excludes_file_stat, _oid_or_none(excludes_file_oid)),
+        )
+        if offset >= len(data):
+            return ret
+        dir_count, offset = decode_varint(data, offset)
+        if dir_count == 0:
+            return ret
+        dirs = []
+
+        def read_dir(offset):
+            untracked_count, offset = decode_varint(data, offset)
+            dir_count, offset = decode_varint(data, offset)
+            names = []
+            for _i in range(untracked_count + 1):
+                end = data.index(b"\0", offset)
+                names.append(data[offset:end])
+                offset = end + 1
+            d = UntrackedCacheDir(names[0], names[1:])
+            dirs.append(d)
+            for _i in range(dir_count):
+                child, offset = read_dir(offset)
+                d.dirs.append(child)
+            return d, offset
+
+        ret.root, offset = read_dir(offset)
+        if len(dirs) != dir_count:
+            raise ValueError("inconsistent number of directories in UNTR")
+        valid, offset = read_ewah(data, offset)
+        check_only, offset = read_ewah(data, offset)
+        oid_valid, offset = read_ewah(data, offset)
+        for i in check_only:
+            dirs[i].check_only = True
+        for i in valid:
+            dirs[i].stat_data = _STAT_DATA.unpack_from(data, offset)
+            offset += 36
+        for i in oid_valid:
+            dirs[i].exclude_oid = data[offset : offset + 20]
+            offset += 20
+        return ret
+
+    def to_bytes(self):
+        """Serialize the cache as the contents of an UNTR extension."""
+        chunks = [
+            encode_varint(len(self.ident)),
+            self.ident,
+            _STAT_DATA.pack(*self.info_exclude[0]),
+            _STAT_DATA.pack(*self.excludes_file[0]),
+            struct.pack(">L", self.dir_flags),
+            self.info_exclude[1] or NULL_OID,
+            self.excludes_file[1] or NULL_OID,
+            self.exclude_per_dir + b"\0",
+        ]
+        if self.root is None:
+            chunks.append(encode_varint(0))
+            return b"".join(chunks)
+        dirs = []
+        blocks = []
+
+        def write_dir(d):
+            dirs.append(d)
+            untracked = d.untracked if d.stat_data is not None else []
+            blocks.append(encode_varint(len(untracked)))
+            blocks.append(encode_varint(len(d.dirs)))
+            blocks.append(d.name + b"\0")
+            blocks.extend(name + b"\0" for name in untracked)
+            for child in d.dirs:
+                write_dir(child)
+
+        write_dir(self.root)
+        chunks.append(encode_varint(len(dirs)))
+        chunks.extend(blocks)
+        valid = [i for i, d in enumerate(dirs) if d.stat_data is not None]
+        chunks.append(write_ewah(valid, len(dirs)))
+        chunks.append(
+            write_ewah(
+                [i for i in valid if dirs[i].check_only],
+                len(dirs),
+            )
+        )
+        chunks.append(
+            write_ewah(
+                [i for i, d in enumerate(dirs) if d.exclude_oid is not None],
+                len(dirs),
+            )
+        )
+        chunks.extend(_STAT_DATA.pack(*dirs[i].stat_data) for i in valid)
+        chunks.extend(d.exclude_oid for d in dirs if d.exclude_oid is not None)
+        chunks.append(b"\0")
+        return b"".join(chunks)
+
+    def invalidate_path(self, path):
+        """Invalidate the listings affected by adding or removing a path.
+
+        This is the directory containing the path and, as untracked
+        directories are listed as a whole, all its parents.
+        """
+        d = self.root
+        for name in path.split(b"/")[:-1]:
+            if d is None:
+                return
+            d.invalidate()
+            d = d.get_dir(name)
+        if d is not None:
+            d.invalidate()
+
+    def update_global_excludes(self, info_exclude_path, excludes_file_path):
+        """Invalidate all listings if the global ignore rules changed."""
+        changed = False
+        for attr, path in [
+            ("info_exclude", info_exclude_path),
+            ("excludes_file", excludes_file_path),
+        ]:
+            oids = exclude_file_oids(path) if path is not None else []
+            if not _oid_matches(getattr(self, attr)[1], oids):
+                if oids:
+                    setattr(self, attr, (stat_data(os.stat(path)), oids[0]))
+                else:
+                    setattr(self, attr, (_NULL_STAT_DATA, None))
+                changed = True
+        if changed and self.root is not None:
+            self.root.invalidate_tree()
+
+    def iter_untracked(self, basedir, index_paths, is_ignored, index_mtime_ns=None):
+        """Yield the untracked paths of a working tree.
+
+        The listings that are out of date are updated.
+
+        :param basedir: Path of the working tree, as bytes
+        :param index_paths: Set of the paths in the index
+        :param is_ignored: Function returning whether a path is ignored; the
+            paths of directories end with a slash
+        :param index_mtime_ns: Modification time of the index, listings of
+            directories modified since are not trusted
+        :return: Iterator over paths relative to the working tree, with a
+            trailing slash for directories
+        """
+        tracked_dirs = {b""}
+        for path in index_paths:
+            parts = path.split(b"/")[:-1]
+            for i in range(len(parts), 0, -1):
+                parent = b"/".join(parts[:i])
+                if parent in tracked_dirs:
+                    break
+                tracked_dirs.add(parent)
+        if self.root is None:
+            self.root = UntrackedCacheDir(b"")
+        todo = [(b"", self.root)]
+        while todo:
+            relpath, d = todo.pop()
+            abspath = os.path.join(basedir, relpath) if relpath else basedir
+            oids = exclude_file_oids(os.path.join(abspath, self.exclude_per_dir))
+            if not _oid_matches(d.exclude_oid, oids):
+                # The ignore rules of the subdirectories changed too.
+                d.invalidate_tree()
+                d.exclude_oid = oids[0] if oids else None
+            try:
+                st = os.lstat(abspath)
+            except FileNotFoundError:
+                d.invalidate()
+                continue
+            if (
+                d.stat_data != stat_data(st)
+                or d.check_only
+                or (index_mtime_ns is not None and st.st_mtime_ns >= index_mtime_ns)
+            ):
+                self._list_dir(
+                    d, relpath, abspath, index_paths, tracked_dirs, is_ignored
+                )
+                d.stat_data = stat_data(st)
+            prefix = relpath + b"/" if relpath else b""
+            for name in d.untracked:
+                yield prefix + name
+            for child in d.dirs:
+                if prefix + child.name in tracked_dirs:
+                    todo.append((prefix + child.name, child))
+
+    def _list_dir(self, d, relpath, abspath, index_paths, tracked_dirs, is_ignored):
+        prefix = relpath + b"/" if relpath else b""
+        untracked = []
+        dirs = []
+        for entry in os.scandir(abspath):
+            name = os.fsencode(entry.name)
+            path = prefix + name
+            if name == b".git" or path in index_paths:
+                continue
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir and path in tracked_dirs:
+                child = d.get_dir(name)
+                if child is None or child.check_only:
+                    child = UntrackedCacheDir(name)
+                dirs.append(child)
+            elif is_ignored(os.fsdecode(path + b"/" if is_dir else path)):
+                continue
+            elif not is_dir:
+                untracked.append(name)
+            elif self._has_untracked(path, entry.path, is_ignored):
+                untracked.append(name + b"/")
+        d.untracked = sorted(untracked)
+        d.dirs = sorted(dirs, key=lambda child: child.name)
+        d.check_only = False
+
+    def _has_untracked(self, relpath, abspath, is_ignored):
+        """Check whether an untracked directory contains untracked files."""
+        if self.dir_flags & DIR_HIDE_EMPTY_DIRECTORIES == 0:
+            return True
+        if os.path.lexists(os.path.join(abspath, b".git")):
+            return True
+        todo = [(relpath, abspath)]
+        while todo:
+            relpath, abspath = todo.pop()
+            try:
+                entries = list(os.scandir(abspath))
+            except OSError:
+                continue
+            for entry in entries:
+                path = relpath + b"/" + os.fsencode(entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_ignored(os.fsdecode(path + b"/")):
+                        todo.append((path, entry.path))
+                elif not is_ignored(os.fsdecode(path)):
+                    return True
+        return False
+
+
+def _oid_matches(oid, oids):
+    if oid is None:
+        return not oids
+    return oid in oids
+
+
+def _oid_or_none(oid):
+    if oid == NULL_OID:
+        return None
+    return oid
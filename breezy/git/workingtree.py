@@ -23,18 +23,25 @@ import os
 import posixpath
 import re
 import stat
+import struct
 import sys
+import time
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from dulwich.config import ConfigFile as GitConfigFile
 from dulwich.file import FileLocked, GitFile
-from dulwich.ignore import IgnoreFilterManager
+from dulwich.ignore import IgnoreFilterManager, default_user_ignore_filter_path
 from dulwich.index import (
+    EXTENDED_FLAG_SKIP_WORKTREE,
+    FLAG_VALID,
     ConflictedIndexEntry,
     Index,
     IndexEntry,
+    IndexExtension,
     SHA1Writer,
     build_index_from_tree,
+    cleanup_mode,
     index_entry_from_path,
     index_entry_from_stat,
     read_submodule_head,
@@ -54,12 +61,45 @@ from ..decorators import only_raises
 from ..mutabletree import BadReferenceTarget, MutableTree
 from ..transport.local import file_kind
 from .dir import BareLocalGitControlDirFormat, LocalGitDir
+from .fsmonitor import FSMN_EXTENSION, get_fsmonitor_changes
 from .mapping import decode_git_path, encode_git_path, mode_kind
 from .tree import MutableGitIndexTree
+from .untracked import (
+    DEFAULT_DIR_FLAGS,
+    UNTR_EXTENSION,
+    UntrackedCache,
+    get_ident,
+)
 
 CONFLICT_SUFFIXES = [".BASE", ".OTHER", ".THIS"]
 
 
+# Spellings of booleans in git's configuration.
+_GIT_TRUE = (b"true", b"yes", b"on", b"1")
+_GIT_FALSE = (b"false", b"no", b"off", b"0")
+
+# Files modified less than this many nanoseconds before the index is written
+# may change again without a change of their timestamps.
+_RACY_INTERVAL_NS = 1000000000
+
+
+def _index_time_ns(index_time):
+    if isinstance(index_time, tuple):
+        return index_time[0] * 1000000000 + index_time[1]
+    return int(index_time * 1000000000)
+
+
+def _index_time_matches(index_time, time_ns):
+    """Check whether a time of an index entry matches a stat time."""
+    if isinstance(index_time, tuple):
+        seconds, nanoseconds = index_time
+    else:
+        seconds, nanoseconds = int(index_time), None
+    if seconds & 0xFFFFFFFF != (time_ns // 1000000000) & 0xFFFFFFFF:
+        return False
+    return nanoseconds is None or nanoseconds == time_ns % 1000000000
+
+
 # TODO: There should be a base revid attribute to better inform the user about
 # how the conflicts were generated.
 class TextConflict(_mod_conflicts.Conflict):
@@ -301,8 +341,119 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
         return False
 
     def _read_index(self):
-        self.index = Index(self.control_transport.local_abspath("index"))
+        index_path = self.control_transport.local_abspath("index")
+        self.index = Index(index_path)
         self._index_dirty = False
+        try:
+            self._index_mtime_ns = os.stat(index_path).st_mtime_ns
+        except FileNotFoundError:
+            self._index_mtime_ns = None
+        self._fsmonitor_changes = None
+        self._untracked_cache = None
+        if self._get_index_extension(UNTR_EXTENSION) is not None:
+            # Adding or removing paths invalidates the untracked listings of
+            # their directories.
+            self._untracked_cache_paths = set(self.index.paths())
+        else:
+            self._untracked_cache_paths = None
+
+    def _get_index_extension(self, signature):
+        for extension in self.index._extensions:
+            if extension.signature == signature:
+                return extension
+        return None
+
+    def _get_git_config(self, name):
+        try:
+            return self.repository._git.get_config_stack().get((b"core",), name)
+        except KeyError:
+            return None
+
+    def _get_untracked_cache(self):
+        """Return the untracked cache of the index.
+
+        The cache is used if the index has one, and created if
+        core.untrackedCache is set, as git does.
+
+        :return: An UntrackedCache, or None
+        """
+        if self._untracked_cache is not None:
+            return self._untracked_cache
+        setting = (self._get_git_config(b"untrackedCache") or b"keep").lower()
+        if setting in _GIT_FALSE:
+            return None
+        extension = self._get_index_extension(UNTR_EXTENSION)
+        if extension is None and setting not in _GIT_TRUE:
+            return None
+        ident = get_ident(self.basedir)
+        cache = None
+        if extension is not None:
+            try:
+                cache = UntrackedCache.from_bytes(extension.data)
+            except (ValueError, IndexError, struct.error) as e:
+                trace.mutter("unable to read untracked cache: %s", e)
+            else:
+                if cache.ident != ident or cache.dir_flags != DEFAULT_DIR_FLAGS:
+                    cache = None
+        if cache is None:
+            if setting not in _GIT_TRUE:
+                return None
+            cache = UntrackedCache(ident)
+            self._untracked_cache_paths = set(self.index.paths())
+        self._untracked_cache = cache
+        return cache
+
+    def _index_extensions(self):
+        """Return the extensions to write to the index.
+
+        Only the untracked cache is kept; the other extensions are not
+        updated as the index changes.
+        """
+        if self._untracked_cache_paths is None:
+            return []
+        cache = self._get_untracked_cache()
+        if cache is None:
+            return []
+        self._invalidate_untracked_cache(cache)
+        return [IndexExtension(UNTR_EXTENSION, cache.to_bytes())]
+
+    def _invalidate_untracked_cache(self, cache):
+        """Invalidate the listings of directories with added or removed paths."""
+        index_paths = set(self.index.paths())
+        for path in self._untracked_cache_paths.symmetric_difference(index_paths):
+            cache.invalidate_path(path)
+        self._untracked_cache_paths = index_paths
+
+    def _get_fsmonitor_changes(self):
+        """Return the paths that may have changed according to fsmonitor.
+
+        :return: A FsmonitorChanges object, or None if fsmonitor is not used
+        """
+        if self._fsmonitor_changes is None:
+            self._fsmonitor_changes = False
+            hook = self._get_git_config(b"fsmonitor")
+            extension = self._get_index_extension(FSMN_EXTENSION)
+            # A boolean enables git's builtin daemon, which isn't supported.
+            if (
+                hook
+                and extension is not None
+                and hook.lower() not in _GIT_TRUE + _GIT_FALSE
+            ):
+                version = self._get_git_config(b"fsmonitorHookVersion")
+                try:
+                    changes = get_fsmonitor_changes(
+                        self.index,
+                        extension.data,
+                        hook,
+                        self.basedir,
+                        version=int(version) if version else None,
+                    )
+                except (ValueError, IndexError, struct.error) as e:
+                    trace.mutter("unable to use fsmonitor: %s", e)
+                else:
+                    if changes is not None:
+                        self._fsmonitor_changes = changes
+        return self._fsmonitor_changes or None
 
     def _get_submodule_index(self, relpath):
         if not isinstance(relpath, bytes):
@@ -752,6 +903,35 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
                 yp = os.path.join(dir_relpath, name)
                 yield os.fsdecode(yp)
 
+    def unknowns(self):
+        with self.lock_read():
+            cache = self._get_untracked_cache()
+            if cache is None:
+                return super().unknowns()
+            git = self.repository._git
+            cache.update_global_excludes(
+                os.path.join(git.controldir(), "info", "exclude"),
+                os.path.expanduser(
+                    default_user_ignore_filter_path(git.get_config_stack())
+                ),
+            )
+            ignore_manager = self._get_ignore_manager()
+            self._invalidate_untracked_cache(cache)
+            paths = []
+            for path in cache.iter_untracked(
+                os.fsencode(self.basedir),
+                self._untracked_cache_paths,
+                lambda p: bool(ignore_manager.is_ignored(p)),
+                self._index_mtime_ns,
+            ):
+                path = decode_git_path(path)
+                if not path.endswith("/"):
+                    if not self.mapping.is_special_file(posixpath.basename(path)):
+                        paths.append(path)
+                elif not self._directory_is_tree_reference(path[:-1]):
+                    paths.extend(self._iter_files_recursive(from_dir=path[:-1]))
+            return iter([path for path in paths if not self.is_ignored(path)])
+
     def extras(self):
         """Yield all unversioned files in this WorkingTree."""
         with self.lock_read():
@@ -787,8 +967,9 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
 
     def _flush(self, f):
         try:
+            self._smudge_racy_entries()
             shaf = SHA1Writer(f)
-            write_index_dict(shaf, self.index)
+            write_index_dict(shaf, self.index, extensions=self._index_extensions())
             shaf.close()
         except BaseException:
             f.abort()
@@ -909,6 +1090,103 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
         encoded_path = os.fsencode(self.abspath(decode_git_path(path)))
         return index_entry_from_path(encoded_path)
 
+    def _index_entry_is_current(self, path, index_entry):
+        """Check whether an index entry is known to match the file on disk.
+
+        This is the case for entries git is told to assume unchanged or
+        to skip, entries fsmonitor knows are unchanged, and entries with
+        the stat data of the file, unless the file changed shortly before
+        the index was written and could have been modified since without
+        changing its stat data.
+        """
+        if index_entry.flags & FLAG_VALID or (
+            index_entry.extended_flags & EXTENDED_FLAG_SKIP_WORKTREE
+        ):
+            return True
+        fsmonitor_changes = self._get_fsmonitor_changes()
+        if fsmonitor_changes is not None and path not in fsmonitor_changes:
+            return True
+        if self._index_mtime_ns is None:
+            return False
+        try:
+            st = os.lstat(self.abspath(decode_git_path(path)))
+        except OSError:
+            return False
+        if st.st_mtime_ns >= self._index_mtime_ns:
+            return False
+        return self._stat_matches_index_entry(st, index_entry)
+
+    def _stat_matches_index_entry(self, st, index_entry):
+        """Check whether the stat data of a file matches an index entry."""
+        if self._supports_executable():
+            if cleanup_mode(st.st_mode) != index_entry.mode:
+                return False
+        elif stat.S_IFMT(st.st_mode) != stat.S_IFMT(index_entry.mode):
+            return False
+        return (
+            (st.st_size & 0xFFFFFFFF) == (index_entry.size & 0xFFFFFFFF)
+            and (st.st_ino & 0xFFFFFFFF) == (index_entry.ino & 0xFFFFFFFF)
+            and _index_time_matches(index_entry.mtime, st.st_mtime_ns)
+            and _index_time_matches(index_entry.ctime, st.st_ctime_ns)
+        )
+
+    def _smudge_racy_entries(self):
+        """Make sure racily clean entries of changed files are not trusted.
+
+        Files modified shortly before the index is written could be modified
+        again without a change of their stat data. As git does, the entries
+        of such files whose contents differ from the index are given a ctime
+        that no file has. Later writes of the index would otherwise hide
+        that they are changed. Entries whose contents match are left alone,
+        so that they are trusted again once the index is newer than them.
+        """
+        racy_ns = time.time_ns() - _RACY_INTERVAL_NS
+        for path, value in self.index.items():
+            if isinstance(value, ConflictedIndexEntry):
+                entries = [value.ancestor, value.this, value.other]
+            else:
+                entries = [value]
+            for entry in entries:
+                if entry is None or _index_time_ns(entry.mtime) < racy_ns:
+                    continue
+                try:
+                    st = os.lstat(self.abspath(decode_git_path(path)))
+                except OSError:
+                    continue
+                if not self._stat_matches_index_entry(st, entry):
+                    # Not trusted anyway.
+                    continue
+                try:
+                    live_entry = self._live_entry(path)
+                except OSError:
+                    live_entry = None
+                if live_entry is None or live_entry.sha != entry.sha:
+                    entry.ctime = (0, 0)
+
+    def _live_entries(self, entries):
+        live_entries = {}
+        stale = []
+        for path, index_entry in entries:
+            if self._index_entry_is_current(path, index_entry):
+                live_entries[path] = index_entry
+            else:
+                stale.append(path)
+
+        def live_entry(path):
+            try:
+                return path, self._live_entry(path)
+            except FileNotFoundError:
+                return None
+
+        workers = self.get_config_stack().get("git.hash_workers")
+        if workers > 1 and len(stale) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(live_entry, stale))
+        else:
+            results = map(live_entry, stale)
+        live_entries.update(result for result in results if result is not None)
+        return live_entries
+
     def is_executable(self, path):
         with self.lock_read():
             if self._supports_executable():
@@ -15,11 +15,7 @@
 
 """A manager of caches."""
 
-import atexit
-import os
-import shutil
 import tempfile
-import weakref
 
 from fastimport.reftracker import RefTracker
 
@@ -28,6 +24,82 @@ from . import branch_mapper
 from .helpers import single_plural
 
 
+class _DiskBlobStore:
+    """Blobs stored in a single temporary file, indexed by id.
+
+    The file is anonymous, so it goes away with the process however that
+    ends. The space of removed blobs is reclaimed by copying the remaining
+    blobs to a new file, once it makes up most of the file.
+    """
+
+    # Removed blobs use at least this many bytes before the file is compacted
+    compact_threshold = 64 * 1024 * 1024
+
+    def __init__(self):
+        self._file = None
+        # id => (offset, n_bytes)
+        self._index = {}
+        self._end = 0
+        # The bytes of the file used by blobs that have been removed
+        self._dead_bytes = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, id):
+        return id in self._index
+
+    def __getitem__(self, id):
+        (offset, n_bytes) = self._index[id]
+        self._file.seek(offset)
+        return self._file.read(n_bytes)
+
+    def __setitem__(self, id, data):
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix="fastimport-blobs-")
+        self._file.seek(self._end)
+        self._file.write(data)
+        self._index[id] = (self._end, len(data))
+        self._end += len(data)
+
+    def __delitem__(self, id):
+        (_offset, n_bytes) = self._index.pop(id)
+        self._dead_bytes += n_bytes
+        if not self._index:
+            self._file.truncate(0)
+            self._end = 0
+            self._dead_bytes = 0
+        elif (
+            self._dead_bytes >= self.compact_threshold
+            and 2 * self._dead_bytes >= self._end
+        ):
+            self._compact()
+
+    def _compact(self):
+        """Copy the remaining blobs to a new file, dropping the old one."""
+        old_file = self._file
+        self._file = tempfile.TemporaryFile(prefix="fastimport-blobs-")
+        index = {}
+        end = 0
+        for id, (offset, n_bytes) in sorted(
+            self._index.items(), key=lambda item: item[1]
+        ):
+            old_file.seek(offset)
+            self._file.write(old_file.read(n_bytes))
+            index[id] = (end, n_bytes)
+            end += n_bytes
+        old_file.close()
+        self._index = index
+        self._end = end
+        self._dead_bytes = 0
+
+    def close(self):
+        self._index.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 class _Cleanup:
     """This class makes sure we clean up when CacheManager goes away.
 
@@ -36,27 +108,17 @@ class _Cleanup:
 
     def __init__(self, disk_blobs):
         self.disk_blobs = disk_blobs
-        self.tempdir = None
-        self.small_blobs = None
 
     def __del__(self):
         self.finalize()
 
     def finalize(self):
         if self.disk_blobs is not None:
-            for info in self.disk_blobs.values():
-                if info[-1] is not None:
-                    os.unlink(info[-1])
+            self.disk_blobs.close()
             self.disk_blobs = None
-        if self.small_blobs is not None:
-            self.small_blobs.close()
-            self.small_blobs = None
-        if self.tempdir is not None:
-            shutil.rmtree(self.tempdir)
 
 
 class CacheManager:
-    _small_blob_threshold = 25 * 1024
     _sticky_cache_size = 300 * 1024 * 1024
     _sticky_flushed_size = 100 * 1024 * 1024
 
@@ -75,11 +137,8 @@ class CacheManager:
         self._sticky_blobs = {}
         self._sticky_memory_bytes = 0
         # if we overflow our memory cache, then we will dump large blobs to
-        # disk in this directory
-        self._tempdir = None
-        # id => (offset, n_bytes, fname)
-        #   if fname is None, then the content is stored in the small file
-        self._disk_blobs = {}
+        # a file on disk
+        self._disk_blobs = _DiskBlobStore()
         self._cleanup = _Cleanup(self._disk_blobs)
 
         # revision-id -> Inventory cache
@@ -178,51 +237,20 @@ class CacheManager:
         sticky_blobs = self._sticky_blobs
         total_blobs = len(sticky_blobs)
         blobs.sort(key=lambda k: len(sticky_blobs[k]))
-        if self._tempdir is None:
-            tempdir = tempfile.mkdtemp(prefix="fastimport_blobs-")
-            self._tempdir = tempdir
-            self._cleanup.tempdir = self._tempdir
-            self._cleanup.small_blobs = tempfile.TemporaryFile(
-                prefix="small-blobs-", dir=self._tempdir
-            )
-            small_blob_ref = weakref.ref(self._cleanup.small_blobs)
-            # Even though we add it to _Cleanup it seems that the object can be
-            # destroyed 'too late' for cleanup to actually occur. Probably a
-            # combination of bzr's "die directly, don't clean up" and how
-            # exceptions close the running stack.
-
-            def exit_cleanup():
-                small_blob = small_blob_ref()
-                if small_blob is not None:
-                    small_blob.close()
-                shutil.rmtree(tempdir, ignore_errors=True)
-
-            atexit.register(exit_cleanup)
         count = 0
         bytes = 0
-        n_small_bytes = 0
         while self._sticky_memory_bytes > self._sticky_flushed_size:
             id = blobs.pop()
             blob = self._sticky_blobs.pop(id)
             n_bytes = len(blob)
             self._sticky_memory_bytes -= n_bytes
-            if n_bytes < self._small_blob_threshold:
-                f = self._cleanup.small_blobs
-                f.seek(0, os.SEEK_END)
-                self._disk_blobs[id] = (f.tell(), n_bytes, None)
-                f.write(blob)
-                n_small_bytes += n_bytes
-            else:
-                fd, name = tempfile.mkstemp(prefix="blob-", dir=self._tempdir)
-                os.write(fd, blob)
-                os.close(fd)
-                self._disk_blobs[id] = (0, n_bytes, name)
+            self._disk_blobs[id] = blob
             bytes += n_bytes
             del blob
             count += 1
         trace.note(
-            "flushed %d/%d blobs w/ %.1fMB (%.1fMB small) to disk"
-            % (count, total_blobs, bytes / 1024.0 / 1024, n_small_bytes / 1024.0 / 1024)
+            "flushed %d/%d blobs w/ %.1fMB to disk"
+            % (count, total_blobs, bytes / 1024.0 / 1024)
         )
 
     def store_blob(self, id, data):
@@ -239,7 +267,7 @@ class CacheManager:
         else:
             self._blobs[id] = data
 
-    def _decref(self, id, cache, fn):
+    def _decref(self, id, cache):
         if not self._blob_ref_counts:
             return False
         count = self._blob_ref_counts.get(id, None)
@@ -247,8 +275,6 @@ class CacheManager:
             count -= 1
             if count <= 0:
                 del cache[id]
-                if fn is not None:
-                    os.unlink(fn)
                 del self._blob_ref_counts[id]
                 return True
             else:
@@ -260,17 +286,10 @@ class CacheManager:
         if id in self._blobs:
             return self._blobs.pop(id)
         if id in self._disk_blobs:
-            (offset, n_bytes, fn) = self._disk_blobs[id]
-            if fn is None:
-                f = self._cleanup.small_blobs
-                f.seek(offset)
-                content = f.read(n_bytes)
-            else:
-                with open(fn, "rb") as fp:
-                    content = fp.read()
-            self._decref(id, self._disk_blobs, fn)
+            content = self._disk_blobs[id]
+            self._decref(id, self._disk_blobs)
             return content
         content = self._sticky_blobs[id]
-        if self._decref(id, self._sticky_blobs, None):
+        if self._decref(id, self._sticky_blobs):
             self._sticky_memory_bytes -= len(content)
         return content
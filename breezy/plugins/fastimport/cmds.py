@@ -465,6 +465,13 @@ class cmd_fast_export(Command):
        bzr fast-export --import-marks=marks.bzr -b other project.other |
               GIT_DIR=project/.git git-fast-import --import-marks=marks.git
 
+     To mirror a branch nightly, keep the marks between runs. Only the
+     revisions without a mark are then read and exported, and the new
+     marks are appended to the marks file::
+
+       bzr fast-export --plain --marks=marks.bzr project.dev |
+              GIT_DIR=project/.git git-fast-import --import-marks-if-exists=marks.git --export-marks=marks.git
+
      If you get a "Missing space after source" error from git-fast-import,
      see the top of the commands.py module for a work-around.
 
@@ -516,6 +523,13 @@ class cmd_fast_export(Command):
             "the first relative commit",
         ),
         Option("no-tags", help="Don't export tags"),
+        Option(
+            "workers",
+            type=int,
+            argname="N",
+            help="Compress a .gz destination with N threads and write the "
+            "stream from another thread (default=0).",
+        ),
     ]
     encoding_type = "exact"
 
@@ -534,6 +548,7 @@ class cmd_fast_export(Command):
         rewrite_tag_names=False,
         no_tags=False,
         baseline=False,
+        workers=0,
     ):
         load_fastimport()
         from ...branch import Branch
@@ -546,7 +561,7 @@ class cmd_fast_export(Command):
         if source is None:
             source = "."
         branch = Branch.open_containing(source)[0]
-        outf = exporter._get_output_stream(destination)
+        outf = exporter._get_output_stream(destination, workers=workers)
         exporter = exporter.BzrFastExporter(
             branch,
             outf=outf,
@@ -43,16 +43,19 @@
 # is not updated (because the parent of commit is already merged, so we don't
 # set new_git_branch to the previously used name)
 
+import collections
 import contextlib
+import gzip
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from email.utils import parseaddr
 
 import breezy.branch
 import breezy.revision
 
-from ... import builtins, lazy_import, lru_cache, osutils, progress, trace
+from ... import builtins, lazy_import, lru_cache, osutils, progress, trace, tsort
 from ... import transport as _mod_transport
 from . import helpers, marks_file
 
@@ -66,15 +69,81 @@ from fastimport import commands
 REVISIONS_CHUNK_SIZE = 1000
 
 
-def _get_output_stream(destination):
+class _ThreadedOutputStream:
+    """Output stream compressing and writing the data from other threads.
+
+    The data is gathered in blocks. When compressing, each block is
+    compressed as a separate gzip member by a pool of threads, as zlib
+    releases the GIL while compressing; readers decompress the members of a
+    gzip file as one stream. The blocks are written out in order by one more
+    thread, so that the export goes on while the output is slow to drain.
+    """
+
+    block_size = 1024 * 1024
+
+    def __init__(self, outf, workers, compress=False):
+        self._outf = outf
+        self._max_pending = 2 * workers
+        if compress:
+            self._compressor = ThreadPoolExecutor(workers)
+        else:
+            self._compressor = None
+        self._writer = ThreadPoolExecutor(1)
+        self._pending = collections.deque()
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.block_size:
+            self._submit()
+
+    def _submit(self):
+        block = b"".join(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        if self._compressor is not None:
+            block = self._compressor.submit(gzip.compress, block)
+        self._pending.append(self._writer.submit(self._write_block, block))
+        # Bound the memory used by the blocks waiting to be written.
+        while len(self._pending) > self._max_pending:
+            self._pending.popleft().result()
+
+    def _write_block(self, block):
+        if not isinstance(block, bytes):
+            block = block.result()
+        self._outf.write(block)
+
+    def flush(self):
+        if self._buffer:
+            self._submit()
+        while self._pending:
+            self._pending.popleft().result()
+        self._outf.flush()
+
+
+def _get_output_stream(destination, workers=0):
+    """Open the stream to write the fast-import data to.
+
+    :param destination: name of the file to write, '-' or None for standard
+        output; data written to a '.gz' file is compressed
+    :param workers: if greater than zero, the number of threads compressing
+        the data; the data is then also written out from another thread
+    """
+    compress = False
     if destination is None or destination == "-":
-        return helpers.binary_stream(getattr(sys.stdout, "buffer", sys.stdout))
+        outf = helpers.binary_stream(getattr(sys.stdout, "buffer", sys.stdout))
     elif destination.endswith(".gz"):
-        import gzip
-
-        return gzip.open(destination, "wb")
+        if not workers:
+            return gzip.open(destination, "wb")
+        outf = open(destination, "wb")
+        compress = True
     else:
-        return open(destination, "wb")
+        outf = open(destination, "wb")
+    if workers:
+        return _ThreadedOutputStream(outf, workers, compress=compress)
+    return outf
 
 
 # from dulwich.repo:
@@ -200,14 +269,22 @@ class BzrFastExporter:
             self.progress_every = 1000
         self._start_time = time.time()
         self._commit_total = 0
+        self._commit_count = 0
 
         # Load the marks and initialise things accordingly
         self.revid_to_mark = {}
         self.branch_names = {}
+        # Revisions written out since the marks were last saved, and whether
+        # the marks file has the other marks, so that they can be appended
+        self._unsaved_revids = []
+        self._marks_saved = False
+        # Revisions given a mark that haven't been written out yet
+        self._unemitted_revids = set()
         if self.import_marks_file:
             marks_info = marks_file.import_marks(self.import_marks_file)
             if marks_info is not None:
                 self.revid_to_mark = {r: m for m, r in marks_info.items()}
+                self._marks_saved = self.import_marks_file == self.export_marks_file
                 # These are no longer included in the marks file
                 # self.branch_names = marks_info[1]
 
@@ -218,6 +295,8 @@ class BzrFastExporter:
             )
             start_rev_id = rev1.rev_id
             end_rev_id = rev2.rev_id
+        elif self.revid_to_mark and not self.baseline:
+            return self._unmarked_history()
         else:
             start_rev_id = None
             end_rev_id = None
@@ -246,24 +325,56 @@ class BzrFastExporter:
                 view_revisions.insert(0, start_rev_id)
         return list(view_revisions)
 
+    def _unmarked_history(self):
+        """List the revisions of the branch without a mark, parents first.
+
+        The walk stops at the revisions with a mark, so that resuming from
+        the marks of an earlier export only reads the new revisions.
+        """
+        self.note("Calculating the revisions without marks ...")
+        graph = self.branch.repository.get_graph()
+        parent_map = {}
+        todo = {self.branch.last_revision()}
+        while todo:
+            todo = {
+                revid
+                for revid in todo
+                if revid != breezy.revision.NULL_REVISION
+                and revid not in self.revid_to_mark
+                and revid not in parent_map
+            }
+            new_parents = graph.get_parent_map(todo)
+            parent_map.update(new_parents)
+            todo = set()
+            for parents in new_parents.values():
+                todo.update(parents)
+        return list(tsort.TopoSorter(parent_map).iter_topo_order())
+
     def emit_commits(self, interesting):
         if self.baseline:
             revobj = self.branch.repository.get_revision(interesting.pop(0))
             self.emit_baseline(revobj, self.ref)
         for i in range(0, len(interesting), REVISIONS_CHUNK_SIZE):
-            chunk = interesting[i : i + REVISIONS_CHUNK_SIZE]
+            chunk = [
+                revid
+                for revid in interesting[i : i + REVISIONS_CHUNK_SIZE]
+                if not self.revid_to_mark.get(revid)
+                and revid not in self.excluded_revisions
+            ]
             history = dict(self.branch.repository.iter_revisions(chunk))
             trees_needed = set()
             trees = {}
+            to_emit = []
             for revid in chunk:
-                trees_needed.update(
-                    self.preprocess_commit(revid, history[revid], self.ref)
-                )
+                needed = self.preprocess_commit(revid, history[revid], self.ref)
+                if needed:
+                    trees_needed.update(needed)
+                    to_emit.append(revid)
 
             for tree in self._get_revision_trees(trees_needed):
                 trees[tree.get_revision_id()] = tree
 
-            for revid in chunk:
+            for revid in to_emit:
                 revobj = history[revid]
                 if len(revobj.parent_ids) == 0:
                     parent = breezy.revision.NULL_REVISION
@@ -282,6 +393,7 @@ class BzrFastExporter:
             self.emit_commits(interesting)
             if self.branch.supports_tags() and not self.no_tags:
                 self.emit_tags()
+        self.outf.flush()
 
         # Save the marks if requested
         self._save_marks()
@@ -331,8 +443,22 @@ class BzrFastExporter:
 
     def _save_marks(self):
         if self.export_marks_file:
-            revision_ids = {m: r for r, m in self.revid_to_mark.items()}
-            marks_file.export_marks(self.export_marks_file, revision_ids)
+            # Only save marks for commits that have been written out.
+            self.outf.flush()
+            if self._marks_saved:
+                revision_ids = {self.revid_to_mark[r]: r for r in self._unsaved_revids}
+                marks_file.export_marks(
+                    self.export_marks_file, revision_ids, append=True
+                )
+            else:
+                revision_ids = {
+                    m: r
+                    for r, m in self.revid_to_mark.items()
+                    if m is not None and r not in self._unemitted_revids
+                }
+                marks_file.export_marks(self.export_marks_file, revision_ids)
+                self._marks_saved = True
+            self._unsaved_revids = []
 
     def is_empty_dir(self, tree, path):
         # Continue if path is not a directory
@@ -360,6 +486,7 @@ class BzrFastExporter:
         file_cmds = self._get_filecommands(tree_old, tree_new)
         self.print_cmd(commands.ResetCommand(ref, None))
         self.print_cmd(self._get_commit_command(ref, mark, revobj, file_cmds))
+        self._unsaved_revids.append(revobj.revision_id)
 
     def preprocess_commit(self, revid, revobj, ref):
         if self.revid_to_mark.get(revid) or revid in self.excluded_revisions:
@@ -380,6 +507,7 @@ class BzrFastExporter:
 
         # Print the commit
         self.revid_to_mark[revobj.revision_id] = b"%d" % (len(self.revid_to_mark) + 1)
+        self._unemitted_revids.add(revobj.revision_id)
         return [parent, revobj.revision_id]
 
     def emit_commit(self, revobj, ref, tree_old, tree_new):
@@ -391,9 +519,12 @@ class BzrFastExporter:
         file_cmds = self._get_filecommands(tree_old, tree_new)
         mark = self.revid_to_mark[revobj.revision_id]
         self.print_cmd(self._get_commit_command(ref, mark, revobj, file_cmds))
+        self._unemitted_revids.discard(revobj.revision_id)
+        self._unsaved_revids.append(revobj.revision_id)
 
         # Report progress and checkpoint if it's time for that
-        ncommits = len(self.revid_to_mark)
+        self._commit_count += 1
+        ncommits = self._commit_count
         self.report_progress(ncommits)
         if (
             self.checkpoint is not None
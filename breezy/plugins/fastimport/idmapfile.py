@@ -18,7 +18,7 @@
 import os
 
 
-def save_id_map(filename, revision_ids):
+def save_id_map(filename, revision_ids, append=False):
     """Save the mapping of commit ids to revision ids to a file.
 
     Throws the usual exceptions if the file cannot be opened,
@@ -26,8 +26,10 @@ def save_id_map(filename, revision_ids):
 
     :param filename: name of the file to save the data to
     :param revision_ids: a dictionary of commit ids to revision ids.
+    :param append: if True, add the entries to the end of the file rather
+        than replacing its contents
     """
-    with open(filename, "wb") as f:
+    with open(filename, "ab" if append else "wb") as f:
         for commit_id in revision_ids:
             f.write(b"%s %s\n" % (commit_id, revision_ids[commit_id]))
 
@@ -40,6 +42,7 @@ def load_id_map(filename):
     the normal exceptions are thrown.
 
     NOTE: It is assumed that commit-ids do not have embedded spaces.
+    Entries appended later replace earlier ones for the same commit id.
 
     :param filename: name of the file to save the data to
     :result: map, count where:
@@ -49,9 +52,10 @@ def load_id_map(filename):
     result = {}
     count = 0
     if os.path.exists(filename):
-        with open(filename) as f:
+        with open(filename, "rb") as f:
             for line in f:
-                parts = line[:-1].split(" ", 1)
+                parts = line[:-1].split(b" ", 1)
+                if parts[0] not in result:
+                    count += 1
                 result[parts[0]] = parts[1]
-                count += 1
     return result, count
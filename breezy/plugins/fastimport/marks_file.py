@@ -59,14 +59,17 @@ def import_marks(filename):
     return revision_ids
 
 
-def export_marks(filename, revision_ids):
+def export_marks(filename, revision_ids, append=False):
     """Save marks to a file.
 
     :param filename: filename to save data to
     :param revision_ids: dictionary mapping marks -> bzr revision-ids
+    :param append: if True, add the marks to the end of the file rather
+        than replacing its contents; later lines take precedence when the
+        file is read back
     """
     try:
-        f = open(filename, "wb")
+        f = open(filename, "ab" if append else "wb")
     except OSError:
         warning("Could not open export-marks file %s - not exporting marks", filename)
         return
@@ -66,6 +66,8 @@ class GenericProcessor(processor.ImportProcessor):
     or is interrupted, it can be started again and this file will be
     used to skip over already loaded revisions. The format of each line
     is "commit-id revision-id" so commit-ids cannot include spaces.
+    Once the file holds all known commit-ids, the commits imported since
+    the last checkpoint are appended to it rather than rewriting it.
 
     Here are the supported parameters:
 
@@ -95,7 +97,9 @@ class GenericProcessor(processor.ImportProcessor):
 
     * import-marks - name of file to read to load mark information from
 
-    * export-marks - name of file to write to save mark information to
+    * export-marks - name of file to write to save mark information to.
+      If this is the file marks were imported from, only the marks of the
+      commits imported are appended to it.
     """
 
     known_params = [
@@ -137,10 +141,16 @@ class GenericProcessor(processor.ImportProcessor):
             self.info, self.verbose, self.inventory_cache_size
         )
 
+        # Marks added by this import, in order, and how many of them the
+        # id-map file has; None until the file has all the other marks.
+        self._new_marks = []
+        self._id_map_saved = None
+        self._marks_imported = False
         if self.params.get("import-marks") is not None:
             mark_info = marks_file.import_marks(self.params.get("import-marks"))
             if mark_info is not None:
                 self.cache_mgr.marks = mark_info
+                self._marks_imported = True
             self.skip_total = False
             self.first_incremental_commit = True
         else:
@@ -288,10 +298,14 @@ class GenericProcessor(processor.ImportProcessor):
         self.repo.commit_write_group()
         self._save_id_map()
 
-        if self.params.get("export-marks") is not None:
-            marks_file.export_marks(
-                self.params.get("export-marks"), self.cache_mgr.marks
-            )
+        export_marks = self.params.get("export-marks")
+        if export_marks is not None:
+            if self._marks_imported and export_marks == self.params.get("import-marks"):
+                marks_file.export_marks(
+                    export_marks, self._get_new_marks(0), append=True
+                )
+            else:
+                marks_file.export_marks(export_marks, self.cache_mgr.marks)
 
         if self.cache_mgr.reftracker.last_ref is None:
             """Nothing to refresh"""
@@ -444,18 +458,33 @@ class GenericProcessor(processor.ImportProcessor):
         # are identical as well.
         self.cache_mgr.marks, known = idmapfile.load_id_map(self.id_map_path)
         if self.cache_mgr.add_mark(b"0", _mod_revision.NULL_REVISION):
-            known += 1
+            # The null revision is not a commit of the stream.
+            known -= 1
+        else:
+            self._new_marks.append(b"0")
+        self._id_map_saved = 0
 
         existing_count = len(self.repo.all_revision_ids())
         if existing_count < known:
             raise plugin_errors.BadRepositorySize(known, existing_count)
         return known
 
+    def _get_new_marks(self, start):
+        """Return the marks added by this import after the first start ones."""
+        marks = self.cache_mgr.marks
+        return {mark: marks[mark] for mark in self._new_marks[start:]}
+
     def _save_id_map(self):
         """Save the id-map."""
-        # Save the whole lot every time. If this proves a problem, we can
-        # change to 'append just the new ones' at a later time.
-        idmapfile.save_id_map(self.id_map_path, self.cache_mgr.marks)
+        if self._id_map_saved is None:
+            idmapfile.save_id_map(self.id_map_path, self.cache_mgr.marks)
+        else:
+            idmapfile.save_id_map(
+                self.id_map_path,
+                self._get_new_marks(self._id_map_saved),
+                append=True,
+            )
+        self._id_map_saved = len(self._new_marks)
 
     def blob_handler(self, cmd):
         """Process a BlobCommand."""
@@ -506,6 +535,7 @@ class GenericProcessor(processor.ImportProcessor):
             print(f"ABORT: exception occurred processing commit {cmd.id}")
             raise
         self.cache_mgr.add_mark(mark, handler.revision_id)
+        self._new_marks.append(mark)
         self._revision_count += 1
         self.report_progress(f"({cmd.id.lstrip(b':')})")
 
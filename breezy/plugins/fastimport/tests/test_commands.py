@@ -235,6 +235,20 @@ class TestFastExport(ExternalBase):
         data2 = self.run_bzr("fast-export bl")[0]
         self.assertEqual(data1, data2)
 
+    def test_marks_incremental(self):
+        tree = self.make_branch_and_tree("br")
+        tree.commit("first")
+        data = self.run_bzr("fast-export --marks=marks br")[0]
+        self.assertIn("mark :1\n", data)
+        tree.commit("second")
+        data = self.run_bzr("fast-export --marks=marks br")[0]
+        # Only the new revision is exported, on top of the one with a mark.
+        self.assertNotIn("mark :1\n", data)
+        self.assertIn("mark :2\n", data)
+        self.assertIn("from :1\n", data)
+        with open("marks", "rb") as f:
+            self.assertEqual(2, len(f.readlines()))
+
 
 simple_fast_import_stream = b"""commit refs/heads/master
 mark :1
@@ -259,6 +273,35 @@ class TestFastImport(ExternalBase):
         self.run_bzr("fast-import file.fi br")[0]
         self.assertEqual(1, tree.branch.revno())
 
+    def test_restart(self):
+        tree = self.make_branch_and_tree("br")
+        self.build_tree_contents(
+            [
+                ("file.fi", simple_fast_import_stream),
+                (
+                    "more.fi",
+                    simple_fast_import_stream
+                    + b"""commit refs/heads/master
+mark :2
+committer Jelmer Vernooij <jelmer@samba.org> 1299718136 +0100
+data 6
+second
+from :1
+
+""",
+                ),
+            ]
+        )
+        self.run_bzr("fast-import file.fi br")
+        # The commits already imported are skipped, using the id map.
+        self.run_bzr("fast-import more.fi br")
+        self.assertEqual(2, tree.branch.revno())
+        id_map_path = tree.branch.repository.control_transport.local_abspath(
+            "fastimport-id-map"
+        )
+        with open(id_map_path, "rb") as f:
+            self.assertEqual([b"0", b"1", b"2"], [line.split(b" ", 1)[0] for line in f])
+
     def test_missing_bytes(self):
         self.build_tree_contents(
             [
@@ -18,9 +18,15 @@
 import gzip
 import os
 import tempfile
+from io import BytesIO
 
 from .... import tests
-from ..exporter import _get_output_stream, check_ref_format, sanitize_ref_name_for_git
+from ..exporter import (
+    BzrFastExporter,
+    _get_output_stream,
+    check_ref_format,
+    sanitize_ref_name_for_git,
+)
 from . import FastimportFeature
 
 
@@ -49,6 +55,47 @@ class TestOutputStream(tests.TestCase):
         with open(filename) as f:
             self.assertEqual("foo", f.read())
 
+    def test_get_source_gz_workers(self):
+        fd, filename = tempfile.mkstemp(suffix=".gz")
+        os.close(fd)
+        stream = _get_output_stream(filename, workers=2)
+        stream.block_size = 4
+        for data in [b"bla", b"bla", b"bla"]:
+            stream.write(data)
+        stream.flush()
+        # Blocks are compressed as separate members, read as one stream.
+        with gzip.GzipFile(filename) as f:
+            self.assertEqual(b"blablabla", f.read())
+
+
+class _Interrupted(Exception):
+    pass
+
+
+class TestBzrFastExporter(tests.TestCaseWithTransport):
+    _test_needs_features = [FastimportFeature]
+
+    def test_checkpoint_saves_written_marks(self):
+        tree = self.make_branch_and_tree("br")
+        for message in ["one", "two", "three"]:
+            tree.commit(message)
+        exporter = BzrFastExporter(
+            tree.branch, BytesIO(), checkpoint=2, export_marks_file="marks"
+        )
+        emit_commit = exporter.emit_commit
+
+        def interrupting_emit_commit(*args):
+            emit_commit(*args)
+            if exporter._commit_count == 2:
+                raise _Interrupted()
+
+        exporter.emit_commit = interrupting_emit_commit
+        self.assertRaises(_Interrupted, exporter.run)
+        # The third revision was given a mark when its chunk was prepared, but
+        # the export stopped before it was written out.
+        with open("marks", "rb") as f:
+            self.assertEqual([b":1", b":2"], [line.split()[0] for line in f])
+
 
 # from dulwich.tests.test_repository:
 class CheckRefFormatTests(tests.TestCase):
@@ -55,3 +55,19 @@ class TestMarksFile(tests.TestCaseWithTransport):
 """,
             "marks",
         )
+
+    def test_append(self):
+        marks_file.export_marks("marks", {b"1": b"jelmer@jelmer-rev1"})
+        marks_file.export_marks(
+            "marks",
+            {b"1": b"jelmer@jelmer-rev1b", b"2": b"joe@example.com-rev2"},
+            append=True,
+        )
+        # Marks appended later take precedence.
+        self.assertEqual(
+            {
+                b"1": b"jelmer@jelmer-rev1b",
+                b"2": b"joe@example.com-rev2",
+            },
+            marks_file.import_marks("marks"),
+        )
@@ -71,6 +71,7 @@ class TestingDAVRequestHandler(http_server.TestingHTTPRequestHandler):
         """Read the body either by chunk or as a whole."""
         content_length = self.headers.get("Content-Length")
         encoding = self.headers.get("Transfer-Encoding")
+        body = b""
         if encoding is not None:
             if encoding != "chunked":
                 raise AssertionError("Unsupported transfer encoding: {}".format(encoding))
@@ -81,7 +82,7 @@ class TestingDAVRequestHandler(http_server.TestingHTTPRequestHandler):
                 if length == 0:
                     break
                 body.append(data)
-            body = "".join(body)
+            body = b"".join(body)
 
         else:
             if content_length is not None:
@@ -103,8 +104,8 @@ class TestingDAVRequestHandler(http_server.TestingHTTPRequestHandler):
         data = None
         if length != 0:
             data = self._read(length)
-            # Eats the newline following the chunk
-            self._readline()
+        # Eats the newline following the chunk, or ending the body
+        self._readline()
         return length, data
 
     def send_head(self):
@@ -18,10 +18,11 @@
 
 import stat
 from http.client import parse_headers
-from io import StringIO
+from io import BytesIO, StringIO
 
 from breezy import errors, tests
 from breezy.plugins.webdav import webdav
+from breezy.plugins.webdav.tests import dav_server
 from breezy.tests import http_server
 
 
@@ -422,3 +423,46 @@ Server: Apache/42 (Wonderland)\r
 """
         t = self.get_transport()
         self.assertRaises(errors.InvalidHttpResponse, t.delete, "whatever")
+
+
+class _UnseekableFile:
+    """A file that can only be read, like a pipe."""
+
+    def __init__(self, content):
+        self._file = BytesIO(content)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+
+class TestDAVPutFile(tests.TestCaseInTempDir):
+    def setUp(self):
+        super().setUp()
+        self.server = dav_server.DAVServer()
+        self.server.start_server()
+        self.addCleanup(self.server.stop_server)
+
+    def get_transport(self):
+        return webdav.HttpDavTransport(self.server.get_url())
+
+    def test_put_file_seekable(self):
+        t = self.get_transport()
+        f = BytesIO(b"skipped" + b"content\n" * 10000)
+        f.seek(7)
+        self.assertEqual(80000, t.put_file("file", f))
+        self.assertFileEqual(b"content\n" * 10000, "file")
+
+    def test_put_file_chunked(self):
+        t = self.get_transport()
+        self.assertEqual(
+            80000, t.put_file("file", _UnseekableFile(b"content\n" * 10000))
+        )
+        self.assertFileEqual(b"content\n" * 10000, "file")
+        # The connection is still usable after a chunked body.
+        t.put_bytes("other", b"more content\n")
+        self.assertFileEqual(b"more content\n", "other")
+
+    def test_put_file_non_atomic_create_parent_dir(self):
+        t = self.get_transport()
+        t.put_file_non_atomic("dir/file", BytesIO(b"content\n"), create_parent_dir=True)
+        self.assertFileEqual(b"content\n", "dir/file")
@@ -27,7 +27,7 @@ import sys
 import time
 import xml.sax
 import xml.sax.handler
-from io import StringIO
+from io import BytesIO, UnsupportedOperation
 
 from breezy import errors, osutils, trace, transport
 from breezy.transport.http import urllib
@@ -308,6 +308,30 @@ def _extract_dir_content(url, infile):
     return elements
 
 
+def _remaining_length(f):
+    """Return the number of bytes left to read from f, or None if unknown."""
+    try:
+        pos = f.tell()
+        end = f.seek(0, os.SEEK_END)
+        f.seek(pos)
+    except (AttributeError, OSError, UnsupportedOperation):
+        return None
+    return end - pos
+
+
+class _CountingReader:
+    """Read from a file, counting the bytes read."""
+
+    def __init__(self, f):
+        self._f = f
+        self.length = 0
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.length += len(data)
+        return data
+
+
 class DavResponse(urllib.Response):
     """Custom HTTPResponse.
 
@@ -403,17 +427,7 @@ class HttpDavTransport(urllib.HttpTransport):
         return result
 
     def put_file(self, relpath, f, mode=None):
-        """See Transport.put_file."""
-        # FIXME: We read the whole file in memory, using chunked encoding and
-        # counting bytes while sending them will be far better. Look at reusing
-        # osutils.pumpfile ?
-        #
-        bytes = f.read()
-        self.put_bytes(relpath, bytes, mode=None)
-        return len(bytes)
-
-    def put_bytes(self, relpath, bytes, mode=None):
-        """Copy the bytes object into the location.
+        """Copy the file-like object into the location.
 
         Tests revealed that contrary to what is said in
         http://www.rfc.net/rfc2068.html, the put is not
@@ -441,7 +455,7 @@ class HttpDavTransport(urllib.HttpTransport):
         tmp_relpath = relpath + stamp
 
         # Will raise if something gets wrong
-        self.put_bytes_non_atomic(tmp_relpath, bytes)
+        length = self._put_file_non_atomic(tmp_relpath, f)
 
         # Now move the temp file
         try:
@@ -456,17 +470,19 @@ class HttpDavTransport(urllib.HttpTransport):
             except BaseException as err:
                 raise exc_type(exc_val).with_traceback(exc_tb) from err
             raise  # raise the original with its traceback if we can.
+        return length
+
+    def put_bytes(self, relpath, bytes, mode=None):
+        """See Transport.put_bytes."""
+        self.put_file(relpath, BytesIO(bytes), mode=mode)
 
     def put_file_non_atomic(
         self, relpath, f, mode=None, create_parent_dir=False, dir_mode=False
     ):
-        # Implementing put_bytes_non_atomic rather than put_file_non_atomic
-        # because to do a put request, we must read all of the file into
-        # RAM anyway. Better to do that than to have the contents, put
-        # into a StringIO() and then read them all out again later.
-        self.put_bytes_non_atomic(
+        """See Transport.put_file_non_atomic."""
+        self._put_file_non_atomic(
             relpath,
-            f.read(),
+            f,
             mode=mode,
             create_parent_dir=create_parent_dir,
             dir_mode=dir_mode,
@@ -475,7 +491,27 @@ class HttpDavTransport(urllib.HttpTransport):
     def put_bytes_non_atomic(
         self, relpath, bytes: bytes, mode=None, create_parent_dir=False, dir_mode=False
     ):
-        """See Transport.put_file_non_atomic."""
+        """See Transport.put_bytes_non_atomic."""
+        self._put_file_non_atomic(
+            relpath,
+            BytesIO(bytes),
+            mode=mode,
+            create_parent_dir=create_parent_dir,
+            dir_mode=dir_mode,
+        )
+
+    def _put_file_non_atomic(
+        self, relpath, f, mode=None, create_parent_dir=False, dir_mode=False
+    ):
+        """Upload the content of f, streaming it from the file.
+
+        The length of the body is announced when f is seekable, otherwise the
+        body is sent with the chunked transfer encoding.  Either way, the file
+        is read while it is sent, so its content never needs to be held in
+        memory.
+
+        :return: The number of bytes uploaded.
+        """
         abspath = self._remote_path(relpath)
 
         # FIXME: Accept */* ? Why ? *we* send, we do not receive :-/
@@ -488,11 +524,20 @@ class HttpDavTransport(urllib.HttpTransport):
             # shame (at least a waste) that we
             # can't use the following.
             #  'Expect': '100-continue',
-            #  'Transfer-Encoding': 'chunked',
         }
+        length = _remaining_length(f)
+        if length is None:
+            body = _CountingReader(f)
+            headers["Transfer-Encoding"] = "chunked"
+        else:
+            start = f.tell()
+            body = f
+            headers["Content-Length"] = str(length)
 
         def bare_put_file_non_atomic():
-            response = self.request("PUT", abspath, body=bytes, headers=headers)
+            if length is not None:
+                f.seek(start)
+            response = self.request("PUT", abspath, body=body, headers=headers)
             code = response.status
 
             if code in (403, 404, 409):
@@ -504,15 +549,20 @@ class HttpDavTransport(urllib.HttpTransport):
         try:
             bare_put_file_non_atomic()
         except transport.NoSuchFile:
-            if not create_parent_dir:
+            if not create_parent_dir or length is None:
+                # The content of f has been consumed if it couldn't be
+                # rewound, so it can't be sent again.
                 raise
             parent_dir = osutils.dirname(relpath)
             if parent_dir:
                 self.mkdir(parent_dir, mode=dir_mode)
-                return bare_put_file_non_atomic()
+                bare_put_file_non_atomic()
             else:
                 # Don't forget to re-raise if the parent dir doesn't exist
                 raise
+        if length is None:
+            return body.length
+        return length
 
     def _put_bytes_ranged(self, relpath, bytes, at):
         """Append the file-like object part to the end of the location.
@@ -824,7 +874,7 @@ class HttpDavTransport(urllib.HttpTransport):
     def _append_by_get_put(self, relpath, bytes):
         # So we need to GET the file first, append to it and finally PUT back
         # the result.
-        full_data = StringIO()
+        full_data = BytesIO()
         try:
             data = self.get(relpath)
             full_data.write(data.read())
@@ -4239,6 +4239,7 @@ def _test_suite_testmod_names():
         "breezy.tests.test_transactions",
         "breezy.tests.test_transform",
         "breezy.tests.test_transport",
+        "breezy.tests.test_transport_aio",
         "breezy.tests.test_transport_log",
         "breezy.tests.test_tree",
         "breezy.tests.test_treebuilder",
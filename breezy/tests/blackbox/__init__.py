@@ -38,6 +38,7 @@ def load_tests(loader, basic_tests, pattern):
         "test_aliases",
         "test_ancestry",
         "test_annotate",
+        "test_benchmark_transport",
         "test_bisect",
         "test_big_file",
         "test_branch",
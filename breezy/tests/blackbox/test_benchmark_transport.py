@@ -0,0 +1,35 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""External tests of 'brz benchmark-transport'."""
+
+from breezy import tests, urlutils
+from breezy.transport import record
+
+
+class TestBenchmarkTransport(tests.TestCaseWithTransport):
+    def test_record_and_replay(self):
+        self.overrideAttr(record, "_recorder", None)
+        self.make_branch_and_tree("branch")
+        url = "record+" + urlutils.local_path_to_url("branch")
+        self.run_bzr(["-Otransport.record_file=branch.trace", "log", url])
+        record._recorder._file.close()
+        out, err = self.run_bzr(["benchmark-transport", "branch.trace", "--repeat=2"])
+        self.assertEqual("", err)
+        self.assertContainsRe(out, r"^replayed \d+ operations in [0-9.]+s")
+        self.assertContainsRe(out, r"\n  get +\d+\n")
+        self.assertEqual(2, out.count("replayed"))
+        self.assertNotContainsRe(out, "did not succeed")
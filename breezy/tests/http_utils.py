@@ -23,6 +23,7 @@ from urllib.request import parse_http_list, parse_keqv_list
 from .. import errors, tests, transport
 from ..bzr.smart import medium
 from ..transport import chroot
+from ..transport.http import urllib
 from . import http_server
 
 
@@ -111,6 +112,8 @@ class TestCaseWithWebserver(tests.TestCaseWithTransport):
     def setUp(self):
         super().setUp()
         self.transport_readonly_server = http_server.HttpServer
+        # Don't leave connections to the servers of this test around
+        self.addCleanup(urllib._connection_pool.clear)
 
     def create_transport_readonly_server(self):
         server = self.transport_readonly_server(protocol_version=self._protocol_version)
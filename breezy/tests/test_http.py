@@ -533,6 +533,130 @@ class TestRangeHeader(tests.TestCase):
         self.check_header("0-9,300-5000,-50", ranges=[(0, 9), (300, 5000)], tail=50)
 
 
+class TestBatchRanges(tests.TestCase):
+    """Test the split of coalesced offsets between requests."""
+
+    def check_batches(self, expected, offsets, parts=1, range_hint="multi"):
+        t = HttpTransport("http://example.com/")
+        t._range_hint = range_hint
+        coalesce = transport.Transport._coalesce_offsets
+        coalesced = list(coalesce(offsets, limit=0, fudge_factor=0))
+        batches = t._batch_ranges(coalesced, parts)
+        self.assertEqual(
+            expected, [[(c.start, c.length) for c in batch] for batch in batches]
+        )
+
+    def test_one_request(self):
+        self.check_batches([[(0, 1), (3, 2), (9, 1)]], [(0, 1), (3, 2), (9, 1)])
+
+    def test_parts(self):
+        self.check_batches(
+            [[(0, 1)], [(3, 2)], [(6, 1), (9, 1)]],
+            [(0, 1), (3, 2), (6, 1), (9, 1)],
+            parts=3,
+        )
+
+    def test_parts_single_range(self):
+        self.check_batches(
+            [[(0, 1), (3, 2)], [(6, 1), (9, 1)]],
+            [(0, 1), (3, 2), (6, 1), (9, 1)],
+            parts=2,
+            range_hint="single",
+        )
+
+    def test_more_parts_than_offsets(self):
+        self.check_batches([[(0, 1)], [(3, 2)]], [(0, 1), (3, 2)], parts=4)
+
+
+class FakeConnection:
+    def __init__(self, key, sock=True):
+        self._pool_key = key
+        self.sock = object() if sock else None
+        self._response = None
+        self.closed = False
+
+    def set_report_activity(self, report_activity):
+        self.report_activity = report_activity
+
+    def close(self):
+        self.closed = True
+        self.sock = None
+
+
+class TestConnectionPool(tests.TestCase):
+    def make_pool(self, max_idle=2, idle_timeout=60.0):
+        pool = urllib.ConnectionPool()
+        pool._max_idle = max_idle
+        pool._idle_timeout = idle_timeout
+        return pool
+
+    def test_acquire_empty(self):
+        pool = self.make_pool()
+        self.assertIs(None, pool.acquire("key"))
+
+    def test_release_and_acquire(self):
+        pool = self.make_pool()
+        connection = FakeConnection("key")
+        pool.release(connection)
+        self.assertIs(None, pool.acquire("other"))
+        self.assertIs(connection, pool.acquire("key", "reporter"))
+        self.assertEqual("reporter", connection.report_activity)
+        self.assertIs(None, pool.acquire("key"))
+
+    def test_closed_connection_not_kept(self):
+        pool = self.make_pool()
+        pool.release(FakeConnection("key", sock=False))
+        self.assertIs(None, pool.acquire("key"))
+
+    def test_unfinished_response_not_kept(self):
+        pool = self.make_pool()
+        connection = FakeConnection("key")
+        connection._response = io.BytesIO(b"pending")
+        connection._response.isclosed = lambda: False
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertIs(None, pool.acquire("key"))
+
+    def test_max_idle(self):
+        pool = self.make_pool(max_idle=1)
+        first = FakeConnection("key")
+        second = FakeConnection("key")
+        pool.release(first)
+        pool.release(second)
+        self.assertTrue(second.closed)
+        self.assertIs(first, pool.acquire("key"))
+
+    def test_idle_timeout(self):
+        pool = self.make_pool(idle_timeout=0.0)
+        connection = FakeConnection("key")
+        pool.release(connection)
+        self.assertIs(None, pool.acquire("key"))
+        self.assertTrue(connection.closed)
+
+    def test_connection_handler(self):
+        self.addCleanup(urllib._connection_pool.clear)
+        handler = urllib.ConnectionHandler()
+        request = urllib.Request("GET", "http://example.com/")
+        connection = handler.create_connection(request, urllib.HTTPConnection)
+        # Pretend the connection has been opened and used
+        connection.sock = socket.socket()
+        urllib._connection_pool.release(connection)
+        self.assertIs(
+            connection, handler.create_connection(request, urllib.HTTPConnection)
+        )
+        self.assertIsNot(
+            connection, handler.create_connection(request, urllib.HTTPSConnection)
+        )
+
+    def test_clear(self):
+        pool = self.make_pool()
+        connection = FakeConnection("key")
+        pool.release(connection)
+        pool.clear()
+        self.assertTrue(connection.closed)
+        self.assertIs(None, pool.acquire("key"))
+
+
 class TestSpecificRequestHandler(http_utils.TestCaseWithWebserver):
     """Tests a specific request handler.
 
@@ -820,6 +944,45 @@ class TestRangeRequestServer(TestSpecificRequestHandler):
         # The server should have issued 3 requests
         self.assertEqual(3, server.GET_request_nb)
 
+    def test_readv_parallel(self):
+        t = self.get_readonly_transport()
+        # Spread the offsets over several requests issued in parallel
+        t._bytes_to_read_before_seek = 0
+        t._readv_pool.size = 3
+        activity = []
+
+        def report_activity(size, direction):
+            activity.append((threading.current_thread(), direction))
+
+        t._report_activity = report_activity
+        l = list(t.readv("a", ((9, 1), (0, 1), (6, 1), (3, 2))))
+        self.assertEqual([(9, b"9"), (0, b"0"), (6, b"6"), (3, b"34")], l)
+        self.assertNotEqual([], t._readv_pool._workers)
+        # The activity of the pool connections is reported by this thread.
+        current = threading.current_thread()
+        self.assertEqual({(current, "read"), (current, "write")}, set(activity))
+
+    def test_readv_adaptive(self):
+        config.GlobalStack().set("http.adaptive_readv", True)
+        t = self.get_readonly_transport()
+        self.assertEqual(64 * 1024, t.recommended_page_size())
+        for _i in range(4):
+            l = list(t.readv("a", ((9, 1), (0, 1))))
+            self.assertEqual([(9, b"9"), (0, b"0")], l)
+        self.assertEqual(4, len(t._readv_policy._samples))
+        self.assertIs(t._readv_policy, t.clone("foo")._readv_policy)
+
+    def test_readv_adaptive_records_before_yielding(self):
+        config.GlobalStack().set("http.adaptive_readv", True)
+        t = self.get_readonly_transport()
+        offsets = t.readv("a", ((0, 1), (9, 1)))
+        self.assertEqual((0, b"0"), next(offsets))
+        # The request is recorded without the time the caller spends between
+        # offsets.
+        self.assertEqual(1, len(t._readv_policy._samples))
+        self.assertEqual([(9, b"9")], list(offsets))
+        self.assertEqual(1, len(t._readv_policy._samples))
+
     def test_complete_readv_leave_pipe_clean(self):
         server = self.get_readonly_server()
         t = self.get_readonly_transport()
@@ -1752,6 +1915,16 @@ class TestAuth(http_utils.TestCaseWithWebserver):
         # Only one 'Authentication Required' error should occur
         self.assertEqual(1, self.server.auth_required_errors)
 
+    def test_readv_parallel(self):
+        self.server.add_user("joe", "foo")
+        t = self.get_user_transport("joe", "foo")
+        self.assertEqual(b"contents of a\n", t.get("a").read())
+        t._bytes_to_read_before_seek = 0
+        t._readv_pool.size = 2
+        self.assertEqual([(0, b"c"), (9, b"of")], list(t.readv("a", ((0, 1), (9, 2)))))
+        # The pool connections reuse the credentials of the transport
+        self.assertEqual(1, self.server.auth_required_errors)
+
     def test_no_credential_leaks_in_log(self):
         old_flags = debug.get_debug_flags()
         self.addCleanup(debug.set_debug_flags, old_flags)
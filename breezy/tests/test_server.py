@@ -19,6 +19,7 @@ import socket
 import socketserver
 import sys
 import threading
+from io import BytesIO
 
 from breezy import cethread, errors, osutils, transport, urlutils
 from breezy.bzr.smart import medium, server
@@ -155,6 +156,80 @@ class FakeVFATServer(DecoratorServer):
         return fakevfat.FakeVFATTransportDecorator
 
 
+class CachingServer(DecoratorServer):
+    """Server for the CachingTransportDecorator for testing with."""
+
+    def get_decorator_class(self):
+        from breezy.transport import caching
+
+        return caching.CachingTransportDecorator
+
+
+class RecordingServer(DecoratorServer):
+    """Server for the RecordingTransportDecorator for testing with.
+
+    The trace is recorded in memory.
+    """
+
+    def start_server(self, server=None):
+        from breezy.transport import record
+
+        super().start_server(server)
+        self._saved_recorder = record._recorder
+        record._recorder = record.TraceRecorder(BytesIO())
+
+    def stop_server(self):
+        from breezy.transport import record
+
+        record._recorder = self._saved_recorder
+        super().stop_server()
+
+    def get_decorator_class(self):
+        from breezy.transport import record
+
+        return record.RecordingTransportDecorator
+
+
+class _SimulatedLinkServer(DecoratorServer):
+    """Base server for the simulated link decorators.
+
+    The link does not delay requests, so the transport tests run at full
+    speed, but it still counts them.
+    """
+
+    def start_server(self, server=None):
+        from breezy.transport import latency
+
+        super().start_server(server)
+        self._saved_links = latency._latency_link, latency._throttle_link
+        latency._latency_link = latency.SimulatedLink()
+        latency._throttle_link = latency.SimulatedLink()
+
+    def stop_server(self):
+        from breezy.transport import latency
+
+        latency._latency_link, latency._throttle_link = self._saved_links
+        super().stop_server()
+
+
+class LatencyServer(_SimulatedLinkServer):
+    """Server for the LatencyTransportDecorator for testing with."""
+
+    def get_decorator_class(self):
+        from breezy.transport import latency
+
+        return latency.LatencyTransportDecorator
+
+
+class ThrottleServer(_SimulatedLinkServer):
+    """Server for the ThrottleTransportDecorator for testing with."""
+
+    def get_decorator_class(self):
+        from breezy.transport import latency
+
+        return latency.ThrottleTransportDecorator
+
+
 class LogDecoratorServer(DecoratorServer):
     """Server for testing."""
 
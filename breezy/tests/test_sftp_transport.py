@@ -15,10 +15,12 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import functools
 import os
 import socket
 import sys
 import time
+from io import BytesIO
 
 from breezy import config, controldir, errors, tests, ui
 from breezy import transport as _mod_transport
@@ -416,6 +418,24 @@ class ReadvFile:
         pass
 
 
+class PipelinedReadvFile(ReadvFile):
+    """An object that acts like the SFTPFile of the default SFTP client."""
+
+    def readv(self, requests):
+        return iter(list(super().readv(requests)))
+
+    def pread(self, offset, length):
+        return self._data[offset : offset + length]
+
+
+class PwriteFile:
+    def __init__(self):
+        self.chunks = {}
+
+    def pwrite(self, offset, data):
+        self.chunks[offset] = data
+
+
 def _null_report_activity(*a, **k):
     pass
 
@@ -470,6 +490,72 @@ class Test_SFTPReadvHelper(tests.TestCase):
         )
 
 
+class TestPipelined(tests.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.requireFeature(features.paramiko)
+
+    def test_results_in_order(self):
+        calls = [functools.partial(lambda i: i * 2, i) for i in range(10)]
+        self.assertEqual(
+            [i * 2 for i in range(10)], list(_mod_sftp._pipelined(calls, 3))
+        )
+
+    def test_not_pipelined(self):
+        calls = [functools.partial(lambda i: i * 2, i) for i in range(3)]
+        self.assertEqual([0, 2, 4], list(_mod_sftp._pipelined(calls, 1)))
+
+    def test_error(self):
+        def fail():
+            raise errors.ReadError("foo")
+
+        calls = [lambda: 1, fail, lambda: 3]
+        results = _mod_sftp._pipelined(calls, 2)
+        self.assertEqual(1, next(results))
+        self.assertRaises(errors.ReadError, next, results)
+
+
+class TestPipelinedTransfers(tests.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.requireFeature(features.paramiko)
+
+    def test__get_requests(self):
+        helper = _mod_sftp._SFTPReadvHelper(
+            [(0, 40000), (40000, 26000), (70000, 10)],
+            "artificial_test",
+            _null_report_activity,
+            depth=3,
+        )
+        self.assertEqual(
+            [(0, 32768), (32768, 32768), (65536, 464), (70000, 10)],
+            helper._get_requests(),
+        )
+
+    def test_request_and_yield_offsets(self):
+        data = bytes(range(256)) * 400
+        offsets = [(70000, 10), (0, 40000), (40000, 26000)]
+        helper = _mod_sftp._SFTPReadvHelper(
+            offsets, "artificial_test", _null_report_activity, depth=3
+        )
+        result = list(helper.request_and_yield_offsets(PipelinedReadvFile(data)))
+        self.assertEqual(
+            [(start, data[start : start + length]) for start, length in offsets],
+            result,
+        )
+
+    def test_pump_pipelined(self):
+        t = _mod_sftp.SFTPTransport("sftp://example.com/")
+        t._pipeline_depth = 3
+        data = bytes(range(256)) * 300
+        outfile = PwriteFile()
+        self.assertEqual(len(data), t._pump_pipelined(BytesIO(data), outfile))
+        self.assertEqual([0, 32768, 65536], sorted(outfile.chunks))
+        self.assertEqual(
+            data, b"".join(chunk for offset, chunk in sorted(outfile.chunks.items()))
+        )
+
+
 class TestUsesAuthConfig(TestCaseWithSFTPServer):
     """Test that AuthenticationConfig can supply default usernames."""
 
@@ -14,8 +14,12 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import os
+import sys
+import time
+
 from breezy import config
-from breezy.tests import TestCase, TestCaseWithTransport
+from breezy.tests import TestCase, TestCaseInTempDir, TestCaseWithTransport, features
 
 from ..errors import SSHVendorNotFound, UnknownSSH
 from ..transport.ssh import (
@@ -25,6 +29,7 @@ from ..transport.ssh import (
     SSHCorpSubprocessVendor,
     SSHVendorManager,
     StrangeHostname,
+    _control_socket_dir,
 )
 
 
@@ -355,3 +360,131 @@ class SubprocessVendorsTests(TestCase):
                 "sftp",
             ],
         )
+
+
+class OpenSSHControlMasterTests(TestCaseInTempDir):
+    def test_disabled_by_default(self):
+        vendor = OpenSSHSubprocessVendor()
+        self.assertIs(None, vendor._get_control_path())
+        args = vendor._get_vendor_specific_argv("user", "host", 100, subsystem="sftp")
+        self.assertFalse([arg for arg in args if arg.startswith("-oControl")])
+
+    def test_control_master_arguments(self):
+        if sys.platform == "win32":
+            self.skipTest("OpenSSH control masters are not supported on win32")
+        config.GlobalStack().set("ssh.control_persist", "600")
+        vendor = OpenSSHSubprocessVendor()
+        args = vendor._get_vendor_specific_argv("user", "host", 100, subsystem="sftp")
+        directory = _control_socket_dir()
+        # Connections never become the master themselves.
+        self.assertEqual(
+            ["-oControlMaster=no", "-oControlPath=" + directory + "/%C"], args[5:7]
+        )
+        self.assertEqual(["-s", "--", "host", "sftp"], args[-4:])
+        self.assertTrue(os.path.isdir(directory))
+        self.assertEqual(0o700, os.stat(directory).st_mode & 0o777)
+        self.assertEqual(
+            [
+                "ssh",
+                "-f",
+                "-N",
+                "-oLogLevel=ERROR",
+                "-oForwardX11=no",
+                "-oForwardAgent=no",
+                "-oClearAllForwardings=yes",
+                "-oNoHostAuthenticationForLocalhost=yes",
+                "-oControlMaster=yes",
+                "-oControlPath=path",
+                "-oControlPersist=600",
+                "-p",
+                "100",
+                "-l",
+                "user",
+                "--",
+                "host",
+            ],
+            vendor._get_control_master_argv("user", "host", 100, "path"),
+        )
+
+
+class FakeParamikoTransport:
+    def __init__(self):
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+
+class ParamikoTransportReuseTests(TestCaseInTempDir):
+    _test_needs_features = [features.paramiko]
+
+    def make_vendor(self):
+        from ..transport.ssh.paramiko import ParamikoVendor
+
+        vendor = ParamikoVendor()
+        self.connections = []
+
+        def connect(username, password, host, port):
+            t = FakeParamikoTransport()
+            self.connections.append((username, host, port))
+            return t
+
+        vendor._connect = connect
+        return vendor
+
+    def test_not_reused_by_default(self):
+        vendor = self.make_vendor()
+        t1 = vendor._get_transport("user", None, "host", 22)
+        t2 = vendor._get_transport("user", None, "host", 22)
+        self.assertIsNot(t1, t2)
+        self.assertEqual(2, len(self.connections))
+
+    def test_reused(self):
+        config.GlobalStack().set("ssh.control_persist", "600")
+        vendor = self.make_vendor()
+        t1 = vendor._get_transport("user", None, "host", 22)
+        t2 = vendor._get_transport("user", "password", "host", 22)
+        t3 = vendor._get_transport("other", None, "host", 22)
+        t4 = vendor._get_transport("user", None, "host", 2222)
+        self.assertIs(t1, t2)
+        self.assertIsNot(t1, t3)
+        self.assertIsNot(t1, t4)
+        self.assertEqual(
+            [("user", "host", 22), ("other", "host", 22), ("user", "host", 2222)],
+            self.connections,
+        )
+
+    def test_inactive_not_reused(self):
+        config.GlobalStack().set("ssh.control_persist", "600")
+        vendor = self.make_vendor()
+        t1 = vendor._get_transport("user", None, "host", 22)
+        t1.active = False
+        t2 = vendor._get_transport("user", None, "host", 22)
+        self.assertIsNot(t1, t2)
+
+    def test_connect_outside_lock(self):
+        config.GlobalStack().set("ssh.control_persist", "600")
+        vendor = self.make_vendor()
+        connect = vendor._connect
+        other = FakeParamikoTransport()
+
+        def concurrent_connect(*args):
+            self.assertFalse(vendor._transports_lock.locked())
+            # Another thread connects to the same destination meanwhile.
+            vendor._transports[("user", "host", 22)] = (other, time.monotonic())
+            return connect(*args)
+
+        vendor._connect = concurrent_connect
+        t1 = vendor._get_transport("user", None, "host", 22)
+        self.assertIsNot(other, t1)
+        self.assertIs(other, vendor._get_transport("user", None, "host", 22))
+
+    def test_idle_expiry(self):
+        config.GlobalStack().set("ssh.control_persist", "600")
+        vendor = self.make_vendor()
+        t1 = vendor._get_transport("user", None, "host", 22)
+        key = ("user", "host", 22)
+        vendor._transports[key] = (t1, vendor._transports[key][1] - 601)
+        t2 = vendor._get_transport("user", None, "host", 22)
+        self.assertIsNot(t1, t2)
+        self.assertIs(t2, vendor._get_transport("user", None, "host", 22))
@@ -24,17 +24,22 @@ from io import BytesIO
 
 import breezy.transport.trace
 
-from .. import errors, osutils, tests, transport, urlutils
+from .. import config, errors, osutils, tests, transport, urlutils
 from ..transport import (
     FileExists,
     NoSuchFile,
     UnsupportedProtocol,
+    caching,
     chroot,
     fakenfs,
+    latency,
     local,
     memory,
     pathfilter,
     readonly,
+    readv_policy,
+    record,
+    replay,
 )
 from ..transport.local import file_kind
 from . import features, test_server
@@ -286,6 +291,53 @@ class TestCoalesceOffsets(tests.TestCase):
         )
 
 
+class TestAdaptiveReadvPolicy(tests.TestCase):
+    def test_static_until_measured(self):
+        policy = readv_policy.AdaptiveReadvPolicy()
+        policy.record(1000, 0.1)
+        self.assertEqual((None, None), policy.estimate())
+        self.assertEqual((128, 0), policy.coalesce_parameters(128, 0))
+        self.assertEqual(65536, policy.page_size(65536))
+
+    def test_estimate(self):
+        policy = readv_policy.AdaptiveReadvPolicy()
+        # 100ms round trips at 1MB/s
+        for size in (1000, 10000, 100000, 1000000):
+            policy.record(size, 0.1 + size / 1000000)
+        rtt, bandwidth = policy.estimate()
+        self.assertAlmostEqual(0.1, rtt)
+        self.assertAlmostEqual(1000000, bandwidth)
+        self.assertEqual(100000, policy.bandwidth_delay_product())
+
+    def test_estimate_similar_requests(self):
+        policy = readv_policy.AdaptiveReadvPolicy()
+        for duration in (0.5, 0.2, 0.3, 0.4):
+            policy.record(4096, duration)
+        rtt, bandwidth = policy.estimate()
+        self.assertEqual(0.2, rtt)
+        self.assertEqual(4096 / 0.2, bandwidth)
+
+    def test_parameters_grow_with_bdp(self):
+        policy = readv_policy.AdaptiveReadvPolicy()
+        for size in (1000, 10000, 100000, 1000000):
+            policy.record(size, 0.1 + size / 1000000)
+        self.assertEqual((100000, 0), policy.coalesce_parameters(128, 0))
+        self.assertEqual((100000, 800000), policy.coalesce_parameters(128, 65536))
+        self.assertEqual((200000, 800000), policy.coalesce_parameters(200000, 65536))
+        self.assertEqual(102400, policy.page_size(65536))
+
+    def test_parameters_capped(self):
+        policy = readv_policy.AdaptiveReadvPolicy()
+        # 1s round trips at 100MB/s
+        for size in (1000, 10000, 100000, 1000000):
+            policy.record(size, 1 + size / 100000000)
+        self.assertEqual(
+            (readv_policy.MAX_FUDGE_FACTOR, readv_policy.MAX_COMBINED_SIZE),
+            policy.coalesce_parameters(128, 65536),
+        )
+        self.assertEqual(readv_policy.MAX_PAGE_SIZE, policy.page_size(65536))
+
+
 class TestMemoryServer(tests.TestCase):
     def test_create_server(self):
         server = memory.MemoryServer()
@@ -629,6 +681,123 @@ class ReadonlyDecoratorTransportTest(tests.TestCase):
         self.assertEqual(True, t.is_readonly())
 
 
+class CachingDecoratorTests(tests.TestCaseInTempDir):
+    pack_name = "packs/" + "a" * 32 + ".pack"
+
+    def setUp(self):
+        super().setUp()
+        self.overrideAttr(caching, "_block_cache", None)
+
+    def make_transport(self, content):
+        backing = memory.MemoryTransport()
+        backing.mkdir("packs")
+        backing.put_bytes(self.pack_name, content)
+        backing.put_bytes("packs/pack-names", content)
+        traced = breezy.transport.trace.TransportTraceDecorator(
+            "trace+" + backing.base, backing
+        )
+        t = caching.CachingTransportDecorator("cache+" + traced.base, traced)
+        return t, traced
+
+    def readvs(self, traced):
+        return [op for op in traced._activity if op[0] == "readv"]
+
+    def test_get_transport(self):
+        t = transport.get_transport_from_url("cache+memory:///")
+        self.assertIsInstance(t, caching.CachingTransportDecorator)
+        self.assertEqual("cache+memory:///", t.base)
+
+    def test_readv_cached(self):
+        content = bytes(range(256)) * 1024
+        t, traced = self.make_transport(content)
+        offsets = [(70000, 10), (5, 3)]
+        expected = [(70000, content[70000:70010]), (5, content[5:8])]
+        self.assertEqual(expected, list(t.readv(self.pack_name, offsets)))
+        # Whole blocks were read
+        self.assertEqual(
+            [
+                (
+                    "readv",
+                    self.pack_name,
+                    [(0, caching.BLOCK_SIZE), (caching.BLOCK_SIZE, caching.BLOCK_SIZE)],
+                    False,
+                    None,
+                )
+            ],
+            self.readvs(traced),
+        )
+        self.assertEqual(expected, list(t.readv(self.pack_name, offsets)))
+        self.assertLength(1, self.readvs(traced))
+        # Clones share the cache
+        cloned = t.clone("packs")
+        self.assertEqual(content[:100], cloned.get_bytes("a" * 32 + ".pack")[:100])
+        self.assertLength(2, self.readvs(traced))
+
+    def test_readv_past_end(self):
+        t, traced = self.make_transport(b"0123456789")
+        self.assertListRaises(
+            errors.ShortReadvError, t.readv, self.pack_name, [(5, 10)]
+        )
+
+    def test_mutable_files_not_cached(self):
+        t, traced = self.make_transport(b"0123456789")
+        for _i in range(2):
+            self.assertEqual([(1, b"1")], list(t.readv("packs/pack-names", [(1, 1)])))
+        self.assertLength(2, self.readvs(traced))
+
+    def test_write_forgets(self):
+        t, traced = self.make_transport(b"0123456789")
+        self.assertEqual([(1, b"1")], list(t.readv(self.pack_name, [(1, 1)])))
+        t.put_bytes(self.pack_name, b"abcdefghij")
+        self.assertEqual([(1, b"b")], list(t.readv(self.pack_name, [(1, 1)])))
+
+    def test_size_unknown(self):
+        t, traced = self.make_transport(b"0123456789")
+
+        def stat(relpath):
+            raise errors.TransportNotPossible("no stat")
+
+        traced.stat = stat
+        self.assertEqual([(2, b"23")], list(t.readv(self.pack_name, [(2, 2)])))
+        self.assertEqual([(1, b"12")], list(t.readv(self.pack_name, [(1, 2)])))
+        self.assertLength(1, self.readvs(traced))
+        self.assertEqual([(2, b"2345")], list(t.readv(self.pack_name, [(2, 4)])))
+        self.assertEqual(
+            ("readv", self.pack_name, [(0, 6)], False, None), self.readvs(traced)[-1]
+        )
+
+    def test_disk_cache(self):
+        cache = caching.BlockCache(1024 * 1024, directory="blocks")
+        cache.set_size("memory:///x.pack", 10)
+        cache.add_block("memory:///x.pack", 0, b"0123456789")
+        cache = caching.BlockCache(1024 * 1024, directory="blocks")
+        self.assertEqual(10, cache.get_size("memory:///x.pack"))
+        self.assertEqual(b"0123456789", cache.get_block("memory:///x.pack", 0))
+        cache.forget("memory:///x.pack")
+        self.assertIs(False, cache.get_size("memory:///x.pack"))
+        self.assertIs(None, cache.get_block("memory:///x.pack", 0))
+
+    def test_disk_cache_evicts(self):
+        cache = caching.BlockCache(1024 * 1024, directory="blocks", max_disk_size=36)
+        cache.add_block("memory:///x.pack", 0, b"0123456789")
+        cache.add_block("memory:///y.pack", 0, b"0123456789")
+        os.utime(cache._file_directory("memory:///x.pack"), (0, 0))
+        os.utime(cache._file_directory("memory:///y.pack"), (1, 1))
+        # Reading blocks from disk marks their file as used.
+        cache = caching.BlockCache(1024 * 1024, directory="blocks", max_disk_size=36)
+        self.assertEqual(b"0123456789", cache.get_block("memory:///x.pack", 0))
+        cache.add_block("memory:///z.pack", 0, b"0123456789")
+        self.assertLength(3, os.listdir("blocks"))
+        # Going over the limit evicts the least recently used files, until
+        # the cache is down to three quarters of the limit.
+        cache.add_block("memory:///z.pack", 1, b"0123456")
+        self.assertLength(2, os.listdir("blocks"))
+        cache = caching.BlockCache(1024 * 1024, directory="blocks")
+        self.assertEqual(b"0123456789", cache.get_block("memory:///x.pack", 0))
+        self.assertIs(None, cache.get_block("memory:///y.pack", 0))
+        self.assertEqual(b"0123456", cache.get_block("memory:///z.pack", 1))
+
+
 class FakeNFSDecoratorTests(tests.TestCaseInTempDir):
     """NFS decorator specific tests."""
 
@@ -1045,6 +1214,233 @@ class TestTransportTrace(tests.TestCase):
         self.assertEqual(expected_result, t._activity)
 
 
+class RecordingDecoratorTests(tests.TestCaseInTempDir):
+    def setUp(self):
+        super().setUp()
+        self.trace_file = BytesIO()
+        self.overrideAttr(record, "_recorder", record.TraceRecorder(self.trace_file))
+
+    def read_trace(self):
+        return replay.read_trace(BytesIO(self.trace_file.getvalue()))
+
+    def test_get_transport(self):
+        t = transport.get_transport_from_url("record+memory:///")
+        self.assertIsInstance(t, record.RecordingTransportDecorator)
+        self.assertIs(record._recorder, t.clone("dir")._recorder)
+
+    def test_record_file(self):
+        self.overrideAttr(record, "_recorder", None)
+        config.GlobalStack().set("transport.record_file", "my.trace")
+        t = transport.get_transport_from_url("record+memory:///")
+        t.put_bytes("foo", b"content")
+        t._recorder._file.close()
+        with open("my.trace", "rb") as f:
+            self.assertEqual(record.TRACE_HEADER, f.readline())
+            self.assertContainsRe(
+                f.read(), b"^[0-9.]+ [0-9.]+ put ok memory:///foo 7\n$"
+            )
+
+    def test_record_file_not_set(self):
+        self.overrideAttr(record, "_recorder", None)
+        self.assertRaises(
+            record.RecordFileNotSet,
+            transport.get_transport_from_url,
+            "record+memory:///",
+        )
+
+    def test_readv_duration(self):
+        clock = [0.0]
+        self.overrideAttr(record._recorder, "now", lambda: clock[0])
+        t = transport.get_transport_from_url("record+memory:///")
+        t.put_bytes("foo", b"content")
+        clock[0] = 10.0
+        for _offset, _data in t.readv("foo", [(0, 1), (3, 2)]):
+            # The caller's processing isn't part of the readv.
+            clock[0] += 5.0
+        entry = self.read_trace()[-1]
+        self.assertEqual(
+            ("readv", 10.0, 0.0), (entry.operation, entry.start, entry.duration)
+        )
+
+    def test_record(self):
+        t = transport.get_transport_from_url("record+memory:///")
+        t.mkdir("dir")
+        t.put_bytes("dir/foo", b"content")
+        sub = t.clone("dir")
+        self.assertEqual(b"content", sub.get_bytes("foo"))
+        self.assertEqual(
+            [(0, b"c"), (3, b"te")], list(sub.readv("foo", [(0, 1), (3, 2)]))
+        )
+        list(sub.readv("foo", [(1, 2)], adjust_for_latency=True, upper_limit=7))
+        self.assertTrue(sub.has("foo"))
+        self.assertRaises(NoSuchFile, sub.get, "bar")
+        sub.rename("foo", "bar")
+        with sub.open_write_stream("stream") as stream:
+            stream.write(b"some ")
+            stream.write(b"bytes")
+        self.assertEqual(9, sub.put_file("file", BytesIO(b"file\ndata")))
+        sub.append_file("file", BytesIO(b"more"))
+        sub.put_bytes_non_atomic("new/bytes", b"abc", create_parent_dir=True)
+        sub.put_file_non_atomic("file2", BytesIO(b"ab"))
+        sub.copy("file", "copy")
+        sub.move("copy", "moved")
+        self.assertEqual(
+            [
+                ("mkdir", True, "dir", []),
+                ("put", True, "dir/foo", ["7"]),
+                ("get", True, "dir/foo", ["7"]),
+                ("readv", True, "dir/foo", ["0+1,3+2", "-", "3"]),
+                ("readv", True, "dir/foo", ["1+2", "7", "7"]),
+                ("has", True, "dir/foo", ["1"]),
+                ("get", False, "dir/bar", ["0"]),
+                ("rename", True, "dir/foo", ["dir/bar"]),
+                ("write_stream", True, "dir/stream", ["10"]),
+                ("put", True, "dir/file", ["9"]),
+                ("append", True, "dir/file", ["4"]),
+                ("put_non_atomic", True, "dir/new/bytes", ["3", "1"]),
+                ("put_non_atomic", True, "dir/file2", ["2", "0"]),
+                ("copy", True, "dir/file", ["dir/copy"]),
+                ("move", True, "dir/copy", ["dir/moved"]),
+            ],
+            [
+                (entry.operation, entry.ok, entry.path, entry.args)
+                for entry in self.read_trace()
+            ],
+        )
+
+    def test_replay(self):
+        backing = memory.MemoryTransport()
+        backing.mkdir("indices")
+        backing.put_bytes("indices/a.rix", b"x" * 1000)
+        t = record.RecordingTransportDecorator("record+" + backing.base, backing)
+        list(t.readv("indices/a.rix", [(10, 10), (900, 100)]))
+        t.get_bytes("indices/a.rix")
+        t.mkdir("upload")
+        t.put_bytes("upload/new.pack", b"y" * 50)
+        t.rename("upload/new.pack", "new.pack")
+        t.delete("new.pack")
+        t.copy("indices/a.rix", "indices/b.rix")
+        t.move("indices/b.rix", "c.rix")
+        t.put_bytes_non_atomic("new/names", b"z" * 5, create_parent_dir=True)
+        entries = self.read_trace()
+        target = memory.MemoryTransport()
+        replay.prepare(target, entries)
+        self.assertEqual(1000, len(target.get_bytes("indices/a.rix")))
+        self.assertFalse(target.has("upload"))
+        self.assertFalse(target.has("indices/b.rix"))
+        result = replay.replay(target, entries)
+        self.assertEqual(0, result.mismatches)
+        self.assertEqual(1110, result.bytes_read)
+        self.assertEqual(55, result.bytes_written)
+        self.assertEqual(1000, len(target.get_bytes("c.rix")))
+        self.assertEqual(
+            {
+                "readv": 1,
+                "get": 1,
+                "mkdir": 1,
+                "put": 1,
+                "rename": 1,
+                "delete": 1,
+                "copy": 1,
+                "move": 1,
+                "put_non_atomic": 1,
+            },
+            dict(result.operations),
+        )
+
+
+class SimulatedLinkDecoratorTests(tests.TestCaseInTempDir):
+    def setUp(self):
+        super().setUp()
+        self.sleeps = []
+        self.overrideAttr(latency, "_sleep", self.sleeps.append)
+        self.overrideAttr(latency, "_latency_link", None)
+        self.overrideAttr(latency, "_throttle_link", None)
+
+    def test_round_trip(self):
+        link = latency.SimulatedLink(rtt=0.05)
+        link.round_trip()
+        link.round_trip(100)
+        self.assertEqual([0.05, 0.05], self.sleeps)
+        self.assertEqual(2, link.round_trips)
+        self.assertEqual(100, link.bytes_transferred)
+        self.assertAlmostEqual(0.1, link.delay)
+
+    def test_bandwidth(self):
+        link = latency.SimulatedLink(rtt=0.01, bandwidth=1000)
+        link.round_trip(500)
+        link.transfer(2000)
+        self.assertEqual(1, link.round_trips)
+        self.assertEqual(2500, link.bytes_transferred)
+        self.assertEqual([0.51, 2.0], [round(delay, 6) for delay in self.sleeps])
+
+    def test_jitter_is_deterministic(self):
+        link = latency.SimulatedLink(rtt=0.01, jitter=0.02, seed=42)
+        for _i in range(10):
+            link.round_trip()
+        first = self.sleeps[:]
+        self.assertLength(10, set(first))
+        for delay in first:
+            self.assertTrue(0.01 <= delay <= 0.03)
+        del self.sleeps[:]
+        link = latency.SimulatedLink(rtt=0.01, jitter=0.02, seed=42)
+        for _i in range(10):
+            link.round_trip()
+        self.assertEqual(first, self.sleeps)
+
+    def test_latency_config(self):
+        stack = config.GlobalStack()
+        stack.set("latency.rtt", "20")
+        stack.set("latency.jitter", "5")
+        stack.set("latency.seed", "3")
+        t = transport.get_transport_from_url("latency+memory:///")
+        self.assertIsInstance(t, latency.LatencyTransportDecorator)
+        self.assertEqual(0.02, t._link.rtt)
+        self.assertEqual(0.005, t._link.jitter)
+        self.assertEqual(0, t._link.bandwidth)
+        self.assertIs(t._link, t.clone("dir")._link)
+
+    def test_throttle_config(self):
+        config.GlobalStack().set("throttle.bandwidth", "2K")
+        t = transport.get_transport_from_url("throttle+memory:///")
+        self.assertIsInstance(t, latency.ThrottleTransportDecorator)
+        self.assertEqual(0, t._link.rtt)
+        self.assertEqual(2000, t._link.bandwidth)
+
+    def test_requests(self):
+        link = latency.SimulatedLink(rtt=0.01)
+        backing = memory.MemoryTransport()
+        t = latency.LatencyTransportDecorator("latency+" + backing.base, backing)
+        t._link = link
+        t.mkdir("dir")
+        sub = t.clone("dir")
+        sub.put_bytes("foo", b"content")
+        self.assertEqual(b"content", sub.get_bytes("foo"))
+        self.assertEqual(
+            [(0, b"c"), (3, b"te")], list(sub.readv("foo", [(0, 1), (3, 2)]))
+        )
+        self.assertTrue(sub.has("foo"))
+        self.assertRaises(NoSuchFile, sub.get, "bar")
+        with sub.open_write_stream("stream") as stream:
+            stream.write(b"some ")
+            stream.write(b"bytes")
+        self.assertEqual(b"some bytes", backing.get_bytes("dir/stream"))
+        self.assertEqual(7, link.round_trips)
+        self.assertEqual(7 + 7 + 3 + 10, link.bytes_transferred)
+        self.assertEqual([0.01] * 7, self.sleeps)
+
+    def test_smart_call_hook(self):
+        from ..bzr.smart import client
+
+        link = latency.SimulatedLink(rtt=0.01)
+        link.smart_call_hook(client.CallHookParams(b"get", (b"foo",), None, None, None))
+        link.smart_call_hook(
+            client.CallHookParams(b"put", (b"foo",), b"data", None, None)
+        )
+        self.assertEqual(2, link.round_trips)
+        self.assertEqual(4, link.bytes_transferred)
+
+
 class TestSSHConnections(tests.TestCaseWithTransport):
     def test_bzr_connect_to_bzr_ssh(self):
         """get_transport of a bzr+ssh:// behaves correctly.
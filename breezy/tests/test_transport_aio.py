@@ -0,0 +1,198 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the asynchronous transport API."""
+
+import asyncio
+from io import BytesIO
+
+from .. import config, errors, transport, urlutils
+from ..transport import aio, memory
+from . import TestCase, TestCaseInTempDir, http_utils
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+class TestMemoryAsyncTransport(TestCase):
+    def make_transport(self):
+        t = memory.MemoryTransport()
+        t.put_bytes("a", b"0123456789")
+        t.mkdir("dir")
+        return aio.get_async_transport(t)
+
+    def test_get_async_transport(self):
+        self.assertIsInstance(self.make_transport(), aio.MemoryAsyncTransport)
+
+    def test_operations(self):
+        t = self.make_transport()
+
+        async def check():
+            self.assertTrue(await t.has("a"))
+            self.assertFalse(await t.has("b"))
+            self.assertEqual(b"0123456789", await t.get_bytes("a"))
+            self.assertEqual(b"0123456789", (await t.get("a")).read())
+            self.assertEqual(
+                [(3, b"34"), (0, b"0")], await t.readv("a", [(3, 2), (0, 1)])
+            )
+            await t.put_bytes("b", b"new")
+            self.assertEqual(2, await t.put_file("c", BytesIO(b"fi")))
+            self.assertEqual(3, (await t.stat("b")).st_size)
+            self.assertEqual(["a", "b", "c", "dir"], sorted(await t.list_dir(".")))
+            with self.assertRaises(transport.NoSuchFile):
+                await t.get_bytes("missing")
+
+        run(check())
+
+    def test_clone(self):
+        t = self.make_transport().clone("dir")
+        self.assertIsInstance(t, aio.MemoryAsyncTransport)
+        self.assertEqual("memory:///dir/", t.base)
+
+
+class TestSyncTransportAdapter(TestCase):
+    def test_operations(self):
+        backing = memory.MemoryTransport()
+        backing.put_bytes("a", b"0123456789")
+        t = aio.SyncTransportAdapter(backing)
+
+        async def check():
+            results = await asyncio.gather(
+                t.get_bytes("a"), t.readv("a", [(9, 1), (1, 2)]), t.has("b")
+            )
+            self.assertEqual([b"0123456789", [(9, b"9"), (1, b"12")], False], results)
+            await t.put_bytes("b", b"new")
+            self.assertEqual(b"new", backing.get_bytes("b"))
+            with self.assertRaises(transport.NoSuchFile):
+                await t.stat("missing")
+
+        run(check())
+
+    def test_readv_default(self):
+        backing = memory.MemoryTransport()
+        backing.put_bytes("a", b"0123456789")
+        t = aio.MemoryAsyncTransport(backing)
+
+        async def check():
+            self.assertEqual(
+                [(8, b"89"), (0, b"01")],
+                await aio.AsyncTransport.readv(t, "a", [(8, 2), (0, 2)]),
+            )
+            with self.assertRaises(errors.ShortReadvError):
+                await aio.AsyncTransport.readv(t, "a", [(8, 5)])
+
+        run(check())
+
+
+class TestLocalAsyncTransport(TestCaseInTempDir):
+    def test_operations(self):
+        self.build_tree_contents([("a", b"0123456789"), ("dir/",)])
+        t = aio.get_async_transport(
+            transport.get_transport_from_url(urlutils.local_path_to_url("."))
+        )
+        self.assertIsInstance(t, aio.LocalAsyncTransport)
+
+        async def check():
+            await asyncio.gather(
+                *[t.put_bytes(f"dir/{i}", b"%d" % i) for i in range(20)]
+            )
+            contents = await asyncio.gather(
+                *[t.get_bytes(f"dir/{i}") for i in range(20)]
+            )
+            self.assertEqual([b"%d" % i for i in range(20)], contents)
+            self.assertEqual([(2, b"234")], await t.readv("a", [(2, 3)]))
+            self.assertEqual(20, len(await t.list_dir("dir")))
+            self.assertEqual(10, (await t.stat("a")).st_size)
+
+        run(check())
+
+
+class TestHttpAsyncTransport(http_utils.TestCaseWithWebserver):
+    def setUp(self):
+        super().setUp()
+        self.build_tree_contents([("a", b"0123456789"), ("b", b"b" * 100000)])
+
+    def make_transport(self):
+        t = aio.get_async_transport(self.get_readonly_transport())
+        self.assertIsInstance(t, aio.HttpAsyncTransport)
+        return t
+
+    def test_get_bytes(self):
+        t = self.make_transport()
+
+        async def check():
+            try:
+                contents = await asyncio.gather(
+                    t.get_bytes("a"), t.get_bytes("b"), t.get_bytes("a")
+                )
+                self.assertEqual(
+                    [b"0123456789", b"b" * 100000, b"0123456789"], contents
+                )
+                with self.assertRaises(transport.NoSuchFile):
+                    await t.get_bytes("missing")
+            finally:
+                await t.close()
+
+        run(check())
+
+    def test_no_connections_kept(self):
+        config.GlobalStack().set("http.max_connections_per_host", "0")
+        t = self.make_transport()
+
+        async def check():
+            try:
+                self.assertEqual(b"0123456789", await t.get_bytes("a"))
+            finally:
+                await t.close()
+
+        run(check())
+
+    def test_has(self):
+        t = self.make_transport()
+
+        async def check():
+            try:
+                self.assertEqual(
+                    [True, False], await asyncio.gather(t.has("a"), t.has("missing"))
+                )
+            finally:
+                await t.close()
+
+        run(check())
+
+    def test_readv(self):
+        t = self.make_transport()
+
+        async def check():
+            try:
+                self.assertEqual(
+                    [(9, b"9"), (0, b"0"), (3, b"34")],
+                    await t.readv("a", [(9, 1), (0, 1), (3, 2)]),
+                )
+            finally:
+                await t.close()
+
+        run(check())
+
+    def test_stat_not_possible(self):
+        t = self.make_transport()
+
+        async def check():
+            with self.assertRaises(errors.TransportNotPossible):
+                await t.stat("a")
+
+        run(check())
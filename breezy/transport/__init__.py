@@ -1687,14 +1687,34 @@ register_lazy_transport(
     "readonly+", "breezy.transport.readonly", "ReadonlyTransportDecorator"
 )
 
+register_transport_proto("cache+")
+register_lazy_transport(
+    "cache+", "breezy.transport.caching", "CachingTransportDecorator"
+)
+
 register_transport_proto("fakenfs+")
 register_lazy_transport(
     "fakenfs+", "breezy.transport.fakenfs", "FakeNFSTransportDecorator"
 )
 
+register_transport_proto("latency+")
+register_lazy_transport(
+    "latency+", "breezy.transport.latency", "LatencyTransportDecorator"
+)
+
 register_transport_proto("log+")
 register_lazy_transport("log+", "breezy.transport.log", "TransportLogDecorator")
 
+register_transport_proto("record+")
+register_lazy_transport(
+    "record+", "breezy.transport.record", "RecordingTransportDecorator"
+)
+
+register_transport_proto("throttle+")
+register_lazy_transport(
+    "throttle+", "breezy.transport.latency", "ThrottleTransportDecorator"
+)
+
 register_transport_proto("trace+")
 register_lazy_transport("trace+", "breezy.transport.trace", "TransportTraceDecorator")
 
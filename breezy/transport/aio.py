@@ -0,0 +1,497 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Asynchronous access to transports.
+
+An AsyncTransport offers coroutine versions of the basic Transport
+operations, so code running in an asyncio event loop can keep many reads and
+writes in flight without dedicating a thread to each of them.  Use
+get_async_transport() to get one for a transport: local, memory and HTTP
+transports have native implementations, other transports are wrapped in a
+SyncTransportAdapter that runs their blocking methods in a thread pool.
+
+Only the operations below are provided; code needing the rest of the
+Transport API can still use the synchronous transport, available as the
+``transport`` attribute.
+"""
+
+import asyncio
+import functools
+import urllib.parse
+import urllib.request
+from io import BytesIO
+
+from .. import config, errors, trace
+from . import NoSuchFile
+
+
+class AsyncTransport:
+    """Coroutine based access to the files of a transport."""
+
+    def __init__(self, transport):
+        """Create an AsyncTransport.
+
+        :param transport: The synchronous transport providing the location
+            and the behaviour the asynchronous methods follow.
+        """
+        self.transport = transport
+        self.base = transport.base
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}({self.base!r})>"
+
+    def clone(self, offset=None):
+        """Return an AsyncTransport for a location relative to this one."""
+        return get_async_transport(self.transport.clone(offset))
+
+    async def close(self):
+        """Release the resources held by this transport."""
+
+    async def has(self, relpath):
+        """Does the target location exist?"""
+        raise NotImplementedError(self.has)
+
+    async def get_bytes(self, relpath):
+        """Return the contents of a file."""
+        raise NotImplementedError(self.get_bytes)
+
+    async def get(self, relpath):
+        """Return a file-like object with the contents of a file.
+
+        The file is read completely before it is returned, so that reading
+        from the result never blocks.
+        """
+        return BytesIO(await self.get_bytes(relpath))
+
+    async def readv(self, relpath, offsets):
+        """Read parts of a file.
+
+        :param offsets: A list of (offset, size) tuples.
+        :return: A list of (offset, data) tuples, in the order of offsets.
+        """
+        data = await self.get_bytes(relpath)
+        return _slice_offsets(relpath, data, 0, offsets)
+
+    async def put_bytes(self, relpath, raw_bytes, mode=None):
+        """Atomically put the supplied bytes into the given location."""
+        raise NotImplementedError(self.put_bytes)
+
+    async def put_file(self, relpath, f, mode=None):
+        """Copy the file-like object into the location.
+
+        :return: The length of the file that was written.
+        """
+        raw_bytes = f.read()
+        await self.put_bytes(relpath, raw_bytes, mode=mode)
+        return len(raw_bytes)
+
+    async def stat(self, relpath):
+        """Return the stat information for a file."""
+        raise NotImplementedError(self.stat)
+
+    async def list_dir(self, relpath):
+        """Return a list of all files at the given location."""
+        raise NotImplementedError(self.list_dir)
+
+
+def _slice_offsets(relpath, data, data_start, offsets):
+    """Cut the ranges described by offsets out of data.
+
+    :param data_start: The offset in the file of the first byte of data.
+    """
+    result = []
+    for start, size in offsets:
+        chunk = data[start - data_start : start - data_start + size]
+        if start < data_start or len(chunk) != size:
+            raise errors.ShortReadvError(relpath, start, size, len(chunk))
+        result.append((start, chunk))
+    return result
+
+
+class SyncTransportAdapter(AsyncTransport):
+    """Run the methods of a synchronous transport in a thread pool.
+
+    Most transports can't be used from several threads at once, so the calls
+    are serialized unless the adapter is told otherwise; the event loop is
+    still free to run other coroutines while a call is in progress.
+    """
+
+    def __init__(self, transport, executor=None, serialize=True):
+        """Create a SyncTransportAdapter.
+
+        :param executor: The concurrent.futures executor to run the calls
+            in, by default the one of the event loop.
+        :param serialize: Whether to wait for a call to finish before
+            starting the next one.
+        """
+        super().__init__(transport)
+        self._executor = executor
+        self._serialize = serialize
+        self._lock = None
+
+    async def _call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        if not self._serialize:
+            return await loop.run_in_executor(self._executor, call)
+        if self._lock is None:
+            # Created here rather than in __init__ as older pythons bind
+            # locks to the event loop current when they are created.
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await loop.run_in_executor(self._executor, call)
+
+    async def has(self, relpath):
+        return await self._call(self.transport.has, relpath)
+
+    async def get_bytes(self, relpath):
+        return await self._call(self.transport.get_bytes, relpath)
+
+    async def readv(self, relpath, offsets):
+        offsets = list(offsets)
+
+        def readv():
+            return list(self.transport.readv(relpath, offsets))
+
+        return await self._call(readv)
+
+    async def put_bytes(self, relpath, raw_bytes, mode=None):
+        await self._call(self.transport.put_bytes, relpath, raw_bytes, mode=mode)
+
+    async def put_file(self, relpath, f, mode=None):
+        return await self._call(self.transport.put_file, relpath, f, mode=mode)
+
+    async def stat(self, relpath):
+        return await self._call(self.transport.stat, relpath)
+
+    async def list_dir(self, relpath):
+        return await self._call(self.transport.list_dir, relpath)
+
+
+class LocalAsyncTransport(SyncTransportAdapter):
+    """Asynchronous access to the local filesystem.
+
+    There is no non-blocking file I/O to build on, so the operations run in
+    a thread pool; unlike with other transports they aren't serialized, as
+    the local transport releases the GIL and carries no connection state.
+    """
+
+    def __init__(self, transport, executor=None):
+        super().__init__(transport, executor=executor, serialize=False)
+
+
+class MemoryAsyncTransport(AsyncTransport):
+    """Asynchronous access to a MemoryTransport.
+
+    A memory transport never blocks, so its methods are called directly.
+    """
+
+    async def has(self, relpath):
+        return self.transport.has(relpath)
+
+    async def get_bytes(self, relpath):
+        return self.transport.get_bytes(relpath)
+
+    async def readv(self, relpath, offsets):
+        return list(self.transport.readv(relpath, offsets))
+
+    async def put_bytes(self, relpath, raw_bytes, mode=None):
+        self.transport.put_bytes(relpath, raw_bytes, mode=mode)
+
+    async def put_file(self, relpath, f, mode=None):
+        return self.transport.put_file(relpath, f, mode=mode)
+
+    async def stat(self, relpath):
+        return self.transport.stat(relpath)
+
+    async def list_dir(self, relpath):
+        return self.transport.list_dir(relpath)
+
+
+class _HttpResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class HttpAsyncTransport(AsyncTransport):
+    """Asynchronous HTTP client built on asyncio streams.
+
+    Requests are sent over up to http.max_connections_per_host keep-alive
+    connections.  Only the plain successful cases are handled natively:
+    responses needing authentication, redirections and unexpected errors
+    are handled by repeating the operation with the synchronous transport,
+    so they behave exactly as they would there.
+    """
+
+    def __init__(self, transport):
+        super().__init__(transport)
+        url = urllib.parse.urlsplit(transport._remote_path("."))
+        self._https = url.scheme == "https"
+        self._host = url.hostname
+        self._port = url.port or (443 if self._https else 80)
+        if url.port is None:
+            self._host_header = self._host
+        else:
+            self._host_header = f"{self._host}:{url.port}"
+        self._idle = []
+        self._semaphore = None
+        self._fallback = None
+
+    def _get_fallback(self):
+        if self._fallback is None:
+            self._fallback = SyncTransportAdapter(self.transport)
+        return self._fallback
+
+    def _ssl_context(self):
+        from .http.urllib import _connection_pool
+
+        config_stack = config.GlobalStack()
+        cert_reqs = config_stack.get("ssl.cert_reqs")
+        ca_certs = self.transport._ca_certs
+        if ca_certs is None:
+            ca_certs = config_stack.get("ssl.ca_certs")
+        return _connection_pool.ssl_context(ca_certs, cert_reqs, None, None)
+
+    async def _open_connection(self):
+        if self._https:
+            return await asyncio.open_connection(
+                self._host,
+                self._port,
+                ssl=self._ssl_context(),
+                server_hostname=self._host,
+            )
+        return await asyncio.open_connection(self._host, self._port)
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for _reader, writer in idle:
+            writer.close()
+        if self._fallback is not None:
+            await self._fallback.close()
+
+    async def _request(self, method, relpath, headers=None):
+        if self._semaphore is None:
+            # 0 only disables keeping idle connections for other transports;
+            # requests still need a connection.
+            self._semaphore = asyncio.Semaphore(
+                max(1, config.GlobalStack().get("http.max_connections_per_host"))
+            )
+        url = urllib.parse.urlsplit(self.transport._remote_path(relpath))
+        target = url.path or "/"
+        if url.query:
+            target += "?" + url.query
+        lines = [
+            f"{method} {target} HTTP/1.1",
+            f"Host: {self._host_header}",
+            f"User-Agent: {_user_agent()}",
+            "Accept: */*",
+        ]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        async with self._semaphore:
+            while True:
+                reused = bool(self._idle)
+                if reused:
+                    reader, writer = self._idle.pop()
+                else:
+                    reader, writer = await self._open_connection()
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    self.transport._report_activity(len(request), "write")
+                    status_line = await reader.readline()
+                    if not status_line:
+                        raise ConnectionResetError("connection closed by server")
+                except (OSError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        # The server closed the idle connection, try again
+                        # with a new one.
+                        continue
+                    raise
+                try:
+                    response, keep_alive = await self._read_response(
+                        reader, method, status_line
+                    )
+                except BaseException:
+                    writer.close()
+                    raise
+                if keep_alive:
+                    self._idle.append((reader, writer))
+                else:
+                    writer.close()
+                return response
+
+    async def _read_response(self, reader, method, status_line):
+        version, status = status_line.decode("latin-1").split(None, 2)[:2]
+        status = int(status)
+        headers = {}
+        received = len(status_line)
+        while True:
+            line = await reader.readline()
+            received += len(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode("latin-1").split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = (
+            version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        )
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size_line = await reader.readline()
+                received += len(size_line)
+                size = int(size_line.split(b";", 1)[0], 16)
+                if size == 0:
+                    break
+                chunk = await reader.readexactly(size + 2)
+                received += len(chunk)
+                chunks.append(chunk[:size])
+            # Skip the trailers.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        self.transport._report_activity(received + len(body), "read")
+        return _HttpResponse(status, headers, body), keep_alive
+
+    async def has(self, relpath):
+        response = await self._request("HEAD", relpath)
+        if response.status == 200:
+            return True
+        elif response.status == 404:
+            return False
+        return await self._get_fallback().has(relpath)
+
+    async def get_bytes(self, relpath):
+        response = await self._request("GET", relpath)
+        if response.status == 200:
+            return response.body
+        elif response.status == 404:
+            raise NoSuchFile(self.transport._remote_path(relpath))
+        return await self._get_fallback().get_bytes(relpath)
+
+    async def readv(self, relpath, offsets):
+        offsets = list(offsets)
+        if not offsets:
+            return []
+        if self.transport._range_hint is None:
+            # The server doesn't understand ranges.
+            return await super().readv(relpath, offsets)
+        fudge_factor, max_size = self.transport._coalesce_parameters()
+        coalesced = self.transport._coalesce_offsets(
+            sorted(offsets),
+            limit=self.transport._max_readv_combine,
+            fudge_factor=fudge_factor,
+            max_size=max_size,
+        )
+        try:
+            parts = await asyncio.gather(
+                *[self._read_range(relpath, coal) for coal in coalesced]
+            )
+        except _RangeNotHandled:
+            return await self._get_fallback().readv(relpath, offsets)
+        data = {}
+        for coal, chunk in zip(coalesced, parts):
+            for sub_offset, size in coal.ranges:
+                data[(coal.start + sub_offset, size)] = chunk[
+                    sub_offset : sub_offset + size
+                ]
+        return [(start, data[(start, size)]) for start, size in offsets]
+
+    async def _read_range(self, relpath, coal):
+        end = coal.start + coal.length - 1
+        response = await self._request(
+            "GET", relpath, headers={"Range": f"bytes={coal.start}-{end}"}
+        )
+        if response.status == 206:
+            content_range = response.headers.get("content-range", "")
+            try:
+                byte_range = content_range.split(None, 1)[1]
+                data_start = int(byte_range.split("-", 1)[0])
+            except ValueError as e:
+                raise errors.InvalidHttpResponse(
+                    self.transport._remote_path(relpath),
+                    f"Invalid Content-Range: {content_range!r}",
+                ) from e
+        elif response.status == 200:
+            data_start = 0
+        elif response.status == 404:
+            raise NoSuchFile(self.transport._remote_path(relpath))
+        else:
+            raise _RangeNotHandled()
+        chunk = response.body[coal.start - data_start : end + 1 - data_start]
+        if coal.start < data_start or len(chunk) != coal.length:
+            raise errors.ShortReadvError(relpath, coal.start, coal.length, len(chunk))
+        return chunk
+
+    async def put_bytes(self, relpath, raw_bytes, mode=None):
+        await self._get_fallback().put_bytes(relpath, raw_bytes, mode=mode)
+
+    async def put_file(self, relpath, f, mode=None):
+        return await self._get_fallback().put_file(relpath, f, mode=mode)
+
+    async def stat(self, relpath):
+        return await self._get_fallback().stat(relpath)
+
+    async def list_dir(self, relpath):
+        return await self._get_fallback().list_dir(relpath)
+
+
+class _RangeNotHandled(Exception):
+    """A range request got a response only the synchronous transport handles."""
+
+
+def _user_agent():
+    from .http import default_user_agent
+
+    return default_user_agent()
+
+
+def _uses_proxy(scheme, host):
+    proxies = urllib.request.getproxies()
+    return scheme in proxies and not urllib.request.proxy_bypass(host)
+
+
+def get_async_transport(transport):
+    """Return an AsyncTransport for transport."""
+    from .http.urllib import HttpTransport
+    from .local import LocalTransport
+    from .memory import MemoryTransport
+
+    if isinstance(transport, LocalTransport):
+        return LocalAsyncTransport(transport)
+    if isinstance(transport, MemoryTransport):
+        return MemoryAsyncTransport(transport)
+    if isinstance(transport, HttpTransport):
+        # Credentials and proxies are left to the synchronous transport.
+        url = transport._parsed_url
+        if url.user is None and not _uses_proxy(
+            transport._unqualified_scheme, url.host
+        ):
+            return HttpAsyncTransport(transport)
+        trace.mutter("using a synchronous adapter for %s", transport.base)
+    return SyncTransportAdapter(transport)
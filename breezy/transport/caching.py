@@ -0,0 +1,396 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Transport decorator caching the contents of immutable files.
+
+Pack repositories name their pack and index files after the hash of their
+contents, so once such a file exists under a given name its contents never
+change.  The CachingTransportDecorator keeps the blocks read from these
+files, so that reading the same regions again (for instance the root pages
+of every index of a repository, read by each command run against it) is
+served without a round trip.
+
+The blocks are BLOCK_SIZE bytes, aligned on BLOCK_SIZE in the file.  They
+are kept in memory, shared by all the caching transports of the process,
+and when block_cache.disk is set also below the breezy cache directory, so
+they survive between invocations.  The cache is keyed by the URL of the
+file: as a name always refers to the same contents, the cached data does
+not need to be validated against the server.
+
+The blocks on disk are kept in a directory per file.  When they take more
+than block_cache.disk_size, the directories of the files that were used
+least recently are removed.
+
+This is requested via the 'cache+' prefix to get_transport().
+"""
+
+import os
+import re
+import shutil
+import threading
+from hashlib import sha1
+from io import BytesIO
+
+from .. import bedding, config, errors, lru_cache, osutils, trace
+from . import decorator
+
+BLOCK_SIZE = 64 * 1024
+
+# The files of pack repositories that are named after their contents.
+_IMMUTABLE_NAME_RE = re.compile(r"(^|/)[0-9a-f]{32}\.(pack|[cirst]ix)$")
+
+
+class BlockCache:
+    """Blocks of immutable files, in memory and optionally on disk."""
+
+    def __init__(self, max_size, directory=None, max_disk_size=0):
+        """Create a BlockCache.
+
+        :param max_size: The number of bytes to keep in memory.
+        :param directory: The directory keeping blocks on disk, or None to
+            keep them in memory only.
+        :param max_disk_size: The number of bytes to keep on disk, or 0 for
+            no limit.
+        """
+        self._lock = threading.Lock()
+        self._blocks = lru_cache.LRUSizeCache(max_size)
+        # The size of the files, None when it can't be determined.
+        self._sizes = {}
+        # Bumped when a file is changed, so its blocks in memory are ignored.
+        self._generations = {}
+        self._directory = directory
+        self._max_disk_size = max_disk_size
+        self._disk_lock = threading.Lock()
+        # The number of bytes on disk, as far as this process knows; None
+        # until the directory has been scanned.
+        self._disk_size = None
+
+    def _file_directory(self, url):
+        return osutils.pathjoin(self._directory, sha1(url.encode("utf-8")).hexdigest())
+
+    def _read_file(self, url, name):
+        if self._directory is None:
+            return None
+        directory = self._file_directory(url)
+        try:
+            with open(osutils.pathjoin(directory, name), "rb") as f:
+                data = f.read()
+            if self._max_disk_size:
+                # Mark the file as used, so it is evicted last.
+                os.utime(directory)
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            trace.mutter("unable to read block cache for %s: %s", url, e)
+            return None
+
+    def _write_file(self, url, name, data):
+        if self._directory is None:
+            return
+        directory = self._file_directory(url)
+        path = osutils.pathjoin(directory, name)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            trace.mutter("unable to write block cache for %s: %s", url, e)
+        else:
+            self._add_disk_size(len(data))
+
+    def _scan_directory(self):
+        """Return the last use, size and path of the directory of each file."""
+        entries = []
+        try:
+            names = os.listdir(self._directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            path = osutils.pathjoin(self._directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except OSError:
+                continue
+            entries.append((mtime, size, path))
+        return entries
+
+    def _add_disk_size(self, size):
+        """Account for data written to disk, evicting files when needed.
+
+        Once the limit is exceeded, the least recently used files are
+        removed until the cache is down to three quarters of it, so that
+        the directory isn't scanned on every write.
+        """
+        if not self._max_disk_size:
+            return
+        with self._disk_lock:
+            if self._disk_size is None:
+                # This includes the data that was just written.
+                self._disk_size = sum(
+                    dir_size for _mtime, dir_size, _path in self._scan_directory()
+                )
+            else:
+                self._disk_size += size
+            if self._disk_size <= self._max_disk_size:
+                return
+            entries = sorted(self._scan_directory())
+            total = sum(dir_size for _mtime, dir_size, _path in entries)
+            for _mtime, dir_size, path in entries:
+                if total <= self._max_disk_size * 3 // 4:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= dir_size
+            self._disk_size = total
+
+    def get_size(self, url):
+        """Return the size of a file.
+
+        :return: The size, None if it can't be determined, or False if it
+            isn't known yet.
+        """
+        with self._lock:
+            size = self._sizes.get(url, False)
+        if size is False:
+            data = self._read_file(url, "size")
+            if data is not None:
+                try:
+                    size = int(data)
+                except ValueError:
+                    return False
+                with self._lock:
+                    self._sizes[url] = size
+        return size
+
+    def set_size(self, url, size):
+        """Record the size of a file, None meaning it can't be determined."""
+        with self._lock:
+            self._sizes[url] = size
+        if size is not None:
+            self._write_file(url, "size", b"%d" % size)
+
+    def get_block(self, url, index):
+        """Return a cached block of a file, or None."""
+        with self._lock:
+            key = (url, self._generations.get(url, 0), index)
+            data = self._blocks.get(key)
+        if data is None:
+            data = self._read_file(url, "%d" % index)
+            if data is not None:
+                with self._lock:
+                    self._blocks[key] = data
+        return data
+
+    def add_block(self, url, index, data):
+        """Cache a block of a file.
+
+        Blocks at the end of the requested data may be partial; they only
+        replace a cached block that is shorter.
+        """
+        with self._lock:
+            key = (url, self._generations.get(url, 0), index)
+            existing = self._blocks.get(key)
+            if existing is not None and len(existing) >= len(data):
+                return
+            self._blocks[key] = data
+        self._write_file(url, "%d" % index, data)
+
+    def forget(self, url):
+        """Drop everything cached about a file."""
+        with self._lock:
+            self._generations[url] = self._generations.get(url, 0) + 1
+            self._sizes.pop(url, None)
+        if self._directory is not None:
+            shutil.rmtree(self._file_directory(url), ignore_errors=True)
+
+
+_block_cache = None
+
+
+def get_block_cache():
+    """Return the block cache shared by the caching transports."""
+    global _block_cache
+    if _block_cache is None:
+        config_stack = config.GlobalStack()
+        if config_stack.get("block_cache.disk"):
+            directory = osutils.pathjoin(bedding.cache_dir(), "blocks")
+        else:
+            directory = None
+        _block_cache = BlockCache(
+            config_stack.get("block_cache.memory_size"),
+            directory=directory,
+            max_disk_size=config_stack.get("block_cache.disk_size"),
+        )
+    return _block_cache
+
+
+class CachingTransportDecorator(decorator.TransportDecorator):
+    """A decorator caching the blocks read from immutable files.
+
+    This is requested via the 'cache+' prefix to get_transport().
+    """
+
+    def __init__(self, url, _decorated=None, _from_transport=None):
+        super().__init__(url, _decorated)
+        if _from_transport is None:
+            self._cache = get_block_cache()
+        else:
+            self._cache = _from_transport._cache
+
+    @classmethod
+    def _get_url_prefix(self):
+        """Caching transport decorators are invoked via 'cache+'."""
+        return "cache+"
+
+    def _cached_url(self, relpath):
+        """Return the URL the blocks of relpath are cached under, or None.
+
+        Only files named after their contents are cached.
+        """
+        url = self._decorated.abspath(relpath)
+        if _IMMUTABLE_NAME_RE.search(url) is None:
+            return None
+        return url
+
+    def _forget(self, relpath):
+        url = self._cached_url(relpath)
+        if url is not None:
+            self._cache.forget(url)
+
+    def _get_size(self, relpath, url):
+        size = self._cache.get_size(url)
+        if size is False:
+            try:
+                size = self._decorated.stat(relpath).st_size
+            except (errors.TransportNotPossible, NotImplementedError):
+                # Reads are then only extended to the end of the blocks when
+                # that data was requested.
+                size = None
+            self._cache.set_size(url, size)
+        return size
+
+    def get(self, relpath):
+        """See Transport.get()."""
+        url = self._cached_url(relpath)
+        if url is None:
+            return self._decorated.get(relpath)
+        size = self._get_size(relpath, url)
+        if size is None:
+            return self._decorated.get(relpath)
+        if size == 0:
+            return BytesIO()
+        return BytesIO(next(self._cached_readv(relpath, url, [(0, size)]))[1])
+
+    def _readv(self, relpath, offsets):
+        """See Transport._readv."""
+        url = self._cached_url(relpath)
+        if url is None:
+            return self._decorated._readv(relpath, offsets)
+        return self._cached_readv(relpath, url, list(offsets))
+
+    def _cached_readv(self, relpath, url, offsets):
+        size = self._get_size(relpath, url)
+        # The end of the data needed from each block.
+        needed = {}
+        for start, length in offsets:
+            if length <= 0:
+                continue
+            first = start // BLOCK_SIZE
+            last = (start + length - 1) // BLOCK_SIZE
+            for index in range(first, last + 1):
+                end = min(start + length, (index + 1) * BLOCK_SIZE)
+                needed[index] = max(needed.get(index, 0), end)
+        blocks = {}
+        requests = []
+        for index, end in sorted(needed.items()):
+            block_start = index * BLOCK_SIZE
+            data = self._cache.get_block(url, index)
+            if data is not None and block_start + len(data) >= end:
+                blocks[index] = data
+                continue
+            if size is not None:
+                length = min(BLOCK_SIZE, size - block_start)
+            else:
+                length = end - block_start
+            if length > 0:
+                requests.append((block_start, length))
+        if requests:
+            for block_start, data in self._decorated.readv(relpath, requests):
+                index = block_start // BLOCK_SIZE
+                blocks[index] = data
+                self._cache.add_block(url, index, data)
+        for start, length in offsets:
+            chunks = []
+            pos = start
+            while pos < start + length:
+                index = pos // BLOCK_SIZE
+                block_start = index * BLOCK_SIZE
+                block = blocks.get(index, b"")
+                chunk = block[pos - block_start : start + length - block_start]
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                pos += len(chunk)
+            data = b"".join(chunks)
+            if len(data) != length:
+                raise errors.ShortReadvError(relpath, start, length, len(data))
+            yield start, data
+
+    def append_file(self, relpath, f, mode=None):
+        """See Transport.append_file()."""
+        self._forget(relpath)
+        return self._decorated.append_file(relpath, f, mode=mode)
+
+    def append_bytes(self, relpath, bytes, mode=None):
+        """See Transport.append_bytes()."""
+        self._forget(relpath)
+        return self._decorated.append_bytes(relpath, bytes, mode=mode)
+
+    def delete(self, relpath):
+        """See Transport.delete()."""
+        self._forget(relpath)
+        return self._decorated.delete(relpath)
+
+    def open_write_stream(self, relpath, mode=None):
+        """See Transport.open_write_stream."""
+        self._forget(relpath)
+        return self._decorated.open_write_stream(relpath, mode=mode)
+
+    def put_file(self, relpath, f, mode=None):
+        """See Transport.put_file()."""
+        self._forget(relpath)
+        return self._decorated.put_file(relpath, f, mode)
+
+    def put_bytes(self, relpath, bytes, mode=None):
+        """See Transport.put_bytes()."""
+        self._forget(relpath)
+        return self._decorated.put_bytes(relpath, bytes, mode)
+
+    def rename(self, rel_from, rel_to):
+        """See Transport.rename()."""
+        self._forget(rel_from)
+        self._forget(rel_to)
+        return self._decorated.rename(rel_from, rel_to)
+
+
+def get_test_permutations():
+    """Return the permutations to be used in testing."""
+    from ..tests import test_server
+
+    return [(CachingTransportDecorator, test_server.CachingServer)]
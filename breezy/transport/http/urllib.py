@@ -22,14 +22,17 @@ There are separate implementation modules for each http client implementation.
 DEBUG = 0
 
 import base64
+import collections
 import errno
 import hashlib
 import http.client
 import os
+import queue
 import re
 import socket
 import ssl
 import sys
+import threading
 import time
 import urllib
 import urllib.request
@@ -40,6 +43,7 @@ from ... import config, debug, errors, osutils, trace, transport, ui, urlutils
 from ...bzr.smart import medium
 from ...trace import mutter, mutter_callsite
 from ...transport import ConnectedTransport, NoSuchFile, UnusableRedirect
+from ...transport.readv_policy import AdaptiveReadvPolicy
 from . import default_user_agent
 
 # TODO: handle_response should be integrated into the http/__init__.py
@@ -218,6 +222,9 @@ class AbstractHTTPConnection:
 
     response_class = Response
 
+    # Set by ConnectionHandler, see ConnectionPool.acquire
+    _pool_key = None
+
     # When we detect a server responding with the whole file to range requests,
     # we want to warn. But not below a given thresold.
     _range_warning_thresold = 1024 * 1024
@@ -281,6 +288,12 @@ class AbstractHTTPConnection:
         """Wrap the socket before anybody use it."""
         self.sock = _ReportingSocket(sock, self._report_activity)
 
+    def set_report_activity(self, report_activity):
+        """Report the activity of the connection to another transport."""
+        self._report_activity = report_activity
+        if self.sock is not None:
+            self.sock._report_activity = report_activity
+
 
 class HTTPConnection(AbstractHTTPConnection, http.client.HTTPConnection):  # type: ignore
     # XXX: Needs refactoring at the caller level.
@@ -347,16 +360,14 @@ class HTTPSConnection(AbstractHTTPConnection, http.client.HTTPSConnection):  # t
                     "trusted CAs."
                 )
         try:
-            ssl_context = ssl.create_default_context(
-                purpose=ssl.Purpose.SERVER_AUTH, cafile=ca_certs
+            ssl_context = _connection_pool.ssl_context(
+                ca_certs, cert_reqs, self.cert_file, self.key_file
+            )
+            ssl_sock = ssl_context.wrap_socket(
+                self.sock,
+                server_hostname=self.host,
+                session=_connection_pool.tls_session(ssl_context, self._pool_key),
             )
-            ssl_context.check_hostname = cert_reqs != ssl.CERT_NONE
-            if self.cert_file:
-                ssl_context.load_cert_chain(
-                    keyfile=self.key_file, certfile=self.cert_file
-                )
-            ssl_context.verify_mode = cert_reqs
-            ssl_sock = ssl_context.wrap_socket(self.sock, server_hostname=self.host)
         except ssl.SSLError:
             trace.note(
                 "\n"
@@ -414,6 +425,13 @@ class Request(urllib.request.Request):
         self.auth = {}
         self.proxy_auth = {}
         self.proxied_host = None
+        # A file body is rewound before each attempt to send the request, as
+        # it is sent again after an authentication challenge or when the
+        # connection is lost.
+        if hasattr(data, "read") and hasattr(data, "seek"):
+            self.data_start = data.tell()
+        else:
+            self.data_start = None
 
     def get_method(self):
         return self.method
@@ -472,6 +490,135 @@ class _ConnectRequest(Request):
         urllib.request.Request.set_proxy(self, proxy, type)
 
 
+def _make_ssl_context(ca_certs, cert_reqs, cert_file, key_file):
+    ssl_context = ssl.create_default_context(
+        purpose=ssl.Purpose.SERVER_AUTH, cafile=ca_certs
+    )
+    ssl_context.check_hostname = cert_reqs != ssl.CERT_NONE
+    if cert_file:
+        ssl_context.load_cert_chain(keyfile=key_file, certfile=cert_file)
+    ssl_context.verify_mode = cert_reqs
+    return ssl_context
+
+
+class ConnectionPool:
+    """Idle HTTP connections, kept open for reuse by any transport.
+
+    Transports cloned from each other share a connection, but unrelated
+    transports to the same host each need their own.  Once no transport
+    uses a connection anymore, that is when the last transport sharing it
+    has been garbage collected, it is released to the pool; a transport
+    needing a new connection to the same host then reuses it instead of
+    connecting again.
+
+    The pool also keeps a SSL context per set of TLS settings, and the last
+    TLS session of each host, so new connections can resume a session
+    rather than doing a full handshake.
+    """
+
+    def __init__(self):
+        # Connections may be released by the garbage collector while the
+        # pool is in use in the same thread.
+        self._lock = threading.RLock()
+        self._idle = {}
+        self._ssl_contexts = {}
+        self._tls_sessions = {}
+        self._max_idle = None
+        self._idle_timeout = None
+
+    def _load_config(self):
+        if self._max_idle is None:
+            config_stack = config.GlobalStack()
+            self._max_idle = config_stack.get("http.max_connections_per_host")
+            self._idle_timeout = config_stack.get("http.idle_timeout")
+
+    def acquire(self, key, report_activity=None):
+        """Get an idle connection for key, or None if there is none.
+
+        :param key: Identifies the kind of connection, the host it is opened
+            to and the proxy it goes through.
+        :param report_activity: The function the connection should report
+            its activity to.
+        """
+        self._load_config()
+        expired = []
+        connection = None
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                released, candidate = idle.pop()
+                if now - released < self._idle_timeout:
+                    connection = candidate
+                    break
+                expired.append(candidate)
+        for candidate in expired:
+            candidate.close()
+        if connection is not None:
+            connection.set_report_activity(report_activity)
+        return connection
+
+    def release(self, connection):
+        """Give back a connection no transport uses anymore.
+
+        The connection is closed rather than kept when it isn't ready for
+        another request, or when enough connections to its host are idle
+        already.
+        """
+        key = getattr(connection, "_pool_key", None)
+        response = connection._response
+        if (
+            key is None
+            or self._max_idle is None
+            or connection.sock is None
+            or (response is not None and not response.isclosed())
+        ):
+            connection.close()
+            return
+        connection.set_report_activity(None)
+        session = getattr(connection.sock, "session", None)
+        with self._lock:
+            if session is not None:
+                self._tls_sessions[key] = (connection.sock.context, session)
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._max_idle:
+                idle.append((time.time(), connection))
+                connection = None
+        if connection is not None:
+            connection.close()
+
+    def ssl_context(self, ca_certs, cert_reqs, cert_file, key_file):
+        """Get a SSL context for the given settings."""
+        settings = (ca_certs, cert_reqs, cert_file, key_file)
+        with self._lock:
+            ssl_context = self._ssl_contexts.get(settings)
+            if ssl_context is None:
+                ssl_context = _make_ssl_context(*settings)
+                self._ssl_contexts[settings] = ssl_context
+        return ssl_context
+
+    def tls_session(self, ssl_context, key):
+        """Get a TLS session to resume for a new connection, if any."""
+        with self._lock:
+            session_context, session = self._tls_sessions.get(key, (None, None))
+        if session_context is not ssl_context:
+            # Sessions can only be resumed with the context that created them
+            return None
+        return session
+
+    def clear(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for connections in idle.values():
+            for _released, connection in connections:
+                connection.close()
+
+
+_connection_pool = ConnectionPool()
+
+
 class ConnectionHandler(urllib.request.BaseHandler):
     """Provides connection-sharing by pre-processing requests.
 
@@ -495,6 +642,10 @@ class ConnectionHandler(urllib.request.BaseHandler):
             # handled in the higher levels
             raise urlutils.InvalidURL(request.get_full_url(), "no host given.")
 
+        key = (http_connection_class, host, request.proxied_host, self.ca_certs)
+        connection = _connection_pool.acquire(key, self._report_activity)
+        if connection is not None:
+            return connection
         # We create a connection (but it will not connect until the first
         # request is made)
         try:
@@ -509,7 +660,7 @@ class ConnectionHandler(urllib.request.BaseHandler):
             raise urlutils.InvalidURL(
                 request.get_full_url(), extra="nonnumeric port"
             ) from e
-
+        connection._pool_key = key
         return connection
 
     def capture_connection(self, request, http_connection_class):
@@ -676,6 +827,8 @@ class AbstractHTTPHandler(urllib.request.AbstractHTTPHandler):
         # that. Since we replace urllib.request.AbstractHTTPHandler.do_open we do it
         # ourself below.
         headers = {name.title(): val for name, val in headers.items()}
+        if getattr(request, "data_start", None) is not None:
+            request.data.seek(request.data_start)
 
         try:
             method = request.get_method()
@@ -1788,6 +1941,67 @@ class Opener:
             pprint.pprint(self._opener.__dict__)
 
 
+class _ReadvConnectionPool:
+    """Extra connections used to fetch ranges in parallel.
+
+    The pool is shared by a transport and its clones.  Each connection is a
+    transport of its own, used by one thread at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._size = None
+
+    @property
+    def size(self):
+        """The number of connections parallel readv may use."""
+        if self._size is None:
+            self._size = config.GlobalStack().get("http.readv_connections")
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        self._size = size
+
+    def get(self, transport):
+        """Get an idle connection, waiting for one if all are in use."""
+        with self._lock:
+            if self._idle.empty() and len(self._workers) < self.size:
+                worker = transport._make_readv_worker()
+                self._workers.append(worker)
+                return worker
+        return self._idle.get()
+
+    def put(self, worker):
+        """Give back a connection obtained with get."""
+        self._idle.put(worker)
+
+    def disconnect(self):
+        for worker in self._workers:
+            worker.disconnect()
+
+
+class _FetchedRange:
+    """The data of a coalesced offset, read at offsets in the whole file."""
+
+    def __init__(self, start, data):
+        self._start = start
+        self._data = data
+        self._pos = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence != os.SEEK_SET:
+            raise AssertionError(f"unsupported whence {whence!r}")
+        self._pos = offset - self._start
+
+    def read(self, size):
+        data = self._data[self._pos : self._pos + size]
+        self._pos += len(data)
+        return data
+
+
 class HttpTransport(ConnectedTransport):
     """HTTP Client implementations.
 
@@ -1820,11 +2034,22 @@ class HttpTransport(ConnectedTransport):
         if _from_transport is not None:
             self._range_hint = _from_transport._range_hint
             self._opener = _from_transport._opener
+            self._ca_certs = _from_transport._ca_certs
+            self._readv_pool = _from_transport._readv_pool
+            self._readv_policy = _from_transport._readv_policy
+            self._readv_worker = _from_transport._readv_worker
         else:
             self._range_hint = "multi"
             self._opener = Opener(
                 report_activity=self._report_activity, ca_certs=ca_certs
             )
+            self._ca_certs = ca_certs
+            self._readv_pool = _ReadvConnectionPool()
+            self._readv_worker = False
+            if config.GlobalStack().get("http.adaptive_readv"):
+                self._readv_policy = AdaptiveReadvPolicy(self._parsed_url.host)
+            else:
+                self._readv_policy = None
 
     def request(self, method, url, fields=None, headers=None, **urlopen_kw):
         body = urlopen_kw.pop("body", None)
@@ -1848,6 +2073,10 @@ class HttpTransport(ConnectedTransport):
             # Clean the httplib.HTTPConnection pipeline in case the previous
             # request couldn't do it
             connection.cleanup_pipe()
+        elif self._readv_worker and self._get_credentials() is not None:
+            # A pool connection, using the credentials of the transport it
+            # was made for, see _make_readv_worker.
+            (auth, proxy_auth) = self._get_credentials()
         else:
             # First request, initialize credentials.
             # scheme and realm will be set by the _urllib2_wrappers.AuthHandler
@@ -1868,6 +2097,14 @@ class HttpTransport(ConnectedTransport):
         if self._get_connection() is not request.connection:
             # First connection or reconnection
             self._set_connection(request.connection, (request.auth, request.proxy_auth))
+            # Hand the connection to other transports once none of the
+            # transports sharing it are left.
+            finalizer = weakref.finalize(
+                self._get_shared_connection(),
+                _connection_pool.release,
+                request.connection,
+            )
+            finalizer.atexit = False
         else:
             # http may change the credentials while keeping the
             # connection opened
@@ -1946,6 +2183,7 @@ class HttpTransport(ConnectedTransport):
         connection = self._get_connection()
         if connection is not None:
             connection.close()
+        self._readv_pool.disconnect()
 
     def has(self, relpath):
         """Does the target location exist?"""
@@ -2092,16 +2330,17 @@ class HttpTransport(ConnectedTransport):
 
             # Coalesce the offsets to minimize the GET requests issued
             sorted_offsets = sorted(offsets)
+            fudge_factor, max_size = self._coalesce_parameters()
             coalesced = self._coalesce_offsets(
                 sorted_offsets,
                 limit=self._max_readv_combine,
-                fudge_factor=self._bytes_to_read_before_seek,
-                max_size=self._get_max_size,
+                fudge_factor=fudge_factor,
+                max_size=max_size,
             )
 
             # Turn it into a list, we will iterate it several times
             coalesced = list(coalesced)
-            if debug.debug_flag_enabled("http"):
+            if debug.debug_flag_enabled("http") or debug.debug_flag_enabled("readv"):
                 mutter(
                     "http readv of %s  offsets => %s collapsed %s",
                     relpath,
@@ -2180,58 +2419,191 @@ class HttpTransport(ConnectedTransport):
                 retried_offset = cur_offset_and_size
                 try_again = True
 
+    def _coalesce_parameters(self):
+        """Return the fudge factor and maximum size to coalesce offsets with."""
+        if self._readv_policy is None:
+            return self._bytes_to_read_before_seek, self._get_max_size
+        return self._readv_policy.coalesce_parameters(
+            self._bytes_to_read_before_seek, self._get_max_size
+        )
+
+    def _record_readv_request(self, ranges, start):
+        """Tell the readv policy about a GET request that has been served."""
+        if self._readv_policy is not None:
+            self._readv_policy.record(
+                sum(coal.length for coal in ranges), time.monotonic() - start
+            )
+
+    def _read_coalesced(self, rfile, coalesced):
+        """Read the data of coalesced offsets from a response.
+
+        :return: A list with a _FetchedRange for each coalesced offset.
+        """
+        fetched = []
+        for coal in coalesced:
+            rfile.seek(coal.start, os.SEEK_SET)
+            fetched.append(_FetchedRange(coal.start, rfile.read(coal.length)))
+        return fetched
+
     def _coalesce_readv(self, relpath, coalesced):
         """Issue several GET requests to satisfy the coalesced offsets."""
 
         def get_and_yield(relpath, coalesced):
             if coalesced:
+                start = time.monotonic()
                 # Note that the _get below may raise
                 # errors.InvalidHttpRange. It's the caller's responsibility to
                 # decide how to retry since it may provide different coalesced
                 # offsets.
                 code, rfile = self._get(relpath, coalesced)
-                for coal in coalesced:
-                    yield coal, rfile
+                if self._readv_policy is None:
+                    for coal in coalesced:
+                        yield coal, rfile
+                    return
+                # Read the whole response before serving any offsets, so that
+                # the time the caller spends between them isn't recorded as
+                # time spent on the request.
+                fetched = self._read_coalesced(rfile, coalesced)
+                self._record_readv_request(coalesced, start)
+                yield from zip(coalesced, fetched)
 
         if self._range_hint is None:
             # Download whole file
             yield from get_and_yield(relpath, coalesced)
+        elif self._readv_pool.size > 1 and len(coalesced) > 1:
+            yield from self._parallel_coalesce_readv(relpath, coalesced)
         else:
-            total = len(coalesced)
-            if self._range_hint == "multi":
-                max_ranges = self._max_get_ranges
-            elif self._range_hint == "single":
-                max_ranges = total
-            else:
-                raise AssertionError(f"Unknown _range_hint {self._range_hint!r}")
             # TODO: Some web servers may ignore the range requests and return
             # the whole file, we may want to detect that and avoid further
             # requests.
             # Hint: test_readv_multiple_get_requests will fail once we do that
-            cumul = 0
-            ranges = []
-            for coal in coalesced:
-                if (
-                    self._get_max_size > 0 and cumul + coal.length > self._get_max_size
-                ) or len(ranges) >= max_ranges:
-                    # Get that much and yield
-                    yield from get_and_yield(relpath, ranges)
-                    # Restart with the current offset
-                    ranges = [coal]
-                    cumul = coal.length
-                else:
-                    ranges.append(coal)
-                    cumul += coal.length
-            # Get the rest and yield
-            yield from get_and_yield(relpath, ranges)
+            for ranges in self._batch_ranges(coalesced):
+                yield from get_and_yield(relpath, ranges)
+
+    def _batch_ranges(self, coalesced, parts=1):
+        """Split coalesced offsets into the ranges of successive requests.
+
+        :param coalesced: A list of _CoalescedOffset.
+        :param parts: The number of requests the offsets should be spread
+            over, when there are enough of them.
+        :return: An iterator over lists of _CoalescedOffset.
+        """
+        total = len(coalesced)
+        if self._range_hint == "multi":
+            max_ranges = self._max_get_ranges
+        elif self._range_hint == "single":
+            max_ranges = total
+        else:
+            raise AssertionError(f"Unknown _range_hint {self._range_hint!r}")
+        max_size = self._coalesce_parameters()[1]
+        if parts > 1:
+            max_ranges = min(max_ranges, -(-total // parts))
+            share = -(-sum(coal.length for coal in coalesced) // parts)
+            if max_size <= 0 or share < max_size:
+                max_size = share
+        cumul = 0
+        ranges = []
+        for coal in coalesced:
+            if ranges and (
+                (max_size > 0 and cumul + coal.length > max_size)
+                or len(ranges) >= max_ranges
+            ):
+                yield ranges
+                # Restart with the current offset
+                ranges = [coal]
+                cumul = coal.length
+            else:
+                ranges.append(coal)
+                cumul += coal.length
+        if ranges:
+            yield ranges
+
+    def _parallel_coalesce_readv(self, relpath, coalesced):
+        """Issue GET requests for the coalesced offsets over several connections.
+
+        At most one request per connection is in flight.  The responses are
+        read in background threads and yielded in the order of the offsets,
+        so _readv can serve them as usual.  The activity of the connections
+        is reported from the calling thread as their responses are yielded.
+        """
+        pool = self._readv_pool
+        batches = self._batch_ranges(coalesced, pool.size)
+        pending = collections.deque()
+
+        def fetch(ranges, result):
+            worker = pool.get(self)
+            try:
+                start = time.monotonic()
+                reused = worker._reuse_for(self.base)
+                reused._range_hint = self._range_hint
+                code, rfile = reused._get(relpath, ranges)
+                fetched = self._read_coalesced(rfile, ranges)
+                self._record_readv_request(ranges, start)
+            except BaseException as e:
+                fetched = e
+            activity = dict(worker._readv_activity)
+            worker._readv_activity.clear()
+            pool.put(worker)
+            result.put((fetched, activity))
+
+        def start_next():
+            ranges = next(batches, None)
+            if ranges is not None:
+                result = queue.Queue(maxsize=1)
+                threading.Thread(
+                    target=fetch, args=(ranges, result), daemon=True
+                ).start()
+                pending.append((ranges, result))
+
+        for _i in range(pool.size):
+            start_next()
+        while pending:
+            ranges, result = pending.popleft()
+            fetched, activity = result.get()
+            for direction, size in activity.items():
+                self._report_activity(size, direction)
+            if isinstance(fetched, BaseException):
+                raise fetched
+            start_next()
+            yield from zip(ranges, fetched)
+
+    def _make_readv_worker(self):
+        """Create a transport with a connection of its own, for parallel readv.
+
+        The credentials of this transport are reused rather than acquired
+        again.  The activity of the connection is counted rather than
+        reported, since it happens in another thread.
+        """
+        worker = self.__class__(self.base, _from_transport=self)
+        worker._readv_worker = True
+        worker._readv_activity = activity = collections.Counter()
+
+        def count_activity(size, direction):
+            activity[direction] += size
+
+        credentials = self._get_credentials()
+        if credentials is not None:
+            (auth, proxy_auth) = credentials
+            credentials = (dict(auth), dict(proxy_auth))
+        worker._shared_connection = transport._SharedConnection(credentials=credentials)
+        # The handlers of an opener keep some state about the request they
+        # process, so they can't be shared between threads.
+        worker._opener = self._opener.__class__(
+            report_activity=count_activity, ca_certs=self._ca_certs
+        )
+        worker._readv_pool = _ReadvConnectionPool()
+        return worker
 
     def recommended_page_size(self):
         """See Transport.recommended_page_size().
 
         For HTTP we suggest a large page size to reduce the overhead
-        introduced by latency.
+        introduced by latency.  With http.adaptive_readv it grows with the
+        measured bandwidth-delay product of the connection.
         """
-        return 64 * 1024
+        if self._readv_policy is None:
+            return 64 * 1024
+        return self._readv_policy.page_size(64 * 1024)
 
     def _post(self, body_bytes):
         """POST body_bytes to .bzr/smart on this transport.
@@ -0,0 +1,321 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Transport decorators simulating the latency and bandwidth of a network.
+
+Most performance problems of remote operations come from the number of round
+trips they need rather than from the work done on either side.  These
+decorators make a local location behave, as far as timing goes, like a
+remote one: every request made through them waits for a simulated round
+trip, and the data transferred is delayed according to a simulated
+bandwidth.  The delays are reproducible, the jitter being drawn from a
+generator with a configured seed.
+
+The requests are counted too, so that tests can assert how many round trips
+an operation needs without a real network.
+
+The decorators are requested via the 'latency+' prefix to get_transport(),
+configured with the latency.rtt, latency.jitter and latency.seed options, and
+the 'throttle+' prefix, configured with the throttle.bandwidth option.  They
+can be combined, as in 'latency+throttle+file:///path'.
+"""
+
+import random
+import threading
+import time
+from io import BytesIO
+
+from .. import config
+from . import decorator
+
+# Replaced by tests simulating a slow link, so that they don't actually wait.
+_sleep = time.sleep
+
+
+class SimulatedLink:
+    """The timing of a simulated network link.
+
+    :ivar round_trips: The number of round trips made over the link.
+    :ivar bytes_transferred: The number of bytes transferred over the link.
+    :ivar delay: The total time waited for the link, in seconds.
+    """
+
+    def __init__(self, rtt=0.0, jitter=0.0, bandwidth=0, seed=0):
+        """Create a SimulatedLink.
+
+        :param rtt: The time a round trip takes, in seconds.
+        :param jitter: The maximum random time added to each round trip, in
+            seconds.
+        :param bandwidth: The bytes transferred per second, 0 meaning the
+            transfers are not delayed.
+        :param seed: The seed of the generator drawing the jitter.
+        """
+        self.rtt = rtt
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.round_trips = 0
+        self.bytes_transferred = 0
+        self.delay = 0.0
+
+    def _wait(self, round_trips, byte_count):
+        with self._lock:
+            delay = 0.0
+            if round_trips:
+                delay += self.rtt
+                if self.jitter:
+                    delay += self._random.uniform(0, self.jitter)
+            if self.bandwidth:
+                delay += byte_count / self.bandwidth
+            self.round_trips += round_trips
+            self.bytes_transferred += byte_count
+            self.delay += delay
+        if delay > 0:
+            _sleep(delay)
+
+    def round_trip(self, byte_count=0):
+        """Wait for a request and its response to cross the link.
+
+        :param byte_count: The bytes sent or received by the request.
+        """
+        self._wait(1, byte_count)
+
+    def transfer(self, byte_count):
+        """Wait for data sent as part of an ongoing request."""
+        self._wait(0, byte_count)
+
+    def smart_call_hook(self, params):
+        """Simulate the link for a call of a smart client.
+
+        Install this as a 'call' hook of breezy.bzr.smart.client._SmartClient
+        to delay smart protocol requests.  Only the size of the request body
+        is known to the hook, so the bandwidth only applies to the data sent.
+        """
+        body = params.body
+        self.round_trip(0 if body is None else len(body))
+
+    def reset(self):
+        """Reset the counters, keeping the state of the jitter generator."""
+        with self._lock:
+            self.round_trips = 0
+            self.bytes_transferred = 0
+            self.delay = 0.0
+
+
+_latency_link = None
+_throttle_link = None
+
+
+def get_latency_link():
+    """Return the link shared by the latency transports."""
+    global _latency_link
+    if _latency_link is None:
+        config_stack = config.GlobalStack()
+        _latency_link = SimulatedLink(
+            rtt=config_stack.get("latency.rtt") / 1000.0,
+            jitter=config_stack.get("latency.jitter") / 1000.0,
+            seed=config_stack.get("latency.seed"),
+        )
+    return _latency_link
+
+
+def get_throttle_link():
+    """Return the link shared by the throttle transports."""
+    global _throttle_link
+    if _throttle_link is None:
+        _throttle_link = SimulatedLink(
+            bandwidth=config.GlobalStack().get("throttle.bandwidth")
+        )
+    return _throttle_link
+
+
+class _SimulatedFileStream:
+    """Wrap a file stream, delaying the data written to it."""
+
+    def __init__(self, link, stream):
+        self._link = link
+        self._stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+        return False
+
+    def write(self, bytes):
+        self._link.transfer(len(bytes))
+        return self._stream.write(bytes)
+
+
+class SimulatedLinkTransportDecorator(decorator.TransportDecorator):
+    """A decorator delaying its requests as a network link would.
+
+    Each request of the transport API costs a round trip, readv() making one
+    per request of the decorated transport.  get() reads the whole file so
+    that the data can be delayed before it is returned.
+
+    Subclasses provide the link through _get_link().
+    """
+
+    def __init__(self, url, _decorated=None, _from_transport=None):
+        super().__init__(url, _decorated)
+        if _from_transport is None:
+            self._link = self._get_link()
+        else:
+            self._link = _from_transport._link
+
+    def _get_link(self):
+        raise NotImplementedError(self._get_link)
+
+    def _request(self, method, *args, **kwargs):
+        """Call a method of the decorated transport after a round trip."""
+        self._link.round_trip()
+        return method(*args, **kwargs)
+
+    def append_file(self, relpath, f, mode=None):
+        """See Transport.append_file()."""
+        return self.append_bytes(relpath, f.read(), mode=mode)
+
+    def append_bytes(self, relpath, bytes, mode=None):
+        """See Transport.append_bytes()."""
+        self._link.round_trip(len(bytes))
+        return self._decorated.append_bytes(relpath, bytes, mode=mode)
+
+    def delete(self, relpath):
+        """See Transport.delete()."""
+        return self._request(self._decorated.delete, relpath)
+
+    def delete_tree(self, relpath):
+        """See Transport.delete_tree()."""
+        return self._request(self._decorated.delete_tree, relpath)
+
+    def get(self, relpath):
+        """See Transport.get()."""
+        try:
+            f = self._decorated.get(relpath)
+            try:
+                data = f.read()
+            finally:
+                f.close()
+        except BaseException:
+            self._link.round_trip()
+            raise
+        self._link.round_trip(len(data))
+        return BytesIO(data)
+
+    def has(self, relpath):
+        """See Transport.has()."""
+        return self._request(self._decorated.has, relpath)
+
+    def iter_files_recursive(self):
+        """See Transport.iter_files_recursive()."""
+        return iter(self._request(lambda: list(self._decorated.iter_files_recursive())))
+
+    def list_dir(self, relpath):
+        """See Transport.list_dir()."""
+        return self._request(self._decorated.list_dir, relpath)
+
+    def lock_read(self, relpath):
+        """See Transport.lock_read()."""
+        return self._request(self._decorated.lock_read, relpath)
+
+    def lock_write(self, relpath):
+        """See Transport.lock_write()."""
+        return self._request(self._decorated.lock_write, relpath)
+
+    def mkdir(self, relpath, mode=None):
+        """See Transport.mkdir()."""
+        return self._request(self._decorated.mkdir, relpath, mode)
+
+    def open_write_stream(self, relpath, mode=None):
+        """See Transport.open_write_stream."""
+        stream = self._request(self._decorated.open_write_stream, relpath, mode=mode)
+        return _SimulatedFileStream(self._link, stream)
+
+    def put_file(self, relpath, f, mode=None):
+        """See Transport.put_file()."""
+        data = f.read()
+        self.put_bytes(relpath, data, mode)
+        return len(data)
+
+    def put_bytes(self, relpath, bytes, mode=None):
+        """See Transport.put_bytes()."""
+        self._link.round_trip(len(bytes))
+        return self._decorated.put_bytes(relpath, bytes, mode)
+
+    def _readv(self, relpath, offsets):
+        """See Transport._readv."""
+        self._link.round_trip()
+        for offset, data in self._decorated._readv(relpath, offsets):
+            self._link.transfer(len(data))
+            yield offset, data
+
+    def rename(self, rel_from, rel_to):
+        """See Transport.rename()."""
+        return self._request(self._decorated.rename, rel_from, rel_to)
+
+    def rmdir(self, relpath):
+        """See Transport.rmdir."""
+        return self._request(self._decorated.rmdir, relpath)
+
+    def stat(self, relpath):
+        """See Transport.stat()."""
+        return self._request(self._decorated.stat, relpath)
+
+
+class LatencyTransportDecorator(SimulatedLinkTransportDecorator):
+    """A decorator adding a simulated round trip time to its requests.
+
+    This is requested via the 'latency+' prefix to get_transport().
+    """
+
+    @classmethod
+    def _get_url_prefix(self):
+        """Latency transport decorators are invoked via 'latency+'."""
+        return "latency+"
+
+    def _get_link(self):
+        return get_latency_link()
+
+
+class ThrottleTransportDecorator(SimulatedLinkTransportDecorator):
+    """A decorator limiting the bandwidth of its transfers.
+
+    This is requested via the 'throttle+' prefix to get_transport().
+    """
+
+    @classmethod
+    def _get_url_prefix(self):
+        """Throttle transport decorators are invoked via 'throttle+'."""
+        return "throttle+"
+
+    def _get_link(self):
+        return get_throttle_link()
+
+
+def get_test_permutations():
+    """Return the permutations to be used in testing."""
+    from ..tests import test_server
+
+    return [
+        (LatencyTransportDecorator, test_server.LatencyServer),
+        (ThrottleTransportDecorator, test_server.ThrottleServer),
+    ]
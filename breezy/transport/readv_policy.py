@@ -0,0 +1,160 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tune readv coalescing to the measured latency and bandwidth of a link.
+
+Transports coalesce the offsets of a readv into fewer, larger requests using
+static parameters chosen for a typical link.  An AdaptiveReadvPolicy records
+how long the requests of a connection take and estimates its round trip time
+and throughput from them.  Their product, the bandwidth-delay product, is the
+amount of data that could have been transferred in the time a request costs:
+reading that much unneeded data is cheaper than issuing another request, so
+the gaps bridged when coalescing, the size of combined requests and the page
+size recommended to indices grow with it.
+
+The static parameters of the transport are used until enough requests have
+been measured, and are never reduced: the policy only makes requests larger
+on links where that pays.  With -Dreadv the decisions are traced to
+~/.brz.log.
+"""
+
+import collections
+
+from .. import debug, trace
+
+# Requests recorded to estimate the latency and throughput of a link.
+_SAMPLES = 32
+# Requests to measure before departing from the static parameters.
+_MIN_SAMPLES = 4
+# Upper bounds for the tuned parameters.
+MAX_FUDGE_FACTOR = 1024 * 1024
+MAX_COMBINED_SIZE = 16 * 1024 * 1024
+MAX_PAGE_SIZE = 1024 * 1024
+# Combined requests may be this many times the bandwidth-delay product.
+_COMBINED_BDP_FACTOR = 8
+_PAGE = 4096
+
+
+class AdaptiveReadvPolicy:
+    """Readv coalescing parameters derived from completed requests."""
+
+    def __init__(self, name=None):
+        """Create an AdaptiveReadvPolicy.
+
+        :param name: A description of the connection, used in traces.
+        """
+        self._name = name
+        self._samples = collections.deque(maxlen=_SAMPLES)
+        self._estimate = None
+
+    def record(self, byte_count, duration):
+        """Record a completed read request.
+
+        :param byte_count: The number of bytes the request returned.
+        :param duration: The time between issuing the request and receiving
+            the last of its bytes, in seconds.
+        """
+        if duration <= 0:
+            return
+        self._samples.append((byte_count, duration))
+        self._estimate = None
+        if debug.debug_flag_enabled("readv"):
+            rtt, bandwidth = self.estimate()
+            trace.mutter(
+                "readv %s: %d bytes in %.3fs, rtt %s bandwidth %s",
+                self._name,
+                byte_count,
+                duration,
+                "unknown" if rtt is None else f"{rtt * 1000:.1f}ms",
+                "unknown" if bandwidth is None else f"{bandwidth / 1024:.0f}kB/s",
+            )
+
+    def estimate(self):
+        """Estimate the round trip time and throughput of the link.
+
+        Each request is assumed to take the round trip time plus its size
+        divided by the throughput; a least squares fit over the recorded
+        requests gives both.  When the requests are too alike for the fit to
+        be meaningful, the fastest request bounds the round trip time and the
+        best observed rate the throughput.
+
+        :return: A (round trip time in seconds, bytes per second) tuple, with
+            None for both while too few requests have been recorded.
+        """
+        if self._estimate is not None:
+            return self._estimate
+        samples = list(self._samples)
+        if len(samples) < _MIN_SAMPLES:
+            return None, None
+        count = len(samples)
+        mean_bytes = sum(b for b, d in samples) / count
+        mean_duration = sum(d for b, d in samples) / count
+        variance = sum((b - mean_bytes) ** 2 for b, d in samples)
+        covariance = sum((b - mean_bytes) * (d - mean_duration) for b, d in samples)
+        rtt = bandwidth = None
+        if variance > 0 and covariance > 0:
+            seconds_per_byte = covariance / variance
+            rtt = mean_duration - seconds_per_byte * mean_bytes
+            bandwidth = 1 / seconds_per_byte
+        if rtt is None or rtt <= 0:
+            rtt = min(d for b, d in samples)
+            bandwidth = max(b / d for b, d in samples)
+        self._estimate = rtt, bandwidth
+        return self._estimate
+
+    def bandwidth_delay_product(self):
+        """Return the bytes that can be transferred during a round trip."""
+        rtt, bandwidth = self.estimate()
+        if rtt is None:
+            return 0
+        return round(rtt * bandwidth)
+
+    def coalesce_parameters(self, fudge_factor, max_size):
+        """Return the fudge factor and maximum size to coalesce offsets with.
+
+        :param fudge_factor: The static fudge factor of the transport.
+        :param max_size: The static maximum size of combined requests, 0
+            meaning no limit.
+        """
+        bdp = self.bandwidth_delay_product()
+        new_fudge_factor = max(fudge_factor, min(bdp, MAX_FUDGE_FACTOR))
+        if max_size:
+            new_max_size = max(
+                max_size, min(bdp * _COMBINED_BDP_FACTOR, MAX_COMBINED_SIZE)
+            )
+        else:
+            new_max_size = max_size
+        if debug.debug_flag_enabled("readv"):
+            trace.mutter(
+                "readv %s: bdp %d bytes, fudge factor %d (static %d),"
+                " max size %d (static %d)",
+                self._name,
+                bdp,
+                new_fudge_factor,
+                fudge_factor,
+                new_max_size,
+                max_size,
+            )
+        return new_fudge_factor, new_max_size
+
+    def page_size(self, page_size):
+        """Return the page size to recommend to readers of the transport.
+
+        :param page_size: The static page size of the transport.
+        """
+        bdp = self.bandwidth_delay_product()
+        pages = -(-min(bdp, MAX_PAGE_SIZE) // _PAGE)
+        return max(page_size, pages * _PAGE)
@@ -0,0 +1,500 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Transport decorator recording the operations performed to a trace file.
+
+The trace captures the access pattern of a command: which files are read,
+which parts of them, how much is written, and how long each operation took.
+It can be replayed against another transport with ``brz benchmark-transport``
+to measure the effect of changes to readv coalescing, caching or prefetching
+on a real workload, without access to the original location.
+
+The trace is a text file.  After a header line, each line records one
+operation as space separated fields::
+
+    START DURATION OPERATION STATUS URL [ARGUMENT...]
+
+START is the time the operation started, in seconds since the recording
+began, and DURATION how long it took.  For readv, DURATION is the time spent
+waiting for the data, without the time the caller spent between offsets.
+STATUS is ``ok``, or ``error`` if the operation raised an exception.  The
+arguments depend on the operation, sizes being in bytes and counts of
+directory entries:
+
+    get URL SIZE
+    readv URL OFFSET+LENGTH,... ADJUST SIZE
+    has URL 1|0
+    stat URL SIZE
+    list_dir URL COUNT
+    iter_files_recursive URL COUNT
+    put URL SIZE
+    put_non_atomic URL SIZE CREATE-PARENT
+    append URL SIZE
+    write_stream URL SIZE
+    mkdir URL
+    rmdir URL
+    delete URL
+    rename URL TARGET-URL
+    copy URL TARGET-URL
+    move URL TARGET-URL
+
+ADJUST is ``-`` when the readv offsets were not to be adjusted for latency,
+otherwise the upper limit given for the file or ``*`` when there was none.
+CREATE-PARENT is 1 when the parent directory was to be created if missing.
+
+This is requested via the 'record+' prefix to get_transport(); the trace is
+appended to the file named by the transport.record_file option, which has to
+be set.
+"""
+
+import threading
+import time
+from io import BytesIO
+
+from .. import config, errors
+from . import decorator
+
+TRACE_HEADER = b"# breezy transport trace 1\n"
+
+
+class RecordFileNotSet(errors.BzrError):
+    _fmt = "Set transport.record_file to the file to record transport operations to."
+
+
+class TraceRecorder:
+    """Write the operations of recording transports to a trace file."""
+
+    def __init__(self, f):
+        """Create a TraceRecorder.
+
+        :param f: The binary file the trace is written to.
+        """
+        self._file = f
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._file.write(TRACE_HEADER)
+        self._file.flush()
+
+    def now(self):
+        """Return the current time of the recording."""
+        return time.monotonic() - self._start
+
+    def record(self, operation, url, start, ok, args=(), duration=None):
+        """Record a completed operation.
+
+        :param operation: The name of the operation.
+        :param url: The URL of the file or directory operated on.
+        :param start: The time the operation started, as returned by now().
+        :param ok: Whether the operation succeeded.
+        :param args: The arguments recorded for the operation.
+        :param duration: How long the operation took, if it didn't last
+            until now.
+        """
+        if duration is None:
+            duration = self.now() - start
+        fields = [
+            f"{start:.6f}",
+            f"{duration:.6f}",
+            operation,
+            "ok" if ok else "error",
+            url,
+        ]
+        fields.extend(str(arg) for arg in args)
+        line = (" ".join(fields) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+
+_recorder = None
+
+
+def get_recorder():
+    """Return the recorder shared by the recording transports."""
+    global _recorder
+    if _recorder is None:
+        path = config.GlobalStack().get("transport.record_file")
+        if not path:
+            raise RecordFileNotSet()
+        _recorder = TraceRecorder(open(path, "ab"))
+    return _recorder
+
+
+def _format_offsets(offsets):
+    if not offsets:
+        return "-"
+    return ",".join(f"{start}+{length}" for start, length in offsets)
+
+
+def _format_adjust(adjust_for_latency, upper_limit):
+    if not adjust_for_latency:
+        return "-"
+    if upper_limit is None:
+        return "*"
+    return str(upper_limit)
+
+
+class _CountingFile:
+    """Wrap a file being read, counting the bytes read from it."""
+
+    def __init__(self, f):
+        self._file = f
+        self.size = 0
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        for line in self._file:
+            self.size += len(line)
+            yield line
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self.size += len(data)
+        return data
+
+    def readline(self, size=-1):
+        line = self._file.readline(size)
+        self.size += len(line)
+        return line
+
+
+class _RecordingFileStream:
+    """Wrap a file stream, recording the bytes written once it is closed."""
+
+    def __init__(self, transport, url, stream, start):
+        self._transport = transport
+        self._url = url
+        self._stream = stream
+        self._start = start
+        self._size = 0
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+        return False
+
+    def write(self, bytes):
+        self._size += len(bytes)
+        return self._stream.write(bytes)
+
+    def close(self, want_fdatasync=False):
+        ok = False
+        try:
+            if want_fdatasync:
+                self._stream.close(want_fdatasync=want_fdatasync)
+            else:
+                self._stream.close()
+            ok = True
+        finally:
+            self._transport._recorder.record(
+                "write_stream", self._url, self._start, ok, (self._size,)
+            )
+
+
+class RecordingTransportDecorator(decorator.TransportDecorator):
+    """A decorator recording the operations performed to a trace file.
+
+    get() reads the whole file so that its size and the time taken to
+    transfer it can be recorded.
+
+    This is requested via the 'record+' prefix to get_transport().
+    """
+
+    def __init__(self, url, _decorated=None, _from_transport=None):
+        super().__init__(url, _decorated)
+        if _from_transport is None:
+            self._recorder = get_recorder()
+        else:
+            self._recorder = _from_transport._recorder
+
+    @classmethod
+    def _get_url_prefix(self):
+        """Recording transport decorators are invoked via 'record+'."""
+        return "record+"
+
+    def _call(self, operation, relpath, result_args, method, *args, **kwargs):
+        """Call a method of the decorated transport and record it.
+
+        :param result_args: A callable returning the arguments to record
+            from the result of the method, or None when it failed.
+        """
+        url = self._decorated.abspath(relpath)
+        start = self._recorder.now()
+        try:
+            result = method(*args, **kwargs)
+        except BaseException:
+            self._recorder.record(operation, url, start, False, result_args(None))
+            raise
+        self._recorder.record(operation, url, start, True, result_args(result))
+        return result
+
+    def append_file(self, relpath, f, mode=None):
+        """See Transport.append_file()."""
+        f = _CountingFile(f)
+        return self._call(
+            "append",
+            relpath,
+            lambda result: (f.size,),
+            self._decorated.append_file,
+            relpath,
+            f,
+            mode=mode,
+        )
+
+    def append_bytes(self, relpath, bytes, mode=None):
+        """See Transport.append_bytes()."""
+        return self._call(
+            "append",
+            relpath,
+            lambda result: (len(bytes),),
+            self._decorated.append_bytes,
+            relpath,
+            bytes,
+            mode=mode,
+        )
+
+    def copy(self, rel_from, rel_to):
+        """See Transport.copy()."""
+        target = self._decorated.abspath(rel_to)
+        return self._call(
+            "copy",
+            rel_from,
+            lambda result: (target,),
+            self._decorated.copy,
+            rel_from,
+            rel_to,
+        )
+
+    def delete(self, relpath):
+        """See Transport.delete()."""
+        return self._call(
+            "delete", relpath, lambda result: (), self._decorated.delete, relpath
+        )
+
+    def get(self, relpath):
+        """See Transport.get()."""
+
+        def get():
+            f = self._decorated.get(relpath)
+            try:
+                return f.read()
+            finally:
+                f.close()
+
+        data = self._call(
+            "get",
+            relpath,
+            lambda result: (0 if result is None else len(result),),
+            get,
+        )
+        return BytesIO(data)
+
+    def has(self, relpath):
+        """See Transport.has()."""
+        return self._call(
+            "has",
+            relpath,
+            lambda result: (1 if result else 0,),
+            self._decorated.has,
+            relpath,
+        )
+
+    def iter_files_recursive(self):
+        """See Transport.iter_files_recursive()."""
+        return iter(
+            self._call(
+                "iter_files_recursive",
+                ".",
+                lambda result: (0 if result is None else len(result),),
+                lambda: list(self._decorated.iter_files_recursive()),
+            )
+        )
+
+    def list_dir(self, relpath):
+        """See Transport.list_dir()."""
+        return self._call(
+            "list_dir",
+            relpath,
+            lambda result: (0 if result is None else len(result),),
+            self._decorated.list_dir,
+            relpath,
+        )
+
+    def mkdir(self, relpath, mode=None):
+        """See Transport.mkdir()."""
+        return self._call(
+            "mkdir", relpath, lambda result: (), self._decorated.mkdir, relpath, mode
+        )
+
+    def move(self, rel_from, rel_to):
+        """See Transport.move()."""
+        target = self._decorated.abspath(rel_to)
+        return self._call(
+            "move",
+            rel_from,
+            lambda result: (target,),
+            self._decorated.move,
+            rel_from,
+            rel_to,
+        )
+
+    def open_write_stream(self, relpath, mode=None):
+        """See Transport.open_write_stream."""
+        start = self._recorder.now()
+        stream = self._decorated.open_write_stream(relpath, mode=mode)
+        return _RecordingFileStream(
+            self, self._decorated.abspath(relpath), stream, start
+        )
+
+    def put_file(self, relpath, f, mode=None):
+        """See Transport.put_file()."""
+        f = _CountingFile(f)
+        return self._call(
+            "put",
+            relpath,
+            lambda result: (f.size,),
+            self._decorated.put_file,
+            relpath,
+            f,
+            mode,
+        )
+
+    def put_file_non_atomic(
+        self, relpath, f, mode=None, create_parent_dir=False, dir_mode=None
+    ):
+        """See Transport.put_file_non_atomic()."""
+        f = _CountingFile(f)
+        return self._call(
+            "put_non_atomic",
+            relpath,
+            lambda result: (f.size, 1 if create_parent_dir else 0),
+            self._decorated.put_file_non_atomic,
+            relpath,
+            f,
+            mode=mode,
+            create_parent_dir=create_parent_dir,
+            dir_mode=dir_mode,
+        )
+
+    def put_bytes(self, relpath, bytes, mode=None):
+        """See Transport.put_bytes()."""
+        return self._call(
+            "put",
+            relpath,
+            lambda result: (len(bytes),),
+            self._decorated.put_bytes,
+            relpath,
+            bytes,
+            mode,
+        )
+
+    def put_bytes_non_atomic(
+        self, relpath, raw_bytes, mode=None, create_parent_dir=False, dir_mode=None
+    ):
+        """See Transport.put_bytes_non_atomic()."""
+        return self._call(
+            "put_non_atomic",
+            relpath,
+            lambda result: (len(raw_bytes), 1 if create_parent_dir else 0),
+            self._decorated.put_bytes_non_atomic,
+            relpath,
+            raw_bytes,
+            mode=mode,
+            create_parent_dir=create_parent_dir,
+            dir_mode=dir_mode,
+        )
+
+    def readv(self, relpath, offsets, adjust_for_latency=False, upper_limit=None):
+        """See Transport.readv."""
+        # Record at the readv() level rather than _readv() so that the trace
+        # has the offsets asked for, before the decorated transport coalesces
+        # them.
+        offsets = list(offsets)
+        url = self._decorated.abspath(relpath)
+        start = self._recorder.now()
+        # Only count the time spent waiting for the decorated transport, so
+        # that a replay doesn't reproduce the caller's processing as latency.
+        duration = 0.0
+        size = 0
+        ok = False
+        waiting = start
+        try:
+            for offset, data in self._decorated.readv(
+                relpath, offsets, adjust_for_latency, upper_limit
+            ):
+                duration += self._recorder.now() - waiting
+                size += len(data)
+                waiting = None
+                yield offset, data
+                waiting = self._recorder.now()
+            ok = True
+        finally:
+            if waiting is not None:
+                duration += self._recorder.now() - waiting
+            self._recorder.record(
+                "readv",
+                url,
+                start,
+                ok,
+                (
+                    _format_offsets(offsets),
+                    _format_adjust(adjust_for_latency, upper_limit),
+                    size,
+                ),
+                duration=duration,
+            )
+
+    def rename(self, rel_from, rel_to):
+        """See Transport.rename()."""
+        target = self._decorated.abspath(rel_to)
+        return self._call(
+            "rename",
+            rel_from,
+            lambda result: (target,),
+            self._decorated.rename,
+            rel_from,
+            rel_to,
+        )
+
+    def rmdir(self, relpath):
+        """See Transport.rmdir."""
+        return self._call(
+            "rmdir", relpath, lambda result: (), self._decorated.rmdir, relpath
+        )
+
+    def stat(self, relpath):
+        """See Transport.stat()."""
+        return self._call(
+            "stat",
+            relpath,
+            lambda result: (0 if result is None else result.st_size,),
+            self._decorated.stat,
+            relpath,
+        )
+
+
+def get_test_permutations():
+    """Return the permutations to be used in testing."""
+    from ..tests import test_server
+
+    return [(RecordingTransportDecorator, test_server.RecordingServer)]
@@ -55,6 +55,10 @@ class RemoteTransport(transport.ConnectedTransport):
     # When making a readv request, cap it at requesting 5MB of data
     _max_readv_bytes = 5 * 1024 * 1024
 
+    # Files are uploaded as a stream of chunks of this size, so that putting a
+    # large file does not need to hold all of it in memory.
+    _put_chunk_size = 64 * 1024
+
     # IMPORTANT FOR IMPLEMENTORS: RemoteTransport MUST NOT be given encoding
     # responsibilities: Put those on SmartClient or similar. This is vital for
     # the ability to support multiple versions of the smart protocol over time:
@@ -186,6 +190,39 @@ class RemoteTransport(transport.ConnectedTransport):
             context = {"relpath": args[0]} if args else {}
             self._translate_error(err, **context)
 
+    def _call_with_body_file(self, method, args, f):
+        """Call a method on the remote server, streaming a file as the body.
+
+        Body streams need version 3 of the protocol; the whole file is sent at
+        once when talking to older servers.
+
+        :return: A (response, length) tuple, length being the number of bytes
+            read from f.
+        """
+        if self._client._medium._protocol_version != 3:
+            body = f.read()
+            return self._call_with_body_bytes(method, args, body), len(body)
+        length = 0
+
+        def chunks():
+            nonlocal length
+            while True:
+                chunk = f.read(self._put_chunk_size)
+                if not chunk:
+                    return
+                length += len(chunk)
+                yield chunk
+
+        try:
+            response, response_handler = self._client.call_with_body_stream(
+                (method,) + args, chunks()
+            )
+        except errors.ErrorFromSmartServer as err:
+            # The first argument, if present, is always a path.
+            context = {"relpath": args[0]} if args else {}
+            self._translate_error(err, **context)
+        return response, length
+
     def has(self, relpath):
         """Indicate whether a remote file of the given name exists or not.
 
@@ -278,24 +315,45 @@ class RemoteTransport(transport.ConnectedTransport):
         # assumption I think - RBC 20060915
         pos = upload_file.tell()
         try:
-            return self.put_bytes(relpath, upload_file.read(), mode)
+            resp, length = self._call_with_body_file(
+                b"put",
+                (self._remote_path(relpath), self._serialise_optional_mode(mode)),
+                upload_file,
+            )
+            self._ensure_ok(resp)
         except:
             upload_file.seek(pos)
             raise
+        return length
 
     def put_file_non_atomic(
         self, relpath, f, mode=None, create_parent_dir=False, dir_mode=None
     ):
-        return self.put_bytes_non_atomic(
-            relpath,
-            f.read(),
-            mode=mode,
-            create_parent_dir=create_parent_dir,
-            dir_mode=dir_mode,
+        """See Transport.put_file_non_atomic."""
+        create_parent_str = b"F"
+        if create_parent_dir:
+            create_parent_str = b"T"
+        resp, _ = self._call_with_body_file(
+            b"put_non_atomic",
+            (
+                self._remote_path(relpath),
+                self._serialise_optional_mode(mode),
+                create_parent_str,
+                self._serialise_optional_mode(dir_mode),
+            ),
+            f,
         )
+        self._ensure_ok(resp)
 
     def append_file(self, relpath, from_file, mode=None):
-        return self.append_bytes(relpath, from_file.read(), mode)
+        resp, _ = self._call_with_body_file(
+            b"append",
+            (self._remote_path(relpath), self._serialise_optional_mode(mode)),
+            from_file,
+        )
+        if resp[0] == b"appended":
+            return int(resp[1])
+        raise errors.UnexpectedSmartServerResponse(resp)
 
     def append_bytes(self, relpath, bytes, mode=None):
         resp = self._call_with_body_bytes(
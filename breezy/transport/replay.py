@@ -0,0 +1,361 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Replay transport traces recorded by the record+ decorator.
+
+The trace refers to the files of the recorded location by URL.  Replaying it
+against another transport maps those URLs below the base of that transport,
+after creating the files and directories the trace reads from: files are
+filled with zeroes, as only the access pattern and the amount of data
+transferred matter for timing.
+"""
+
+import collections
+import os
+import time
+
+from .. import errors, osutils
+from ..commands import Command
+from ..option import Option
+
+# The size of the writes used to replay write streams.
+_WRITE_SIZE = 64 * 1024
+
+_READ_OPERATIONS = frozenset(
+    ["get", "readv", "has", "stat", "delete", "rename", "copy", "move"]
+)
+# The operations recording the URL they write to as their first argument.
+_TARGET_OPERATIONS = frozenset(["rename", "copy", "move"])
+_DIRECTORY_OPERATIONS = frozenset(["list_dir", "iter_files_recursive", "rmdir"])
+
+
+class TraceEntry(
+    collections.namedtuple(
+        "TraceEntry", ["start", "duration", "operation", "ok", "path", "args"]
+    )
+):
+    """An operation of a transport trace.
+
+    :ivar path: The path operated on, relative to the base of the trace.
+    :ivar args: The arguments recorded for the operation, as strings.
+    """
+
+    __slots__ = ()
+
+
+def _parse_offsets(text):
+    if text == "-":
+        return []
+    offsets = []
+    for offset in text.split(","):
+        start, length = offset.split("+")
+        offsets.append((int(start), int(length)))
+    return offsets
+
+
+def _parse_adjust(text):
+    """Return the adjust_for_latency and upper_limit arguments of a readv."""
+    if text == "-":
+        return False, None
+    if text == "*":
+        return True, None
+    return True, int(text)
+
+
+def read_trace(f):
+    """Read a transport trace.
+
+    :param f: A binary file the trace is read from.
+    :return: A list of TraceEntry objects, with paths relative to the
+        deepest directory containing all the URLs of the trace.
+    """
+    lines = []
+    for line in f:
+        line = line.decode("utf-8").rstrip("\n")
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split(" ")
+        if len(fields) < 5:
+            raise errors.BzrError(f"Invalid transport trace line: {line!r}")
+        lines.append(fields)
+    urls = [fields[4] for fields in lines]
+    urls.extend(fields[5] for fields in lines if fields[2] in _TARGET_OPERATIONS)
+    if not urls:
+        return []
+    base = os.path.commonprefix(urls)
+    base = base[: base.rfind("/") + 1]
+
+    def relpath(url):
+        return url[len(base) :] or "."
+
+    entries = []
+    for fields in lines:
+        args = fields[5:]
+        if fields[2] in _TARGET_OPERATIONS:
+            args = [relpath(args[0])] + args[1:]
+        entries.append(
+            TraceEntry(
+                float(fields[0]),
+                float(fields[1]),
+                fields[2],
+                fields[3] == "ok",
+                relpath(fields[4]),
+                args,
+            )
+        )
+    return entries
+
+
+def prepare(transport, entries):
+    """Create the files and directories a trace reads from.
+
+    Files that are read before the trace writes them are created with the
+    size needed by the reads.
+
+    :param transport: The transport the trace is to be replayed against.
+    :param entries: The entries of the trace, as returned by read_trace().
+    """
+    directories = set()
+    sizes = {}
+    written = set()
+    for entry in entries:
+        path = entry.path
+        paths = [path]
+        if entry.operation in _TARGET_OPERATIONS:
+            paths.append(entry.args[0])
+        for parent in paths:
+            parent = osutils.dirname(parent)
+            while parent:
+                if parent not in written:
+                    directories.add(parent)
+                parent = osutils.dirname(parent)
+        if entry.operation in _TARGET_OPERATIONS:
+            written.add(entry.args[0])
+        if entry.operation in (
+            "mkdir",
+            "put",
+            "put_non_atomic",
+            "append",
+            "write_stream",
+        ):
+            written.add(path)
+            continue
+        if entry.operation in _DIRECTORY_OPERATIONS:
+            if entry.ok and path not in written:
+                directories.add(path)
+            continue
+        if entry.operation not in _READ_OPERATIONS or not entry.ok or path in written:
+            continue
+        if entry.operation == "has" and entry.args[0] != "1":
+            continue
+        if entry.operation == "get" or entry.operation == "stat":
+            size = int(entry.args[0])
+        elif entry.operation == "readv":
+            size = max(
+                [start + length for start, length in _parse_offsets(entry.args[0])],
+                default=0,
+            )
+            _, upper_limit = _parse_adjust(entry.args[1])
+            if upper_limit is not None:
+                size = max(size, upper_limit)
+        else:
+            size = 0
+        sizes[path] = max(sizes.get(path, 0), size)
+        if entry.operation in ("delete", "rename", "move"):
+            # The file is gone once this is replayed.
+            written.add(path)
+    directories.discard(".")
+    for directory in sorted(directories):
+        if transport.has(directory):
+            continue
+        transport.mkdir(directory)
+    for path, size in sorted(sizes.items()):
+        if path in directories or path == ".":
+            continue
+        transport.put_bytes(path, b"\0" * size)
+
+
+class ReplayResult:
+    """The outcome of replaying a trace.
+
+    :ivar operations: A Counter of the operations replayed, by name.
+    :ivar mismatches: The number of operations that failed when they had
+        succeeded in the trace, or the reverse.
+    :ivar bytes_read: The number of bytes read.
+    :ivar bytes_written: The number of bytes written.
+    :ivar elapsed: The time the replay took, in seconds.
+    :ivar recorded: The time the operations took when recorded, in seconds.
+    """
+
+    def __init__(self):
+        self.operations = collections.Counter()
+        self.mismatches = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.elapsed = 0.0
+        self.recorded = 0.0
+
+
+def _replay_entry(transport, entry):
+    """Replay one operation.
+
+    :return: A (bytes read, bytes written) tuple.
+    """
+    operation = entry.operation
+    path = entry.path
+    if operation == "get":
+        return len(transport.get_bytes(path)), 0
+    elif operation == "readv":
+        adjust, upper_limit = _parse_adjust(entry.args[1])
+        offsets = _parse_offsets(entry.args[0])
+        data = transport.readv(path, offsets, adjust, upper_limit)
+        return sum(len(bytes) for offset, bytes in data), 0
+    elif operation == "has":
+        transport.has(path)
+    elif operation == "stat":
+        transport.stat(path)
+    elif operation == "list_dir":
+        transport.list_dir(path)
+    elif operation == "iter_files_recursive":
+        list(transport.clone(path).iter_files_recursive())
+    elif operation == "put":
+        size = int(entry.args[0])
+        transport.put_bytes(path, b"\0" * size)
+        return 0, size
+    elif operation == "put_non_atomic":
+        size = int(entry.args[0])
+        transport.put_bytes_non_atomic(
+            path, b"\0" * size, create_parent_dir=entry.args[1] == "1"
+        )
+        return 0, size
+    elif operation == "append":
+        size = int(entry.args[0])
+        transport.append_bytes(path, b"\0" * size)
+        return 0, size
+    elif operation == "write_stream":
+        size = int(entry.args[0])
+        with transport.open_write_stream(path) as stream:
+            for start in range(0, size, _WRITE_SIZE):
+                stream.write(b"\0" * min(_WRITE_SIZE, size - start))
+        return 0, size
+    elif operation == "mkdir":
+        transport.mkdir(path)
+    elif operation == "rmdir":
+        transport.rmdir(path)
+    elif operation == "delete":
+        transport.delete(path)
+    elif operation == "rename":
+        transport.rename(path, entry.args[0])
+    elif operation == "copy":
+        transport.copy(path, entry.args[0])
+    elif operation == "move":
+        transport.move(path, entry.args[0])
+    else:
+        raise errors.BzrError(f"Unknown transport trace operation: {operation}")
+    return 0, 0
+
+
+def replay(transport, entries, latency=0.0):
+    """Replay a trace against a transport.
+
+    The operations are performed in order, one at a time.
+
+    :param transport: The transport to replay the trace against, usually
+        prepared with prepare().
+    :param entries: The entries of the trace, as returned by read_trace().
+    :param latency: Time to wait before each operation, in seconds, to
+        simulate the round trip time of a network.
+    :return: A ReplayResult.
+    """
+    result = ReplayResult()
+    start = time.monotonic()
+    for entry in entries:
+        if latency:
+            time.sleep(latency)
+        try:
+            bytes_read, bytes_written = _replay_entry(transport, entry)
+        except (errors.PathError, errors.TransportError, errors.LockError):
+            ok = False
+        else:
+            ok = True
+            result.bytes_read += bytes_read
+            result.bytes_written += bytes_written
+        if ok != entry.ok:
+            result.mismatches += 1
+        result.operations[entry.operation] += 1
+        result.recorded += entry.duration
+    result.elapsed = time.monotonic() - start
+    return result
+
+
+class cmd_benchmark_transport(Command):
+    __doc__ = """Replay a transport trace and report how long it takes.
+
+    Traces are recorded by accessing a location through a record+ URL, for
+    instance with "brz log record+bzr+ssh://example.com/branch"; the
+    transport.record_file option gives the file they are written to.
+
+    The trace is replayed against the --target location, an empty memory
+    transport by default.  The files the trace reads are created there
+    first, so the target should be an empty directory.  As the trace may
+    change the files, repeated replays are only comparable with the default
+    target, which is recreated for each of them.
+    """
+
+    hidden = True
+    takes_args = ["trace"]
+    takes_options = [
+        Option(
+            "target",
+            type=str,
+            help="URL of the location to replay the trace against.",
+        ),
+        Option(
+            "latency",
+            type=float,
+            help="Round trip time to simulate for each operation, in milliseconds.",
+        ),
+        Option("repeat", type=int, help="Number of times to replay the trace."),
+    ]
+
+    def run(self, trace, target=None, latency=None, repeat=None):
+        from . import get_transport
+
+        with open(trace, "rb") as f:
+            entries = read_trace(f)
+        if latency is None:
+            latency = 0.0
+        if repeat is None:
+            repeat = 1
+        for _i in range(repeat):
+            t = get_transport("memory:///" if target is None else target)
+            prepare(t, entries)
+            result = replay(t, entries, latency=latency / 1000.0)
+            self.outf.write(
+                f"replayed {len(entries)} operations in {result.elapsed:.3f}s"
+                f" (recorded: {result.recorded:.3f}s)\n"
+            )
+            for operation, count in sorted(result.operations.items()):
+                self.outf.write(f"  {operation:<22} {count}\n")
+            self.outf.write(
+                f"  {result.bytes_read} bytes read,"
+                f" {result.bytes_written} bytes written\n"
+            )
+            if result.mismatches:
+                self.outf.write(
+                    f"  {result.mismatches} operations did not succeed or fail"
+                    " as recorded\n"
+                )
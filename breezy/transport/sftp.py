@@ -24,12 +24,16 @@
 # these methods when we officially drop support for those formats.
 
 import bisect
+import collections
 import errno
+import functools
 import itertools
 import os
+import queue
 import random
 import stat
 import sys
+import threading
 import time
 
 from .. import config, debug, errors, urlutils
@@ -49,6 +53,66 @@ from ..transport import (
 SFTPError = _sftp_rs.SFTPError
 
 
+# The size of the read and write requests issued when several are kept in
+# flight. The SFTP spec only requires servers to support 32kB requests.
+_PIPELINED_REQUEST_SIZE = 32768
+
+
+def _pipelined(calls, depth):
+    """Make blocking SFTP requests from several threads.
+
+    :param calls: An iterable of callables, each making one request.
+    :param depth: The number of requests to keep in flight.
+    :return: An iterator over the results of the calls, in order.
+    """
+    if depth <= 1:
+        for call in calls:
+            yield call()
+        return
+    tasks = queue.Queue()
+    pending = collections.deque()
+    cancelled = threading.Event()
+    workers = []
+
+    def work():
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            call, result = task
+            if cancelled.is_set():
+                continue
+            try:
+                result.put((True, call()))
+            except BaseException as e:
+                result.put((False, e))
+
+    def submit(call):
+        if len(workers) < depth:
+            worker = threading.Thread(target=work, daemon=True)
+            worker.start()
+            workers.append(worker)
+        result = queue.Queue(maxsize=1)
+        tasks.put((call, result))
+        pending.append(result)
+
+    calls = iter(calls)
+    try:
+        for call in itertools.islice(calls, depth):
+            submit(call)
+        while pending:
+            succeeded, value = pending.popleft().get()
+            if not succeeded:
+                raise value
+            for call in itertools.islice(calls, 1):
+                submit(call)
+            yield value
+    finally:
+        cancelled.set()
+        for _worker in workers:
+            tasks.put(None)
+
+
 class WriteStream:
     def __init__(self, f):
         self.f = f
@@ -95,7 +159,7 @@ class SFTPLock:
 class _SFTPReadvHelper:
     """A class to help with managing the state of a readv request."""
 
-    def __init__(self, original_offsets, relpath, _report_activity):
+    def __init__(self, original_offsets, relpath, _report_activity, depth=1):
         """Create a new readv helper.
 
         :param original_offsets: The original requests given by the caller of
@@ -103,10 +167,12 @@ class _SFTPReadvHelper:
         :param relpath: The name of the file (if known)
         :param _report_activity: A Transport._report_activity bound method,
             to be called as data arrives.
+        :param depth: The number of read requests to keep in flight.
         """
         self.original_offsets = list(original_offsets)
         self.relpath = relpath
         self._report_activity = _report_activity
+        self.depth = depth
 
     def _get_requests(self):
         """Break up the offsets into individual requests over sftp.
@@ -130,7 +196,18 @@ class _SFTPReadvHelper:
                 sorted_offsets, limit=0, fudge_factor=0
             )
         )
-        requests = [(c_offset.start, c_offset.length) for c_offset in coalesced]
+        if self.depth > 1:
+            # Split the ranges so that several requests are in flight even
+            # when reading a single large range.
+            requests = []
+            for c_offset in coalesced:
+                for offset in range(
+                    0, max(c_offset.length, 1), _PIPELINED_REQUEST_SIZE
+                ):
+                    size = min(_PIPELINED_REQUEST_SIZE, c_offset.length - offset)
+                    requests.append((c_offset.start + offset, size))
+        else:
+            requests = [(c_offset.start, c_offset.length) for c_offset in coalesced]
 
         if debug.debug_flag_enabled("sftp"):
             mutter(
@@ -142,6 +219,18 @@ class _SFTPReadvHelper:
             )
         return requests
 
+    def _read_requests(self, fp, requests):
+        """Read the data of requests from fp, in order."""
+        if self.depth <= 1 or getattr(fp, "pread", None) is None:
+            # Paramiko keeps the requests of a readv in flight by itself.
+            return fp.readv(requests)
+        # Each request gets an iterator of its own, so they can be read from
+        # different threads.
+        calls = (
+            functools.partial(next, fp.readv([request]), None) for request in requests
+        )
+        return _pipelined(calls, self.depth)
+
     def request_and_yield_offsets(self, fp):
         """Request the data from the remote machine, yielding the results.
 
@@ -166,7 +255,9 @@ class _SFTPReadvHelper:
         # Create an 'unlimited' data stream, so we stop based on requests,
         # rather than just because the data stream ended. This lets us detect
         # short readv.
-        data_stream = itertools.chain(fp.readv(requests), itertools.repeat(None))
+        data_stream = itertools.chain(
+            self._read_requests(fp, requests), itertools.repeat(None)
+        )
         for (start, length), data in zip(requests, data_stream):
             if data is None and cur_coalesced is not None:
                 raise errors.ShortReadvError(self.relpath, start, length, len(data))
@@ -298,9 +389,48 @@ class SFTPTransport(ConnectedTransport):
     # 8KiB had good performance for both local and remote network operations
     _bytes_to_read_before_seek = 8192
 
+    _pipeline_depth = None
+
     def _pump(self, infile, outfile):
         return pumpfile(infile, WriteStream(outfile))
 
+    def _get_pipeline_depth(self):
+        """Return the number of requests to keep in flight."""
+        if self._pipeline_depth is None:
+            self._pipeline_depth = config.GlobalStack().get("sftp.pipeline_depth")
+        return self._pipeline_depth
+
+    def _pump_pipelined(self, infile, outfile):
+        """Copy infile into the new, empty, remote file outfile.
+
+        Several write requests are kept in flight, so the copy isn't bound
+        by the latency of each of them.
+        """
+        depth = self._get_pipeline_depth()
+        if depth <= 1:
+            return self._pump(infile, outfile)
+        pwrite = getattr(outfile, "pwrite", None)
+        if pwrite is None:
+            # Paramiko can pipeline the writes to a file by itself.
+            set_pipelined = getattr(outfile, "set_pipelined", None)
+            if set_pipelined is not None:
+                set_pipelined(True)
+            return self._pump(infile, outfile)
+        length = 0
+
+        def writes():
+            nonlocal length
+            while True:
+                data = infile.read(_PIPELINED_REQUEST_SIZE)
+                if not data:
+                    return
+                yield functools.partial(pwrite, length, data)
+                length += len(data)
+
+        for _ in _pipelined(writes(), depth):
+            pass
+        return length
+
     def _remote_path(self, relpath):
         """Return the path to be passed along the sftp protocol for relpath.
 
@@ -428,7 +558,9 @@ class SFTPTransport(ConnectedTransport):
         does not support ranges > 64K, so it caps the request size, and
         just reads until it gets all the stuff it wants.
         """
-        helper = _SFTPReadvHelper(offsets, relpath, self._report_activity)
+        helper = _SFTPReadvHelper(
+            offsets, relpath, self._report_activity, self._get_pipeline_depth()
+        )
         return helper.request_and_yield_offsets(fp)
 
     def put_file(self, relpath, f, mode=None):
@@ -453,7 +585,7 @@ class SFTPTransport(ConnectedTransport):
         closed = False
         try:
             try:
-                length = self._pump(f, fout)
+                length = self._pump_pipelined(f, fout)
             except (OSError, SFTPError) as e:
                 self._translate_io_exception(e, tmp_abspath)
             # XXX: This doesn't truly help like we would like it to.
@@ -557,7 +689,7 @@ class SFTPTransport(ConnectedTransport):
         """
 
         def writer(fout):
-            self._pump(f, fout)
+            self._pump_pipelined(f, fout)
 
         self._put_non_atomic_helper(
             relpath,
@@ -591,16 +723,25 @@ class SFTPTransport(ConnectedTransport):
 
     def iter_files_recursive(self):
         """Walk the relative paths of all files in this transport."""
+
         # progress is handled by list_dir
-        queue = list(self.list_dir("."))
-        while queue:
-            relpath = queue.pop(0)
-            st = self.stat(relpath)
-            if stat.S_ISDIR(st.st_mode):
-                for i, basename in enumerate(self.list_dir(relpath)):
-                    queue.insert(i, relpath + "/" + basename)
-            else:
-                yield relpath
+        def walk(relpaths):
+            stats = self.stat_multi(relpaths)
+            directories = [
+                relpath
+                for relpath, st in zip(relpaths, stats)
+                if stat.S_ISDIR(st.st_mode)
+            ]
+            listings = dict(zip(directories, self.list_dir_multi(directories)))
+            for relpath in relpaths:
+                if relpath in listings:
+                    yield from walk(
+                        [relpath + "/" + basename for basename in listings[relpath]]
+                    )
+                else:
+                    yield relpath
+
+        yield from walk(self.list_dir("."))
 
     def _mkdir(self, abspath, mode=None):
         local_mode = 511 if mode is None else mode
@@ -788,6 +929,29 @@ class SFTPTransport(ConnectedTransport):
         except (OSError, SFTPError) as e:
             self._translate_io_exception(e, path, ": unable to stat")
 
+    def stat_multi(self, relpaths):
+        """Return the stat information for several files.
+
+        The requests are pipelined, see the sftp.pipeline_depth option.
+
+        :return: A list of stat results, in the order of relpaths.
+        """
+        # Connect before the requests are spread over several threads
+        self._get_sftp()
+        calls = [functools.partial(self.stat, relpath) for relpath in relpaths]
+        return list(_pipelined(calls, self._get_pipeline_depth()))
+
+    def list_dir_multi(self, relpaths):
+        """Return the lists of files at several locations.
+
+        The requests are pipelined, see the sftp.pipeline_depth option.
+
+        :return: A list of lists of files, in the order of relpaths.
+        """
+        self._get_sftp()
+        calls = [functools.partial(self.list_dir, relpath) for relpath in relpaths]
+        return list(_pipelined(calls, self._get_pipeline_depth()))
+
     def readlink(self, relpath):
         """See Transport.readlink."""
         path = self._remote_path(relpath)
@@ -22,9 +22,10 @@ import os
 import socket
 import subprocess
 import sys
+import tempfile
 from typing import Set, Tuple, Type
 
-from ... import config, errors, osutils, registry, trace
+from ... import bedding, config, errors, osutils, registry, trace
 from ..._transport_rs import sftp as _sftp_rs
 
 SFTPClient = _sftp_rs.SFTPClient
@@ -330,21 +331,132 @@ class SubprocessVendor(SSHVendor):
         raise NotImplementedError(self._get_vendor_specific_argv)
 
 
+def _control_socket_dir():
+    """Return the directory holding the sockets of SSH control masters."""
+    return osutils.pathjoin(bedding.cache_dir(), "ssh")
+
+
 class OpenSSHSubprocessVendor(SubprocessVendor):
     """SSH vendor that uses the 'ssh' executable from OpenSSH."""
 
     executable_path = "ssh"
 
+    _common_options = [
+        "-oForwardX11=no",
+        "-oForwardAgent=no",
+        "-oClearAllForwardings=yes",
+        "-oNoHostAuthenticationForLocalhost=yes",
+    ]
+
+    def _get_control_path(self):
+        """Return the path of the sockets of the control masters.
+
+        The control socket is named after a hash of the user, host and port
+        (OpenSSH's %C), so each destination gets its own master.
+
+        :return: The path, or None if connections are not shared
+        """
+        persist = config.GlobalStack().get("ssh.control_persist")
+        if persist <= 0 or sys.platform == "win32":
+            return None
+        directory = _control_socket_dir()
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        except OSError as e:
+            trace.mutter("unable to create ssh control directory %s: %s", directory, e)
+            return None
+        return osutils.pathjoin(directory, "%C")
+
+    def _get_destination_argv(self, username, host, port):
+        args = []
+        if port is not None:
+            args.extend(["-p", str(port)])
+        if username is not None:
+            args.extend(["-l", username])
+        args.extend(["--", host])
+        return args
+
+    def _get_control_master_argv(self, username, host, port, control_path):
+        """Return the arguments starting a control master in the background.
+
+        The master goes to the background once authenticated (-f), runs no
+        command (-N) and exits once it has been idle for
+        ssh.control_persist seconds.
+        """
+        persist = config.GlobalStack().get("ssh.control_persist")
+        return (
+            [self.executable_path, "-f", "-N", "-oLogLevel=ERROR"]
+            + self._common_options
+            + [
+                "-oControlMaster=yes",
+                "-oControlPath=" + control_path,
+                f"-oControlPersist={persist}",
+            ]
+            + self._get_destination_argv(username, host, port)
+        )
+
+    def _start_control_master(self, username, host, port):
+        """Start a control master for a destination, unless one is running.
+
+        The master outlives brz, so it is not started by the connection
+        itself, which would keep the pipes of brz open. It gets none of them,
+        and what it writes to stderr goes to the log instead.
+        """
+        control_path = self._get_control_path()
+        if control_path is None:
+            return
+        check_argv = [
+            self.executable_path,
+            "-oControlPath=" + control_path,
+            "-O",
+            "check",
+        ] + self._get_destination_argv(username, host, port)
+        master_argv = self._get_control_master_argv(username, host, port, control_path)
+        try:
+            status = subprocess.call(
+                check_argv,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                **os_specific_subprocess_params(),
+            )
+            if status == 0:
+                # A master is running already.
+                return
+            # A file rather than a pipe, as the master keeps it open.
+            with tempfile.TemporaryFile() as stderr:
+                subprocess.call(
+                    master_argv,
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr,
+                    **os_specific_subprocess_params(),
+                )
+                stderr.seek(0)
+                output = stderr.read()
+        except OSError as e:
+            trace.mutter("unable to start ssh control master: %s", e)
+            return
+        if output:
+            trace.mutter("ssh control master: %s", output.decode(errors="replace"))
+
+    def connect_sftp(self, username, password, host, port):
+        self._start_control_master(username, host, port)
+        return super().connect_sftp(username, password, host, port)
+
+    def connect_ssh(self, username, password, host, port, command):
+        self._start_control_master(username, host, port)
+        return super().connect_ssh(username, password, host, port, command)
+
     def _get_vendor_specific_argv(
         self, username, host, port, subsystem=None, command=None
     ):
-        args = [
-            self.executable_path,
-            "-oForwardX11=no",
-            "-oForwardAgent=no",
-            "-oClearAllForwardings=yes",
-            "-oNoHostAuthenticationForLocalhost=yes",
-        ]
+        args = [self.executable_path] + self._common_options
+        control_path = self._get_control_path()
+        if control_path is not None:
+            # Use the master started by _start_control_master if it is
+            # running, or connect directly.
+            args.extend(["-oControlMaster=no", "-oControlPath=" + control_path])
         if port is not None:
             args.extend(["-p", str(port)])
         if username is not None:
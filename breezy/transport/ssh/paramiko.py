@@ -18,6 +18,8 @@
 import getpass
 import logging
 import os
+import threading
+import time
 from binascii import hexlify
 from typing import Dict
 
@@ -175,7 +177,16 @@ def save_host_keys():
 
 
 class ParamikoVendor(SSHVendor):
-    """Vendor that uses paramiko."""
+    """Vendor that uses paramiko.
+
+    When ssh.control_persist is positive, the authenticated paramiko
+    transports are kept by user, host and port, and later connections open
+    new channels on them rather than performing another handshake.
+    """
+
+    def __init__(self):
+        self._transports = {}
+        self._transports_lock = threading.Lock()
 
     def _hexify(self, s):
         return hexlify(s).upper()
@@ -229,8 +240,38 @@ class ParamikoVendor(SSHVendor):
         _paramiko_auth(username, password, host, port, t)
         return t
 
-    def connect_sftp(self, username, password, host, port):
+    def _get_transport(self, username, password, host, port):
+        """Return an authenticated transport, reusing a cached one if possible.
+
+        A cached transport expires once no channel has been opened on it for
+        ssh.control_persist seconds. It is forgotten rather than closed, as
+        channels opened earlier may still be using it.
+        """
+        persist = config.GlobalStack().get("ssh.control_persist")
+        if persist <= 0:
+            return self._connect(username, password, host, port)
+        key = (username, host, port)
+        with self._transports_lock:
+            cached = self._transports.pop(key, None)
+            if cached is not None:
+                t, last_used = cached
+                now = time.monotonic()
+                if t.is_active() and now - last_used <= persist:
+                    self._transports[key] = (t, now)
+                    return t
+        # Connecting may prompt for a password, so other destinations
+        # shouldn't wait for it.
         t = self._connect(username, password, host, port)
+        with self._transports_lock:
+            cached = self._transports.get(key)
+            if cached is None or not cached[0].is_active():
+                self._transports[key] = (t, time.monotonic())
+            # Otherwise another thread connected meanwhile; its transport
+            # stays cached and this one is used only once.
+        return t
+
+    def connect_sftp(self, username, password, host, port):
+        t = self._get_transport(username, password, host, port)
         try:
             return t.open_sftp_client()
         except paramiko.SSHException as e:
@@ -239,7 +280,7 @@ class ParamikoVendor(SSHVendor):
             )
 
     def connect_ssh(self, username, password, host, port, command):
-        t = self._connect(username, password, host, port)
+        t = self._get_transport(username, password, host, port)
         try:
             channel = t.open_session()
             cmdline = " ".join(command)
@@ -114,7 +114,7 @@ impl SFTPFile {
         Ok(())
     }
 
-    fn pwrite(&mut self, py: Python, offset: u64, data: &[u8]) -> PyResult<()> {
+    fn pwrite(&self, py: Python, offset: u64, data: &[u8]) -> PyResult<()> {
         py.allow_threads(|| self.sftp.pwrite(&self.file, offset, data))
             .map_err(|e| sftp_error_to_py_err(e, None))
     }
@@ -293,14 +293,14 @@ impl SFTPClient {
             .map_err(|e| sftp_error_to_py_err(e, None))
     }
 
-    fn lstat(&mut self, py: Python, path: &str, flags: Option<u32>) -> PyResult<SFTPAttributes> {
+    fn lstat(&self, py: Python, path: &str, flags: Option<u32>) -> PyResult<SFTPAttributes> {
         let path = self._adjust_cwd(path);
         py.allow_threads(|| self.sftp.lstat(path.as_str(), flags))
             .map_err(|e| sftp_error_to_py_err(e, Some(path.as_str())))
             .map(SFTPAttributes)
     }
 
-    fn stat(&mut self, py: Python, path: &str, flags: Option<u32>) -> PyResult<SFTPAttributes> {
+    fn stat(&self, py: Python, path: &str, flags: Option<u32>) -> PyResult<SFTPAttributes> {
         let path = self._adjust_cwd(path);
         py.allow_threads(|| self.sftp.stat(path.as_str(), flags))
             .map_err(|e| sftp_error_to_py_err(e, Some(path.as_str())))
@@ -457,7 +457,7 @@ impl SFTPClient {
         Ok(ret)
     }
 
-    fn opendir(&mut self, py: Python, path: &str) -> PyResult<SFTPDir> {
+    fn opendir(&self, py: Python, path: &str) -> PyResult<SFTPDir> {
         let path = self._adjust_cwd(path);
         let h = py
             .allow_threads(|| self.sftp.opendir(path.as_str()))
@@ -465,7 +465,7 @@ impl SFTPClient {
         Ok(SFTPDir(Arc::clone(&self.sftp), h))
     }
 
-    fn listdir(&mut self, py: Python, path: &str) -> PyResult<Vec<String>> {
+    fn listdir(&self, py: Python, path: &str) -> PyResult<Vec<String>> {
         let path = self._adjust_cwd(path);
         let mut dir = self.opendir(py, path.as_str())?;
         let mut entries = Vec::new();